@@ -13,10 +13,14 @@ Auxiliary functions to control the Pyrad data processing flow
     _initialize_datasets
     _process_datasets
     _postprocess_datasets
+    _save_partial_states
+    _postprocess_partial_states
     _wait_for_files
     _get_radars_data
     _generate_dataset
     _generate_prod
+    _dataset_up_to_date
+    _get_dataset_hashes
     _create_cfg_dict
     _create_datacfg_dict
     _create_dscfg_dict
@@ -59,10 +63,18 @@ from ..io.io_aux import get_datetime, get_file_list, get_scan_list
 from ..io.io_aux import get_dataset_fields, get_datatype_fields
 from ..io.io_aux import get_new_rainbow_file_name
 from ..io.trajectory import Trajectory
-from ..io.read_data_other import read_last_state
+from ..io.read_data_other import read_last_state, read_partial_state
+from ..io.write_data import write_partial_state
+from ..io.product_manifest import get_config_hash, get_product_key
+from ..io.product_manifest import get_manifest_fname, get_manifest_value
+from ..io.product_manifest import set_manifest_value, outputs_exist
 
 from ..proc.process_aux import get_process_func
 from ..prod.product_aux import get_prodgen_func
+from ..util.accumulator import merge_accumulator_states
+from ..util.dtype_utils import compact_radar_fields
+
+from .product_executor import run_products, wait_pending_products
 
 try:
     import dask
@@ -71,6 +83,11 @@ except ImportError:
 
 PROFILE_LEVEL = 0
 
+# product types keeping a state between volumes, like the movies. They are
+# generated even if their files exist so that their state is complete
+_STATEFUL_PRODUCTS = ('MOVIE', )
+
+
 def profiler(level=1):
     """
     Function to be used as decorator for memory debugging. The function will
@@ -304,7 +321,7 @@ def _initialize_datasets(dataset_levels, cfg, traj=None, infostr=None):
 @profiler(level=1)
 def _process_datasets(dataset_levels, cfg, dscfg, radar_list, master_voltime,
                       traj=None, infostr=None, MULTIPROCESSING_DSET=False,
-                      MULTIPROCESSING_PROD=False):
+                      MULTIPROCESSING_PROD=False, input_id=None):
     """
     Processes the radar volumes for a particular time stamp.
 
@@ -332,6 +349,10 @@ def _process_datasets(dataset_levels, cfg, dscfg, radar_list, master_voltime,
     MULTIPROCESSING_PROD : Bool
         If true the generation of products from each dataset will be
         parallelized
+    input_id : str or None
+        identity of the input file of the volume. If given and memoization
+        is activated the products already generated from the same input are
+        skipped
 
     Returns
     -------
@@ -357,7 +378,8 @@ def _process_datasets(dataset_levels, cfg, dscfg, radar_list, master_voltime,
                     dataset, cfg, dscfg_aux, proc_status=1,
                     radar_list=radar_list_aux, voltime=master_voltime,
                     trajectory=traj, runinfo=infostr,
-                    MULTIPROCESSING_PROD=MULTIPROCESSING_PROD))
+                    MULTIPROCESSING_PROD=MULTIPROCESSING_PROD,
+                    input_id=input_id))
 
             try:
                 jobs = dask.compute(*jobs)
@@ -381,7 +403,8 @@ def _process_datasets(dataset_levels, cfg, dscfg, radar_list, master_voltime,
                         dataset, cfg, dscfg[dataset], proc_status=1,
                         radar_list=radar_list, voltime=master_voltime,
                         trajectory=traj, runinfo=infostr,
-                        MULTIPROCESSING_PROD=MULTIPROCESSING_PROD)
+                        MULTIPROCESSING_PROD=MULTIPROCESSING_PROD,
+                        input_id=input_id)
 
                     _add_dataset(
                         new_dataset, radar_list, ind_rad,
@@ -443,6 +466,114 @@ def _postprocess_datasets(dataset_levels, cfg, dscfg, traj=None, infostr=None):
     return dscfg, traj
 
 
+def _save_partial_states(dataset_levels, dscfg, partial_state_path,
+                         chunk_id):
+    """
+    Saves the partial state of the datasets that keep a mergeable
+    accumulator or quantile sketch so that they can be post-processed once
+    the partial states of all processing chunks have been merged
+
+    Parameters
+    ----------
+    dataset_levels : dict
+        dictionary containing the list of data sets to be generated at each
+        processing level
+    dscfg : dict
+        dictionary containing the configuration data for each dataset
+    partial_state_path : str
+        path where to store the partial states. The partial states of each
+        dataset are stored in a subdirectory with the dataset name
+    chunk_id : str
+        identifier of the processing chunk used as file name
+
+    Returns
+    -------
+    postproc_levels : dict
+        dictionary containing the list of data sets without a mergeable
+        state at each processing level. They have to be post-processed as
+        usual
+
+    """
+    postproc_levels = dict()
+    for level in sorted(dataset_levels):
+        postproc_levels.update({level: []})
+        for dataset in dataset_levels[level]:
+            global_data = dscfg[dataset]['global_data']
+            if (not isinstance(global_data, dict) or
+                    ('accumulator' not in global_data and
+                     'sketch' not in global_data)):
+                postproc_levels[level].append(dataset)
+                continue
+
+            savedir = partial_state_path+dataset+'/'
+            os.makedirs(savedir, exist_ok=True)
+            fname = write_partial_state(
+                global_data, savedir+chunk_id+'.pkl')
+            if fname is None:
+                postproc_levels[level].append(dataset)
+                continue
+            print('--- Saved partial state of dataset '+dataset+': '+fname)
+
+    return postproc_levels
+
+
+def _postprocess_partial_states(dataset_levels, cfg, dscfg,
+                                partial_state_path, infostr=None):
+    """
+    Merges the partial states of each dataset saved by the processing chunks
+    and post-processes the datasets with the merged states
+
+    Parameters
+    ----------
+    dataset_levels : dict
+        dictionary containing the list of data sets to be generated at each
+        processing level
+    cfg : dict
+        processing configuration dictionary
+    dscfg : dict
+        dictionary containing the configuration data for each dataset
+    partial_state_path : str
+        path where the partial states are stored
+    infostr : str
+        Information string about the actual data processing
+        (e.g. 'RUN57'). This string is added to product files.
+
+    Returns
+    -------
+    dscfg : dict
+        the modified configuration dictionary
+
+    """
+    for level in sorted(dataset_levels):
+        print('-- Process level: '+level)
+        for dataset in dataset_levels[level]:
+            fname_list = sorted(
+                glob.glob(partial_state_path+dataset+'/*.pkl'))
+            state_list = []
+            for fname in fname_list:
+                state = read_partial_state(fname)
+                if state is not None:
+                    state_list.append(state)
+            if not state_list:
+                continue
+
+            print('--- Merging '+str(len(state_list)) +
+                  ' partial states of dataset: '+dataset)
+            for state in merge_accumulator_states(state_list):
+                dscfg[dataset]['global_data'] = state
+                dscfg[dataset]['initialized'] = 1
+                _generate_dataset(
+                    dataset, cfg, dscfg[dataset], proc_status=2,
+                    radar_list=None, voltime=None, runinfo=infostr)
+
+                gc.collect()
+
+    # manual garbage collection after post-processing
+    gc.collect()
+
+    return dscfg
+
+
 def _wait_for_files(nowtime, datacfg, datatype_list, last_processed=None):
     """
     Waits for the master file and all files in a volume scan to be present
@@ -704,7 +835,7 @@ def _get_radars_data(master_voltime, datatypesdescr_list, datacfg,
 @profiler(level=2)
 def _generate_dataset(dsname, cfg, dscfg, proc_status=0, radar_list=None,
                       voltime=None, trajectory=None, runinfo=None,
-                      MULTIPROCESSING_PROD=False):
+                      MULTIPROCESSING_PROD=False, input_id=None):
     """
     generates a new dataset
 
@@ -729,6 +860,10 @@ def _generate_dataset(dsname, cfg, dscfg, proc_status=0, radar_list=None,
     MULTIPROCESSING_PROD : Bool
         If true the generation of products from each dataset will be
         parallelized
+    input_id : str or None
+        identity of the input file of the volume. If given and memoization
+        is activated the products already generated from the same input are
+        skipped
 
     Returns
     -------
@@ -743,7 +878,20 @@ def _generate_dataset(dsname, cfg, dscfg, proc_status=0, radar_list=None,
 
 
     """
-    dscfg = deepcopy(dscfg)
+    # memoization applies only to the processing of the volumes
+    memoize = cfg.get('memoize', 0) and proc_status == 1 and input_id
+    if not memoize:
+        input_id = None
+    elif _dataset_up_to_date(dsname, cfg, dscfg, voltime, runinfo, input_id):
+        print('---- Dataset up to date: '+dsname)
+        return None, None, dsname, dscfg
+
+    # the global data is not copied so that accumulated data can be updated
+    # in place
+    global_data = dscfg.get('global_data', None)
+    dscfg = deepcopy(
+        {key: value for key, value in dscfg.items() if key != 'global_data'})
+    dscfg['global_data'] = global_data
 
     dscfg['timeinfo'] = voltime
     try:
@@ -756,6 +904,10 @@ def _generate_dataset(dsname, cfg, dscfg, proc_status=0, radar_list=None,
     if isinstance(proc_ds_func, str):
         proc_ds_func = getattr(proc, proc_ds_func)
 
+    # the products of the previous volume left running may use data that
+    # is updated in place
+    wait_pending_products((cfg['name'], dsname))
+
     # Create dataset
     if 'trajectory' in inspect.getfullargspec(proc_ds_func).args:
         new_dataset, ind_rad = proc_ds_func(proc_status, dscfg,
@@ -765,9 +917,27 @@ def _generate_dataset(dsname, cfg, dscfg, proc_status=0, radar_list=None,
         new_dataset, ind_rad = proc_ds_func(proc_status, dscfg,
                                             radar_list=radar_list)
 
+    if memoize:
+        # a dataset keeping no state can be skipped when its products are
+        # up to date
+        stateless = dscfg['global_data'] is None and not dscfg['initialized']
+        manifest_fname = get_manifest_fname(
+            cfg['saveimgbasepath'], cfg['name'], dsname)
+        stateless_key = 'stateless:'+cfg['dataset_hashes'][dsname]
+        if get_manifest_value(manifest_fname, stateless_key) != stateless:
+            set_manifest_value(manifest_fname, stateless_key, stateless)
+
     if new_dataset is None:
         return None, None, dsname, dscfg
 
+    # the radar object and its fields may be shared with the dataset state
+    # so that compact copies of them are used
+    if dscfg.get('compactdtype', 0) and isinstance(new_dataset, dict):
+        if new_dataset.get('radar_out', None) is not None:
+            new_dataset = dict(new_dataset)
+            new_dataset['radar_out'] = compact_radar_fields(
+                new_dataset['radar_out'])
+
     try:
         prod_func = get_prodgen_func(dsformat, dscfg['dsname'],
                                      dscfg['type'])
@@ -778,20 +948,19 @@ def _generate_dataset(dsname, cfg, dscfg, proc_status=0, radar_list=None,
     # create the data set products
     if 'products' in dscfg:
         if MULTIPROCESSING_PROD:
-            jobs = []
-            for product in dscfg['products']:
-                # delay the data hashing
-                new_dataset = dask.delayed(new_dataset)
-                jobs.append(dask.delayed(_generate_prod)(
-                    new_dataset, cfg, product, prod_func, dscfg['dsname'],
-                    voltime, runinfo=runinfo))
-
-            dask.compute(*jobs)
+            products = list(dscfg['products'])
+            run_products(
+                _generate_prod, products,
+                [dscfg['products'][product]['type'] for product in products],
+                pending_key=(cfg['name'], dsname), dataset=new_dataset,
+                cfg=cfg, prdfunc=prod_func, dsname=dscfg['dsname'],
+                voltime=voltime, runinfo=runinfo, input_id=input_id)
 
         else:
             for product in dscfg['products']:
                 _generate_prod(new_dataset, cfg, product, prod_func,
-                               dscfg['dsname'], voltime, runinfo=runinfo)
+                               dscfg['dsname'], voltime, runinfo=runinfo,
+                               input_id=input_id)
 
                 gc.collect()
     return new_dataset, ind_rad, dsname, dscfg
@@ -799,7 +968,7 @@ def _generate_dataset(dsname, cfg, dscfg, proc_status=0, radar_list=None,
 
 @profiler(level=3)
 def _generate_prod(dataset, cfg, prdname, prdfunc, dsname, voltime,
-                   runinfo=None):
+                   runinfo=None, input_id=None):
     """
     generates a product
 
@@ -819,6 +988,10 @@ def _generate_prod(dataset, cfg, prdname, prdfunc, dsname, voltime,
         reference time of the radar(s)
     runinfo : str
         string containing run info
+    input_id : str or None
+        identity of the input file of the volume. If given the product is
+        skipped if it has already been generated from the same input and
+        its files exist
 
     Returns
     -------
@@ -829,14 +1002,125 @@ def _generate_prod(dataset, cfg, prdname, prdfunc, dsname, voltime,
     print('---- Processing product: ' + prdname)
     prdcfg = _create_prdcfg_dict(cfg, dsname, prdname, voltime,
                                  runinfo=runinfo)
+
+    if prdcfg['type'] in _STATEFUL_PRODUCTS:
+        input_id = None
+
+    if input_id is not None:
+        manifest_fname = get_manifest_fname(
+            cfg['saveimgbasepath'], cfg['name'], dsname)
+        prd_key = get_product_key(
+            prdcfg, cfg['dataset_hashes'][dsname], input_id)
+        if outputs_exist(get_manifest_value(manifest_fname, prd_key)):
+            print('---- Product up to date: ' + prdname)
+            return False
+
     try:
-        prdfunc(dataset, prdcfg)
-        return False
+        fname_list = prdfunc(dataset, prdcfg)
     except Exception as inst:
         warn(str(inst))
         traceback.print_exc()
         return True
 
+    if input_id is not None:
+        if isinstance(fname_list, str):
+            fname_list = [fname_list]
+        if (isinstance(fname_list, list) and fname_list and
+                all(isinstance(fname, str) for fname in fname_list)):
+            set_manifest_value(manifest_fname, prd_key, fname_list)
+
+    return False
+
+
+def _dataset_up_to_date(dsname, cfg, dscfg, voltime, runinfo, input_id):
+    """
+    Checks whether the processing of a dataset can be skipped because all
+    its products have already been generated from the same input. Only
+    datasets that do not keep a state between volumes and whose data is
+    not used by other datasets can be skipped
+
+    Parameters
+    ----------
+    dsname : str
+        name of the dataset
+    cfg : dict
+        configuration data
+    dscfg : dict
+        dataset configuration data
+    voltime : datetime object
+        reference time of the radar(s)
+    runinfo : str
+        string containing run info
+    input_id : str
+        identity of the input file of the volume
+
+    Returns
+    -------
+    up_to_date : bool
+        True if the dataset can be skipped
+
+    """
+    if dscfg.get('MAKE_GLOBAL', 0) or not dscfg.get('products', None):
+        return False
+
+    manifest_fname = get_manifest_fname(
+        cfg['saveimgbasepath'], cfg['name'], dsname)
+    if not get_manifest_value(
+            manifest_fname, 'stateless:'+cfg['dataset_hashes'][dsname]):
+        return False
+
+    for prdname in dscfg['products']:
+        prdcfg = _create_prdcfg_dict(
+            cfg, dsname, prdname, voltime, runinfo=runinfo)
+        prd_key = get_product_key(
+            prdcfg, cfg['dataset_hashes'][dsname], input_id)
+        if not outputs_exist(get_manifest_value(manifest_fname, prd_key)):
+            return False
+
+    return True
+
+
+def _get_dataset_hashes(dscfg, dataset_levels):
+    """
+    Computes a hash of the configuration of each dataset. The hash of a
+    dataset includes the configuration of the datasets of the lower
+    processing levels, since its data may depend on them
+
+    Parameters
+    ----------
+    dscfg : dict
+        dictionary containing the configuration data of each dataset, as
+        created by _create_dscfg_dict. It includes the parameters of the
+        main and location config files used by the dataset (radar
+        constants, gas attenuation, data type, paths...)
+    dataset_levels : dict
+        dictionary containing the list of data sets to be generated at each
+        processing level
+
+    Returns
+    -------
+    dataset_hashes : dict
+        the hash of each dataset
+
+    """
+    # the products have their own key and the rest is the state of the run
+    exclude = ('products', 'global_data', 'initialized', 'timeinfo',
+               'traj_atplane_dict', 'traj_antenna_dict')
+    dataset_hashes = dict()
+    lower_levels_hash = ''
+    for level in sorted(dataset_levels):
+        level_hashes = [
+            get_config_hash(dscfg[dataset], exclude=exclude)
+            for dataset in dataset_levels[level]]
+        for dataset, level_hash in zip(dataset_levels[level], level_hashes):
+            dataset_hashes[dataset] = get_config_hash(
+                {'lower_levels': lower_levels_hash, 'dataset': level_hash})
+        lower_levels_hash = get_config_hash(
+            {'lower_levels': lower_levels_hash,
+             'level': sorted(level_hashes)})
+
+    return dataset_hashes
+
 
 @profiler(level=3)
 def _create_cfg_dict(cfgfile):
@@ -897,6 +1181,24 @@ def _create_cfg_dict(cfgfile):
         cfg.update({'excessgatespath': None})
     if 'dempath' not in cfg:
         cfg.update({'dempath': None})
+    if 'staticpath' not in cfg:
+        cfg.update({'staticpath': None})
+    if 'compactdtype' not in cfg:
+        cfg.update({'compactdtype': 0})
+    if 'nplotprocesses' not in cfg:
+        cfg.update({'nplotprocesses': 0})
+    if 'maxplotjobs' not in cfg:
+        cfg.update({'maxplotjobs': None})
+    if 'memoize' not in cfg:
+        cfg.update({'memoize': 0})
+    if 'nprodthreads' not in cfg:
+        cfg.update({'nprodthreads': None})
+    if 'prodtimeout' not in cfg:
+        cfg.update({'prodtimeout': None})
+    if 'csvflushtime' not in cfg:
+        cfg.update({'csvflushtime': 0.})
+    if 'csvflushsize' not in cfg:
+        cfg.update({'csvflushsize': 1048576})
     if 'smnpath' not in cfg:
         cfg.update({'smnpath': None})
     if 'disdropath' not in cfg:
@@ -999,6 +1301,8 @@ def _create_datacfg_dict(cfg):
     datacfg.update({'NumRadars': cfg['NumRadars']})
     datacfg.update({'cosmopath': cfg['cosmopath']})
     datacfg.update({'dempath': cfg['dempath']})
+    datacfg.update({'staticpath': cfg['staticpath']})
+    datacfg.update({'compactdtype': cfg['compactdtype']})
     datacfg.update({'loadbasepath': cfg['loadbasepath']})
     datacfg.update({'loadname': cfg['loadname']})
     datacfg.update({'RadarName': cfg['RadarName']})
@@ -1059,6 +1363,7 @@ def _create_dscfg_dict(cfg, dataset):
     dscfg.update({'lradomev': cfg['lradomev']})
     dscfg.update({'AntennaGain': cfg['AntennaGain']})
     dscfg.update({'attg': cfg['attg']})
+    dscfg.update({'compactdtype': cfg['compactdtype']})
     dscfg.update({'basepath': cfg['saveimgbasepath']})
     dscfg.update({'procname': cfg['name']})
     dscfg.update({'dsname': dataset})
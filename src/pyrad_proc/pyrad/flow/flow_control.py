@@ -8,7 +8,9 @@ functions to control the Pyrad data processing flow
     :toctree: generated/
 
     main
+    main_chunks
     main_rt
+    _process_chunk
 
 """
 from __future__ import print_function
@@ -20,6 +22,8 @@ from datetime import timedelta
 import gc
 import queue
 import time
+import tempfile
+import shutil
 
 from pyart import version as pyart_version
 from pyrad import version as pyrad_version
@@ -31,27 +35,39 @@ from .flow_aux import _get_datasets_list, _get_masterfile_list
 from .flow_aux import _wait_for_files, _get_radars_data
 from .flow_aux import _initialize_datasets
 from .flow_aux import _process_datasets, _postprocess_datasets
+from .flow_aux import _save_partial_states, _postprocess_partial_states
+from .flow_aux import _get_dataset_hashes, _dataset_up_to_date
+from .product_executor import start_product_executor
+from .product_executor import close_product_executor
 
 from ..io.io_aux import get_datetime
 from ..io.read_data_other import read_last_state
 from ..io.write_data import write_last_state
+from ..io.product_manifest import get_file_identity
+from ..io.buffered_csv_writer import start_csv_writer, close_csv_writer
+from ..io.buffered_csv_writer import flush_all
+
+from ..graph.plot_pool import start_plot_pool, close_plot_pool
+from ..graph.movie_writer import close_movie_writers
+from ..graph.time_height_raster import close_time_height_rasters
 
 ALLOW_USER_BREAK = False
 
 try:
+    import dask
     from dask.diagnostics import Profiler, ResourceProfiler, CacheProfiler
     from dask.diagnostics import visualize
-    from distributed import Client
     from bokeh.io import export_png
     _DASK_AVAILABLE = True
 except ImportError:
-    warn('dask not available: The processing will not be parallelized')
+    warn('dask not available: The datasets will not be parallelized')
     _DASK_AVAILABLE = False
 
 
 def main(cfgfile, starttime=None, endtime=None, trajfile="", trajtype='plane',
          flashnr=0, infostr="", MULTIPROCESSING_DSET=False,
-         MULTIPROCESSING_PROD=False, PROFILE_MULTIPROCESSING=False):
+         MULTIPROCESSING_PROD=False, PROFILE_MULTIPROCESSING=False,
+         partial_state_path=None):
     """
     Main flow control. Processes radar data off-line over a period of time
     given either by the user, a trajectory file, or determined by the last
@@ -80,9 +96,13 @@ def main(cfgfile, starttime=None, endtime=None, trajfile="", trajtype='plane',
         be parallelized
     MULTIPROCESSING_PROD : Bool
         If true the generation of products from each dataset will be
-        parallelized
+        parallelized with a pool of threads
     PROFILE_MULTIPROCESSING : Bool
         If true and code parallelized the multiprocessing is profiled
+    partial_state_path : str
+        If not None, the datasets keeping a mergeable accumulator are not
+        post-processed. Instead, their partial state is saved in this path
+        so that it can be merged with the states of other processing chunks
 
     """
     print("- PYRAD version: %s (compiled %s by %s)" %
@@ -98,21 +118,16 @@ def main(cfgfile, starttime=None, endtime=None, trajfile="", trajtype='plane',
     if ALLOW_USER_BREAK:
         input_queue = _initialize_listener()
 
+    # the products are parallelized with a pool of threads. dask is only
+    # needed to parallelize the datasets
     if not _DASK_AVAILABLE:
         MULTIPROCESSING_DSET = False
-        MULTIPROCESSING_PROD = False
         PROFILE_MULTIPROCESSING = False
 
     # check if multiprocessing profiling is necessary
-    if not MULTIPROCESSING_DSET and not MULTIPROCESSING_PROD:
-        PROFILE_MULTIPROCESSING = False
-    elif MULTIPROCESSING_DSET and MULTIPROCESSING_PROD:
+    if not MULTIPROCESSING_DSET:
         PROFILE_MULTIPROCESSING = False
 
-    if MULTIPROCESSING_DSET and MULTIPROCESSING_PROD:
-        # necessary to launch tasks from tasks
-        Client()
-
     if PROFILE_MULTIPROCESSING:
         prof = Profiler()
         rprof = ResourceProfiler()
@@ -125,6 +140,15 @@ def main(cfgfile, starttime=None, endtime=None, trajfile="", trajtype='plane',
     cfg = _create_cfg_dict(cfgfile)
     datacfg = _create_datacfg_dict(cfg)
 
+    # start the workers rendering the plots before the data is loaded
+    start_plot_pool(cfg['nplotprocesses'], max_jobs=cfg['maxplotjobs'])
+    if MULTIPROCESSING_PROD:
+        start_product_executor(
+            nthreads=cfg['nprodthreads'], timeout=cfg['prodtimeout'])
+    if cfg['csvflushtime'] > 0.:
+        start_csv_writer(
+            flush_time=cfg['csvflushtime'], flush_size=cfg['csvflushsize'])
+
     starttime, endtime, traj = _get_times_and_traj(
         trajfile, starttime, endtime, cfg['ScanPeriod'],
         last_state_file=cfg['lastStateFile'], trajtype=trajtype,
@@ -163,6 +187,10 @@ def main(cfgfile, starttime=None, endtime=None, trajfile="", trajtype='plane',
     dscfg, traj = _initialize_datasets(
         dataset_levels, cfg, traj=traj, infostr=infostr)
 
+    # products already generated by a previous run are skipped
+    if cfg['memoize']:
+        cfg['dataset_hashes'] = _get_dataset_hashes(dscfg, dataset_levels)
+
     # process all data files in file list or until user interrupts processing
     for masterfile in masterfilelist:
         if ALLOW_USER_BREAK:
@@ -178,6 +206,18 @@ def main(cfgfile, starttime=None, endtime=None, trajfile="", trajtype='plane',
 
         master_voltime = get_datetime(masterfile, masterdatatypedescr)
 
+        input_id = None
+        if cfg['memoize']:
+            input_id = get_file_identity(masterfile)
+            if input_id is not None and all(
+                    _dataset_up_to_date(
+                        dataset, cfg, dscfg[dataset], master_voltime,
+                        infostr, input_id)
+                    for level in dataset_levels
+                    for dataset in dataset_levels[level]):
+                print('- All products up to date. Volume skipped')
+                continue
+
         radar_list = _get_radars_data(
             master_voltime, datatypesdescr_list, datacfg,
             num_radars=datacfg['NumRadars'])
@@ -186,18 +226,34 @@ def main(cfgfile, starttime=None, endtime=None, trajfile="", trajtype='plane',
         dscfg, traj = _process_datasets(
             dataset_levels, cfg, dscfg, radar_list, master_voltime, traj=traj,
             infostr=infostr, MULTIPROCESSING_DSET=MULTIPROCESSING_DSET,
-            MULTIPROCESSING_PROD=MULTIPROCESSING_PROD)
+            MULTIPROCESSING_PROD=MULTIPROCESSING_PROD, input_id=input_id)
 
         # delete variables
         del radar_list
 
         gc.collect()
 
+    # the csv files are complete before the post-processing reads them
+    flush_all()
+
+    # save the partial state of the mergeable datasets
+    if partial_state_path is not None:
+        print('\n\n- Saving partial states:')
+        dataset_levels = _save_partial_states(
+            dataset_levels, dscfg, partial_state_path,
+            starttime.strftime('%Y%m%d%H%M%S'))
+
     # post-processing of the datasets
     print('\n\n- Post-processing datasets:')
     dscfg, traj = _postprocess_datasets(
         dataset_levels, cfg, dscfg, traj=traj, infostr=infostr)
 
+    close_product_executor()
+    close_plot_pool()
+    close_movie_writers()
+    close_time_height_rasters()
+    close_csv_writer()
+
     if PROFILE_MULTIPROCESSING:
         prof.unregister()
         rprof.unregister()
@@ -216,6 +272,74 @@ def main(cfgfile, starttime=None, endtime=None, trajfile="", trajtype='plane',
     print('- This is the end my friend! See you soon!')
 
 
+def main_chunks(cfgfile, starttimes, endtimes, infostr="", nprocesses=1,
+                partial_state_path=None):
+    """
+    Processes radar data off-line over a period of time split in chunks.
+    Each chunk is processed independently, in parallel if dask is
+    available. The datasets keeping a mergeable accumulator (occurrence,
+    time averages, monitoring histograms) save their partial state at the
+    end of each chunk. The partial states are then merged and the datasets
+    post-processed, yielding the same products as a sequential processing of
+    the whole period. For time averages this holds if the chunks are aligned
+    with the averaging periods
+
+    Parameters
+    ----------
+    cfgfile : str
+        path of the main config file
+    starttimes, endtimes : list of datetime objects
+        start and end time of each chunk of data to be processed
+    infostr : str
+        Information string about the actual data processing
+        (e.g. 'RUN57'). This string is added to product files.
+    nprocesses : int
+        number of chunks processed in parallel
+    partial_state_path : str
+        path where to store the partial states. If None a temporary
+        directory is used and removed at the end of the processing
+
+    """
+    remove_path = False
+    if partial_state_path is None:
+        partial_state_path = tempfile.mkdtemp(prefix='pyrad_partial_')
+        remove_path = True
+    if not partial_state_path.endswith('/'):
+        partial_state_path += '/'
+
+    print('- Number of chunks to process: '+str(len(starttimes)))
+
+    # process the chunks independently
+    if _DASK_AVAILABLE and nprocesses > 1:
+        jobs = []
+        for starttime, endtime in zip(starttimes, endtimes):
+            jobs.append(dask.delayed(_process_chunk)(
+                cfgfile, starttime, endtime, partial_state_path,
+                infostr=infostr))
+        dask.compute(*jobs, scheduler='processes', num_workers=nprocesses)
+    else:
+        for starttime, endtime in zip(starttimes, endtimes):
+            _process_chunk(
+                cfgfile, starttime, endtime, partial_state_path,
+                infostr=infostr)
+
+    # merge the partial states and post-process the datasets
+    cfg = _create_cfg_dict(cfgfile)
+    dataset_levels = _get_datasets_list(cfg)
+
+    print('\n\n- Initializing datasets:')
+    dscfg, _ = _initialize_datasets(dataset_levels, cfg, infostr=infostr)
+
+    print('\n\n- Merging partial states and post-processing datasets:')
+    _postprocess_partial_states(
+        dataset_levels, cfg, dscfg, partial_state_path, infostr=infostr)
+
+    if remove_path:
+        shutil.rmtree(partial_state_path, ignore_errors=True)
+
+    print('- This is the end my friend! See you soon!')
+
+
 def main_rt(cfgfile_list, starttime=None, endtime=None, infostr_list=None,
             proc_period=60, proc_finish=None):
     """
@@ -327,6 +451,16 @@ def main_rt(cfgfile_list, starttime=None, endtime=None, infostr_list=None,
 
         gc.collect()
 
+    # start the workers rendering the plots. The pool is shared by all the
+    # configurations
+    start_plot_pool(
+        max(cfg['nplotprocesses'] for cfg in cfg_list),
+        max_jobs=cfg_list[0]['maxplotjobs'])
+    if cfg_list[0]['csvflushtime'] > 0.:
+        start_csv_writer(
+            flush_time=cfg_list[0]['csvflushtime'],
+            flush_size=cfg_list[0]['csvflushsize'])
+
     end_proc = False
     while not end_proc:
         if ALLOW_USER_BREAK:
@@ -395,6 +529,7 @@ def main_rt(cfgfile_list, starttime=None, endtime=None, infostr_list=None,
             if masterfile is None:
                 last_processed_list[icfg] = last_processed
                 if last_processed is not None:
+                    flush_all()
                     write_last_state(last_processed, cfg['lastStateFile'])
                 continue
 
@@ -410,7 +545,9 @@ def main_rt(cfgfile_list, starttime=None, endtime=None, infostr_list=None,
                 dataset_levels, cfg, dscfg, radar_list, master_voltime,
                 infostr=infostr)
 
+            # the csv files are complete up to the last state saved
             last_processed_list[icfg] = master_voltime
+            flush_all()
             write_last_state(master_voltime, cfg['lastStateFile'])
             dscfg_list[icfg] = dscfg
 
@@ -470,6 +607,44 @@ def main_rt(cfgfile_list, starttime=None, endtime=None, infostr_list=None,
 
             gc.collect()
 
+    close_plot_pool()
+    close_movie_writers()
+    close_time_height_rasters()
+    close_csv_writer()
+
     print('- This is the end my friend! See you soon!')
 
     return end_proc
+
+
+def _process_chunk(cfgfile, starttime, endtime, partial_state_path,
+                   infostr=""):
+    """
+    Processes a chunk of data saving the partial state of the mergeable
+    datasets
+
+    Parameters
+    ----------
+    cfgfile : str
+        path of the main config file
+    starttime, endtime : datetime object
+        start and end time of the chunk
+    partial_state_path : str
+        path where to store the partial states
+    infostr : str
+        Information string about the actual data processing
+        (e.g. 'RUN57'). This string is added to product files.
+
+    Returns
+    -------
+    error : bool
+        False if the chunk could be processed
+
+    """
+    try:
+        main(cfgfile, starttime=starttime, endtime=endtime, infostr=infostr,
+             partial_state_path=partial_state_path)
+        return False
+    except ValueError as ee:
+        warn(str(ee))
+        return True
@@ -0,0 +1,233 @@
+"""
+pyrad.flow.product_executor
+===========================
+
+Persistent pools of threads generating the products of the datasets. The
+products are grouped by cost class. The light products, like the writing
+of time series in csv files, are generated in the thread processing the
+dataset, while the images and the saving of volumes are generated by their
+own pool of threads. The pools are shared by all the datasets so that they
+can be used together with the parallel processing of the datasets.
+
+The products that do not finish in time are left running. Since they may
+read data the dataset updates in place, like accumulated fields, the next
+update of the dataset waits for them.
+
+.. autosummary::
+    :toctree: generated/
+
+    start_product_executor
+    close_product_executor
+    get_product_cost_class
+    run_products
+    wait_pending_products
+    _wait_products
+
+"""
+
+from warnings import warn
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import os
+import threading
+import time
+
+# the pools of threads for each cost class, the maximum time to wait for
+# a product [s] and the futures of the products not finished in time of
+# each dataset
+_PRODUCT_EXECUTOR = {
+    'pools': dict(),
+    'timeout': None,
+    'pending': dict()}
+_PRODUCT_EXECUTOR_LOCK = threading.Lock()
+
+# patterns of the product types of each cost class. The first matching
+# class is used. The products not matching any pattern are light
+_COST_CLASS_PATTERNS = (
+    ('save', ('SAVE', )),
+    ('image', ('IMAGE', 'MAP', 'PLOT', 'CONTOUR', 'HISTOGRAM', 'QUANTILES',
+               'PROFILE', 'COVERAGE', 'MOVIE')))
+
+
+def start_product_executor(nthreads=None, nsave_threads=2, timeout=None):
+    """
+    Starts the pools of threads generating the products
+
+    Parameters
+    ----------
+    nthreads : int or None
+        number of threads generating images. If None it is the number of
+        CPUs
+    nsave_threads : int
+        number of threads saving volumes
+    timeout : float or None
+        maximum time to wait for a product [s]. If None there is no limit
+
+    """
+    if nthreads is None:
+        nthreads = os.cpu_count() or 1
+
+    close_product_executor()
+
+    with _PRODUCT_EXECUTOR_LOCK:
+        _PRODUCT_EXECUTOR['pools'] = {
+            'image': ThreadPoolExecutor(max_workers=max(1, nthreads)),
+            'save': ThreadPoolExecutor(max_workers=max(1, nsave_threads))}
+        _PRODUCT_EXECUTOR['timeout'] = timeout
+
+    print('- Product executor started with '+str(nthreads)+' image and ' +
+          str(nsave_threads)+' save threads')
+
+
+def close_product_executor():
+    """
+    Waits for the products being generated and stops the pools of threads
+
+    """
+    with _PRODUCT_EXECUTOR_LOCK:
+        pools = _PRODUCT_EXECUTOR['pools']
+        _PRODUCT_EXECUTOR['pools'] = dict()
+        _PRODUCT_EXECUTOR['pending'] = dict()
+    for pool in pools.values():
+        pool.shutdown(wait=True)
+
+
+def get_product_cost_class(prdtype):
+    """
+    Gets the cost class of a product type
+
+    Parameters
+    ----------
+    prdtype : str
+        the product type
+
+    Returns
+    -------
+    cost_class : str
+        the cost class. Can be 'save', 'image' or 'light'
+
+    """
+    for cost_class, patterns in _COST_CLASS_PATTERNS:
+        if any(pattern in prdtype for pattern in patterns):
+            return cost_class
+    return 'light'
+
+
+def run_products(func, products, prdtypes, pending_key=None, **kwargs):
+    """
+    Generates a list of products. The costly products are submitted to the
+    pools of threads first and the light products are then generated in the
+    calling thread. If the executor is not running all the products are
+    generated in the calling thread
+
+    Parameters
+    ----------
+    func : function
+        the function generating a product. The name of the product is passed
+        as keyword prdname. It returns True if the product failed
+    products : list of str
+        the names of the products
+    prdtypes : list of str
+        the types of the products
+    pending_key : hashable or None
+        key under which the products not finished in time are kept, usually
+        the dataset. They are waited for by wait_pending_products
+    kwargs :
+        the other keyword arguments of the function
+
+    Returns
+    -------
+    errors : dict
+        True for the products that failed or did not finish in time. False
+        for the others
+
+    """
+    with _PRODUCT_EXECUTOR_LOCK:
+        pools = dict(_PRODUCT_EXECUTOR['pools'])
+        timeout = _PRODUCT_EXECUTOR['timeout']
+
+    jobs = []
+    light_products = []
+    for product, prdtype in zip(products, prdtypes):
+        pool = pools.get(get_product_cost_class(prdtype), None)
+        if pool is None:
+            light_products.append(product)
+            continue
+        jobs.append((product, time.time(), pool.submit(
+            func, prdname=product, **kwargs)))
+
+    errors = dict()
+    for product in light_products:
+        errors[product] = func(prdname=product, **kwargs)
+
+    wait_errors, pending = _wait_products(jobs, timeout=timeout)
+    errors.update(wait_errors)
+
+    if pending and pending_key is not None:
+        with _PRODUCT_EXECUTOR_LOCK:
+            _PRODUCT_EXECUTOR['pending'].setdefault(
+                pending_key, []).extend(pending)
+
+    return errors
+
+
+def wait_pending_products(pending_key):
+    """
+    Waits for the products that did not finish in time. To be called before
+    the data used by the products is updated
+
+    Parameters
+    ----------
+    pending_key : hashable
+        the key under which the products were kept
+
+    """
+    with _PRODUCT_EXECUTOR_LOCK:
+        pending = _PRODUCT_EXECUTOR['pending'].pop(pending_key, [])
+
+    for product, future in pending:
+        if not future.done():
+            print('---- Waiting for product '+product)
+        try:
+            future.result()
+        except Exception as inst:
+            warn(str(inst))
+
+
+def _wait_products(jobs, timeout=None):
+    """
+    Waits for the products submitted to the pools of threads
+
+    Parameters
+    ----------
+    jobs : list of tuples
+        the name of each product, its submission time and its future
+    timeout : float or None
+        maximum time to wait for each product since its submission [s]
+
+    Returns
+    -------
+    errors : dict
+        True for the products that failed or did not finish in time. False
+        for the others
+    pending : list of tuples
+        the name and the future of the products not finished in time
+
+    """
+    errors = dict()
+    pending = []
+    for product, start_time, future in jobs:
+        remaining = None
+        if timeout is not None:
+            remaining = max(0., start_time+timeout-time.time())
+        try:
+            errors[product] = future.result(timeout=remaining)
+        except TimeoutError:
+            warn('Product '+product+' not finished after '+str(timeout) +
+                 ' s. It is left running in the background')
+            errors[product] = True
+            pending.append((product, future))
+        except Exception as inst:
+            warn(str(inst))
+            errors[product] = True
+
+    return errors, pending
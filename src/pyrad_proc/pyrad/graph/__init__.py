@@ -49,6 +49,52 @@ Plots
     get_field_name
     _plot_time_range
 
+Plot pool
+=========
+
+.. autosummary::
+    :toctree: generated/
+
+    start_plot_pool
+    close_plot_pool
+    submit_plot
+    collect_plots
+    plot_inline
+    get_plot_radar
+
+Raster plots
+============
+
+.. autosummary::
+    :toctree: generated/
+
+    plot_ppi_raster
+    plot_cappi_raster
+    get_ppi_raster_index
+    get_cappi_raster_index
+    TimeHeightRaster
+    plot_time_height_raster
+    close_time_height_rasters
+
+Map layers
+==========
+
+.. autosummary::
+    :toctree: generated/
+
+    get_map_layers
+    add_map_layers
+
+Movies
+======
+
+.. autosummary::
+    :toctree: generated/
+
+    MovieWriter
+    append_movie_frame
+    close_movie_writers
+
 """
 
 from .plots import plot_histogram, plot_histogram2, plot_density, plot_scatter
@@ -70,4 +116,18 @@ from .plots_timeseries import plot_sun_retrieval_ts, plot_ml_ts
 
 from .plots_aux import get_colobar_label, get_field_name
 
+from .plot_pool import start_plot_pool, close_plot_pool, submit_plot
+from .plot_pool import collect_plots, plot_inline, get_plot_radar
+
+from .plots_raster import plot_ppi_raster, plot_cappi_raster
+from .plots_raster import get_ppi_raster_index, get_cappi_raster_index
+
+from .time_height_raster import TimeHeightRaster, plot_time_height_raster
+from .time_height_raster import close_time_height_rasters
+
+from .map_layers import get_map_layers, add_map_layers
+
+from .movie_writer import MovieWriter, append_movie_frame
+from .movie_writer import close_movie_writers
+
 __all__ = [s for s in dir() if not s.startswith('_')]
@@ -0,0 +1,272 @@
+"""
+pyrad.graph.map_layers
+======================
+
+Cache of the static layers of the PPI maps. The maps, the range rings and
+the relief are rendered once per map configuration and radar position and
+kept as images in memory and on disk, so that they are shared among the
+products and the processes. The images of each volume are composed of the
+radar data and the cached layers.
+
+.. autosummary::
+    :toctree: generated/
+
+    get_map_layers
+    add_map_layers
+    _render_map_layers
+    _read_map_layers
+    _write_map_layers
+
+"""
+
+import os
+import hashlib
+import tempfile
+import zipfile
+from warnings import warn
+
+import numpy as np
+
+import matplotlib as mpl
+mpl.use('Agg')
+
+import matplotlib.pyplot as plt
+
+from mpl_toolkits.axes_grid1 import make_axes_locatable
+
+import pyart
+
+# map layers already rendered. The key identifies the map configuration,
+# the image size and the radar position
+_MAP_LAYER_CACHE = dict()
+_MAP_LAYER_CACHE_SIZE = 10
+
+# maps drawn below the radar data. The other maps and the range rings are
+# drawn above it
+_MAP_UNDERLAYS = ('relief', )
+
+
+def get_map_layers(radar, field_name, prdcfg):
+    """
+    Gets the static layers of a PPI map. They are read from the cache or
+    rendered if not available
+
+    Parameters
+    ----------
+    radar : Radar object
+        object containing the radar data to plot. Its position and range
+        define the range rings
+    field_name : str
+        name of the radar field to plot
+    prdcfg : dict
+        dictionary containing the product configuration
+
+    Returns
+    -------
+    layers : dict or None
+        dictionary with the images of the layers below ('under') and above
+        ('over') the radar data, None if there is nothing to draw, and their
+        extent in projection coordinates ('extent'). None if there are no
+        static layers or they could not be rendered
+
+    """
+    map_config = prdcfg['ppiMapImageConfig']
+    image_config = prdcfg['ppiImageConfig']
+
+    rng_ring = map_config.get('rngRing', 0)
+    if not map_config['maps'] and rng_ring <= 0:
+        return None
+
+    rng_max = radar.range['data'][-1]/1000.
+    key_params = (
+        map_config['lonmin'], map_config['lonmax'], map_config['latmin'],
+        map_config['latmax'], map_config['mapres'],
+        tuple(map_config['maps']), rng_ring, image_config['xsize'],
+        image_config['ysize'], image_config.get('dpi', 72),
+        np.round(radar.latitude['data'][0], 4),
+        np.round(radar.longitude['data'][0], 4),
+        np.round(rng_max, 1) if rng_ring > 0 else None)
+    key = hashlib.sha1(repr(key_params).encode('utf-8')).hexdigest()
+
+    layers = _MAP_LAYER_CACHE.get(key, None)
+    if layers is not None:
+        return layers
+
+    cachepath = map_config.get(
+        'cachepath', os.path.join(tempfile.gettempdir(), 'pyrad_map_cache'))
+    fname = os.path.join(cachepath, 'map_layers_'+key+'.npz')
+    layers = _read_map_layers(fname)
+    if layers is None:
+        try:
+            layers = _render_map_layers(radar, field_name, prdcfg)
+        except Exception as inst:
+            warn(str(inst))
+            warn('Unable to render the map layers')
+            return None
+        _write_map_layers(fname, layers)
+
+    if len(_MAP_LAYER_CACHE) >= _MAP_LAYER_CACHE_SIZE:
+        _MAP_LAYER_CACHE.pop(next(iter(_MAP_LAYER_CACHE)))
+    _MAP_LAYER_CACHE[key] = layers
+
+    return layers
+
+
+def add_map_layers(ax, layers):
+    """
+    Draws the static layers of a PPI map on the axes of a PPI map
+
+    Parameters
+    ----------
+    ax : GeoAxes object
+        the axes where the radar data has been plotted
+    layers : dict
+        the map layers as returned by get_map_layers
+
+    """
+    extent = tuple(layers['extent'])
+    for name, zorder in (('under', 0.5), ('over', 2.5)):
+        if layers[name] is None:
+            continue
+        ax.imshow(
+            layers[name], origin='upper', extent=extent,
+            transform=ax.projection, interpolation='nearest', zorder=zorder)
+    ax.set_extent(extent, crs=ax.projection)
+
+
+def _render_map_layers(radar, field_name, prdcfg):
+    """
+    Renders the static layers of a PPI map. The figure is built as in
+    plot_ppi_map, so that the layers have the same resolution as the maps
+    of the final image, but the radar data is not drawn
+
+    Parameters
+    ----------
+    radar : Radar object
+        object containing the radar data to plot
+    field_name : str
+        name of the radar field to plot
+    prdcfg : dict
+        dictionary containing the product configuration
+
+    Returns
+    -------
+    layers : dict
+        the map layers
+
+    """
+    map_config = prdcfg['ppiMapImageConfig']
+    dpi = prdcfg['ppiImageConfig'].get('dpi', 72)
+
+    maps_under = [
+        map_name for map_name in map_config['maps']
+        if map_name in _MAP_UNDERLAYS]
+    maps_over = [
+        map_name for map_name in map_config['maps']
+        if map_name not in _MAP_UNDERLAYS]
+    rng_ring = map_config.get('rngRing', 0)
+
+    layers = {'under': None, 'over': None, 'extent': None}
+    for name, maps_list in (('under', maps_under), ('over', maps_over)):
+        if not maps_list and (name == 'under' or rng_ring <= 0):
+            continue
+
+        fig = plt.figure(
+            figsize=[prdcfg['ppiImageConfig']['xsize'],
+                     prdcfg['ppiImageConfig']['ysize']], dpi=dpi)
+        fig.patch.set_alpha(0.)
+        ax = fig.add_subplot(111, aspect='equal')
+
+        display_map = pyart.graph.RadarMapDisplay(radar)
+        display_map.plot_ppi_map(
+            field_name, sweep=0, min_lon=map_config['lonmin'],
+            max_lon=map_config['lonmax'], min_lat=map_config['latmin'],
+            max_lat=map_config['latmax'], resolution=map_config['mapres'],
+            lat_lines=[], lon_lines=[], maps_list=maps_list,
+            colorbar_flag=False, fig=fig, ax=ax)
+        ax = display_map.ax
+        for artist in display_map.plots:
+            artist.set_visible(False)
+        ax.patch.set_visible(False)
+        if getattr(ax, 'background_patch', None) is not None:
+            ax.background_patch.set_visible(False)
+
+        if name == 'over' and rng_ring > 0:
+            for rng in np.arange(0., radar.range['data'][-1]/1000., rng_ring):
+                display_map.plot_range_ring(rng, ax=ax)
+
+        # keep the same axes size as the final image
+        divider = make_axes_locatable(ax)
+        divider.append_axes("right", size="5%", pad=0.05).set_visible(False)
+
+        fig.canvas.draw()
+        image = np.asarray(fig.canvas.buffer_rgba())
+        xmin, ymin, xmax, ymax = np.round(ax.bbox.extents).astype(int)
+        nrows = image.shape[0]
+        layers[name] = image[nrows-ymax:nrows-ymin, xmin:xmax].copy()
+        layers['extent'] = np.array(ax.get_extent())
+        plt.close(fig)
+
+    return layers
+
+
+def _read_map_layers(fname):
+    """
+    Reads map layers from the disk cache
+
+    Parameters
+    ----------
+    fname : str
+        name of the cache file
+
+    Returns
+    -------
+    layers : dict or None
+        the map layers. None if the file does not exist or can not be read
+
+    """
+    if not os.path.isfile(fname):
+        return None
+
+    try:
+        with np.load(fname) as npz:
+            layers = {'under': None, 'over': None, 'extent': npz['extent']}
+            for name in ('under', 'over'):
+                if name in npz.files:
+                    layers[name] = npz[name]
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile) as ee:
+        warn(str(ee))
+        warn('Unable to read map layers file '+fname)
+        return None
+
+    return layers
+
+
+def _write_map_layers(fname, layers):
+    """
+    Writes map layers in the disk cache. The file is written under a
+    temporary name and renamed so that other processes never read it
+    partially written
+
+    Parameters
+    ----------
+    fname : str
+        name of the cache file
+    layers : dict
+        the map layers
+
+    """
+    arrays = {'extent': layers['extent']}
+    for name in ('under', 'over'):
+        if layers[name] is not None:
+            arrays[name] = layers[name]
+
+    fname_tmp = fname+'.'+str(os.getpid())+'.tmp'
+    try:
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        with open(fname_tmp, 'wb') as fid:
+            np.savez_compressed(fid, **arrays)
+        os.replace(fname_tmp, fname)
+    except OSError as ee:
+        warn(str(ee))
+        warn('Unable to write map layers file '+fname)
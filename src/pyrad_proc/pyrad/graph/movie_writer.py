@@ -0,0 +1,445 @@
+"""
+pyrad.graph.movie_writer
+========================
+
+Movies built while the volumes are processed. Each new frame is piped to an
+ffmpeg encoder that is kept open until the movie is complete, so that the
+frames are never loaded all together in memory and the movie is ready when
+the last volume has been processed. Movies over a rolling time window keep
+only the encoded frames of the window in memory and are encoded again at
+each new frame.
+
+The movies are written under a temporary name and renamed once complete.
+A movie started when the processing is restarted is seeded with the frames
+of the same product saved earlier in the frame directory, so that the
+movie of the day contains the frames produced before the restart.
+
+.. autosummary::
+    :toctree: generated/
+
+    MovieWriter
+    append_movie_frame
+    close_movie_writers
+    _get_previous_frames
+
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+import datetime
+from collections import deque
+from warnings import warn
+
+# the movie writers open. The key identifies the product
+_MOVIE_WRITERS = dict()
+_MOVIE_WRITERS_LOCK = threading.Lock()
+
+# ffmpeg output options of each movie format
+_FFMPEG_OUTPUT_OPTIONS = {
+    'mp4': ['-c:v', 'libx264', '-pix_fmt', 'yuv420p',
+            '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2'],
+    'avi': ['-c:v', 'png'],
+    'gif': []}
+
+
+class MovieWriter(object):
+    """
+    Builds a movie frame by frame with an ffmpeg encoder fed through a pipe.
+    The frames are PNG images.
+
+    Attributes
+    ----------
+    fname : str
+        name of the movie file
+    fps : float
+        number of frames per second
+    window : float or None
+        length of the rolling time window [h]. If None all frames are kept
+        in the movie
+    nframes : int
+        number of frames in the movie
+
+    Methods:
+    --------
+    append : Adds a frame to the movie
+    add_previous_frames : Adds the frames saved before the writer started
+    close : Finishes the movie
+
+    """
+
+    def __init__(self, fname, fps=2., window=None):
+        """
+        Initalize the object.
+
+        Parameters
+        ----------
+        fname : str
+            name of the movie file. Its extension defines the format. Can be
+            'mp4', 'avi' or 'gif'
+        fps : float
+            number of frames per second
+        window : float or None
+            length of the rolling time window [h]
+
+        """
+        self.fname = fname
+        self.fps = fps
+        self.window = window
+        self.nframes = 0
+        self._frames = deque()
+        self._encoder = None
+
+    def append(self, frame_fname, frame_time):
+        """
+        Adds a frame to the movie
+
+        Parameters
+        ----------
+        frame_fname : str
+            name of the PNG file with the frame
+        frame_time : datetime object
+            time of the frame. Used to drop the frames out of the rolling
+            window
+
+        Returns
+        -------
+        ok : bool
+            True if the frame has been added
+
+        """
+        frame = self._read_frame(frame_fname)
+        if frame is None:
+            return False
+
+        if self.window is None:
+            if self._encoder is None:
+                self._encoder = self._start_encoder()
+                if self._encoder is None:
+                    return False
+            if not self._write_frame(self._encoder, frame):
+                self._encoder = None
+                return False
+            self.nframes += 1
+            return True
+
+        # rolling window: keep the frames of the window and encode them all
+        self._frames.append((frame_time, frame))
+        starttime = frame_time-datetime.timedelta(hours=self.window)
+        while self._frames[0][0] <= starttime:
+            self._frames.popleft()
+
+        encoder = self._start_encoder()
+        if encoder is None:
+            return False
+        for _, frame_window in self._frames:
+            if not self._write_frame(encoder, frame_window):
+                return False
+        self.nframes = len(self._frames)
+        return self._finish_encoder(encoder)
+
+    def add_previous_frames(self, frame_list):
+        """
+        Adds the frames saved before the writer was started, for example by
+        a run interrupted during the day. The movies over a rolling window
+        are encoded when the next frame is appended
+
+        Parameters
+        ----------
+        frame_list : list of tuples
+            the name of the PNG file and the time of each frame, sorted in
+            time
+
+        """
+        for frame_fname, frame_time in frame_list:
+            if self.window is None:
+                if not self.append(frame_fname, frame_time):
+                    return
+                continue
+            frame = self._read_frame(frame_fname)
+            if frame is not None:
+                self._frames.append((frame_time, frame))
+
+    def close(self):
+        """
+        Finishes the movie. The encoder is closed and the movie file is
+        moved to its final name
+
+        Returns
+        -------
+        fname : str or None
+            the name of the movie file. None if the movie could not be
+            written
+
+        """
+        if self.window is not None:
+            self._frames.clear()
+            return self.fname if self.nframes > 0 else None
+
+        if self._encoder is None:
+            return None
+        encoder = self._encoder
+        self._encoder = None
+        if not self._finish_encoder(encoder):
+            return None
+        return self.fname
+
+    def _read_frame(self, frame_fname):
+        """
+        Reads a frame
+
+        Parameters
+        ----------
+        frame_fname : str
+            name of the PNG file with the frame
+
+        Returns
+        -------
+        frame : bytes or None
+            the PNG image. None if the file could not be read
+
+        """
+        try:
+            with open(frame_fname, 'rb') as frame_file:
+                return frame_file.read()
+        except EnvironmentError as ee:
+            warn(str(ee))
+            warn('Unable to read movie frame '+frame_fname)
+            return None
+
+    def _start_encoder(self):
+        """
+        Starts an ffmpeg process reading PNG frames from its standard input
+        and writing the movie in a temporary file
+
+        Returns
+        -------
+        encoder : Popen object or None
+            the ffmpeg process. None if it could not be started
+
+        """
+        movie_format = os.path.splitext(self.fname)[1][1:].lower()
+        if movie_format not in _FFMPEG_OUTPUT_OPTIONS:
+            warn('Unsupported movie format '+movie_format)
+            return None
+
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is None:
+            warn('ffmpeg not available. Unable to write movie '+self.fname)
+            return None
+
+        fname_tmp = self._get_tmp_fname()
+        cmd = (
+            [ffmpeg, '-y', '-loglevel', 'error', '-f', 'image2pipe',
+             '-framerate', str(self.fps), '-c:v', 'png', '-i', '-'] +
+            _FFMPEG_OUTPUT_OPTIONS[movie_format] +
+            ['-f', movie_format, fname_tmp])
+        try:
+            os.makedirs(os.path.dirname(self.fname), exist_ok=True)
+            return subprocess.Popen(cmd, stdin=subprocess.PIPE)
+        except OSError as ee:
+            warn(str(ee))
+            warn('Unable to start movie encoder for '+self.fname)
+            return None
+
+    def _write_frame(self, encoder, frame):
+        """
+        Sends a frame to the encoder
+
+        Parameters
+        ----------
+        encoder : Popen object
+            the ffmpeg process
+        frame : bytes
+            the PNG image
+
+        Returns
+        -------
+        ok : bool
+            True if the frame has been sent. Otherwise the encoder is
+            stopped
+
+        """
+        try:
+            encoder.stdin.write(frame)
+            return True
+        except (BrokenPipeError, ValueError) as ee:
+            warn(str(ee))
+            warn('Movie encoder of '+self.fname+' stopped')
+            encoder.kill()
+            encoder.wait()
+            return False
+
+    def _finish_encoder(self, encoder):
+        """
+        Closes the input of the encoder, waits for it to finish and moves
+        the movie to its final name
+
+        Parameters
+        ----------
+        encoder : Popen object
+            the ffmpeg process
+
+        Returns
+        -------
+        ok : bool
+            True if the movie has been written
+
+        """
+        try:
+            encoder.stdin.close()
+        except BrokenPipeError:
+            pass
+        if encoder.wait() != 0:
+            warn('Unable to encode movie '+self.fname)
+            return False
+
+        try:
+            os.replace(self._get_tmp_fname(), self.fname)
+        except OSError as ee:
+            warn(str(ee))
+            warn('Unable to write movie '+self.fname)
+            return False
+        return True
+
+    def _get_tmp_fname(self):
+        """
+        Gets the temporary name of the movie file while it is encoded
+
+        Returns
+        -------
+        fname_tmp : str
+            the temporary file name
+
+        """
+        return self.fname+'.'+str(os.getpid())+'.tmp'
+
+
+def append_movie_frame(key, fname, frame_fname, frame_time, fps=2.,
+                       window=None):
+    """
+    Adds a frame to the movie of a product. If the movie of the product has
+    changed name, for example because a new day has started, the previous
+    movie is finished first. A new movie starts with the frames of the
+    product saved earlier in the directory of the frame
+
+    Parameters
+    ----------
+    key : str
+        identifier of the product
+    fname : str
+        name of the movie file
+    frame_fname : str
+        name of the PNG file with the frame
+    frame_time : datetime object
+        time of the frame
+    fps : float
+        number of frames per second
+    window : float or None
+        length of the rolling time window [h]. If None the movie contains
+        all the frames added with the same movie name
+
+    Returns
+    -------
+    fname_list : list of str
+        the names of the movies finished or updated
+
+    """
+    fname_list = []
+    with _MOVIE_WRITERS_LOCK:
+        writer = _MOVIE_WRITERS.get(key, None)
+        if writer is not None and writer.fname != fname:
+            fname_done = writer.close()
+            if fname_done is not None:
+                fname_list.append(fname_done)
+            writer = None
+        new_writer = writer is None
+        if new_writer:
+            writer = MovieWriter(fname, fps=fps, window=window)
+            _MOVIE_WRITERS[key] = writer
+
+    if new_writer:
+        writer.add_previous_frames(
+            _get_previous_frames(frame_fname, frame_time, window=window))
+    if writer.append(frame_fname, frame_time) and window is not None:
+        fname_list.append(fname)
+
+    return fname_list
+
+
+def close_movie_writers():
+    """
+    Finishes all the movies being written
+
+    Returns
+    -------
+    fname_list : list of str
+        the names of the movies finished
+
+    """
+    with _MOVIE_WRITERS_LOCK:
+        writers = list(_MOVIE_WRITERS.values())
+        _MOVIE_WRITERS.clear()
+
+    fname_list = []
+    for writer in writers:
+        fname = writer.close()
+        if fname is not None:
+            print('----- save to '+fname)
+            fname_list.append(fname)
+
+    return fname_list
+
+
+def _get_previous_frames(frame_fname, frame_time, window=None):
+    """
+    Gets the frames of a product saved before a given frame. They are the
+    files of the frame directory whose name only differs in the time
+    prefix
+
+    Parameters
+    ----------
+    frame_fname : str
+        name of the PNG file with the frame
+    frame_time : datetime object
+        time of the frame
+    window : float or None
+        length of the rolling time window [h]. If set only the frames within
+        the window are returned
+
+    Returns
+    -------
+    frame_list : list of tuples
+        the name of the PNG file and the time of each previous frame, sorted
+        in time
+
+    """
+    dirname, basename = os.path.split(frame_fname)
+    timestr, _, suffix = basename.partition('_')
+    starttime = None
+    if window is not None:
+        starttime = frame_time-datetime.timedelta(hours=window)
+
+    try:
+        fname_list = sorted(os.listdir(dirname))
+    except OSError as ee:
+        warn(str(ee))
+        warn('Unable to list previous movie frames in '+dirname)
+        return []
+
+    frame_list = []
+    for fname in fname_list:
+        prev_timestr, _, prev_suffix = fname.partition('_')
+        if prev_suffix != suffix or prev_timestr >= timestr:
+            continue
+        try:
+            prev_time = datetime.datetime.strptime(
+                prev_timestr, '%Y%m%d%H%M%S')
+        except ValueError:
+            continue
+        if starttime is not None and prev_time <= starttime:
+            continue
+        frame_list.append((os.path.join(dirname, fname), prev_time))
+
+    return frame_list
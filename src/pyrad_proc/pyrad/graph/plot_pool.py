@@ -0,0 +1,286 @@
+"""
+pyrad.graph.plot_pool
+=====================
+
+Pool of worker processes rendering the images of the products. The products
+submit plot jobs that contain only the data needed by the plot and go on
+with the processing while the images are rendered and encoded by the
+workers. The number of jobs pending is limited so that the processing does
+not run ahead of the rendering indefinitely.
+
+.. autosummary::
+    :toctree: generated/
+
+    start_plot_pool
+    close_plot_pool
+    submit_plot
+    collect_plots
+    plot_inline
+    get_plot_radar
+    _init_plot_worker
+    _run_plot_job
+    _collect_ready_jobs
+
+"""
+
+from warnings import warn
+from copy import copy
+from collections import deque
+from contextlib import contextmanager
+import multiprocessing
+import threading
+import traceback
+
+import matplotlib as mpl
+mpl.use('Agg')
+
+import matplotlib.pyplot as plt
+
+# the pool of workers, the jobs pending in submission order, the maximum
+# number of jobs pending and the names of the files rendered since they
+# were last collected
+_PLOT_POOL = {
+    'pool': None,
+    'jobs': deque(),
+    'max_jobs': 0,
+    'fname_list': []}
+_PLOT_POOL_LOCK = threading.Lock()
+
+# threads where the plots are rendered immediately even if the pool is
+# running
+_PLOT_INLINE = threading.local()
+
+
+def start_plot_pool(nprocesses, max_jobs=None):
+    """
+    Starts the pool of worker processes rendering the plots
+
+    Parameters
+    ----------
+    nprocesses : int
+        number of worker processes. If 0 the plots are rendered in the
+        process submitting them
+    max_jobs : int or None
+        maximum number of jobs pending. When it is reached the submission of
+        a new job waits for the oldest job to finish. If None 4 jobs per
+        worker are allowed
+
+    Returns
+    -------
+    started : bool
+        True if the pool has been started
+
+    """
+    if nprocesses < 1:
+        return False
+
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        warn('The plot pool requires forking worker processes.' +
+             ' The plots will be rendered in the processing thread')
+        return False
+
+    close_plot_pool()
+
+    if max_jobs is None:
+        max_jobs = 4*nprocesses
+
+    try:
+        ctx = multiprocessing.get_context('fork')
+        pool = ctx.Pool(processes=nprocesses, initializer=_init_plot_worker)
+    except (AssertionError, OSError, ValueError) as ee:
+        warn(str(ee))
+        warn('Unable to start the plot pool.' +
+             ' The plots will be rendered in the processing thread')
+        return False
+
+    with _PLOT_POOL_LOCK:
+        _PLOT_POOL['pool'] = pool
+        _PLOT_POOL['max_jobs'] = max(1, max_jobs)
+
+    print('- Plot pool started with '+str(nprocesses)+' workers')
+
+    return True
+
+
+def close_plot_pool():
+    """
+    Waits for the pending plot jobs and stops the pool of worker processes
+
+    Returns
+    -------
+    fname_list : list of str
+        list of names of the files rendered since they were last collected
+
+    """
+    fname_list = collect_plots(wait=True)
+
+    with _PLOT_POOL_LOCK:
+        pool = _PLOT_POOL['pool']
+        _PLOT_POOL['pool'] = None
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    return fname_list
+
+
+def submit_plot(plot_func, *args, **kwargs):
+    """
+    Submits a plot job to the pool of worker processes. If the pool is not
+    running the plot is rendered immediately
+
+    Parameters
+    ----------
+    plot_func : function
+        the plotting function. It has to be a module level function
+    args, kwargs :
+        the arguments of the plotting function. They are sent to the worker
+        so they should contain only the data needed by the plot
+
+    Returns
+    -------
+    job : AsyncResult or None
+        the job. Its get method returns the output of the plotting function.
+        None if the plot has been rendered immediately
+
+    """
+    with _PLOT_POOL_LOCK:
+        pool = _PLOT_POOL['pool']
+        if pool is None or getattr(_PLOT_INLINE, 'active', False):
+            pool_running = False
+        else:
+            pool_running = True
+            _collect_ready_jobs()
+            while len(_PLOT_POOL['jobs']) >= _PLOT_POOL['max_jobs']:
+                _PLOT_POOL['jobs'][0].wait()
+                _collect_ready_jobs()
+
+            job = pool.apply_async(_run_plot_job, (plot_func, args, kwargs))
+            _PLOT_POOL['jobs'].append(job)
+
+    if not pool_running:
+        plot_func(*args, **kwargs)
+        return None
+
+    return job
+
+
+def collect_plots(wait=False):
+    """
+    Gets the names of the files rendered by the plot jobs finished since
+    the last call
+
+    Parameters
+    ----------
+    wait : bool
+        If True waits for all the pending jobs to finish
+
+    Returns
+    -------
+    fname_list : list of str
+        list of names of the rendered files
+
+    """
+    with _PLOT_POOL_LOCK:
+        if wait:
+            for job in _PLOT_POOL['jobs']:
+                job.wait()
+        _collect_ready_jobs()
+        fname_list = _PLOT_POOL['fname_list']
+        _PLOT_POOL['fname_list'] = []
+
+    return fname_list
+
+
+@contextmanager
+def plot_inline():
+    """
+    Context in which the plots submitted by the current thread are rendered
+    immediately, so that the files exist when the products return. Used by
+    the products that need to read back the images they generate
+
+    """
+    active = getattr(_PLOT_INLINE, 'active', False)
+    _PLOT_INLINE.active = True
+    try:
+        yield
+    finally:
+        _PLOT_INLINE.active = active
+
+
+def get_plot_radar(radar, field_name, sweeps=None):
+    """
+    Gets a radar object with only the data needed to plot a field
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object containing the data
+    field_name : str
+        the name of the field to plot
+    sweeps : list of int or None
+        the sweeps to plot. If None all the sweeps are kept
+
+    Returns
+    -------
+    radar_plot : radar object
+        radar object with only the field and the sweeps to plot
+
+    """
+    radar_plot = copy(radar)
+    radar_plot.fields = {field_name: radar.fields[field_name]}
+    if sweeps is not None:
+        radar_plot = radar_plot.extract_sweeps(sweeps)
+
+    return radar_plot
+
+
+def _init_plot_worker():
+    """
+    Initializes a worker process of the pool. The Agg backend is selected
+    once so that the workers are ready to render
+
+    """
+    mpl.use('Agg')
+    plt.close('all')
+
+
+def _run_plot_job(plot_func, args, kwargs):
+    """
+    Renders a plot in a worker process
+
+    Parameters
+    ----------
+    plot_func : function
+        the plotting function
+    args, kwargs :
+        the arguments of the plotting function
+
+    Returns
+    -------
+    output : object
+        the output of the plotting function. None if it failed
+
+    """
+    try:
+        return plot_func(*args, **kwargs)
+    except Exception as inst:
+        warn(str(inst))
+        traceback.print_exc()
+        return None
+    finally:
+        plt.close('all')
+
+
+def _collect_ready_jobs():
+    """
+    Removes the finished jobs from the head of the queue of pending jobs and
+    keeps the names of the files they rendered. It has to be called with the
+    pool lock acquired
+
+    """
+    jobs = _PLOT_POOL['jobs']
+    while jobs and jobs[0].ready():
+        output = jobs.popleft().get()
+        if isinstance(output, list):
+            _PLOT_POOL['fname_list'].extend(output)
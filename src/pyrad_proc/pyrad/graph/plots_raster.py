@@ -0,0 +1,586 @@
+"""
+pyrad.graph.plots_raster
+========================
+
+Functions to plot PPI and CAPPI images as rasters. The pixels of the image
+are mapped to the radar gates once per scan geometry and image
+configuration. Afterwards each image is obtained by gathering the colour
+index of the gates into the pixels and applying the colormap as a look-up
+table. Matplotlib is used only to annotate the raster.
+
+.. autosummary::
+    :toctree: generated/
+
+    plot_ppi_raster
+    plot_cappi_raster
+    get_ppi_raster_index
+    get_cappi_raster_index
+    _get_raster_grid
+    _get_pixel_centres
+    _get_ray_index
+    _get_gate_edges
+    _store_index
+    _get_colour_index
+    _get_lut
+    _save_raster
+
+"""
+
+import numpy as np
+
+import matplotlib as mpl
+mpl.use('Agg')
+
+import matplotlib.pyplot as plt
+
+import pyart
+
+from .plots_aux import get_colobar_label, get_norm
+from ..util.radar_utils import get_geometry_key
+
+# pixel to gate index maps already computed. The key identifies the scan
+# geometry, the plotted sweep or altitude and the image configuration
+_RASTER_INDEX_CACHE = dict()
+_RASTER_INDEX_CACHE_SIZE = 20
+
+# colour index of the pixels without data
+_NODATA_INDEX = 255
+
+
+def plot_ppi_raster(radar, field_name, ind_el, prdcfg, fname_list,
+                    titl=None):
+    """
+    plots a PPI as a raster. The value of each pixel is the value of the
+    radar gate closest to the pixel centre
+
+    Parameters
+    ----------
+    radar : Radar object
+        object containing the radar data to plot
+    field_name : str
+        name of the radar field to plot
+    ind_el : int
+        sweep index to plot
+    prdcfg : dict
+        dictionary containing the product configuration
+    fname_list : list of str
+        list of names of the files where to store the plot
+    titl : str
+        Plot title. If None it is generated from the radar metadata
+
+    Returns
+    -------
+    fname_list : list of str
+        list of names of the created plots
+
+    """
+    index, extent = get_ppi_raster_index(
+        radar, ind_el, prdcfg['ppiImageConfig'])
+
+    ind_start = radar.sweep_start_ray_index['data'][ind_el]
+    ind_end = radar.sweep_end_ray_index['data'][ind_el]
+    colour_index, cmap, norm = _get_colour_index(
+        radar.fields[field_name]['data'][ind_start:ind_end+1, :],
+        field_name)
+
+    if titl is None:
+        titl = pyart.graph.common.generate_title(radar, field_name, ind_el)
+
+    rng_max = None
+    if prdcfg['ppiImageConfig'].get('rngRing', 0) > 0:
+        rng_max = radar.range['data'][-1]/1000.
+
+    return _save_raster(
+        colour_index[index], extent, cmap, norm, radar.fields[field_name],
+        field_name, titl, prdcfg['ppiImageConfig'], fname_list,
+        rng_max=rng_max)
+
+
+def plot_cappi_raster(radar, field_name, altitude, prdcfg, fname_list):
+    """
+    plots a Constant Altitude Plan Position Indicator CAPPI as a raster. The
+    value of each pixel is the value of the gate closest to the pixel centre
+    in the sweep whose beam is closest to the CAPPI altitude
+
+    Parameters
+    ----------
+    radar : Radar object
+        object containing the radar data to plot
+    field_name : str
+        name of the radar field to plot
+    altitude : float
+        the altitude [m MSL] to be plotted
+    prdcfg : dict
+        dictionary containing the product configuration
+    fname_list : list of str
+        list of names of the files where to store the plot
+
+    Returns
+    -------
+    fname_list : list of str
+        list of names of the created plots
+
+    """
+    index, extent = get_cappi_raster_index(
+        radar, altitude, prdcfg['ppiImageConfig'],
+        cappi_res=prdcfg.get('res', 500.))
+
+    colour_index, cmap, norm = _get_colour_index(
+        radar.fields[field_name]['data'], field_name)
+
+    time_begin = pyart.graph.common.generate_radar_time_begin(radar)
+    titl = (
+        pyart.graph.common.generate_radar_name(radar)+' ' +
+        '{:.1f}'.format(altitude/1000.)+' km ' +
+        time_begin.isoformat()+'Z\n' +
+        pyart.graph.common.generate_field_name(radar, field_name))
+
+    return _save_raster(
+        colour_index[index], extent, cmap, norm, radar.fields[field_name],
+        field_name, titl, prdcfg['ppiImageConfig'], fname_list)
+
+
+def get_ppi_raster_index(radar, ind_el, image_config):
+    """
+    Gets the index of the radar gate closest to the centre of each pixel of
+    a PPI image. The gates are projected on the ground using the mean
+    elevation of the sweep
+
+    Parameters
+    ----------
+    radar : Radar object
+        the radar object containing the scan geometry
+    ind_el : int
+        sweep index
+    image_config : dict
+        the PPI image configuration
+
+    Returns
+    -------
+    index : int array (ny, nx)
+        index of the gate of each pixel in the flattened sweep data. Pixels
+        without gate point to the element after the last gate
+    extent : tuple
+        the limits of the raster [km]
+
+    """
+    key, extent, shape = _get_raster_grid(radar, ('PPI', ind_el), image_config)
+    index = _RASTER_INDEX_CACHE.get(key, None)
+    if index is not None:
+        return index, extent
+    xpix, ypix = _get_pixel_centres(extent, shape)
+
+    ind_start = radar.sweep_start_ray_index['data'][ind_el]
+    ind_end = radar.sweep_end_ray_index['data'][ind_el]
+    nrays = ind_end-ind_start+1
+    ngates = radar.ngates
+    azi = radar.azimuth['data'][ind_start:ind_end+1]
+    ele = np.mean(radar.elevation['data'][ind_start:ind_end+1])
+
+    ray_ind = _get_ray_index(azi, xpix, ypix, radar.ray_angle_res, ind_el)
+
+    # ground distance of the gates along the beam
+    xgate, _, _ = pyart.core.antenna_to_cartesian(
+        radar.range['data']/1000., 90., ele)
+    gate_ind = np.searchsorted(
+        _get_gate_edges(xgate), np.sqrt(xpix*xpix+ypix*ypix)*1000.)-1
+
+    valid = (ray_ind >= 0) & (gate_ind >= 0) & (gate_ind < ngates)
+    index = _store_index(
+        key, np.where(valid, ray_ind*ngates+gate_ind, nrays*ngates))
+
+    return index, extent
+
+
+def get_cappi_raster_index(radar, altitude, image_config, cappi_res=500.):
+    """
+    Gets the index of the radar gate used for each pixel of a CAPPI image.
+    At each pixel the gate closest to the pixel centre is taken from the
+    sweep whose beam centre is closest to the CAPPI altitude. Pixels where
+    no beam is within the radius of influence used by plot_cappi are left
+    without data
+
+    Parameters
+    ----------
+    radar : Radar object
+        the radar object containing the scan geometry
+    altitude : float
+        the CAPPI altitude [m MSL]
+    image_config : dict
+        the PPI image configuration
+    cappi_res : float
+        the CAPPI resolution [m]. Used as minimum radius of influence
+
+    Returns
+    -------
+    index : int array (ny, nx)
+        index of the gate of each pixel in the flattened radar data. Pixels
+        without gate point to the element after the last gate
+    extent : tuple
+        the limits of the raster [km]
+
+    """
+    key, extent, shape = _get_raster_grid(
+        radar, ('CAPPI', altitude, cappi_res), image_config)
+    index = _RASTER_INDEX_CACHE.get(key, None)
+    if index is not None:
+        return index, extent
+    xpix, ypix = _get_pixel_centres(extent, shape)
+
+    beamwidth = 1.
+    beam_spacing = 1.
+    if (radar.instrument_parameters is not None and
+            'radar_beam_width_h' in radar.instrument_parameters):
+        beamwidth = radar.instrument_parameters[
+            'radar_beam_width_h']['data'][0]
+    if radar.ray_angle_res is not None:
+        beam_spacing = radar.ray_angle_res['data'][0]
+
+    ngates = radar.ngates
+    dist = np.sqrt(xpix*xpix+ypix*ypix)*1000.
+    height = altitude-radar.altitude['data'][0]
+    roi = np.maximum(
+        dist*np.tan(np.deg2rad(beamwidth*beam_spacing)), cappi_res/2.)
+
+    index = np.ma.masked_all(xpix.shape, dtype=np.int64)
+    dz_min = np.ma.masked_all(xpix.shape, dtype=np.float64)
+    for ind_el in range(radar.nsweeps):
+        ind_start = radar.sweep_start_ray_index['data'][ind_el]
+        ind_end = radar.sweep_end_ray_index['data'][ind_el]
+        azi = radar.azimuth['data'][ind_start:ind_end+1]
+        ele = np.mean(radar.elevation['data'][ind_start:ind_end+1])
+
+        ray_ind = _get_ray_index(
+            azi, xpix, ypix, radar.ray_angle_res, ind_el)
+
+        xgate, _, zgate = pyart.core.antenna_to_cartesian(
+            radar.range['data']/1000., 90., ele)
+        gate_ind = np.searchsorted(_get_gate_edges(xgate), dist)-1
+
+        valid = (ray_ind >= 0) & (gate_ind >= 0) & (gate_ind < ngates)
+        dz = np.ma.masked_where(
+            ~valid, np.abs(zgate[np.clip(gate_ind, 0, ngates-1)]-height))
+        dz = np.ma.masked_where(dz > roi, dz)
+
+        closer = ~np.ma.getmaskarray(dz) & (
+            np.ma.getmaskarray(dz_min) | (dz < dz_min).filled(False))
+        dz_min[closer] = dz[closer]
+        index[closer] = (ind_start+ray_ind[closer])*ngates+gate_ind[closer]
+
+    index = _store_index(key, index.filled(radar.nrays*ngates))
+
+    return index, extent
+
+
+def _get_raster_grid(radar, plot_key, image_config):
+    """
+    Gets the cache key, the limits and the shape of a raster. The raster
+    covers the whole figure. The limits of the image are enlarged as needed
+    to keep the pixels square
+
+    Parameters
+    ----------
+    radar : Radar object
+        the radar object containing the scan geometry
+    plot_key : tuple
+        identifier of what is plotted (type of image, sweep, altitude...)
+    image_config : dict
+        the image configuration
+
+    Returns
+    -------
+    key : tuple
+        the key of the pixel to gate index map in the cache
+    extent : tuple
+        the limits of the raster (xmin, xmax, ymin, ymax) [km]
+    shape : tuple
+        the number of pixels of the raster (ny, nx)
+
+    """
+    dpi = image_config.get('dpi', 72)
+    nx = int(round(image_config['xsize']*dpi))
+    ny = int(round(image_config['ysize']*dpi))
+
+    xmin = image_config['xmin']
+    xmax = image_config['xmax']
+    ymin = image_config['ymin']
+    ymax = image_config['ymax']
+    pix_size = max((xmax-xmin)/nx, (ymax-ymin)/ny)
+    xmid = (xmin+xmax)/2.
+    ymid = (ymin+ymax)/2.
+    extent = (
+        xmid-pix_size*nx/2., xmid+pix_size*nx/2.,
+        ymid-pix_size*ny/2., ymid+pix_size*ny/2.)
+
+    key = (get_geometry_key(radar), )+tuple(plot_key)+extent+(nx, ny)
+
+    return key, extent, (ny, nx)
+
+
+def _get_pixel_centres(extent, shape):
+    """
+    Gets the coordinates of the pixel centres of a raster
+
+    Parameters
+    ----------
+    extent : tuple
+        the limits of the raster (xmin, xmax, ymin, ymax) [km]
+    shape : tuple
+        the number of pixels of the raster (ny, nx)
+
+    Returns
+    -------
+    xpix, ypix : float arrays (ny, nx)
+        the coordinates of the pixel centres [km]. The first row is the
+        northernmost
+
+    """
+    ny, nx = shape
+    pix_size = (extent[1]-extent[0])/nx
+
+    return np.meshgrid(
+        extent[0]+(np.arange(nx)+0.5)*pix_size,
+        extent[3]-(np.arange(ny)+0.5)*pix_size)
+
+
+def _get_ray_index(azi, xpix, ypix, ray_angle_res, ind_el):
+    """
+    Gets the index of the ray closest in azimuth to each pixel. Pixels
+    further than one ray spacing from any ray are left without ray
+
+    Parameters
+    ----------
+    azi : float array
+        the azimuth of the rays of the sweep [deg]
+    xpix, ypix : float arrays
+        the coordinates of the pixel centres [km]
+    ray_angle_res : dict or None
+        the ray angle resolution of the radar object
+    ind_el : int
+        sweep index
+
+    Returns
+    -------
+    ray_ind : int array
+        index of the ray within the sweep. -1 for pixels without ray
+
+    """
+    order = np.argsort(azi)
+    azi_sorted = azi[order]
+    if ray_angle_res is not None:
+        spacing = ray_angle_res['data'][ind_el]
+    elif azi_sorted.size > 1:
+        spacing = np.median(np.diff(azi_sorted))
+    else:
+        spacing = 1.
+
+    # the sorted azimuths are extended to wrap around north
+    azi_ext = np.concatenate(
+        ([azi_sorted[-1]-360.], azi_sorted, [azi_sorted[0]+360.]))
+    order_ext = np.concatenate(([order[-1]], order, [order[0]]))
+
+    azi_pix = np.mod(np.rad2deg(np.arctan2(xpix, ypix)), 360.)
+    ind = np.searchsorted((azi_ext[1:]+azi_ext[:-1])/2., azi_pix)
+    ray_ind = order_ext[ind]
+    ray_ind[np.abs(azi_ext[ind]-azi_pix) > spacing] = -1
+
+    return ray_ind
+
+
+def _get_gate_edges(gate_dist):
+    """
+    Gets the limits of the gates along the beam
+
+    Parameters
+    ----------
+    gate_dist : float array
+        the distance of the gate centres from the radar
+
+    Returns
+    -------
+    edges : float array
+        the limits of the gates. It has one element more than the gates
+
+    """
+    if gate_dist.size == 1:
+        return np.array([0., 2.*gate_dist[0]])
+    mid = (gate_dist[1:]+gate_dist[:-1])/2.
+    return np.concatenate((
+        [2.*gate_dist[0]-mid[0]], mid, [2.*gate_dist[-1]-mid[-1]]))
+
+
+def _store_index(key, index):
+    """
+    Keeps a pixel to gate index map in the cache. The oldest map is removed
+    when the cache is full
+
+    Parameters
+    ----------
+    key : tuple
+        the key of the index map
+    index : int array
+        the index map
+
+    Returns
+    -------
+    index : int array
+        the read-only index map kept in the cache
+
+    """
+    index = index.astype(np.int32)
+    index.flags.writeable = False
+
+    if len(_RASTER_INDEX_CACHE) >= _RASTER_INDEX_CACHE_SIZE:
+        _RASTER_INDEX_CACHE.pop(next(iter(_RASTER_INDEX_CACHE)))
+    _RASTER_INDEX_CACHE[key] = index
+
+    return index
+
+
+def _get_colour_index(data, field_name):
+    """
+    Converts the data of the gates into indices of the colormap look-up
+    table. The last element of the output is the index of the pixels without
+    data
+
+    Parameters
+    ----------
+    data : masked array
+        the data of the gates
+    field_name : str
+        name of the radar field
+
+    Returns
+    -------
+    colour_index : uint8 array
+        the flattened colour indices of the gates plus the no data index
+    cmap : Colormap object
+        the colormap
+    norm : Normalize object
+        the normalization of the colormap
+
+    """
+    norm, _, _ = get_norm(field_name)
+    cmap = mpl.cm.get_cmap(pyart.config.get_field_colormap(field_name))
+
+    data = np.ma.masked_invalid(data).ravel()
+    if norm is None:
+        vmin, vmax = pyart.config.get_field_limits(field_name)
+        norm = mpl.colors.Normalize(vmin=vmin, vmax=vmax)
+        ncolours = min(cmap.N, _NODATA_INDEX)
+        colour_index = np.ma.round(
+            np.ma.clip(norm(data), 0., 1.)*(ncolours-1))
+    else:
+        ncolours = min(norm.Ncmap, _NODATA_INDEX)
+        colour_index = np.ma.clip(norm(data), 0, ncolours-1)
+
+    colour_index = np.append(
+        colour_index.filled(_NODATA_INDEX).astype(np.uint8), _NODATA_INDEX)
+
+    return colour_index, cmap, norm
+
+
+def _get_lut(cmap, norm):
+    """
+    Gets the look-up table converting colour indices into RGBA colours. The
+    pixels without data are transparent
+
+    Parameters
+    ----------
+    cmap : Colormap object
+        the colormap
+    norm : Normalize object
+        the normalization of the colormap
+
+    Returns
+    -------
+    lut : uint8 array (256, 4)
+        the RGBA colour of each colour index
+
+    """
+    lut = np.zeros((_NODATA_INDEX+1, 4), dtype=np.uint8)
+    if isinstance(norm, mpl.colors.BoundaryNorm):
+        ncolours = min(norm.Ncmap, _NODATA_INDEX)
+        lut[:ncolours] = cmap(np.arange(ncolours), bytes=True)
+    else:
+        ncolours = min(cmap.N, _NODATA_INDEX)
+        lut[:ncolours] = cmap(np.linspace(0., 1., ncolours), bytes=True)
+
+    return lut
+
+
+def _save_raster(colour_index, extent, cmap, norm, field_dict, field_name,
+                 titl, image_config, fname_list, rng_max=None):
+    """
+    Applies the colormap look-up table to a raster of colour indices and
+    saves it annotated with the title, the colorbar and, optionally, the
+    range rings
+
+    Parameters
+    ----------
+    colour_index : uint8 array (ny, nx)
+        the colour index of each pixel
+    extent : tuple
+        the limits of the raster [km]
+    cmap : Colormap object
+        the colormap
+    norm : Normalize object
+        the normalization of the colormap
+    field_dict : dict
+        the field dictionary. Used to get the colorbar label
+    field_name : str
+        name of the radar field
+    titl : str
+        the title of the plot
+    image_config : dict
+        the image configuration
+    fname_list : list of str
+        list of names of the files where to store the plot
+    rng_max : float or None
+        maximum range of the range rings [km]. If None the range rings are
+        not plotted
+
+    Returns
+    -------
+    fname_list : list of str
+        list of names of the created plots
+
+    """
+    lut = _get_lut(cmap, norm)
+
+    dpi = image_config.get('dpi', 72)
+    ny, nx = colour_index.shape
+    fig = plt.figure(figsize=[nx/dpi, ny/dpi], dpi=dpi)
+    fig.figimage(lut[colour_index], origin='upper')
+
+    # transparent axes covering the raster used for the annotations
+    ax = fig.add_axes([0., 0., 1., 1.])
+    ax.set_xlim(extent[0], extent[1])
+    ax.set_ylim(extent[2], extent[3])
+    ax.patch.set_alpha(0.)
+    ax.set_axis_off()
+    ax.plot([-5., 5.], [0., 0.], 'k-')
+    ax.plot([0., 0.], [-5., 5.], 'k-')
+    if rng_max is not None:
+        theta = np.linspace(0., 2.*np.pi, 361)
+        for rng in np.arange(
+                image_config['rngRing'], rng_max, image_config['rngRing']):
+            ax.plot(rng*np.sin(theta), rng*np.cos(theta), 'k-', lw=0.5)
+    ax.text(
+        0.5, 0.99, titl, transform=ax.transAxes, ha='center', va='top',
+        bbox=dict(facecolor='white', alpha=0.7, edgecolor='none'))
+
+    cax = fig.add_axes([0.9, 0.1, 0.025, 0.6])
+    cb = mpl.colorbar.ColorbarBase(cax, cmap=cmap, norm=norm)
+    _, ticks, ticklabs = get_norm(field_name)
+    if ticks is not None:
+        cb.set_ticks(ticks)
+    if ticklabs:
+        cb.set_ticklabels(ticklabs)
+    cb.set_label(get_colobar_label(field_dict, field_name))
+
+    for fname in fname_list:
+        fig.savefig(fname, dpi=dpi)
+    plt.close(fig)
+
+    return fname_list
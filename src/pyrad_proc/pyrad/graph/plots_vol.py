@@ -45,6 +45,7 @@ import pyart
 from .plots_aux import get_colobar_label, get_norm, generate_fixed_rng_title
 from .plots_aux import generate_fixed_rng_span_title
 from .plots import plot_quantiles, plot_histogram
+from .map_layers import get_map_layers, add_map_layers
 
 from ..util.radar_utils import compute_quantiles_sweep, find_ang_index
 from ..util.radar_utils import compute_histogram_sweep
@@ -207,6 +208,12 @@ def plot_ppi_map(radar, field_name, ind_el, prdcfg, fname_list):
                           np.ceil(prdcfg['ppiMapImageConfig']['latmax'])+1,
                           0.5)
 
+    # the static map layers are drawn from the cache
+    map_layers = get_map_layers(radar, field_name, prdcfg)
+    maps_list = prdcfg['ppiMapImageConfig']['maps']
+    if map_layers is not None:
+        maps_list = []
+
     display_map = pyart.graph.RadarMapDisplay(radar)
     display_map.plot_ppi_map(
         field_name, sweep=ind_el, norm=norm, ticks=ticks,
@@ -216,10 +223,11 @@ def plot_ppi_map(radar, field_name, ind_el, prdcfg, fname_list):
         max_lat=prdcfg['ppiMapImageConfig']['latmax'],
         resolution=prdcfg['ppiMapImageConfig']['mapres'],
         lat_lines=lat_lines, lon_lines=lon_lines,
-        maps_list=prdcfg['ppiMapImageConfig']['maps'],
-        colorbar_flag=False, fig=fig, ax=ax)
+        maps_list=maps_list, colorbar_flag=False, fig=fig, ax=ax)
 
-    if 'rngRing' in prdcfg['ppiMapImageConfig']:
+    if map_layers is not None:
+        add_map_layers(display_map.ax, map_layers)
+    elif 'rngRing' in prdcfg['ppiMapImageConfig']:
         if prdcfg['ppiMapImageConfig']['rngRing'] > 0:
             rng_rings = np.arange(
                 0., radar.range['data'][-1]/1000.,
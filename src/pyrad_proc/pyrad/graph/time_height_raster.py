@@ -0,0 +1,348 @@
+"""
+pyrad.graph.time_height_raster
+==============================
+
+Incremental rendering of time-range and time-height plots, like the plots
+of quasi vertical profiles, whose radar object grows by one ray at each
+volume. The image is a preallocated raster with a fixed number of time
+slots and one row per range gate. At each volume only the new rays are
+converted into colours and copied into their time slot, and the figure,
+which is kept open, is saved again. When the raster is full it scrolls so
+that it shows the last period. The cost of each volume is therefore
+independent of the number of rays accumulated.
+
+.. autosummary::
+    :toctree: generated/
+
+    TimeHeightRaster
+    plot_time_height_raster
+    close_time_height_rasters
+
+"""
+
+import datetime
+import threading
+
+import numpy as np
+from netCDF4 import num2date
+
+import matplotlib as mpl
+mpl.use('Agg')
+
+import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import pyart
+
+from .plots_aux import get_colobar_label, get_norm
+from .plots_raster import _get_colour_index, _get_lut
+
+# rasters of the products being rendered. The key identifies the product
+_TIME_HEIGHT_RASTERS = dict()
+_TIME_HEIGHT_RASTERS_SIZE = 20
+_TIME_HEIGHT_RASTERS_LOCK = threading.Lock()
+
+
+class TimeHeightRaster(object):
+    """
+    Time-height image kept in a preallocated raster. Each ray is drawn in
+    the time slot containing its time.
+
+    Attributes
+    ----------
+    field_name : str
+        name of the radar field plotted
+    heights : float array
+        the range or height of the gates [m]
+    start_time : datetime object
+        the start time of the first time slot
+    time_res : float
+        the duration of each time slot [s]
+    nslots : int
+        the number of time slots
+    nrays : int
+        the number of rays of the radar object already drawn
+    nupdates : int
+        the number of updates since the image was last saved
+    fname_list : list of str
+        the files where the image was last requested to be saved
+    titl : str
+        the title of the last update
+
+    Methods:
+    --------
+    add_rays : Draws new rays in the raster
+    save : Saves the image
+
+    """
+
+    def __init__(self, field_name, field_dict, heights, start_time,
+                 time_res=300., nslots=288, figsize=(10, 8), dpi=72):
+        """
+        Initalize the object.
+
+        Parameters
+        ----------
+        field_name : str
+            name of the radar field plotted
+        field_dict : dict
+            the field dictionary. Used to get the colorbar label
+        heights : float array
+            the range or height of the gates [m]
+        start_time : datetime object
+            the time of the first ray. The first time slot starts at this
+            time rounded down to the time resolution
+        time_res : float
+            the duration of each time slot [s]
+        nslots : int
+            the number of time slots
+        figsize : list
+            figure size [xsize, ysize]
+        dpi : int
+            dpi
+
+        """
+        self.field_name = field_name
+        self.heights = np.array(heights, dtype=np.float64)
+        self.time_res = time_res
+        self.nslots = int(nslots)
+        day_start = datetime.datetime(
+            start_time.year, start_time.month, start_time.day)
+        self.start_time = day_start+datetime.timedelta(seconds=time_res*int(
+            (start_time-day_start).total_seconds()/time_res))
+        self.nrays = 0
+        self.nupdates = 0
+        self.fname_list = None
+        self.titl = None
+
+        self._clabel = get_colobar_label(field_dict, field_name)
+        self._figsize = figsize
+        self._dpi = dpi
+        self._rgba = np.zeros(
+            (self.heights.size, self.nslots, 4), dtype=np.uint8)
+        self._lut = None
+        self._cmap = None
+        self._norm = None
+        self._fig = None
+        self._ax = None
+        self._image = None
+
+    def add_rays(self, time_ref, time_data, data):
+        """
+        Draws new rays in the raster. If a ray is after the last time slot
+        the raster scrolls to make room for it. Rays before the first time
+        slot are ignored
+
+        Parameters
+        ----------
+        time_ref : datetime object
+            the reference time of the rays
+        time_data : float array
+            the time of each ray from the reference time [s]
+        data : masked array (nrays, ngates)
+            the data of the rays
+
+        """
+        slots = np.floor(
+            ((time_ref-self.start_time).total_seconds()+time_data) /
+            self.time_res).astype(int)
+
+        nshift = np.max(slots)-self.nslots+1
+        if nshift > 0:
+            nshift = min(nshift, self.nslots)
+            self._rgba[:, :self.nslots-nshift] = self._rgba[:, nshift:]
+            self._rgba[:, self.nslots-nshift:] = 0
+            self.start_time += datetime.timedelta(
+                seconds=self.time_res*nshift)
+            slots -= nshift
+
+        colour_index, cmap, norm = _get_colour_index(data, self.field_name)
+        if self._lut is None:
+            self._lut = _get_lut(cmap, norm)
+            self._cmap = cmap
+            self._norm = norm
+
+        valid = slots >= 0
+        colour_index = colour_index[:-1].reshape(data.shape)[valid]
+        self._rgba[:, slots[valid]] = np.swapaxes(
+            self._lut[colour_index], 0, 1)
+
+    def save(self, fname_list, titl):
+        """
+        Saves the image. The figure is created at the first call and then
+        only its raster and title are updated
+
+        Parameters
+        ----------
+        fname_list : list of str
+            list of names of the files where to store the plot
+        titl : str
+            the title of the plot
+
+        Returns
+        -------
+        fname_list : list of str
+            list of names of the created plots
+
+        """
+        if self._fig is None:
+            self._init_figure()
+
+        xmin = mdates.date2num(self.start_time)
+        xmax = xmin+self.nslots*self.time_res/86400.
+        ymin, ymax = self._image.get_extent()[2:]
+        self._image.set_data(self._rgba)
+        self._image.set_extent((xmin, xmax, ymin, ymax))
+        self._ax.set_xlim(xmin, xmax)
+        self._ax.set_title(titl)
+
+        for fname in fname_list:
+            self._fig.savefig(fname, dpi=self._dpi)
+        self.nupdates = 0
+
+        return fname_list
+
+    def _init_figure(self):
+        """
+        Creates the figure with the raster, the axes labels and the colorbar.
+        The figure is not managed by pyplot so that it can be kept open
+
+        """
+        hres = 1.
+        if self.heights.size > 1:
+            hres = self.heights[1]-self.heights[0]
+        extent = (
+            0., 1., (self.heights[0]-hres/2.)/1000.,
+            (self.heights[-1]+hres/2.)/1000.)
+
+        self._fig = Figure(figsize=self._figsize, dpi=self._dpi)
+        FigureCanvasAgg(self._fig)
+        self._ax = self._fig.add_subplot(111)
+        self._image = self._ax.imshow(
+            self._rgba, origin='lower', aspect='auto',
+            interpolation='nearest', extent=extent)
+        self._ax.xaxis_date()
+        self._ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+        self._ax.set_xlabel('time (UTC)')
+        self._ax.set_ylabel('range (Km)')
+
+        cmap = self._cmap
+        norm = self._norm
+        if cmap is None:
+            _, cmap, norm = _get_colour_index(
+                np.ma.masked_all(1), self.field_name)
+        mappable = mpl.cm.ScalarMappable(norm=norm, cmap=cmap)
+        mappable.set_array([])
+        cb = self._fig.colorbar(mappable, ax=self._ax)
+        _, ticks, ticklabs = get_norm(self.field_name)
+        if ticks is not None:
+            cb.set_ticks(ticks)
+        if ticklabs:
+            cb.set_ticklabels(ticklabs)
+        cb.set_label(self._clabel)
+
+        self._fig.tight_layout()
+
+
+def plot_time_height_raster(radar, field_name, ind_sweep, prdcfg, fname_list,
+                            key):
+    """
+    plots a time-range plot incrementally. The rays of the sweep not yet
+    drawn are added to the raster of the product and the image is saved
+    every write_every updates
+
+    Parameters
+    ----------
+    radar : Radar object
+        object containing the radar data to plot. The rays already drawn
+        are expected to be at the beginning of the sweep
+    field_name : str
+        name of the radar field to plot
+    ind_sweep : int
+        sweep index to plot
+    prdcfg : dict
+        dictionary containing the product configuration. It may contain the
+        keys time_res, the duration of each time slot [s] (default 300.),
+        period, the period shown [s] (default 86400.), and write_every, the
+        number of updates between two savings of the image (default 1)
+    fname_list : list of str
+        list of names of the files where to store the plot
+    key : str
+        identifier of the product
+
+    Returns
+    -------
+    fname_list : list of str or None
+        list of names of the created plots. None if the image has not been
+        saved at this update
+
+    """
+    ind_start = radar.sweep_start_ray_index['data'][ind_sweep]
+    ind_end = radar.sweep_end_ray_index['data'][ind_sweep]
+    nrays = ind_end-ind_start+1
+
+    time_ref = num2date(
+        0., radar.time['units'], radar.time.get('calendar', 'gregorian'))
+    time_ref = datetime.datetime(
+        time_ref.year, time_ref.month, time_ref.day, time_ref.hour,
+        time_ref.minute, time_ref.second)
+
+    with _TIME_HEIGHT_RASTERS_LOCK:
+        raster = _TIME_HEIGHT_RASTERS.get(key, None)
+        if (raster is None or raster.nrays > nrays or
+                raster.heights.size != radar.ngates or
+                not np.allclose(raster.heights, radar.range['data'])):
+            time_res = prdcfg.get('time_res', 300.)
+            image_config = prdcfg['ppiImageConfig']
+            raster = TimeHeightRaster(
+                field_name, radar.fields[field_name], radar.range['data'],
+                time_ref+datetime.timedelta(
+                    seconds=float(radar.time['data'][ind_start])),
+                time_res=time_res,
+                nslots=int(np.ceil(prdcfg.get('period', 86400.)/time_res)),
+                figsize=[image_config.get('xsize', 10),
+                         image_config.get('ysize', 8)],
+                dpi=image_config.get('dpi', 72))
+            if len(_TIME_HEIGHT_RASTERS) >= _TIME_HEIGHT_RASTERS_SIZE:
+                _TIME_HEIGHT_RASTERS.pop(next(iter(_TIME_HEIGHT_RASTERS)))
+            _TIME_HEIGHT_RASTERS[key] = raster
+
+    if nrays > raster.nrays:
+        ind_new = np.arange(ind_start+raster.nrays, ind_end+1)
+        raster.add_rays(
+            time_ref, radar.time['data'][ind_new],
+            radar.fields[field_name]['data'][ind_new, :])
+        raster.nrays = nrays
+
+    raster.fname_list = fname_list
+    raster.titl = pyart.graph.common.generate_title(
+        radar, field_name, ind_sweep)
+    raster.nupdates += 1
+    if raster.nupdates < prdcfg.get('write_every', 1):
+        return None
+
+    return raster.save(fname_list, raster.titl)
+
+
+def close_time_height_rasters():
+    """
+    Saves the images with updates not yet saved and releases the rasters
+
+    Returns
+    -------
+    fname_list : list of str
+        list of names of the created plots
+
+    """
+    with _TIME_HEIGHT_RASTERS_LOCK:
+        rasters = list(_TIME_HEIGHT_RASTERS.values())
+        _TIME_HEIGHT_RASTERS.clear()
+
+    fname_list = []
+    for raster in rasters:
+        if raster.nupdates > 0 and raster.fname_list:
+            fname_list.extend(raster.save(raster.fname_list, raster.titl))
+            print('----- save to '+' '.join(raster.fname_list))
+
+    return fname_list
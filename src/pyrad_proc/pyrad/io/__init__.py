@@ -47,6 +47,7 @@ Reading other data
 
     read_last_state
     read_status
+    read_status_table
     read_rad4alp_cosmo
     read_rad4alp_vis
     read_excess_gates
@@ -59,6 +60,7 @@ Reading other data
     get_sensor_data
     read_smn
     read_smn2
+    read_station_table
     read_disdro_scattering
     read_sun_hits
     read_sun_hits_multiple_days
@@ -80,6 +82,10 @@ Reading other data
     read_histogram_ts
     read_quantiles_ts
     read_ml_ts
+    read_grid_weights
+    read_hist2d_accumulator
+    read_partial_state
+    read_static_radar
 
 Writing data
 ==================
@@ -102,6 +108,7 @@ Writing data
     write_histogram
     write_quantiles
     write_ts_polar_data
+    write_ts_multi_point_data
     write_ts_cum
     write_monitoring_ts
     write_excess_gates
@@ -112,6 +119,49 @@ Writing data
     write_sun_hits
     write_sun_retrieval
     write_fixed_angle
+    write_grid_weights
+    write_hist2d_accumulator
+    write_partial_state
+    write_static_radar
+
+Time series store
+=================
+
+.. autosummary::
+    :toctree: generated/
+
+    ts_store_in_sync
+    update_ts_store
+    ts_store_plot_due
+    set_ts_store_plotted
+    get_ts_store_pending
+
+Product manifest
+================
+
+.. autosummary::
+    :toctree: generated/
+
+    get_config_hash
+    get_file_identity
+    get_product_key
+    get_manifest_fname
+    get_manifest_value
+    set_manifest_value
+    outputs_exist
+
+Buffered csv writer
+===================
+
+.. autosummary::
+    :toctree: generated/
+
+    start_csv_writer
+    close_csv_writer
+    append_csv_rows
+    format_csv_rows
+    flush_csv_file
+    flush_all
 
 
 Auxiliary functions
@@ -168,6 +218,7 @@ from .read_data_hzt import read_hzt_data, hzt2radar_data, hzt2radar_coord
 from .read_data_hzt import get_iso0_field
 
 from .read_data_other import read_status, read_rad4alp_cosmo, read_rad4alp_vis
+from .read_data_other import read_status_table
 from .read_data_other import read_timeseries, read_monitoring_ts, read_ts_cum
 from .read_data_other import read_intercomp_scores_ts, read_quantiles
 from .read_data_other import read_selfconsistency, read_colocated_gates
@@ -176,9 +227,12 @@ from .read_data_other import read_last_state, read_rhi_profile
 from .read_data_other import read_excess_gates, read_histogram
 from .read_data_other import read_profile_ts, read_histogram_ts
 from .read_data_other import read_quantiles_ts, read_ml_ts
+from .read_data_other import read_grid_weights, read_partial_state
+from .read_data_other import read_static_radar, read_hist2d_accumulator
 
 from .read_data_sensor import read_lightning, read_lightning_traj
 from .read_data_sensor import get_sensor_data, read_smn, read_smn2
+from .read_data_sensor import read_station_table
 from .read_data_sensor import read_disdro_scattering, read_trt_data
 from .read_data_sensor import read_trt_traj_data
 from .read_data_sensor import read_trt_scores, read_trt_cell_lightning
@@ -188,6 +242,7 @@ from .read_data_sun import read_sun_hits_multiple_days, read_sun_hits
 from .read_data_sun import read_sun_retrieval, read_solar_flux
 
 from .write_data import write_smn, write_ts_polar_data, write_ts_cum
+from .write_data import write_ts_multi_point_data
 from .write_data import write_monitoring_ts, write_intercomp_scores_ts
 from .write_data import write_sun_hits, write_sun_retrieval
 from .write_data import write_colocated_gates, write_colocated_data
@@ -198,6 +253,21 @@ from .write_data import write_excess_gates, write_trt_cell_data
 from .write_data import write_histogram, write_quantiles, write_ts_lightning
 from .write_data import write_trt_cell_scores, write_trt_cell_lightning
 from .write_data import write_trt_info, write_fixed_angle
+from .write_data import write_grid_weights, write_partial_state
+from .write_data import write_static_radar, write_hist2d_accumulator
+
+from .timeseries_store import ts_store_in_sync, update_ts_store
+from .timeseries_store import ts_store_plot_due, set_ts_store_plotted
+from .timeseries_store import get_ts_store_pending
+
+from .product_manifest import get_config_hash, get_file_identity
+from .product_manifest import get_product_key, get_manifest_fname
+from .product_manifest import get_manifest_value, set_manifest_value
+from .product_manifest import outputs_exist
+
+from .buffered_csv_writer import start_csv_writer, close_csv_writer
+from .buffered_csv_writer import append_csv_rows, format_csv_rows
+from .buffered_csv_writer import flush_csv_file, flush_all
 
 from .io_aux import get_save_dir, make_filename, get_new_rainbow_file_name
 from .io_aux import get_datetime, get_dataset_fields, map_hydro, map_Doppler
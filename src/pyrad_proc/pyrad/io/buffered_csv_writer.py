@@ -0,0 +1,409 @@
+"""
+pyrad.io.buffered_csv_writer
+============================
+
+Buffered writing of the rows appended to csv files, like the time series
+written at each volume. The rows of each call are formatted in bulk and
+kept in memory. A single writer thread keeps a long-lived handle on each
+output file and appends the buffered rows when they are older than a
+given time or larger than a given size, locking the file once per flush.
+If the writer thread is not running the rows are written immediately.
+
+The files are locked with fcntl.flock while written so that they can be
+shared by several processes. The header of a file is written when the file
+is empty.
+
+.. autosummary::
+    :toctree: generated/
+
+    start_csv_writer
+    close_csv_writer
+    append_csv_rows
+    format_csv_rows
+    flush_csv_file
+    flush_all
+    _CsvFile
+    _csv_writer_loop
+    _flush_files
+
+"""
+
+import os
+import io
+import fcntl
+import threading
+import time
+from warnings import warn
+
+import numpy as np
+
+# the buffered files and the configuration of the writer thread
+_CSV_WRITER = {
+    'files': dict(),
+    'thread': None,
+    'stop': False,
+    'flush_time': 60.,
+    'flush_size': 1048576}
+_CSV_WRITER_LOCK = threading.Lock()
+_CSV_WRITER_CONDITION = threading.Condition(_CSV_WRITER_LOCK)
+
+# serializes the flushes so that the rows of a file are written in order
+_CSV_FLUSH_LOCK = threading.Lock()
+
+# maximum number of file handles kept open
+_CSV_MAX_OPEN_FILES = 64
+
+
+def start_csv_writer(flush_time=60., flush_size=1048576):
+    """
+    Starts the thread writing the buffered rows
+
+    Parameters
+    ----------
+    flush_time : float
+        maximum time the rows of a file are kept in memory [s]
+    flush_size : int
+        maximum size of the rows of a file kept in memory [bytes]
+
+    """
+    close_csv_writer()
+
+    with _CSV_WRITER_LOCK:
+        _CSV_WRITER['flush_time'] = flush_time
+        _CSV_WRITER['flush_size'] = flush_size
+        _CSV_WRITER['stop'] = False
+        _CSV_WRITER['thread'] = threading.Thread(
+            target=_csv_writer_loop, name='pyrad_csv_writer', daemon=True)
+        _CSV_WRITER['thread'].start()
+
+    print('- csv writer started. Flush time '+str(flush_time)+' s, ' +
+          'flush size '+str(flush_size)+' bytes')
+
+
+def close_csv_writer():
+    """
+    Writes all the buffered rows, stops the writer thread and closes the
+    files
+
+    """
+    with _CSV_WRITER_CONDITION:
+        thread = _CSV_WRITER['thread']
+        _CSV_WRITER['thread'] = None
+        _CSV_WRITER['stop'] = True
+        _CSV_WRITER_CONDITION.notify_all()
+    if thread is not None:
+        thread.join()
+
+    flush_all()
+    with _CSV_FLUSH_LOCK:
+        with _CSV_WRITER_LOCK:
+            csv_files = list(_CSV_WRITER['files'].values())
+            _CSV_WRITER['files'].clear()
+        for csv_file in csv_files:
+            csv_file.close()
+
+
+def append_csv_rows(fname, rows, header='', rewrite=False):
+    """
+    Appends rows to a csv file. If the writer thread is running the rows
+    are buffered, otherwise they are written immediately
+
+    Parameters
+    ----------
+    fname : str
+        file name where to store the data
+    rows : str
+        the formatted rows
+    header : str
+        the header written if the file is empty
+    rewrite : bool
+        if True the current content of the file is replaced
+
+    Returns
+    -------
+    fname : str
+        the name of the file where data has written
+
+    """
+    with _CSV_WRITER_CONDITION:
+        if _CSV_WRITER['thread'] is not None:
+            csv_file = _CSV_WRITER['files'].get(fname, None)
+            if csv_file is None:
+                csv_file = _CsvFile(fname)
+                _CSV_WRITER['files'][fname] = csv_file
+            csv_file.append(rows, header=header, rewrite=rewrite)
+            if csv_file.size >= _CSV_WRITER['flush_size']:
+                _CSV_WRITER_CONDITION.notify_all()
+            return fname
+
+    csv_file = _CsvFile(fname)
+    csv_file.append(rows, header=header, rewrite=rewrite)
+    csv_file.flush(*csv_file.take())
+    csv_file.close()
+
+    return fname
+
+
+def format_csv_rows(columns, delimiter=','):
+    """
+    Formats the rows of a csv file. The columns are converted to strings
+    in bulk. The lines are terminated as in the csv module
+
+    Parameters
+    ----------
+    columns : list of array like
+        the values of each column. All columns must have the same length
+    delimiter : str
+        the column delimiter
+
+    Returns
+    -------
+    rows : str
+        the formatted rows
+
+    """
+    if np.size(columns[0]) == 0:
+        return ''
+
+    data = np.column_stack([np.asarray(col).astype(str) for col in columns])
+    buffer = io.StringIO()
+    np.savetxt(buffer, data, fmt='%s', delimiter=delimiter, newline='\r\n')
+
+    return buffer.getvalue()
+
+
+def flush_csv_file(fname):
+    """
+    Writes the buffered rows of a file. Used before reading the file
+
+    Parameters
+    ----------
+    fname : str
+        the file name
+
+    """
+    with _CSV_FLUSH_LOCK:
+        with _CSV_WRITER_LOCK:
+            csv_file = _CSV_WRITER['files'].get(fname, None)
+            if csv_file is None:
+                return
+            pending = csv_file.take()
+        csv_file.flush(*pending)
+
+
+def flush_all():
+    """
+    Writes the buffered rows of all files. To be called at the end of the
+    processing and at the checkpoints
+
+    """
+    _flush_files(force=True)
+
+
+class _CsvFile(object):
+    """
+    A csv file with its buffered rows and its long-lived handle
+
+    Attributes
+    ----------
+    fname : str
+        the file name
+    size : int
+        the size of the buffered rows
+    last_used : float
+        the time of the last flush
+
+    """
+
+    def __init__(self, fname):
+        """
+        Initalize the object.
+
+        Parameters
+        ----------
+        fname : str
+            the file name
+
+        """
+        self.fname = fname
+        self.size = 0
+        self.last_used = time.time()
+        self._rows = []
+        self._header = ''
+        self._rewrite = False
+        self._first_time = None
+        self._handle = None
+
+    def append(self, rows, header='', rewrite=False):
+        """
+        Buffers rows
+
+        Parameters
+        ----------
+        rows : str
+            the formatted rows
+        header : str
+            the header written if the file is empty
+        rewrite : bool
+            if True the current content of the file and the buffered rows
+            are replaced
+
+        """
+        if rewrite:
+            self._rows = []
+            self.size = 0
+            self._header = header
+            self._rewrite = True
+        elif not self._rows:
+            self._header = header
+        if self._first_time is None:
+            self._first_time = time.time()
+        self._rows.append(rows)
+        self.size += len(rows)
+
+    def is_due(self, flush_time, flush_size):
+        """
+        Checks if the buffered rows have to be written
+
+        Parameters
+        ----------
+        flush_time : float
+            maximum time the rows are kept in memory [s]
+        flush_size : int
+            maximum size of the rows kept in memory [bytes]
+
+        Returns
+        -------
+        due : bool
+            True if the rows have to be written
+
+        """
+        if self._first_time is None:
+            return False
+        return (self.size >= flush_size or
+                time.time()-self._first_time >= flush_time)
+
+    def take(self):
+        """
+        Removes the buffered rows. To be called with the writer lock held
+
+        Returns
+        -------
+        rows, header, rewrite : str, str, bool
+            the buffered rows, the header and whether the file is replaced
+
+        """
+        pending = (''.join(self._rows), self._header, self._rewrite)
+        self._rows = []
+        self.size = 0
+        self._rewrite = False
+        self._first_time = None
+
+        return pending
+
+    def flush(self, rows, header, rewrite):
+        """
+        Writes rows in the file. The file is locked while written
+
+        Parameters
+        ----------
+        rows : str
+            the formatted rows
+        header : str
+            the header written if the file is empty
+        rewrite : bool
+            if True the current content of the file is replaced
+
+        """
+        self.last_used = time.time()
+        if not rows and not rewrite:
+            return
+        if self._handle is not None and not os.path.exists(self.fname):
+            # the file has been removed since it was opened
+            self.close()
+        try:
+            if self._handle is None:
+                self._handle = open(self.fname, 'a', newline='')
+            fcntl.flock(self._handle, fcntl.LOCK_EX)
+            try:
+                if rewrite:
+                    self._handle.truncate(0)
+                if os.fstat(self._handle.fileno()).st_size == 0:
+                    self._handle.write(header)
+                self._handle.write(rows)
+                self._handle.flush()
+            finally:
+                fcntl.flock(self._handle, fcntl.LOCK_UN)
+        except EnvironmentError as ee:
+            warn(str(ee))
+            warn('Unable to write file '+self.fname)
+            self.close()
+
+    def close(self):
+        """
+        Closes the handle of the file
+
+        """
+        if self._handle is None:
+            return
+        try:
+            self._handle.close()
+        except EnvironmentError as ee:
+            warn(str(ee))
+        self._handle = None
+
+
+def _csv_writer_loop():
+    """
+    Loop of the writer thread. Writes the rows that are due until the
+    thread is stopped
+
+    """
+    while True:
+        with _CSV_WRITER_CONDITION:
+            if _CSV_WRITER['stop']:
+                return
+            _CSV_WRITER_CONDITION.wait(
+                timeout=max(1., _CSV_WRITER['flush_time']/10.))
+            if _CSV_WRITER['stop']:
+                return
+        _flush_files()
+
+
+def _flush_files(force=False):
+    """
+    Writes the buffered rows of the files that are due and closes the
+    handles of the files least recently used
+
+    Parameters
+    ----------
+    force : bool
+        if True the rows of all files are written
+
+    """
+    with _CSV_FLUSH_LOCK:
+        with _CSV_WRITER_LOCK:
+            flush_time = _CSV_WRITER['flush_time']
+            flush_size = _CSV_WRITER['flush_size']
+            pending = [
+                (csv_file, csv_file.take())
+                for csv_file in _CSV_WRITER['files'].values()
+                if force or csv_file.is_due(flush_time, flush_size)]
+
+        for csv_file, (rows, header, rewrite) in pending:
+            csv_file.flush(rows, header, rewrite)
+
+        with _CSV_WRITER_LOCK:
+            nfiles = len(_CSV_WRITER['files'])
+            if nfiles <= _CSV_MAX_OPEN_FILES:
+                return
+            idle_files = sorted(
+                (csv_file for csv_file in _CSV_WRITER['files'].values()
+                 if csv_file.size == 0),
+                key=lambda csv_file: csv_file.last_used)
+            idle_files = idle_files[:nfiles-_CSV_MAX_OPEN_FILES]
+            for csv_file in idle_files:
+                del _CSV_WRITER['files'][csv_file.fname]
+
+        for csv_file in idle_files:
+            csv_file.close()
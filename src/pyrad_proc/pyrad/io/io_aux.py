@@ -606,6 +606,9 @@ def get_datatype_odim(datatype):
     elif datatype == 'RR':
         field_name = 'radar_estimated_rain_rate'
         datatype_odim = 'RATE'
+    elif datatype == 'Raccu':
+        field_name = 'rainfall_accumulation'
+        datatype_odim = 'ACRR'
 
     elif datatype == 'hydro':
         field_name = 'radar_echo_classification'
@@ -921,6 +924,8 @@ def get_fieldname_pyart(datatype):
         field_name = 'frequency_of_occurrence'
     elif datatype == 'RR':
         field_name = 'radar_estimated_rain_rate'
+    elif datatype == 'Raccu':
+        field_name = 'rainfall_accumulation'
 
     elif datatype == 'hydro':
         field_name = 'radar_echo_classification'
@@ -0,0 +1,245 @@
+"""
+pyrad.io.product_manifest
+=========================
+
+Manifest of the products generated by previous processing runs. Each
+product generated from a radar volume is identified by a key computed from
+the product and dataset configurations, the version of Pyrad and the
+identity of the input file. The manifest keeps the files produced under
+each key so that a reprocessing run can skip the products whose key is
+known and whose files still exist.
+
+The manifest of each dataset is a file with one JSON record per line. The
+records are only appended so that several processes can share the file.
+
+.. autosummary::
+    :toctree: generated/
+
+    get_config_hash
+    get_file_identity
+    get_product_key
+    get_manifest_fname
+    get_manifest_value
+    set_manifest_value
+    outputs_exist
+    _read_manifest
+
+"""
+
+import os
+import json
+import hashlib
+import threading
+from warnings import warn
+
+from ..version import version, git_revision
+
+# records of the manifest files already read. The key is the file name
+_MANIFEST_CACHE = dict()
+_MANIFEST_LOCK = threading.Lock()
+
+
+def get_config_hash(config, exclude=()):
+    """
+    Computes a hash of a configuration dictionary
+
+    Parameters
+    ----------
+    config : dict
+        the configuration dictionary
+    exclude : tuple of str
+        keys of the dictionary not taken into account
+
+    Returns
+    -------
+    config_hash : str
+        hexadecimal string identifying the configuration
+
+    """
+    config = {key: value for key, value in config.items()
+              if key not in exclude}
+    return hashlib.sha1(json.dumps(
+        config, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def get_file_identity(fname):
+    """
+    Gets a string identifying the contents of a file from its path, size
+    and modification time
+
+    Parameters
+    ----------
+    fname : str
+        name of the file
+
+    Returns
+    -------
+    identity : str or None
+        the file identity. None if the file does not exist
+
+    """
+    try:
+        stat = os.stat(fname)
+    except OSError:
+        return None
+    return (os.path.abspath(fname)+':'+str(stat.st_size)+':' +
+            str(stat.st_mtime_ns))
+
+
+def get_product_key(prdcfg, dataset_hash, input_id):
+    """
+    Computes the key identifying a product generated from a radar volume
+
+    Parameters
+    ----------
+    prdcfg : dict
+        the product configuration dictionary. It contains the volume time
+    dataset_hash : str
+        hash of the configuration of the dataset and of the datasets it may
+        depend on
+    input_id : str
+        identity of the input file
+
+    Returns
+    -------
+    key : str
+        hexadecimal string identifying the product
+
+    """
+    key = hashlib.sha1()
+    key.update((version+':'+git_revision).encode('utf-8'))
+    key.update(dataset_hash.encode('utf-8'))
+    key.update(get_config_hash(prdcfg).encode('utf-8'))
+    key.update(input_id.encode('utf-8'))
+
+    return key.hexdigest()
+
+
+def get_manifest_fname(basepath, procname, dsname):
+    """
+    Gets the name of the manifest file of a dataset
+
+    Parameters
+    ----------
+    basepath : str
+        base path of the products
+    procname : str
+        name of the processing
+    dsname : str
+        name of the dataset
+
+    Returns
+    -------
+    fname : str
+        name of the manifest file
+
+    """
+    return os.path.join(basepath, procname, '.manifest', dsname+'.jsonl')
+
+
+def get_manifest_value(fname, key):
+    """
+    Gets the value recorded under a key in a manifest
+
+    Parameters
+    ----------
+    fname : str
+        name of the manifest file
+    key : str
+        the key
+
+    Returns
+    -------
+    value : object or None
+        the value recorded. None if the key is not in the manifest
+
+    """
+    with _MANIFEST_LOCK:
+        if fname not in _MANIFEST_CACHE:
+            _MANIFEST_CACHE[fname] = _read_manifest(fname)
+        return _MANIFEST_CACHE[fname].get(key, None)
+
+
+def set_manifest_value(fname, key, value):
+    """
+    Records a value under a key in a manifest. The record is appended to
+    the manifest file
+
+    Parameters
+    ----------
+    fname : str
+        name of the manifest file
+    key : str
+        the key
+    value : object
+        the value. It has to be serializable in JSON
+
+    """
+    line = json.dumps({'key': key, 'value': value})+'\n'
+    with _MANIFEST_LOCK:
+        if fname not in _MANIFEST_CACHE:
+            _MANIFEST_CACHE[fname] = _read_manifest(fname)
+        _MANIFEST_CACHE[fname][key] = value
+        try:
+            os.makedirs(os.path.dirname(fname), exist_ok=True)
+            with open(fname, 'a') as fid:
+                fid.write(line)
+        except OSError as ee:
+            warn(str(ee))
+            warn('Unable to write manifest file '+fname)
+
+
+def outputs_exist(fname_list):
+    """
+    Checks whether all the files of a list exist
+
+    Parameters
+    ----------
+    fname_list : list of str
+        list of file names
+
+    Returns
+    -------
+    exist : bool
+        True if the list is not empty and all the files exist
+
+    """
+    if not fname_list:
+        return False
+    return all(os.path.isfile(fname) for fname in fname_list)
+
+
+def _read_manifest(fname):
+    """
+    Reads a manifest file. Later records override the earlier records with
+    the same key. Lines that can not be parsed, like a line partially
+    written, are ignored
+
+    Parameters
+    ----------
+    fname : str
+        name of the manifest file
+
+    Returns
+    -------
+    records : dict
+        the values recorded in the manifest by key
+
+    """
+    records = dict()
+    if not os.path.isfile(fname):
+        return records
+
+    try:
+        with open(fname, 'r') as fid:
+            for line in fid:
+                try:
+                    record = json.loads(line)
+                    records[record['key']] = record['value']
+                except (ValueError, KeyError, TypeError):
+                    continue
+    except OSError as ee:
+        warn(str(ee))
+        warn('Unable to read manifest file '+fname)
+
+    return records
@@ -25,10 +25,10 @@ from scipy.interpolate import NearestNDInterpolator
 from scipy.spatial import cKDTree
 import netCDF4
 
-from pyart.core import wgs84_to_swissCH1903
 from pyart.config import get_metadata, get_field_name
 
 from ..io.io_aux import get_fieldname_cosmo
+from ..util.gate_geometry import get_gate_geometry
 
 # from memory_profiler import profile
 
@@ -37,7 +37,7 @@ from ..io.io_aux import get_fieldname_cosmo
 
 def cosmo2radar_data(radar, cosmo_coord, cosmo_data, time_index=0,
                      slice_xy=True, slice_z=False,
-                     field_names=['temperature']):
+                     field_names=['temperature'], dtype=float):
     """
     get the COSMO value corresponding to each radar gate using nearest
     neighbour interpolation
@@ -61,6 +61,8 @@ def cosmo2radar_data(radar, cosmo_coord, cosmo_data, time_index=0,
         of the radar field
     field_names : str
         names of COSMO fields to convert (default temperature)
+    dtype : numpy data type
+        data type of the output fields
 
     Returns
     -------
@@ -102,7 +104,7 @@ def cosmo2radar_data(radar, cosmo_coord, cosmo_data, time_index=0,
 
             # put field
             field_dict = get_metadata(field)
-            field_dict['data'] = data_interp.astype(float)
+            field_dict['data'] = data_interp.astype(dtype)
             cosmo_fields.append({field: field_dict})
 
             del data_interp
@@ -187,7 +189,7 @@ def cosmo2radar_coord(radar, cosmo_coord, slice_xy=True, slice_z=False,
 
 
 def get_cosmo_fields(cosmo_data, cosmo_ind, time_index=0,
-                     field_names=['temperature']):
+                     field_names=['temperature'], dtype=float):
     """
     Get the COSMO data corresponding to each radar gate
     using a precomputed look up table of the nearest neighbour
@@ -202,6 +204,8 @@ def get_cosmo_fields(cosmo_data, cosmo_ind, time_index=0,
         index of the forecasted data
     field_names : str
         names of COSMO parameters (default temperature)
+    dtype : numpy data type
+        data type of the output fields
 
     Returns
     -------
@@ -220,7 +224,7 @@ def get_cosmo_fields(cosmo_data, cosmo_ind, time_index=0,
             # put field
             field_dict = get_metadata(field)
             field_dict['data'] = values[cosmo_ind['data'].flatten()].reshape(
-                nrays, ngates).astype(float)
+                nrays, ngates).astype(dtype)
             cosmo_fields.append({field: field_dict})
 
     if not cosmo_fields:
@@ -500,15 +504,9 @@ def _put_radar_in_swiss_coord(radar):
     Returns
     -------
     x_radar, y_radar, z_radar : 2D arrays
-        arrays containing swiss coordinates of the radar [in m]
+        arrays containing swiss coordinates of the radar [in m]. The arrays
+        are shared by all radar objects with the same scan geometry and are
+        read-only
 
     """
-    x0, y0, _ = wgs84_to_swissCH1903(
-        radar.longitude['data'][0], radar.latitude['data'][0],
-        radar.altitude['data'][0], no_altitude_transform=True)
-
-    x_radar = radar.gate_x['data']+x0
-    y_radar = radar.gate_y['data']+y0
-    z_radar = radar.gate_altitude['data']
-
-    return x_radar, y_radar, z_radar
+    return get_gate_geometry(radar).get_swiss_coord()
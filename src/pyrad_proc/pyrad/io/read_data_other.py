@@ -13,6 +13,7 @@ Functions for reading auxiliary data
     read_rhi_profile
     read_last_state
     read_status
+    read_status_table
     read_rad4alp_cosmo
     read_rad4alp_vis
     read_histogram
@@ -31,6 +32,10 @@ Functions for reading auxiliary data
     read_intercomp_scores_ts_old_v0
     read_selfconsistency
     read_antenna_pattern
+    read_grid_weights
+    read_hist2d_accumulator
+    read_partial_state
+    read_static_radar
 
 """
 
@@ -43,12 +48,22 @@ from warnings import warn
 import fcntl
 import time
 import errno
+import pickle
 
 import numpy as np
+from scipy.sparse import csr_matrix
 
 from pyart.config import get_fillvalue, get_metadata
 
 from .io_aux import get_fieldname_pyart, _get_datetime
+from .buffered_csv_writer import flush_csv_file
+
+from ..util.dtype_utils import unpack_mask
+from ..util.hist2d_accumulator import Hist2dAccumulator
+
+# calibration constants of the status files of the last volumes read
+_STATUS_TABLE_CACHE = dict()
+_STATUS_TABLE_CACHE_SIZE = 5
 
 
 def read_profile_ts(fname_list, labels, hres=None, label_nr=0, t_res=300.):
@@ -362,6 +377,64 @@ def read_status(voltime, cfg, ind_rad=0):
         return None
 
 
+def read_status_table(voltime, cfg, ind_rad=0):
+    """
+    Reads the calibration constants of each sweep contained in the rad4alp
+    xml status file. The file is parsed only once per volume and the
+    result is shared by all the sweeps and datasets that need it
+
+    Parameters
+    ----------
+    voltime : datetime object
+        volume scan time
+    cfg: dictionary of dictionaries
+        configuration info to figure out where the data is
+    ind_rad: int
+        radar index
+
+    Returns
+    -------
+    status_table : dict or None
+        dictionary with one float array per calibration parameter (e.g.
+        'noisepower_frontend_h_inuse', 'rconst_h') indexed by sweep number
+        (starting at 0). Values not available are NaN. None if the status
+        file could not be read
+
+    """
+    key = (str(cfg['datapath']), str(cfg['RadarName']), ind_rad, voltime)
+    if key in _STATUS_TABLE_CACHE:
+        return _STATUS_TABLE_CACHE[key]
+
+    root = read_status(voltime, cfg, ind_rad=ind_rad)
+    status_table = None
+    if root is not None:
+        sweep_values = dict()
+        nsweeps = 0
+        for sweep in root.findall('sweep'):
+            sweep_number = int(sweep.attrib['name'].split('.')[1])-1
+            nsweeps = max(nsweeps, sweep_number+1)
+            for param in sweep.findall('./RADAR/STAT/CALIB/*'):
+                try:
+                    value = float(param.attrib['value'])
+                except (KeyError, ValueError):
+                    continue
+                if param.tag not in sweep_values:
+                    sweep_values.update({param.tag: dict()})
+                sweep_values[param.tag].update({sweep_number: value})
+
+        status_table = dict()
+        for param, values in sweep_values.items():
+            param_values = np.full(nsweeps, np.nan)
+            param_values[list(values.keys())] = list(values.values())
+            status_table.update({param: param_values})
+
+    if len(_STATUS_TABLE_CACHE) >= _STATUS_TABLE_CACHE_SIZE:
+        _STATUS_TABLE_CACHE.pop(next(iter(_STATUS_TABLE_CACHE)))
+    _STATUS_TABLE_CACHE.update({key: status_table})
+
+    return status_table
+
+
 def read_rad4alp_cosmo(fname, datatype, ngates=0):
     """
     Reads rad4alp COSMO data binary file.
@@ -433,7 +506,8 @@ def read_rad4alp_vis(fname, datatype):
     Returns
     -------
     field_list : list of dictionaries
-        A data field. Each element of the list corresponds to one elevation
+        A data field. Each element of the list corresponds to one elevation.
+        The visibility is kept as uint8 as in the file
 
     """
     if datatype != 'VIS':
@@ -458,7 +532,7 @@ def read_rad4alp_vis(fname, datatype):
                 sweep_end_index = sweep_start_index+naz*nrng-1
                 field_data = np.reshape(
                     bindata[sweep_start_index:sweep_end_index+1],
-                    (naz, nrng)).astype(float)
+                    (naz, nrng))
                 sweep_start_index = sweep_end_index+1
 
                 field_name = get_fieldname_pyart(datatype)
@@ -686,6 +760,7 @@ def read_colocated_data(fname):
         A tupple with the data read. None otherwise
 
     """
+    flush_csv_file(fname)
     try:
         with open(fname, 'r', newline='') as csvfile:
             # first count the lines
@@ -758,6 +833,7 @@ def read_colocated_data_time_avg(fname):
         A tupple with the data read. None otherwise
 
     """
+    flush_csv_file(fname)
     try:
         with open(fname, 'r', newline='') as csvfile:
             # first count the lines
@@ -838,6 +914,7 @@ def read_timeseries(fname):
         containing the value. None otherwise
 
     """
+    flush_csv_file(fname)
     try:
         with open(fname, 'r', newline='') as csvfile:
             # first count the lines
@@ -994,6 +1071,7 @@ def read_monitoring_ts(fname, sort_by_date=False):
         The read data. None otherwise
 
     """
+    flush_csv_file(fname)
     try:
         with open(fname, 'r', newline='') as csvfile:
             while True:
@@ -1123,6 +1201,7 @@ def read_intercomp_scores_ts(fname, sort_by_date=False):
         The read data. None otherwise
 
     """
+    flush_csv_file(fname)
     try:
         with open(fname, 'r', newline='') as csvfile:
             while True:
@@ -1503,3 +1582,125 @@ def read_antenna_pattern(fname, linear=False, twoway=False):
         pattern['attenuation'] = 10.**(pattern['attenuation']/10.)
 
     return pattern
+
+
+def read_grid_weights(fname):
+    """
+    Reads a sparse matrix of gate to grid point weights
+
+    Parameters
+    ----------
+    fname : str
+        name of the file to read
+
+    Returns
+    -------
+    weights : scipy csr_matrix
+        the matrix of weights
+
+    """
+    try:
+        with np.load(fname) as npzfile:
+            return csr_matrix(
+                (npzfile['data'], npzfile['indices'], npzfile['indptr']),
+                shape=tuple(npzfile['shape']))
+    except (EnvironmentError, KeyError, ValueError) as ee:
+        warn(str(ee))
+        warn('Unable to read file '+fname)
+        return None
+
+
+def read_hist2d_accumulator(fname):
+    """
+    Reads a 2D histogram accumulator of colocated values
+
+    Parameters
+    ----------
+    fname : str
+        name of the file to read
+
+    Returns
+    -------
+    accumulator : Hist2dAccumulator object
+        the accumulator. None if the file could not be read
+
+    """
+    try:
+        with np.load(fname) as npzfile:
+            accumulator = Hist2dAccumulator(
+                npzfile['bin_edges1'], npzfile['bin_edges2'])
+            accumulator.counts = npzfile['counts']
+            accumulator.diff_edges = npzfile['diff_edges']
+            accumulator.diff_counts = npzfile['diff_counts']
+            accumulator.sums = npzfile['sums']
+            # files written before the time of the last volume was kept
+            if 'last_time' in npzfile and npzfile['last_time'].size > 0:
+                accumulator.last_time = npzfile['last_time'][0]
+            return accumulator
+    except (EnvironmentError, KeyError, ValueError) as ee:
+        warn(str(ee))
+        warn('Unable to read file '+fname)
+        return None
+
+
+def read_partial_state(fname):
+    """
+    Reads the partial state of an accumulating dataset
+
+    Parameters
+    ----------
+    fname : str
+        name of the file to read
+
+    Returns
+    -------
+    state : dict
+        the dataset global data containing the accumulator
+
+    """
+    try:
+        with open(fname, 'rb') as statefile:
+            return pickle.load(statefile)
+    except (EnvironmentError, EOFError, pickle.UnpicklingError) as ee:
+        warn(str(ee))
+        warn('Unable to read file '+fname)
+        return None
+
+
+def read_static_radar(fname):
+    """
+    Reads a radar object containing static fields. The data of the fields
+    is memory-mapped read-only so that it is only loaded when used. Since
+    it is shared by all volumes any attempt to modify it in place fails
+
+    Parameters
+    ----------
+    fname : str
+        name of the file to read
+
+    Returns
+    -------
+    radar : radar object
+        the radar object containing the static fields
+
+    """
+    try:
+        with open(fname, 'rb') as radarfile:
+            radar = pickle.load(radarfile)
+
+        datapath = os.path.dirname(fname)
+        for field in radar.fields.values():
+            field['data'] = np.load(
+                os.path.join(datapath, field['data']), mmap_mode='r')
+            if 'mask' in field:
+                mask = np.load(os.path.join(datapath, field.pop('mask')))
+                if mask.dtype != bool:
+                    mask = unpack_mask(mask, field['data'].shape)
+                mask.flags.writeable = False
+                field['data'] = np.ma.masked_array(field['data'], mask=mask)
+        return radar
+    except (EnvironmentError, EOFError, ValueError,
+            pickle.UnpicklingError) as ee:
+        warn(str(ee))
+        warn('Unable to read file '+fname)
+        return None
@@ -16,6 +16,8 @@ Functions for reading radar data files
     merge_scans_cosmo_rad4alp
     merge_scans_dem_rad4alp
     merge_scans_hydro_rad4alp
+    get_static_radar
+    add_static_fields
     merge_fields_rainbow
     merge_fields_pyrad
     merge_fields_dem
@@ -31,8 +33,9 @@ Functions for reading radar data files
 import glob
 import datetime
 import os
+import hashlib
 from warnings import warn
-from copy import deepcopy
+from copy import copy, deepcopy
 
 import numpy as np
 from scipy.interpolate import RegularGridInterpolator
@@ -45,7 +48,10 @@ except Exception:
 
 import pyart
 
-from .read_data_other import read_status, read_rad4alp_cosmo, read_rad4alp_vis
+from .read_data_other import read_status_table, read_rad4alp_cosmo
+from .read_data_other import read_rad4alp_vis
+from .read_data_other import read_static_radar
+from .write_data import write_static_radar
 from .read_data_mxpol import pyrad_MXPOL, pyrad_MCH
 
 from .io_aux import get_datatype_metranet, get_fieldname_pyart, get_file_list
@@ -53,6 +59,13 @@ from .io_aux import get_datatype_odim, find_date_in_file_name
 from .io_aux import get_datatype_fields, get_datetime, map_hydro, map_Doppler
 from .io_aux import find_cosmo_file, find_rad4alpcosmo_file
 
+from ..util.radar_utils import get_geometry_key
+from ..util.gate_geometry import attach_gate_geometry
+from ..util.dtype_utils import compact_radar_fields
+
+# radar objects containing static fields already built in this process
+_STATIC_RADAR_CACHE = dict()
+
 
 def get_data(voltime, datatypesdescr, cfg):
     """
@@ -262,9 +275,8 @@ def get_data(voltime, datatypesdescr, cfg):
 
     # add DEM files to the radar field
     if ndatatypes_dem > 0 and _WRADLIB_AVAILABLE:
-        radar_aux = merge_scans_dem(
-            cfg['dempath'][ind_rad], cfg['ScanList'][ind_rad], datatype_dem)
-        radar = add_field(radar, radar_aux)
+        radar = add_static_fields(radar, get_static_radar(
+            'DEM', datatype_dem, voltime, cfg, ind_rad=ind_rad), voltime)
 
     elif ndatatypes_rad4alpdem > 0:
         if ((cfg['RadarRes'][ind_rad] is None) or
@@ -280,22 +292,9 @@ def get_data(voltime, datatypesdescr, cfg):
                 'Current radar '+cfg['RadarName'][ind_rad] +
                 cfg['RadarRes'][ind_rad])
 
-        for dt_rad4alpdem in datatype_rad4alpdem:
-            radar_aux = merge_scans_dem_rad4alp(
-                voltime, dt_rad4alpdem, cfg, ind_rad=ind_rad)
-            if radar is None:
-                radar = radar_aux
-                continue
-            if radar_aux is None:
-                continue
-            for field_name in radar_aux.fields.keys():
-                try:
-                    radar.add_field(
-                        field_name, radar_aux.fields[field_name])
-                except (ValueError, KeyError) as ee:
-                    warn("Unable to add field '"+field_name +
-                         "' to radar object"
-                         ": (%s)" % str(ee))
+        radar = add_static_fields(radar, get_static_radar(
+            'RAD4ALPDEM', datatype_rad4alpdem, voltime, cfg,
+            ind_rad=ind_rad), voltime)
 
     if ndatatypes_rad4alphydro > 0:
         if ((cfg['RadarRes'][ind_rad] is None) or
@@ -360,8 +359,14 @@ def get_data(voltime, datatypesdescr, cfg):
         if 'altitude' in cfg['RadarPosition']:
             radar.altitude['data'][0] = (
                 cfg['RadarPosition']['altitude'][ind_rad])
-        radar.init_gate_longitude_latitude()
-        radar.init_gate_altitude()
+
+    if radar is not None:
+        if cfg.get('compactdtype', 0):
+            radar = compact_radar_fields(radar)
+
+        # share the gate coordinates between volumes of the same scan
+        # strategy
+        attach_gate_geometry(radar)
 
     return radar
 
@@ -998,18 +1003,11 @@ def merge_scans_dem_rad4alp(voltime, datatype, cfg, ind_rad=0):
             filename[0], ['dBZ'], scan_list[0], cfg, ind_rad=ind_rad)
 
         if radar is not None:
-            radar.fields = dict()
-
             # add visibility data for first scan
-            if cfg['rmax'] > 0:
-                ngates = radar.ngates
-                radar.add_field(
-                    get_fieldname_pyart(datatype),
-                    vis_list[int(scan_list[0])-1][:, :ngates])
-            else:
-                radar.add_field(
-                    get_fieldname_pyart(datatype),
-                    vis_list[int(scan_list[0])-1])
+            radar.fields = dict()
+            radar.add_field(
+                get_fieldname_pyart(datatype),
+                _get_vis_field(vis_list, scan_list[0], radar.ngates))
 
     if len(scan_list) == 1:
         return radar
@@ -1026,14 +1024,9 @@ def merge_scans_dem_rad4alp(voltime, datatype, cfg, ind_rad=0):
             continue
 
         radar_aux.fields = dict()
-        if cfg['rmax'] > 0:
-            ngates = radar_aux.ngates
-            radar_aux.add_field(
-                get_fieldname_pyart(datatype),
-                vis_list[int(scan_list[0])-1][:, :ngates])
-        else:
-            radar_aux.add_field(
-                get_fieldname_pyart(datatype), vis_list[int(scan)-1])
+        radar_aux.add_field(
+            get_fieldname_pyart(datatype),
+            _get_vis_field(vis_list, scan, radar_aux.ngates))
         if radar is None:
             radar = radar_aux
         else:
@@ -1042,6 +1035,173 @@ def merge_scans_dem_rad4alp(voltime, datatype, cfg, ind_rad=0):
     return radar
 
 
+def _get_vis_field(vis_list, scan, ngates):
+    """
+    gets the visibility field of a rad4alp scan cut at the number of gates
+    of the radar object and in the data type used in the visibility file
+
+    Parameters
+    ----------
+    vis_list : list of dict
+        the visibility fields of each rad4alp scan
+    scan : str
+        the scan number (001 to 020)
+    ngates : int
+        the number of gates of the radar object
+
+    Returns
+    -------
+    vis_field : dict
+        the visibility field
+
+    """
+    vis_field = dict(vis_list[int(scan)-1])
+    vis_field['data'] = vis_field['data'][:, :ngates].astype(np.uint8)
+
+    return vis_field
+
+
+def get_static_radar(datagroup, datatype_list, voltime, cfg, ind_rad=0):
+    """
+    Gets a radar object containing static fields, i.e. fields that do not
+    change from one volume to the next such as the visibility. The fields
+    are built only once per radar and scan strategy and kept in memory. If
+    'staticpath' is specified in the config they are also stored on disk in
+    a memory-mappable form so that other processes can reuse them
+
+    Parameters
+    ----------
+    datagroup : str
+        the data group of the static fields. Can be 'DEM' or 'RAD4ALPDEM'
+    datatype_list : list of str
+        the data types to get
+    voltime: datetime object
+        reference time of the scan. Used only if the fields have to be built
+    cfg : dict
+        configuration dictionary
+    ind_rad : int
+        radar index
+
+    Returns
+    -------
+    static_radar : dict
+        dictionary containing the radar object with the static fields
+        ('radar') and the key of its scan geometry ('geometry_key')
+
+    """
+    key = hashlib.sha1(str((
+        datagroup, datatype_list, cfg['dempath'][ind_rad],
+        cfg['ScanList'][ind_rad], cfg['RadarName'], cfg['RadarRes'],
+        cfg['rmax'], cfg.get('compactdtype', 0),
+        ind_rad)).encode('utf-8')).hexdigest()
+
+    if key in _STATIC_RADAR_CACHE:
+        return _STATIC_RADAR_CACHE[key]
+
+    fname = None
+    radar = None
+    if cfg.get('staticpath', None) is not None:
+        fname = os.path.join(cfg['staticpath'], 'static_'+key+'.pkl')
+        if os.path.isfile(fname):
+            radar = read_static_radar(fname)
+
+    if radar is None:
+        if datagroup == 'RAD4ALPDEM':
+            for datatype in datatype_list:
+                radar = add_field(radar, merge_scans_dem_rad4alp(
+                    voltime, datatype, cfg, ind_rad=ind_rad))
+        else:
+            radar = merge_scans_dem(
+                cfg['dempath'][ind_rad], cfg['ScanList'][ind_rad],
+                datatype_list)
+        if radar is None:
+            return None
+
+        if cfg.get('compactdtype', 0):
+            radar = compact_radar_fields(radar)
+
+        # the cached fields are shared by all volumes
+        _set_read_only(radar)
+
+        # do not keep the fields if some scans are missing
+        if radar.nsweeps != len(cfg['ScanList'][ind_rad]):
+            warn('Static fields not available for all scans')
+            return {
+                'radar': radar,
+                'geometry_key': get_geometry_key(radar)}
+
+        if fname is not None:
+            if not os.path.isdir(cfg['staticpath']):
+                os.makedirs(cfg['staticpath'])
+            write_static_radar(radar, fname)
+
+            # use the memory-mapped version
+            radar_aux = read_static_radar(fname)
+            if radar_aux is not None:
+                radar = radar_aux
+
+    static_radar = {
+        'radar': radar,
+        'geometry_key': get_geometry_key(radar)}
+    _STATIC_RADAR_CACHE.update({key: static_radar})
+
+    return static_radar
+
+
+def add_static_fields(radar, static_radar, voltime):
+    """
+    adds the static fields to a radar object. The data of the static fields
+    is not copied. If the radar object has the same scan geometry as the
+    static fields they are added directly, otherwise they are interpolated.
+    If there is no radar object a new one with the geometry of the static
+    fields is created
+
+    Parameters
+    ----------
+    radar : radar object or None
+        the destination radar
+    static_radar : dict
+        dictionary containing the radar object with the static fields and
+        the key of its scan geometry. See get_static_radar
+    voltime: datetime object
+        reference time of the scan
+
+    Returns
+    -------
+    radar : radar object
+        the radar object with the static fields
+
+    """
+    if static_radar is None:
+        return radar
+
+    # the field dictionaries and data arrays are new objects so that the
+    # cached ones are not modified but the data is shared. The data is
+    # read-only so that modifying it in place fails
+    fields = dict()
+    for field_name, field in static_radar['radar'].fields.items():
+        field = dict(field)
+        field['data'] = field['data'].view()
+        fields.update({field_name: field})
+
+    radar_aux = copy(static_radar['radar'])
+    radar_aux.fields = dict()
+    if radar is None:
+        radar = deepcopy(radar_aux)
+        radar.time['units'] = (
+            'seconds since '+voltime.strftime('%Y-%m-%dT%H:%M:%SZ'))
+        radar.fields = fields
+        return radar
+
+    if get_geometry_key(radar) == static_radar['geometry_key']:
+        for field_name, field in fields.items():
+            radar.add_field(field_name, field, replace_existing=True)
+        return radar
+
+    radar_aux.fields = fields
+    return add_field(radar, radar_aux)
+
+
 def merge_scans_hydro_rad4alp(voltime, datatype, cfg, ind_rad=0):
     """
     merge rad4alp hydrometeor classification scans. If data for all the scans
@@ -1733,75 +1893,10 @@ def get_data_rad4alp(filename, datatype_list, scan_name, cfg, ind_rad=0):
     if ('Nh' not in datatype_list) and ('Nv' not in datatype_list):
         return radar
 
-    # create noise moments
-    # read radar information in status file
+    # create noise moments from the radar information in status file
     voltime = get_datetime(filename, 'RAD4ALP:dBZ')
-    root = read_status(voltime, cfg, ind_rad=ind_rad)
-    if root is None:
-        return radar
-
-    sweep_number = int(scan_name)-1
-    if 'Nh' in datatype_list:
-        found = False
-        for sweep in root.findall('sweep'):
-            sweep_number_file = (
-                int(sweep.attrib['name'].split('.')[1])-1)
-            if sweep_number_file == sweep_number:
-                noise_h = sweep.find(
-                    "./RADAR/STAT/CALIB/noisepower_frontend_h_inuse")
-                rconst_h = sweep.find("./RADAR/STAT/CALIB/rconst_h")
-                if noise_h is None or rconst_h is None:
-                    warn('Horizontal channel noise power not ' +
-                         'available for sweep '+scan_name)
-                    break
-
-                noisedBADU_h = 10.*np.log10(
-                    float(noise_h.attrib['value']))
-                rconst_h = float(rconst_h.attrib['value'])
-
-                noisedBZ_h = pyart.retrieve.compute_noisedBZ(
-                    radar.nrays, noisedBADU_h+rconst_h,
-                    radar.range['data'], 100.,
-                    noise_field='noisedBZ_hh')
-
-                radar.add_field('noisedBZ_hh', noisedBZ_h)
-
-                found = True
-        if not found:
-            warn('Horizontal channel noise power not ' +
-                 'available for sweep '+scan_name)
-
-    if 'Nv' in datatype_list:
-        found = False
-        for sweep in root.findall('sweep'):
-            sweep_number_file = (
-                int(sweep.attrib['name'].split('.')[1])-1)
-            if sweep_number_file == sweep_number:
-                noise_v = sweep.find(
-                    "./RADAR/STAT/CALIB/noisepower_frontend_v_inuse")
-                rconst_v = sweep.find("./RADAR/STAT/CALIB/rconst_v")
-                if noise_v is None or rconst_v is None:
-                    warn('Vertical channel noise power not ' +
-                         'available for sweep '+scan_name)
-                    break
-
-                noisedBADU_v = 10.*np.log10(
-                    float(noise_v.attrib['value']))
-                rconst_v = float(rconst_v.attrib['value'])
-
-                noisedBZ_v = pyart.retrieve.compute_noisedBZ(
-                    radar.nrays, noisedBADU_v+rconst_v,
-                    radar.range['data'], 100.,
-                    noise_field='noisedBZ_vv')
-
-                radar.add_field('noisedBZ_vv', noisedBZ_v)
-
-                found = True
-        if not found:
-            warn('Horizontal channel noise power not ' +
-                 'available for sweep '+scan_name)
-
-    return radar
+    return _add_noise_fields(
+        radar, datatype_list, voltime, scan_name, cfg, ind_rad=ind_rad)
 
 
 def get_data_odim(filename, datatype_list, scan_name, cfg, ind_rad=0):
@@ -1841,75 +1936,94 @@ def get_data_odim(filename, datatype_list, scan_name, cfg, ind_rad=0):
     if ('Nh' not in datatype_list) and ('Nv' not in datatype_list):
         return radar
 
-    # create noise moments
-    # read radar information in status file
+    # create noise moments from the radar information in status file
     voltime = get_datetime(filename, 'ODIM:dBZ')
-    root = read_status(voltime, cfg, ind_rad=ind_rad)
-    if root is None:
+    return _add_noise_fields(
+        radar, datatype_list, voltime, scan_name, cfg, ind_rad=ind_rad)
+
+
+def _add_noise_fields(radar, datatype_list, voltime, scan_name, cfg,
+                      ind_rad=0):
+    """
+    adds the noise moments of a sweep to a radar object. The noise power
+    and radar constant are taken from the rad4alp status file of the volume
+
+    Parameters
+    ----------
+    radar : Radar
+        radar object containing the sweep
+    datatype_list : list of strings
+        list of data fields to get. Only 'Nh' and 'Nv' are considered
+    voltime : datetime object
+        volume scan time
+    scan_name : str
+        name of the elevation (001 to 020)
+    cfg : dict
+        configuration dictionary
+    ind_rad : int
+        radar index
+
+    Returns
+    -------
+    radar : Radar
+        radar object with the noise moments
+
+    """
+    status_table = read_status_table(voltime, cfg, ind_rad=ind_rad)
+    if status_table is None:
         return radar
 
     sweep_number = int(scan_name)-1
-    if 'Nh' in datatype_list:
-        found = False
-        for sweep in root.findall('sweep'):
-            sweep_number_file = (
-                int(sweep.attrib['name'].split('.')[1])-1)
-            if sweep_number_file == sweep_number:
-                noise_h = sweep.find(
-                    "./RADAR/STAT/CALIB/noisepower_frontend_h_inuse")
-                rconst_h = sweep.find("./RADAR/STAT/CALIB/rconst_h")
-                if noise_h is None or rconst_h is None:
-                    warn('Horizontal channel noise power not ' +
-                         'available for sweep '+scan_name)
-                    break
+    for datatype, pol, field_name, channel in (
+            ('Nh', 'h', 'noisedBZ_hh', 'Horizontal'),
+            ('Nv', 'v', 'noisedBZ_vv', 'Vertical')):
+        if datatype not in datatype_list:
+            continue
 
-                noisedBADU_h = 10.*np.log10(
-                    float(noise_h.attrib['value']))
-                rconst_h = float(rconst_h.attrib['value'])
+        noise = _get_status_value(
+            status_table, 'noisepower_frontend_'+pol+'_inuse', sweep_number)
+        rconst = _get_status_value(
+            status_table, 'rconst_'+pol, sweep_number)
+        if noise is None or rconst is None:
+            warn(channel+' channel noise power not ' +
+                 'available for sweep '+scan_name)
+            continue
 
-                noisedBZ_h = pyart.retrieve.compute_noisedBZ(
-                    radar.nrays, noisedBADU_h+rconst_h,
-                    radar.range['data'], 100.,
-                    noise_field='noisedBZ_hh')
+        noisedBZ = pyart.retrieve.compute_noisedBZ(
+            radar.nrays, 10.*np.log10(noise)+rconst, radar.range['data'],
+            100., noise_field=field_name)
 
-                radar.add_field('noisedBZ_hh', noisedBZ_h)
+        radar.add_field(field_name, noisedBZ)
 
-                found = True
-        if not found:
-            warn('Horizontal channel noise power not ' +
-                 'available for sweep '+scan_name)
+    return radar
 
-    if 'Nv' in datatype_list:
-        found = False
-        for sweep in root.findall('sweep'):
-            sweep_number_file = (
-                int(sweep.attrib['name'].split('.')[1])-1)
-            if sweep_number_file == sweep_number:
-                noise_v = sweep.find(
-                    "./RADAR/STAT/CALIB/noisepower_frontend_v_inuse")
-                rconst_v = sweep.find("./RADAR/STAT/CALIB/rconst_v")
-                if noise_v is None or rconst_v is None:
-                    warn('Vertical channel noise power not ' +
-                         'available for sweep '+scan_name)
-                    break
 
-                noisedBADU_v = 10.*np.log10(
-                    float(noise_v.attrib['value']))
-                rconst_v = float(rconst_v.attrib['value'])
+def _get_status_value(status_table, param, sweep_number):
+    """
+    gets the value of a parameter of the status file for a given sweep
 
-                noisedBZ_v = pyart.retrieve.compute_noisedBZ(
-                    radar.nrays, noisedBADU_v+rconst_v,
-                    radar.range['data'], 100.,
-                    noise_field='noisedBZ_vv')
+    Parameters
+    ----------
+    status_table : dict
+        dictionary of arrays indexed by sweep number. See read_status_table
+    param : str
+        the parameter name
+    sweep_number : int
+        the sweep number (starting at 0)
 
-                radar.add_field('noisedBZ_vv', noisedBZ_v)
+    Returns
+    -------
+    value : float or None
+        the value of the parameter. None if not available
 
-                found = True
-        if not found:
-            warn('Horizontal channel noise power not ' +
-                 'available for sweep '+scan_name)
+    """
+    values = status_table.get(param, None)
+    if values is None or sweep_number >= values.size:
+        return None
+    if np.isnan(values[sweep_number]):
+        return None
 
-    return radar
+    return values[sweep_number]
 
 
 def get_data_mxpol(filename, datatype_list):
@@ -2087,3 +2201,20 @@ def interpol_field(radar_dest, radar_orig, field_name, fill_value=None,
             field_dest_sweep)
 
     return field_dest
+
+
+def _set_read_only(radar):
+    """
+    Makes the data and the mask of the fields of a radar object read-only
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object
+
+    """
+    for field in radar.fields.values():
+        data = field['data']
+        if np.ma.isMaskedArray(data) and data.mask is not np.ma.nomask:
+            data.mask.flags.writeable = False
+        data.flags.writeable = False
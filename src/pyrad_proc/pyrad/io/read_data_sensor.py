@@ -20,6 +20,9 @@ Functions for reading data from other sensors
     read_smn2
     read_disdro_scattering
     read_disdro
+    read_station_table
+    _get_cached_sensor_data
+    _get_sensor_file_stat
 
 """
 
@@ -34,6 +37,11 @@ import numpy as np
 
 from pyart.config import get_fillvalue
 
+# sensor data of the last daily files read. The key is the file name and
+# the value the size and modification time of the file and the data read
+_SENSOR_DATA_CACHE = dict()
+_SENSOR_DATA_CACHE_SIZE = 20
+
 
 def read_trt_scores(fname):
     """
@@ -912,7 +920,9 @@ def read_lightning_all(fname,
 
 def get_sensor_data(date, datatype, cfg):
     """
-    Gets data from a point measurement sensor (rain gauge or disdrometer)
+    Gets data from a point measurement sensor (rain gauge or disdrometer).
+    The daily sensor files are read only once as long as they are not
+    modified
 
     Parameters
     ----------
@@ -934,6 +944,9 @@ def get_sensor_data(date, datatype, cfg):
     if cfg['sensor'] == 'rgage':
         datapath = cfg['smnpath']+date.strftime('%Y%m')+'/'
         datafile = date.strftime('%Y%m%d')+'_' + cfg['sensorid']+'.csv'
+        sensor_data = _get_cached_sensor_data(datapath+datafile)
+        if sensor_data is not None:
+            return sensor_data
         _, sensordate, _, _, _, sensorvalue, _, _ = read_smn(
             datapath+datafile)
         if sensordate is None:
@@ -954,6 +967,9 @@ def get_sensor_data(date, datatype, cfg):
             '_'+str(cfg['freq'])+'GHz_'+sensor_datatype+'_el'+str(cfg['ele']) +
             '.csv')
 
+        sensor_data = _get_cached_sensor_data(datapath+datafile)
+        if sensor_data is not None:
+            return sensor_data
         sensordate, _, sensorvalue, _ = read_disdro(datapath+datafile)
         if sensordate is None:
             return None, None, None, None
@@ -964,6 +980,14 @@ def get_sensor_data(date, datatype, cfg):
         warn('Unknown sensor: '+cfg['sensor'])
         return None, None, None, None
 
+    stat = _get_sensor_file_stat(datapath+datafile)
+    if stat is not None:
+        if len(_SENSOR_DATA_CACHE) >= _SENSOR_DATA_CACHE_SIZE:
+            _SENSOR_DATA_CACHE.pop(next(iter(_SENSOR_DATA_CACHE)))
+        _SENSOR_DATA_CACHE.update({
+            datapath+datafile: (
+                stat, (sensordate, sensorvalue, label, period))})
+
     return sensordate, sensorvalue, label, period
 
 
@@ -1227,3 +1251,101 @@ def read_disdro(fname):
         warn(str(ee))
         warn('Unable to read file '+fname)
         return (None, None, None, None)
+
+
+def read_station_table(fname):
+    """
+    Reads a table of stations (e.g. SwissMetNet stations or disdrometers)
+    contained in a csv file with columns StationID, Longitude, Latitude and
+    Altitude
+
+    Parameters
+    ----------
+    fname : str
+        path of the station table file
+
+    Returns
+    -------
+    station_id : str array
+        the station identifiers
+    lon, lat, alt : float arrays
+        the station longitude, latitude [deg] and altitude [m MSL]
+
+    """
+    try:
+        with open(fname, 'r', newline='') as csvfile:
+            # skip comment lines
+            reader = csv.DictReader(
+                row for row in csvfile if not row.startswith('#'))
+            station_id = list()
+            lon = list()
+            lat = list()
+            alt = list()
+            for row in reader:
+                station_id.append(row['StationID'].strip())
+                lon.append(float(row['Longitude']))
+                lat.append(float(row['Latitude']))
+                alt.append(float(row['Altitude']))
+
+            csvfile.close()
+
+            if not station_id:
+                warn('Empty file '+fname)
+                return None, None, None, None
+
+            return (
+                np.array(station_id), np.array(lon, dtype=float),
+                np.array(lat, dtype=float), np.array(alt, dtype=float))
+    except (EnvironmentError, KeyError, ValueError) as ee:
+        warn(str(ee))
+        warn('Unable to read file '+fname)
+        return None, None, None, None
+
+
+def _get_cached_sensor_data(fname):
+    """
+    Gets the data of a sensor file from the cache if the file has not been
+    modified since it was read
+
+    Parameters
+    ----------
+    fname : str
+        path of the sensor file
+
+    Returns
+    -------
+    sensor_data : tupple or None
+        date, value, type of sensor and measurement period. None if the
+        file is not in the cache or has been modified
+
+    """
+    if fname not in _SENSOR_DATA_CACHE:
+        return None
+    stat, sensor_data = _SENSOR_DATA_CACHE[fname]
+    if stat != _get_sensor_file_stat(fname):
+        del _SENSOR_DATA_CACHE[fname]
+        return None
+    return sensor_data
+
+
+def _get_sensor_file_stat(fname):
+    """
+    Gets the size and modification time of a sensor file
+
+    Parameters
+    ----------
+    fname : str
+        path of the sensor file
+
+    Returns
+    -------
+    stat : tupple or None
+        size and modification time of the file. None if the file does not
+        exist
+
+    """
+    try:
+        stat = os.stat(fname)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
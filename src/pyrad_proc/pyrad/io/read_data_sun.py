@@ -11,10 +11,14 @@ Functions for reading data used in sun monitoring
     read_sun_hits
     read_sun_retrieval
     read_solar_flux
+    _update_sun_hits_store
+    _remove_from_sun_hits_store
 """
 
+import os
 import datetime
 import csv
+import threading
 from warnings import warn
 
 import numpy as np
@@ -22,11 +26,29 @@ import numpy as np
 from pyart.config import get_fillvalue
 
 from .io_aux import get_save_dir, make_filename
+from .buffered_csv_writer import flush_csv_file
+
+# columns of the sun hits files in the order returned by the readers
+_SUN_HITS_COLUMNS = (
+    'time', 'ray', 'NPrng', 'rad_el', 'rad_az', 'sun_el', 'sun_az',
+    'dBm_sun_hit', 'std(dBm_sun_hit)', 'NPh', 'NPhval', 'dBmv_sun_hit',
+    'std(dBmv_sun_hit)', 'NPv', 'NPvval', 'ZDR_sun_hit', 'std(ZDR_sun_hit)',
+    'NPzdr', 'NPzdrval')
+
+# columnar stores of the sun hits read from file, one per dataset. 'files'
+# contains the modification time of each file loaded and 'columns' the data
+# of all the files sorted by time together with the file each hit comes
+# from. Each store is guarded by its own lock
+_SUN_HITS_STORES = dict()
+_SUN_HITS_STORES_LOCK = threading.Lock()
 
 
 def read_sun_hits_multiple_days(cfg, time_ref, nfiles=1):
     """
-    Reads sun hits data from multiple file sources
+    Reads sun hits data from multiple file sources. The daily files are
+    loaded into a columnar hit store of the dataset kept in memory between
+    calls, so that only new or modified files are parsed, and the hits are
+    retrieved with a single time range query on the store
 
     Parameters
     ----------
@@ -47,26 +69,7 @@ def read_sun_hits_multiple_days(cfg, time_ref, nfiles=1):
     """
     timeinfo = time_ref - datetime.timedelta(days=nfiles-1)
 
-    date = list()
-    ray = list()
-    nrng = list()
-    rad_el = list()
-    rad_az = list()
-    sun_el = list()
-    sun_az = list()
-    ph = np.ma.array(list())
-    ph_std = np.ma.array(list())
-    nph = list()
-    nvalh = list()
-    pv = np.ma.array(list())
-    pv_std = np.ma.array(list())
-    npv = list()
-    nvalv = list()
-    zdr = np.ma.array(list())
-    zdr_std = np.ma.array(list())
-    nzdr = list()
-    nvalzdr = list()
-
+    fname_list = []
     for i in range(nfiles):
         savedir = get_save_dir(
             cfg['basepath'], cfg['procname'], cfg['dsname'],
@@ -76,53 +79,49 @@ def read_sun_hits_multiple_days(cfg, time_ref, nfiles=1):
             'info', cfg['type'], 'detected', ['csv'],
             timeinfo=timeinfo, timeformat='%Y%m%d')
 
-        (date_aux, ray_aux, nrng_aux, rad_el_aux, rad_az_aux, sun_el_aux,
-         sun_az_aux, ph_aux, ph_std_aux, nph_aux, nvalh_aux, pv_aux,
-         pv_std_aux, npv_aux, nvalv_aux, zdr_aux, zdr_std_aux, nzdr_aux,
-         nvalzdr_aux) = read_sun_hits(savedir+fname[0])
-
-        if date_aux is None:
-            return (None, None, None, None, None, None, None, None, None,
-                    None, None, None, None, None, None, None, None, None,
-                    None)
-
-        date += date_aux
-        ray += list(ray_aux)
-        nrng += list(nrng_aux)
-        rad_el += list(rad_el_aux)
-        rad_az += list(rad_az_aux)
-        sun_el += list(sun_el_aux)
-        sun_az += list(sun_az_aux)
-        ph = np.ma.append(ph, ph_aux)
-        ph_std = np.ma.append(ph_std, ph_std_aux)
-        nph += list(nph_aux)
-        nvalh += list(nvalh_aux)
-        pv = np.ma.append(pv, pv_aux)
-        pv_std = np.ma.append(pv_std, pv_std_aux)
-        npv += list(npv_aux)
-        nvalv += list(nvalv_aux)
-        zdr = np.ma.append(zdr, zdr_aux)
-        zdr_std = np.ma.append(zdr_std, zdr_std_aux)
-        nzdr += list(nzdr_aux)
-        nvalzdr += list(nvalzdr_aux)
+        fname_list.append(savedir+fname[0])
 
         timeinfo += datetime.timedelta(days=1)
 
-    ray = np.squeeze(np.array(ray))
-    nrng = np.squeeze(np.array(nrng))
-    rad_el = np.squeeze(np.array(rad_el))
-    rad_az = np.squeeze(np.array(rad_az))
-    sun_el = np.squeeze(np.array(sun_el))
-    sun_az = np.squeeze(np.array(sun_az))
-    nph = np.squeeze(np.array(nph))
-    nvalh = np.squeeze(np.array(nvalh))
-    npv = np.squeeze(np.array(npv))
-    nvalv = np.squeeze(np.array(nvalv))
-    nzdr = np.squeeze(np.array(nzdr))
-    nvalzdr = np.squeeze(np.array(nvalzdr))
-
-    return (date, ray, nrng, rad_el, rad_az, sun_el, sun_az, ph, ph_std, nph,
-            nvalh, pv, pv_std, npv, nvalv, zdr, zdr_std, nzdr, nvalzdr)
+    store_key = (
+        cfg['basepath'], cfg['procname'], cfg['dsname'], cfg['sun_hits_dir'],
+        cfg['type'])
+    with _SUN_HITS_STORES_LOCK:
+        store = _SUN_HITS_STORES.get(store_key, None)
+        if store is None:
+            store = {
+                'files': dict(), 'columns': None, 'lock': threading.Lock()}
+            _SUN_HITS_STORES[store_key] = store
+
+    with store['lock']:
+        for fname in fname_list:
+            if not _update_sun_hits_store(store, fname):
+                return (None, None, None, None, None, None, None, None, None,
+                        None, None, None, None, None, None, None, None, None,
+                        None)
+
+        # discard the files out of the period of interest
+        for fname in list(store['files']):
+            if fname not in fname_list:
+                _remove_from_sun_hits_store(store, fname)
+
+        tend = np.datetime64(datetime.datetime(
+            time_ref.year, time_ref.month, time_ref.day))+np.timedelta64(
+                1, 'D')
+        tstart = tend-np.timedelta64(nfiles, 'D')
+        columns = store['columns']
+        ind_start, ind_end = np.searchsorted(
+            columns['time'],
+            np.array([tstart, tend], dtype='datetime64[us]'))
+        rows = slice(ind_start, ind_end)
+
+        # the returned arrays are copies, the store is not modified by the
+        # caller
+        date = columns['time'][rows].astype(datetime.datetime).tolist()
+
+        return tuple(
+            [date]+[columns[col][rows].copy()
+                    for col in _SUN_HITS_COLUMNS[1:]])
 
 
 def read_sun_hits(fname):
@@ -142,6 +141,7 @@ def read_sun_hits(fname):
         a variable
 
     """
+    flush_csv_file(fname)
     try:
         with open(fname, 'r', newline='') as csvfile:
             # first count the lines
@@ -409,3 +409,87 @@ def read_solar_flux(fname):
         warn(str(ee))
         warn('Unable to read file '+fname)
         return None, None
+
+
+def _update_sun_hits_store(store, fname):
+    """
+    Loads a sun hits file into a columnar hit store if it is not there or
+    if it has been modified since it was loaded. To be called with the lock
+    of the store held
+
+    Parameters
+    ----------
+    store : dict
+        the hit store of the dataset
+    fname : str
+        path of the sun hits file
+
+    Returns
+    -------
+    success : bool
+        False if the file could not be read
+
+    """
+    flush_csv_file(fname)
+    try:
+        mtime = os.path.getmtime(fname)
+    except OSError:
+        mtime = None
+    if mtime is not None and store['files'].get(fname) == mtime:
+        return True
+
+    sun_hits = read_sun_hits(fname)
+    if sun_hits[0] is None:
+        return False
+
+    _remove_from_sun_hits_store(store, fname)
+
+    file_columns = {
+        'time': np.array(sun_hits[0], dtype='datetime64[us]'),
+        'file': np.full(len(sun_hits[0]), fname, dtype=object)}
+    for col, data in zip(_SUN_HITS_COLUMNS[1:], sun_hits[1:]):
+        file_columns[col] = data
+
+    columns = store['columns']
+    if columns is not None:
+        for col, data in file_columns.items():
+            if np.ma.isMaskedArray(data):
+                file_columns[col] = np.ma.concatenate((columns[col], data))
+            else:
+                file_columns[col] = np.concatenate((columns[col], data))
+
+    ind_sort = np.argsort(file_columns['time'], kind='mergesort')
+    for col, data in file_columns.items():
+        file_columns[col] = data[ind_sort]
+
+    store['columns'] = file_columns
+    store['files'][fname] = mtime
+
+    return True
+
+
+def _remove_from_sun_hits_store(store, fname):
+    """
+    Removes the sun hits of a file from a columnar hit store. To be called
+    with the lock of the store held
+
+    Parameters
+    ----------
+    store : dict
+        the hit store of the dataset
+    fname : str
+        path of the sun hits file
+
+    Returns
+    -------
+    None
+
+    """
+    if fname not in store['files']:
+        return
+    del store['files'][fname]
+
+    columns = store['columns']
+    keep = columns['file'] != fname
+    for col, data in columns.items():
+        columns[col] = data[keep]
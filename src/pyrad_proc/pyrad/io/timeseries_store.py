@@ -0,0 +1,279 @@
+"""
+pyrad.io.timeseries_store
+=========================
+
+In-memory store of the time series kept in csv files by the products. The
+series of each file is read once and afterwards the samples appended by the
+products are added to the series in memory. The store remembers the size and
+modification time of each file so that a file modified by somebody else is
+read again. It also keeps track of the samples already plotted by each
+product so that the figures can be refreshed at a lower cadence. The rows
+of a file buffered by the csv writer are written before its size and
+modification time are checked.
+
+.. autosummary::
+    :toctree: generated/
+
+    ts_store_in_sync
+    update_ts_store
+    ts_store_plot_due
+    set_ts_store_plotted
+    get_ts_store_pending
+    _get_file_stat
+    _append_sample
+
+"""
+
+import os
+import threading
+
+import numpy as np
+
+from .buffered_csv_writer import flush_csv_file
+
+# series of the time series files. The key is the file name and each entry
+# contains the columns of the series, with some spare capacity, the number
+# of samples, the size and modification time of the file and the number of
+# samples plotted by each product together with the information the product
+# needs to plot the series
+_TS_STORE = dict()
+_TS_STORE_LOCK = threading.Lock()
+
+
+def ts_store_in_sync(fname):
+    """
+    Checks whether the series of a file kept in the store is in sync with
+    the file. It has to be called before appending a sample to the file
+
+    Parameters
+    ----------
+    fname : str
+        name of the time series file
+
+    Returns
+    -------
+    in_sync : bool
+        True if the series is in the store and the file has not been
+        modified since
+
+    """
+    flush_csv_file(fname)
+    with _TS_STORE_LOCK:
+        if fname not in _TS_STORE:
+            return False
+        return _TS_STORE[fname]['stat'] == _get_file_stat(fname)
+
+
+def update_ts_store(fname, read_func, sample=None, read_kwargs=None,
+                    sort_by_date=False, owner=None, owner_info=None):
+    """
+    Gets the series of a time series file. If a sample is given it is
+    appended to the series in memory. Otherwise the file is read if the
+    series is not in sync with it
+
+    Parameters
+    ----------
+    fname : str
+        name of the time series file
+    read_func : function
+        function used to read the file. It returns a tuple with the columns
+        of the series, the first one being the date
+    sample : tuple or None
+        a sample just appended to the file with one value per column. It
+        should be given only if the series was in sync with the file before
+        appending the sample
+    read_kwargs : dict or None
+        keyword arguments passed to the read function
+    sort_by_date : bool
+        If True the series is kept sorted by date
+    owner : str or None
+        identifier of the product plotting the series. If given the samples
+        plotted by the product are tracked
+    owner_info : dict or None
+        information the product needs to plot the series. It is returned
+        together with the series pending to be plotted
+
+    Returns
+    -------
+    series : tuple or None
+        the columns of the series. None if the file could not be read
+
+    """
+    flush_csv_file(fname)
+    with _TS_STORE_LOCK:
+        entry = _TS_STORE.get(fname, None)
+        if sample is not None and entry is not None:
+            _append_sample(entry, sample, sort_by_date=sort_by_date)
+        elif entry is None or entry['stat'] != _get_file_stat(fname):
+            if read_kwargs is None:
+                read_kwargs = dict()
+            series = read_func(fname, **read_kwargs)
+            if series[0] is None:
+                _TS_STORE.pop(fname, None)
+                return None
+            columns = []
+            for col in series:
+                if np.ma.isMaskedArray(col):
+                    columns.append(col.copy())
+                elif isinstance(col, list):
+                    columns.append(np.array(col, dtype=object))
+                else:
+                    columns.append(np.array(col))
+            plotted = dict()
+            info = dict()
+            if entry is not None:
+                plotted = dict.fromkeys(entry['plotted'], 0)
+                info = entry['info']
+            entry = {
+                'columns': columns,
+                'nsamples': len(series[0]),
+                'plotted': plotted,
+                'info': info}
+            _TS_STORE[fname] = entry
+        entry['stat'] = _get_file_stat(fname)
+        if owner is not None:
+            if owner not in entry['plotted']:
+                entry['plotted'][owner] = 0
+            if owner_info is not None:
+                entry['info'][owner] = owner_info
+
+        return tuple(col[:entry['nsamples']] for col in entry['columns'])
+
+
+def ts_store_plot_due(fname, owner, plot_every=1, final=False):
+    """
+    Checks whether a product should refresh its figure of a time series
+
+    Parameters
+    ----------
+    fname : str
+        name of the time series file
+    owner : str
+        identifier of the product plotting the series
+    plot_every : int
+        number of new samples between figure refreshes. If 0 the figure is
+        refreshed only at the end of the processing
+    final : bool
+        If True the processing is ending and the figure is refreshed if
+        there are samples not yet plotted
+
+    Returns
+    -------
+    plot_due : bool
+        True if the figure should be refreshed
+
+    """
+    with _TS_STORE_LOCK:
+        if fname not in _TS_STORE:
+            return True
+        entry = _TS_STORE[fname]
+        nnew = entry['nsamples']-entry['plotted'].get(owner, 0)
+        if final:
+            return nnew > 0
+        if plot_every <= 0:
+            return False
+        return nnew >= plot_every
+
+
+def set_ts_store_plotted(fname, owner):
+    """
+    Records that a product has plotted all the samples of a time series
+
+    Parameters
+    ----------
+    fname : str
+        name of the time series file
+    owner : str
+        identifier of the product plotting the series
+
+    """
+    with _TS_STORE_LOCK:
+        if fname in _TS_STORE:
+            entry = _TS_STORE[fname]
+            entry['plotted'][owner] = entry['nsamples']
+
+
+def get_ts_store_pending(owner):
+    """
+    Gets the time series with samples not yet plotted by a product
+
+    Parameters
+    ----------
+    owner : str
+        identifier of the product plotting the series
+
+    Returns
+    -------
+    pending : list of tuples
+        name of each time series file with samples pending to be plotted
+        and the information the product gave to plot it
+
+    """
+    with _TS_STORE_LOCK:
+        return [
+            (fname, entry['info'].get(owner, None))
+            for fname, entry in _TS_STORE.items()
+            if owner in entry['plotted'] and
+            entry['plotted'][owner] < entry['nsamples']]
+
+
+def _get_file_stat(fname):
+    """
+    Gets the size and modification time of a file
+
+    Parameters
+    ----------
+    fname : str
+        name of the file
+
+    Returns
+    -------
+    stat : tuple or None
+        size and modification time of the file. None if the file does not
+        exist
+
+    """
+    try:
+        stat = os.stat(fname)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def _append_sample(entry, sample, sort_by_date=False):
+    """
+    Appends a sample to the series of a store entry. The capacity of the
+    columns is doubled when they are full
+
+    Parameters
+    ----------
+    entry : dict
+        the store entry
+    sample : tuple
+        the sample with one value per column
+    sort_by_date : bool
+        If True and the sample is older than the last sample the series is
+        sorted by date
+
+    """
+    nsamples = entry['nsamples']
+    columns = entry['columns']
+    if nsamples >= len(columns[0]):
+        capacity = max(2*len(columns[0]), 16)
+        for i, col in enumerate(columns):
+            if np.ma.isMaskedArray(col):
+                new_col = np.ma.masked_all(capacity, dtype=col.dtype)
+            else:
+                new_col = np.empty(capacity, dtype=col.dtype)
+            new_col[:nsamples] = col[:nsamples]
+            columns[i] = new_col
+
+    for col, value in zip(columns, sample):
+        col[nsamples] = value
+    entry['nsamples'] = nsamples+1
+
+    if (sort_by_date and nsamples > 0 and
+            columns[0][nsamples] < columns[0][nsamples-1]):
+        ind = np.argsort(columns[0][:nsamples+1], kind='stable')
+        for col in columns:
+            col[:nsamples+1] = col[:nsamples+1][ind]
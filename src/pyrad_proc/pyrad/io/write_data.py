@@ -23,6 +23,7 @@ Functions for writing pyrad output data
     write_histogram
     write_quantiles
     write_ts_polar_data
+    write_ts_multi_point_data
     write_ts_ml
     write_ts_cum
     write_monitoring_ts
@@ -33,24 +34,31 @@ Functions for writing pyrad output data
     write_colocated_data_time_avg
     write_sun_hits
     write_sun_retrieval
+    write_grid_weights
+    write_hist2d_accumulator
+    write_partial_state
+    write_static_radar
 
 """
 
 from __future__ import print_function
+import os
 import glob
 import csv
 from warnings import warn
 import smtplib
 from email.message import EmailMessage
-import fcntl
-import errno
-import time
+import pickle
+from copy import copy
 
 import numpy as np
 
 from pyart.config import get_fillvalue
 
 from .io_aux import generate_field_name_str
+from .buffered_csv_writer import append_csv_rows, format_csv_rows
+
+from ..util.dtype_utils import pack_mask
 
 
 def write_fixed_angle(time_data, fixed_angle, rad_lat, rad_lon, rad_alt,
@@ -960,51 +968,30 @@ def write_ts_polar_data(dataset, fname):
         the name of the file where data has written
 
     """
-    filelist = glob.glob(fname)
-    if not filelist:
-        with open(fname, 'w', newline='') as csvfile:
-            csvfile.write('# Weather radar timeseries data file\n')
-            csvfile.write('# Comment lines are preceded by "#"\n')
-            csvfile.write('# Description: \n')
-            csvfile.write('# Time series of a weather radar data over a ' +
-                          'fixed location.\n')
-            csvfile.write(
-                '# Location [lon, lat, alt]: ' +
-                str(dataset['point_coordinates_WGS84_lon_lat_alt']) + '\n')
-            csvfile.write(
-                '# Nominal antenna coordinates used [az, el, r]: ' +
-                str(dataset['antenna_coordinates_az_el_r'])+'\n')
-            csvfile.write(
-                '# Data: '+generate_field_name_str(dataset['datatype'])+'\n')
-            csvfile.write('# Fill Value: '+str(get_fillvalue())+'\n')
-            csvfile.write(
-                '# Start: ' +
-                dataset['time'].strftime('%Y-%m-%d %H:%M:%S UTC')+'\n')
-            csvfile.write('#\n')
-
-            fieldnames = ['date', 'az', 'el', 'r', 'value']
-            writer = csv.DictWriter(csvfile, fieldnames)
-            writer.writeheader()
-            writer.writerow(
-                {'date': dataset['time'],
-                 'az': dataset['used_antenna_coordinates_az_el_r'][0],
-                 'el': dataset['used_antenna_coordinates_az_el_r'][1],
-                 'r': dataset['used_antenna_coordinates_az_el_r'][2],
-                 'value': dataset['value']})
-            csvfile.close()
-    else:
-        with open(fname, 'a', newline='') as csvfile:
-            fieldnames = ['date', 'az', 'el', 'r', 'value']
-            writer = csv.DictWriter(csvfile, fieldnames)
-            writer.writerow(
-                {'date': dataset['time'],
-                 'az': dataset['used_antenna_coordinates_az_el_r'][0],
-                 'el': dataset['used_antenna_coordinates_az_el_r'][1],
-                 'r': dataset['used_antenna_coordinates_az_el_r'][2],
-                 'value': dataset['value']})
-            csvfile.close()
-
-    return fname
+    header = (
+        '# Weather radar timeseries data file\n' +
+        '# Comment lines are preceded by "#"\n' +
+        '# Description: \n' +
+        '# Time series of a weather radar data over a fixed location.\n' +
+        '# Location [lon, lat, alt]: ' +
+        str(dataset['point_coordinates_WGS84_lon_lat_alt'])+'\n' +
+        '# Nominal antenna coordinates used [az, el, r]: ' +
+        str(dataset['antenna_coordinates_az_el_r'])+'\n' +
+        '# Data: '+generate_field_name_str(dataset['datatype'])+'\n' +
+        '# Fill Value: '+str(get_fillvalue())+'\n' +
+        '# Start: ' +
+        dataset['time'].strftime('%Y-%m-%d %H:%M:%S UTC')+'\n' +
+        '#\n' +
+        'date,az,el,r,value\r\n')
+
+    rows = format_csv_rows([
+        [str(dataset['time'])],
+        [str(dataset['used_antenna_coordinates_az_el_r'][0])],
+        [str(dataset['used_antenna_coordinates_az_el_r'][1])],
+        [str(dataset['used_antenna_coordinates_az_el_r'][2])],
+        [str(dataset['value'])]])
+
+    return append_csv_rows(fname, rows, header=header)
 
 
 def write_ts_ml(dt_ml, ml_top_avg, ml_top_std, thick_avg, thick_std,
@@ -1087,6 +1074,78 @@ def write_ts_ml(dt_ml, ml_top_avg, ml_top_std, thick_avg, thick_std,
     return fname
 
 
+def write_ts_multi_point_data(dataset, ind_station, fname):
+    """
+    writes time series of data of several fields at one of the stations of
+    a multiple point measurement dataset
+
+    Parameters
+    ----------
+    dataset : dict
+        dictionary containing the data of all the stations
+    ind_station : int
+        index of the station to write
+    fname : str
+        file name where to store the data
+
+    Returns
+    -------
+    fname : str
+        the name of the file where data has written
+
+    """
+    fieldnames = ['date', 'az', 'el', 'r']+dataset['datatypes']
+    row = {
+        'date': dataset['time'][ind_station],
+        'az': dataset['used_antenna_coordinates_az_el_r'][ind_station, 0],
+        'el': dataset['used_antenna_coordinates_az_el_r'][ind_station, 1],
+        'r': dataset['used_antenna_coordinates_az_el_r'][ind_station, 2]}
+    for datatype in dataset['datatypes']:
+        row.update({datatype: dataset['values'][datatype].filled(
+            fill_value=get_fillvalue())[ind_station]})
+
+    filelist = glob.glob(fname)
+    if not filelist:
+        with open(fname, 'w', newline='') as csvfile:
+            csvfile.write('# Weather radar timeseries data file\n')
+            csvfile.write('# Comment lines are preceded by "#"\n')
+            csvfile.write('# Description: \n')
+            csvfile.write('# Time series of a weather radar data over a ' +
+                          'fixed location.\n')
+            csvfile.write(
+                '# Station: '+dataset['station_id'][ind_station]+'\n')
+            csvfile.write(
+                '# Location [lon, lat, alt]: ' +
+                str(list(dataset['point_coordinates_WGS84_lon_lat_alt'][
+                    ind_station]))+'\n')
+            csvfile.write(
+                '# Nominal antenna coordinates used [az, el, r]: ' +
+                str(list(dataset['antenna_coordinates_az_el_r'][
+                    ind_station]))+'\n')
+            csvfile.write(
+                '# Data: '+', '.join(
+                    [generate_field_name_str(datatype)
+                     for datatype in dataset['datatypes']])+'\n')
+            csvfile.write('# Fill Value: '+str(get_fillvalue())+'\n')
+            csvfile.write(
+                '# Start: ' +
+                dataset['time'][ind_station].strftime(
+                    '%Y-%m-%d %H:%M:%S UTC')+'\n')
+            csvfile.write('#\n')
+
+            writer = csv.DictWriter(csvfile, fieldnames)
+            writer.writeheader()
+            writer.writerow(row)
+            csvfile.close()
+    else:
+        with open(fname, 'a', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames)
+            writer.writerow(row)
+            csvfile.close()
+
+    return fname
+
+
 def write_ts_cum(dataset, fname):
     """
     writes time series accumulation of data
@@ -1188,79 +1247,25 @@ def write_monitoring_ts(start_time, np_t, values, quantiles, datatype, fname,
         values_aux = values.filled(fill_value=get_fillvalue())
         np_t_aux = np_t
 
-    if rewrite:
-        file_exists = False
-    else:
-        filelist = glob.glob(fname)
-        if not filelist:
-            file_exists = False
-        else:
-            file_exists = True
-
-    if not file_exists:
-        with open(fname, 'w', newline='') as csvfile:
-            while True:
-                try:
-                    fcntl.flock(csvfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
-                    break
-                except OSError as e:
-                    if e.errno != errno.EAGAIN:
-                        raise
-                    else:
-                        time.sleep(0.1)
-
-            csvfile.write(
-                '# Weather radar monitoring timeseries data file\n' +
-                '# Comment lines are preceded by "#"\n' +
-                '# Description: \n' +
-                '# Time series of a monitoring of weather radar data.\n' +
-                '# Quantiles: '+str(quantiles[1])+', '+str(quantiles[0])+', ' +
-                str(quantiles[2])+' percent.\n' +
-                '# Data: '+generate_field_name_str(datatype)+'\n' +
-                '# Fill Value: '+str(get_fillvalue())+'\n' +
-                '# Start: '+start_time_aux[0].strftime(
-                    '%Y-%m-%d %H:%M:%S UTC')+'\n' +
-                '#\n')
+    header = (
+        '# Weather radar monitoring timeseries data file\n' +
+        '# Comment lines are preceded by "#"\n' +
+        '# Description: \n' +
+        '# Time series of a monitoring of weather radar data.\n' +
+        '# Quantiles: '+str(quantiles[1])+', '+str(quantiles[0])+', ' +
+        str(quantiles[2])+' percent.\n' +
+        '# Data: '+generate_field_name_str(datatype)+'\n' +
+        '# Fill Value: '+str(get_fillvalue())+'\n' +
+        '# Start: '+start_time_aux[0].strftime(
+            '%Y-%m-%d %H:%M:%S UTC')+'\n' +
+        '#\n' +
+        'date,NP,central_quantile,low_quantile,high_quantile\r\n')
 
-            fieldnames = ['date', 'NP', 'central_quantile', 'low_quantile',
-                          'high_quantile']
-            writer = csv.DictWriter(csvfile, fieldnames)
-            writer.writeheader()
-            for i, np_t_el in enumerate(np_t_aux):
-                writer.writerow({
-                    'date': start_time_aux[i].strftime('%Y%m%d%H%M%S'),
-                    'NP': np_t_el,
-                    'central_quantile': values_aux[i, 1],
-                    'low_quantile': values_aux[i, 0],
-                    'high_quantile': values_aux[i, 2]})
+    rows = format_csv_rows([
+        [dt.strftime('%Y%m%d%H%M%S') for dt in start_time_aux],
+        np_t_aux, values_aux[:, 1], values_aux[:, 0], values_aux[:, 2]])
 
-            fcntl.flock(csvfile, fcntl.LOCK_UN)
-            csvfile.close()
-    else:
-        with open(fname, 'a', newline='') as csvfile:
-            while True:
-                try:
-                    fcntl.flock(csvfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
-                    break
-                except OSError as e:
-                    if e.errno != errno.EAGAIN:
-                        raise
-                    else:
-                        time.sleep(0.1)
-
-            fieldnames = ['date', 'NP', 'central_quantile', 'low_quantile',
-                          'high_quantile']
-            writer = csv.DictWriter(csvfile, fieldnames)
-            for i, np_t_el in enumerate(np_t_aux):
-                writer.writerow({
-                    'date': start_time_aux[i].strftime('%Y%m%d%H%M%S'),
-                    'NP': np_t_el,
-                    'central_quantile': values_aux[i, 1],
-                    'low_quantile': values_aux[i, 0],
-                    'high_quantile': values_aux[i, 2]})
-            fcntl.flock(csvfile, fcntl.LOCK_UN)
-            csvfile.close()
-    return fname
+    return append_csv_rows(fname, rows, header=header, rewrite=rewrite)
 
 
 def write_excess_gates(excess_dict, fname):
@@ -1372,103 +1377,29 @@ def write_intercomp_scores_ts(start_time, stats, field_name, fname,
         start_time_aux = np.asarray(start_time)
         np_t = stats['npoints']
 
-    if rewrite:
-        file_exists = False
-    else:
-        filelist = glob.glob(fname)
-        if not filelist:
-            file_exists = False
-        else:
-            file_exists = True
-
-    if not file_exists:
-        with open(fname, 'w', newline='') as csvfile:
-            while True:
-                try:
-                    fcntl.flock(csvfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
-                    break
-                except OSError as e:
-                    if e.errno != errno.EAGAIN:
-                        raise
-                    else:
-                        time.sleep(0.1)
-
-            csvfile.write(
-                '# Weather radar intercomparison scores timeseries file\n' +
-                '# Comment lines are preceded by "#"\n' +
-                '# Description: \n' +
-                '# Time series of the intercomparison between two radars.\n' +
-                '# Radar 1: '+rad1_name+'\n' +
-                '# Radar 2: '+rad2_name+'\n' +
-                '# Field name: '+field_name+'\n' +
-                '# Fill Value: '+str(get_fillvalue())+'\n' +
-                '# Start: '+start_time_aux[0].strftime(
-                    '%Y-%m-%d %H:%M:%S UTC')+'\n' +
-                '#\n')
-
-            fieldnames = ['date', 'NP', 'mean_bias', 'median_bias',
-                          'quant25_bias', 'quant75_bias', 'mode_bias', 'corr',
-                          'slope_of_linear_regression',
-                          'intercep_of_linear_regression',
-                          'intercep_of_linear_regression_of_slope_1']
-            writer = csv.DictWriter(csvfile, fieldnames)
-            writer.writeheader()
-
-            for i, dt in enumerate(start_time_aux):
-                writer.writerow({
-                    'date': dt.strftime('%Y%m%d%H%M%S'),
-                    'NP': np_t[i],
-                    'mean_bias': meanbias[i],
-                    'median_bias': medianbias[i],
-                    'quant25_bias': quant25bias[i],
-                    'quant75_bias': quant75bias[i],
-                    'mode_bias': modebias[i],
-                    'corr': corr[i],
-                    'slope_of_linear_regression': slope[i],
-                    'intercep_of_linear_regression': intercep[i],
-                    'intercep_of_linear_regression_of_slope_1': (
-                        intercep_slope_1[i])
-                    })
-
-            fcntl.flock(csvfile, fcntl.LOCK_UN)
-            csvfile.close()
-    else:
-        with open(fname, 'a', newline='') as csvfile:
-            while True:
-                try:
-                    fcntl.flock(csvfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
-                    break
-                except OSError as e:
-                    if e.errno != errno.EAGAIN:
-                        raise
-                    else:
-                        time.sleep(0.1)
-
-            fieldnames = ['date', 'NP', 'mean_bias', 'median_bias',
-                          'quant25_bias', 'quant75_bias', 'mode_bias', 'corr',
-                          'slope_of_linear_regression',
-                          'intercep_of_linear_regression',
-                          'intercep_of_linear_regression_of_slope_1']
-            writer = csv.DictWriter(csvfile, fieldnames)
-            for i, dt in enumerate(start_time_aux):
-                writer.writerow({
-                    'date': dt.strftime('%Y%m%d%H%M%S'),
-                    'NP': np_t[i],
-                    'mean_bias': meanbias[i],
-                    'median_bias': medianbias[i],
-                    'quant25_bias': quant25bias[i],
-                    'quant75_bias': quant75bias[i],
-                    'mode_bias': modebias[i],
-                    'corr': corr[i],
-                    'slope_of_linear_regression': slope[i],
-                    'intercep_of_linear_regression': intercep[i],
-                    'intercep_of_linear_regression_of_slope_1': (
-                        intercep_slope_1[i])
-                    })
-            fcntl.flock(csvfile, fcntl.LOCK_UN)
-            csvfile.close()
-
-    return fname
+    header = (
+        '# Weather radar intercomparison scores timeseries file\n' +
+        '# Comment lines are preceded by "#"\n' +
+        '# Description: \n' +
+        '# Time series of the intercomparison between two radars.\n' +
+        '# Radar 1: '+rad1_name+'\n' +
+        '# Radar 2: '+rad2_name+'\n' +
+        '# Field name: '+field_name+'\n' +
+        '# Fill Value: '+str(get_fillvalue())+'\n' +
+        '# Start: '+start_time_aux[0].strftime(
+            '%Y-%m-%d %H:%M:%S UTC')+'\n' +
+        '#\n' +
+        'date,NP,mean_bias,median_bias,quant25_bias,quant75_bias,' +
+        'mode_bias,corr,slope_of_linear_regression,' +
+        'intercep_of_linear_regression,' +
+        'intercep_of_linear_regression_of_slope_1\r\n')
+
+    rows = format_csv_rows([
+        [dt.strftime('%Y%m%d%H%M%S') for dt in start_time_aux], np_t,
+        meanbias, medianbias, quant25bias, quant75bias, modebias, corr,
+        slope, intercep, intercep_slope_1])
+
+    return append_csv_rows(fname, rows, header=header, rewrite=rewrite)
 
 
 def write_colocated_gates(coloc_gates, fname):
@@ -1533,67 +1464,25 @@ def write_colocated_data(coloc_data, fname):
         the name of the file where data has written
 
     """
-    filelist = glob.glob(fname)
-    if not filelist:
-        with open(fname, 'w', newline='') as csvfile:
-            csvfile.write('# Colocated radar gates data file\n')
-            csvfile.write('# Comment lines are preceded by "#"\n')
-            csvfile.write('#\n')
-
-            fieldnames = [
-                'rad1_time', 'rad1_ray_ind', 'rad1_rng_ind', 'rad1_ele',
-                'rad1_azi', 'rad1_rng', 'rad1_val', 'rad2_time',
-                'rad2_ray_ind', 'rad2_rng_ind', 'rad2_ele', 'rad2_azi',
-                'rad2_rng', 'rad2_val']
-            writer = csv.DictWriter(csvfile, fieldnames)
-            writer.writeheader()
-            for i, rad1_time in enumerate(coloc_data['rad1_time']):
-                writer.writerow({
-                    'rad1_time': rad1_time.strftime('%Y%m%d%H%M%S'),
-                    'rad1_ray_ind': coloc_data['rad1_ray_ind'][i],
-                    'rad1_rng_ind': coloc_data['rad1_rng_ind'][i],
-                    'rad1_ele': coloc_data['rad1_ele'][i],
-                    'rad1_azi': coloc_data['rad1_azi'][i],
-                    'rad1_rng': coloc_data['rad1_rng'][i],
-                    'rad1_val': coloc_data['rad1_val'][i],
-                    'rad2_time': (
-                        coloc_data['rad2_time'][i].strftime('%Y%m%d%H%M%S')),
-                    'rad2_ray_ind': coloc_data['rad2_ray_ind'][i],
-                    'rad2_rng_ind': coloc_data['rad2_rng_ind'][i],
-                    'rad2_ele': coloc_data['rad2_ele'][i],
-                    'rad2_azi': coloc_data['rad2_azi'][i],
-                    'rad2_rng': coloc_data['rad2_rng'][i],
-                    'rad2_val': coloc_data['rad2_val'][i]})
-
-            csvfile.close()
-    else:
-        with open(fname, 'a', newline='') as csvfile:
-            fieldnames = [
-                'rad1_time', 'rad1_ray_ind', 'rad1_rng_ind', 'rad1_ele',
-                'rad1_azi', 'rad1_rng', 'rad1_val', 'rad2_time',
-                'rad2_ray_ind', 'rad2_rng_ind', 'rad2_ele', 'rad2_azi',
-                'rad2_rng', 'rad2_val']
-            writer = csv.DictWriter(csvfile, fieldnames)
-            for i, rad1_time in enumerate(coloc_data['rad1_time']):
-                writer.writerow({
-                    'rad1_time': rad1_time.strftime('%Y%m%d%H%M%S'),
-                    'rad1_ray_ind': coloc_data['rad1_ray_ind'][i],
-                    'rad1_rng_ind': coloc_data['rad1_rng_ind'][i],
-                    'rad1_ele': coloc_data['rad1_ele'][i],
-                    'rad1_azi': coloc_data['rad1_azi'][i],
-                    'rad1_rng': coloc_data['rad1_rng'][i],
-                    'rad1_val': coloc_data['rad1_val'][i],
-                    'rad2_time': (
-                        coloc_data['rad2_time'][i].strftime('%Y%m%d%H%M%S')),
-                    'rad2_ray_ind': coloc_data['rad2_ray_ind'][i],
-                    'rad2_rng_ind': coloc_data['rad2_rng_ind'][i],
-                    'rad2_ele': coloc_data['rad2_ele'][i],
-                    'rad2_azi': coloc_data['rad2_azi'][i],
-                    'rad2_rng': coloc_data['rad2_rng'][i],
-                    'rad2_val': coloc_data['rad2_val'][i]})
-            csvfile.close()
-
-    return fname
+    header = (
+        '# Colocated radar gates data file\n' +
+        '# Comment lines are preceded by "#"\n' +
+        '#\n' +
+        'rad1_time,rad1_ray_ind,rad1_rng_ind,rad1_ele,rad1_azi,rad1_rng,' +
+        'rad1_val,rad2_time,rad2_ray_ind,rad2_rng_ind,rad2_ele,rad2_azi,' +
+        'rad2_rng,rad2_val\r\n')
+
+    rows = format_csv_rows([
+        [dt.strftime('%Y%m%d%H%M%S') for dt in coloc_data['rad1_time']],
+        coloc_data['rad1_ray_ind'], coloc_data['rad1_rng_ind'],
+        coloc_data['rad1_ele'], coloc_data['rad1_azi'],
+        coloc_data['rad1_rng'], coloc_data['rad1_val'],
+        [dt.strftime('%Y%m%d%H%M%S') for dt in coloc_data['rad2_time']],
+        coloc_data['rad2_ray_ind'], coloc_data['rad2_rng_ind'],
+        coloc_data['rad2_ele'], coloc_data['rad2_azi'],
+        coloc_data['rad2_rng'], coloc_data['rad2_val']])
+
+    return append_csv_rows(fname, rows, header=header)
 
 
 def write_colocated_data_time_avg(coloc_data, fname):
@@ -1613,77 +1502,28 @@ def write_colocated_data_time_avg(coloc_data, fname):
         the name of the file where data has written
 
     """
-    filelist = glob.glob(fname)
-    if not filelist:
-        with open(fname, 'w', newline='') as csvfile:
-            csvfile.write('# Colocated radar gates data file\n')
-            csvfile.write('# Comment lines are preceded by "#"\n')
-            csvfile.write('#\n')
-
-            fieldnames = [
-                'rad1_time', 'rad1_ray_ind', 'rad1_rng_ind', 'rad1_ele',
-                'rad1_azi', 'rad1_rng', 'rad1_dBZavg', 'rad1_PhiDPavg',
-                'rad1_Flagavg', 'rad2_time', 'rad2_ray_ind', 'rad2_rng_ind',
-                'rad2_ele', 'rad2_azi', 'rad2_rng', 'rad2_dBZavg',
-                'rad2_PhiDPavg', 'rad2_Flagavg']
-            writer = csv.DictWriter(csvfile, fieldnames)
-            writer.writeheader()
-            for i, rad1_time in enumerate(coloc_data['rad1_time']):
-                writer.writerow({
-                    'rad1_time': rad1_time.strftime('%Y%m%d%H%M%S'),
-                    'rad1_ray_ind': coloc_data['rad1_ray_ind'][i],
-                    'rad1_rng_ind': coloc_data['rad1_rng_ind'][i],
-                    'rad1_ele': coloc_data['rad1_ele'][i],
-                    'rad1_azi': coloc_data['rad1_azi'][i],
-                    'rad1_rng': coloc_data['rad1_rng'][i],
-                    'rad1_dBZavg': coloc_data['rad1_dBZavg'][i],
-                    'rad1_PhiDPavg': coloc_data['rad1_PhiDPavg'][i],
-                    'rad1_Flagavg': coloc_data['rad1_Flagavg'][i],
-                    'rad2_time': (
-                        coloc_data['rad2_time'][i].strftime('%Y%m%d%H%M%S')),
-                    'rad2_ray_ind': coloc_data['rad2_ray_ind'][i],
-                    'rad2_rng_ind': coloc_data['rad2_rng_ind'][i],
-                    'rad2_ele': coloc_data['rad2_ele'][i],
-                    'rad2_azi': coloc_data['rad2_azi'][i],
-                    'rad2_rng': coloc_data['rad2_rng'][i],
-                    'rad2_dBZavg': coloc_data['rad2_dBZavg'][i],
-                    'rad2_PhiDPavg': coloc_data['rad2_PhiDPavg'][i],
-                    'rad2_Flagavg': coloc_data['rad2_Flagavg'][i]})
-
-            csvfile.close()
-    else:
-        with open(fname, 'a', newline='') as csvfile:
-            fieldnames = [
-                'rad1_time', 'rad1_ray_ind', 'rad1_rng_ind', 'rad1_ele',
-                'rad1_azi', 'rad1_rng', 'rad1_dBZavg', 'rad1_PhiDPavg',
-                'rad1_Flagavg', 'rad2_time', 'rad2_ray_ind', 'rad2_rng_ind',
-                'rad2_ele', 'rad2_azi', 'rad2_rng', 'rad2_dBZavg',
-                'rad2_PhiDPavg', 'rad2_Flagavg']
-            writer = csv.DictWriter(csvfile, fieldnames)
-            for i, rad1_time in enumerate(coloc_data['rad1_time']):
-                writer.writerow({
-                    'rad1_time': rad1_time.strftime('%Y%m%d%H%M%S'),
-                    'rad1_ray_ind': coloc_data['rad1_ray_ind'][i],
-                    'rad1_rng_ind': coloc_data['rad1_rng_ind'][i],
-                    'rad1_ele': coloc_data['rad1_ele'][i],
-                    'rad1_azi': coloc_data['rad1_azi'][i],
-                    'rad1_rng': coloc_data['rad1_rng'][i],
-                    'rad1_dBZavg': coloc_data['rad1_dBZavg'][i],
-                    'rad1_PhiDPavg': coloc_data['rad1_PhiDPavg'][i],
-                    'rad1_Flagavg': coloc_data['rad1_Flagavg'][i],
-                    'rad2_time': (
-                        coloc_data['rad2_time'][i].strftime('%Y%m%d%H%M%S')),
-                    'rad2_ray_ind': coloc_data['rad2_ray_ind'][i],
-                    'rad2_rng_ind': coloc_data['rad2_rng_ind'][i],
-                    'rad2_ele': coloc_data['rad2_ele'][i],
-                    'rad2_azi': coloc_data['rad2_azi'][i],
-                    'rad2_rng': coloc_data['rad2_rng'][i],
-                    'rad2_dBZavg': coloc_data['rad2_dBZavg'][i],
-                    'rad2_PhiDPavg': coloc_data['rad2_PhiDPavg'][i],
-                    'rad2_Flagavg': coloc_data['rad2_Flagavg'][i]})
-            csvfile.close()
-
-    return fname
+    header = (
+        '# Colocated radar gates data file\n' +
+        '# Comment lines are preceded by "#"\n' +
+        '#\n' +
+        'rad1_time,rad1_ray_ind,rad1_rng_ind,rad1_ele,rad1_azi,rad1_rng,' +
+        'rad1_dBZavg,rad1_PhiDPavg,rad1_Flagavg,rad2_time,rad2_ray_ind,' +
+        'rad2_rng_ind,rad2_ele,rad2_azi,rad2_rng,rad2_dBZavg,' +
+        'rad2_PhiDPavg,rad2_Flagavg\r\n')
+
+    rows = format_csv_rows([
+        [dt.strftime('%Y%m%d%H%M%S') for dt in coloc_data['rad1_time']],
+        coloc_data['rad1_ray_ind'], coloc_data['rad1_rng_ind'],
+        coloc_data['rad1_ele'], coloc_data['rad1_azi'],
+        coloc_data['rad1_rng'], coloc_data['rad1_dBZavg'],
+        coloc_data['rad1_PhiDPavg'], coloc_data['rad1_Flagavg'],
+        [dt.strftime('%Y%m%d%H%M%S') for dt in coloc_data['rad2_time']],
+        coloc_data['rad2_ray_ind'], coloc_data['rad2_rng_ind'],
+        coloc_data['rad2_ele'], coloc_data['rad2_azi'],
+        coloc_data['rad2_rng'], coloc_data['rad2_dBZavg'],
+        coloc_data['rad2_PhiDPavg'], coloc_data['rad2_Flagavg']])
+
+    return append_csv_rows(fname, rows, header=header)
 
 
 def write_sun_hits(sun_hits, fname):
@@ -1714,77 +1554,25 @@ def write_sun_hits(sun_hits, fname):
     std_zdr_sun_hit = sun_hits['std(ZDR_sun_hit)'].filled(
         fill_value=get_fillvalue())
 
-    filelist = glob.glob(fname)
-    if not filelist:
-        with open(fname, 'w', newline='') as csvfile:
-            csvfile.write('# Weather radar sun hits data file\n')
-            csvfile.write('# Comment lines are preceded by "#"\n')
-            csvfile.write('# Fill Value: '+str(get_fillvalue())+'\n')
-            csvfile.write('#\n')
+    header = (
+        '# Weather radar sun hits data file\n' +
+        '# Comment lines are preceded by "#"\n' +
+        '# Fill Value: '+str(get_fillvalue())+'\n' +
+        '#\n' +
+        'time,ray,NPrng,rad_el,rad_az,sun_el,sun_az,dBm_sun_hit,' +
+        'std(dBm_sun_hit),NPh,NPhval,dBmv_sun_hit,std(dBmv_sun_hit),NPv,' +
+        'NPvval,ZDR_sun_hit,std(ZDR_sun_hit),NPzdr,NPzdrval\r\n')
 
-            fieldnames = [
-                'time', 'ray', 'NPrng',
-                'rad_el', 'rad_az', 'sun_el', 'sun_az',
-                'dBm_sun_hit', 'std(dBm_sun_hit)', 'NPh', 'NPhval',
-                'dBmv_sun_hit', 'std(dBmv_sun_hit)', 'NPv', 'NPvval',
-                'ZDR_sun_hit', 'std(ZDR_sun_hit)', 'NPzdr', 'NPzdrval']
-            writer = csv.DictWriter(csvfile, fieldnames)
-            writer.writeheader()
-            for i, sh_time in enumerate(sun_hits['time']):
-                writer.writerow({
-                    'time': sh_time.strftime('%Y-%m-%d %H:%M:%S.%f'),
-                    'ray': sun_hits['ray'][i],
-                    'NPrng': sun_hits['NPrng'][i],
-                    'rad_el': sun_hits['rad_el'][i],
-                    'rad_az': sun_hits['rad_az'][i],
-                    'sun_el': sun_hits['sun_el'][i],
-                    'sun_az': sun_hits['sun_az'][i],
-                    'dBm_sun_hit': dBm_sun_hit[i],
-                    'std(dBm_sun_hit)': std_dBm_sun_hit[i],
-                    'NPh': sun_hits['NPh'][i],
-                    'NPhval': sun_hits['NPhval'][i],
-                    'dBmv_sun_hit': dBmv_sun_hit[i],
-                    'std(dBmv_sun_hit)': std_dBmv_sun_hit[i],
-                    'NPv': sun_hits['NPv'][i],
-                    'NPvval': sun_hits['NPvval'][i],
-                    'ZDR_sun_hit': zdr_sun_hit[i],
-                    'std(ZDR_sun_hit)': std_zdr_sun_hit[i],
-                    'NPzdr': sun_hits['NPzdr'][i],
-                    'NPzdrval': sun_hits['NPzdrval'][i]})
-            csvfile.close()
-    else:
-        with open(fname, 'a', newline='') as csvfile:
-            fieldnames = [
-                'time', 'ray', 'NPrng',
-                'rad_el', 'rad_az', 'sun_el', 'sun_az',
-                'dBm_sun_hit', 'std(dBm_sun_hit)', 'NPh', 'NPhval',
-                'dBmv_sun_hit', 'std(dBmv_sun_hit)', 'NPv', 'NPvval',
-                'ZDR_sun_hit', 'std(ZDR_sun_hit)', 'NPzdr', 'NPzdrval']
-            writer = csv.DictWriter(csvfile, fieldnames)
-            for i, sh_time in enumerate(sun_hits['time']):
-                writer.writerow({
-                    'time': sh_time.strftime('%Y-%m-%d %H:%M:%S.%f'),
-                    'ray': sun_hits['ray'][i],
-                    'NPrng': sun_hits['NPrng'][i],
-                    'rad_el': sun_hits['rad_el'][i],
-                    'rad_az': sun_hits['rad_az'][i],
-                    'sun_el': sun_hits['sun_el'][i],
-                    'sun_az': sun_hits['sun_az'][i],
-                    'dBm_sun_hit': dBm_sun_hit[i],
-                    'std(dBm_sun_hit)': std_dBm_sun_hit[i],
-                    'NPh': sun_hits['NPh'][i],
-                    'NPhval': sun_hits['NPhval'][i],
-                    'dBmv_sun_hit': dBmv_sun_hit[i],
-                    'std(dBmv_sun_hit)': std_dBmv_sun_hit[i],
-                    'NPv': sun_hits['NPv'][i],
-                    'NPvval': sun_hits['NPvval'][i],
-                    'ZDR_sun_hit': zdr_sun_hit[i],
-                    'std(ZDR_sun_hit)': std_zdr_sun_hit[i],
-                    'NPzdr': sun_hits['NPzdr'][i],
-                    'NPzdrval': sun_hits['NPzdrval'][i]})
-            csvfile.close()
+    rows = format_csv_rows([
+        [dt.strftime('%Y-%m-%d %H:%M:%S.%f') for dt in sun_hits['time']],
+        sun_hits['ray'], sun_hits['NPrng'], sun_hits['rad_el'],
+        sun_hits['rad_az'], sun_hits['sun_el'], sun_hits['sun_az'],
+        dBm_sun_hit, std_dBm_sun_hit, sun_hits['NPh'], sun_hits['NPhval'],
+        dBmv_sun_hit, std_dBmv_sun_hit, sun_hits['NPv'], sun_hits['NPvval'],
+        zdr_sun_hit, std_zdr_sun_hit, sun_hits['NPzdr'],
+        sun_hits['NPzdrval']])
 
-    return fname
+    return append_csv_rows(fname, rows, header=header)
 
 
 def write_sun_retrieval(sun_retrieval, fname):
@@ -1924,3 +1712,149 @@ def write_sun_retrieval(sun_retrieval, fname):
             csvfile.close()
 
     return fname
+
+
+def write_grid_weights(weights, fname):
+    """
+    Writes a sparse matrix of gate to grid point weights
+
+    Parameters
+    ----------
+    weights : scipy csr_matrix
+        the matrix of weights
+    fname : str
+        file name where to store the data
+
+    Returns
+    -------
+    fname : str
+        the name of the file where data has written
+
+    """
+    try:
+        with open(fname, 'wb') as npzfile:
+            np.savez(
+                npzfile, data=weights.data, indices=weights.indices,
+                indptr=weights.indptr, shape=np.array(weights.shape))
+            npzfile.close()
+
+            return fname
+    except EnvironmentError:
+        warn('Unable to write on file '+fname)
+        return None
+
+
+def write_hist2d_accumulator(accumulator, fname):
+    """
+    Writes a 2D histogram accumulator of colocated values. The file is
+    written under a temporary name and renamed so that it is never read
+    partially written
+
+    Parameters
+    ----------
+    accumulator : Hist2dAccumulator object
+        the accumulator
+    fname : str
+        file name where to store the data
+
+    Returns
+    -------
+    fname : str
+        the name of the file where data has written
+
+    """
+    fname_tmp = fname+'.'+str(os.getpid())+'.tmp'
+    try:
+        with open(fname_tmp, 'wb') as npzfile:
+            np.savez_compressed(
+                npzfile, bin_edges1=accumulator.bin_edges1,
+                bin_edges2=accumulator.bin_edges2,
+                counts=accumulator.counts,
+                diff_edges=accumulator.diff_edges,
+                diff_counts=accumulator.diff_counts, sums=accumulator.sums,
+                last_time=np.array(
+                    [] if accumulator.last_time is None else
+                    [accumulator.last_time], dtype='datetime64[us]'))
+        os.replace(fname_tmp, fname)
+
+        return fname
+    except EnvironmentError:
+        warn('Unable to write on file '+fname)
+        return None
+
+
+def write_partial_state(state, fname):
+    """
+    Writes the partial state of an accumulating dataset so that it can be
+    merged with the partial states of other processing chunks
+
+    Parameters
+    ----------
+    state : dict
+        the dataset global data containing the accumulator
+    fname : str
+        file name where to store the data
+
+    Returns
+    -------
+    fname : str
+        the name of the file where data has written
+
+    """
+    try:
+        with open(fname, 'wb') as statefile:
+            pickle.dump(state, statefile, protocol=pickle.HIGHEST_PROTOCOL)
+            statefile.close()
+
+            return fname
+    except (EnvironmentError, pickle.PicklingError):
+        warn('Unable to write on file '+fname)
+        return None
+
+
+def write_static_radar(radar, fname):
+    """
+    Writes a radar object containing static fields. The radar object without
+    the fields is pickled into fname and the data of each field is stored
+    in a separate .npy file in the same directory so that it can be
+    memory-mapped. Masks are stored bit-packed
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object containing the static fields
+    fname : str
+        file name where to store the radar object
+
+    Returns
+    -------
+    fname : str
+        the name of the file where data has written
+
+    """
+    basename = os.path.splitext(fname)[0]
+    radar_aux = copy(radar)
+    radar_aux.fields = dict()
+    try:
+        for field_name, field in radar.fields.items():
+            # the data file names are stored relative to fname
+            field_aux = dict(field)
+            field_aux['data'] = basename+'_'+field_name+'.npy'
+            np.save(field_aux['data'], np.ma.getdata(field['data']))
+            field_aux['data'] = os.path.basename(field_aux['data'])
+            if np.ma.is_masked(field['data']):
+                field_aux['mask'] = basename+'_'+field_name+'_mask.npy'
+                np.save(field_aux['mask'], pack_mask(
+                    np.ma.getmaskarray(field['data'])))
+                field_aux['mask'] = os.path.basename(field_aux['mask'])
+            radar_aux.fields.update({field_name: field_aux})
+
+        with open(fname, 'wb') as radarfile:
+            pickle.dump(
+                radar_aux, radarfile, protocol=pickle.HIGHEST_PROTOCOL)
+            radarfile.close()
+
+            return fname
+    except (EnvironmentError, pickle.PicklingError):
+        warn('Unable to write on file '+fname)
+        return None
@@ -20,6 +20,7 @@ Auxiliary functions
     process_fixed_rng_span
     process_roi
     process_grid
+    process_grid_rainfall_accumulation
     process_azimuthal_average
 
 Echo classification and filtering
@@ -100,6 +101,7 @@ Retrievals
     process_l
     process_cdr
     process_rainrate
+    process_rainfall_accumulation
     process_vol_refl
     process_bird_density
 
@@ -123,6 +125,7 @@ Time series functions
     :toctree: generated/
 
     process_point_measurement
+    process_multi_point_measurement
     process_qvp
     process_rqvp
     process_svp
@@ -154,14 +157,27 @@ COSMO data
     process_hzt_lookup_table
     process_hzt_coord
 
+Parallel processing
+===================
+
+.. autosummary::
+    :toctree: generated/
+
+    get_partition_blocks
+    extract_ray_block
+    run_partitioned
+    run_chunked
+
 
 """
 
 from .process_aux import get_process_func, process_raw, process_save_radar
 from .process_aux import process_grid, process_roi, process_azimuthal_average
 from .process_aux import process_fixed_rng, process_fixed_rng_span
+from .process_aux import process_grid_rainfall_accumulation
 
 from .process_timeseries import process_point_measurement, process_qvp
+from .process_timeseries import process_multi_point_measurement
 from .process_timeseries import process_rqvp, process_evp, process_svp
 from .process_timeseries import process_time_height
 
@@ -206,6 +222,7 @@ from .process_retrieve import process_signal_power, process_snr
 from .process_retrieve import process_l, process_cdr, process_bird_density
 from .process_retrieve import process_rainrate, process_vol_refl, process_rcs
 from .process_retrieve import process_rcs_pr
+from .process_retrieve import process_rainfall_accumulation
 
 from .process_Doppler import process_wind_vel, process_windshear
 from .process_Doppler import process_dealias_fourdd
@@ -217,4 +234,7 @@ from .process_cosmo import process_cosmo, process_cosmo_lookup_table
 from .process_cosmo import process_cosmo_coord, process_hzt
 from .process_cosmo import process_hzt_lookup_table, process_hzt_coord
 
+from .process_parallel import get_partition_blocks, extract_ray_block
+from .process_parallel import run_partitioned, run_chunked
+
 __all__ = [s for s in dir() if not s.startswith('_')]
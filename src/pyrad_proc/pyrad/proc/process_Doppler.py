@@ -24,6 +24,7 @@ import numpy as np
 import pyart
 
 from ..io.io_aux import get_datatype_fields, get_fieldname_pyart
+from .process_parallel import run_partitioned
 
 
 def process_dealias_fourdd(procstatus, dscfg, radar_list=None):
@@ -162,6 +163,9 @@ def process_dealias_region_based(procstatus, dscfg, radar_list=None):
             algorithm so that the average number of unfolding is near 0. False
             does not apply centering which may results in individual sweeps
             under or over folded by the nyquist interval.
+        nprocesses : int. Dataset keyword
+            number of processes used to process the volume in parallel.
+            The volume is partitioned in sweeps. Default 1
     radar_list : list of Radar objects
         Optional. list of radar objects
 
@@ -197,11 +201,13 @@ def process_dealias_region_based(procstatus, dscfg, radar_list=None):
     skip_along_ray = dscfg.get('skip_along_ray', 100)
     centered = dscfg.get('centered', True)
 
-    corr_vel_dict = pyart.correct.dealias_region_based(
-        radar, ref_vel_field=None, interval_splits=interval_splits,
-        interval_limits=None, skip_between_rays=skip_between_rays,
-        skip_along_ray=skip_along_ray, centered=centered,
-        nyquist_vel=None, check_nyquist_uniform=True, gatefilter=False,
+    corr_vel_dict = run_partitioned(
+        pyart.correct.dealias_region_based, radar, partition='sweep',
+        nprocesses=dscfg.get('nprocesses', 1), ref_vel_field=None,
+        interval_splits=interval_splits, interval_limits=None,
+        skip_between_rays=skip_between_rays, skip_along_ray=skip_along_ray,
+        centered=centered, nyquist_vel=None, check_nyquist_uniform=True,
+        gatefilter=False,
         rays_wrap_around=None, keep_original=False, set_limits=False,
         vel_field=vel_field, corr_vel_field=corr_vel_field)
 
@@ -236,6 +242,10 @@ def process_dealias_unwrap_phase(procstatus, dscfg, radar_list=None):
             contaminated by clutter. 'ray' does not use the gatefilter
             parameter and rays where gates ared masked will result in poor
             dealiasing for that ray.
+        nprocesses : int. Dataset keyword
+            number of processes used to process the volume in parallel.
+            The volume is partitioned in sweeps or in blocks of rays
+            depending on the unwrap unit. Default 1
     radar_list : list of Radar objects
         Optional. list of radar objects
 
@@ -268,9 +278,10 @@ def process_dealias_unwrap_phase(procstatus, dscfg, radar_list=None):
     # get user parameters
     unwrap_unit = dscfg.get('unwrap_unit', 'sweep')
 
-    corr_vel_dict = pyart.correct.dealias_unwrap_phase(
-        radar, unwrap_unit=unwrap_unit, nyquist_vel=None,
-        check_nyquist_uniform=True, gatefilter=False,
+    corr_vel_dict = run_partitioned(
+        pyart.correct.dealias_unwrap_phase, radar, partition=unwrap_unit,
+        nprocesses=dscfg.get('nprocesses', 1), unwrap_unit=unwrap_unit,
+        nyquist_vel=None, check_nyquist_uniform=True, gatefilter=False,
         rays_wrap_around=None, keep_original=False, set_limits=False,
         vel_field=vel_field, corr_vel_field=corr_vel_field, skip_checks=False)
 
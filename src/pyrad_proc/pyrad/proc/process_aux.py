@@ -16,21 +16,38 @@ determined points or regions of interest.
     process_fixed_rng_span
     process_roi
     process_grid
+    process_grid_rainfall_accumulation
     process_azimuthal_average
+    _get_grid_config
+    _get_grid_weights
+    _get_rainfall_accumulation_grid
 
 """
 
 from copy import deepcopy
 from warnings import warn
+import os
+import hashlib
 import numpy as np
 
 import pyart
 
 from ..io.io_aux import get_datatype_fields, get_fieldname_pyart
 from ..io.read_data_sensor import read_trt_traj_data
-from ..util.radar_utils import belongs_roi_indices, get_target_elevations
+from ..io.read_data_other import read_grid_weights
+from ..io.write_data import write_grid_weights
+from ..util.radar_utils import find_roi_gates, get_roi_radar
+from ..util.radar_utils import get_target_elevations
+from ..util.radar_utils import get_geometry_key
+from ..util.grid_utils import compute_grid_weights, grid_from_weights
 from ..util.radar_utils import find_neighbour_gates, compute_directional_stats
 from ..util.radar_utils import get_fixed_rng_data, get_fixed_rng_span_data
+from ..util.rainfall_accumulator import RainfallAccumulator
+from ..util.dtype_utils import get_float_dtype
+
+# gate to grid point weights already computed in this process
+_GRID_WEIGHTS_CACHE = dict()
+_GRID_WEIGHTS_CACHE_SIZE = 10
 
 
 def get_process_func(dataset_type, dsname):
@@ -77,6 +94,7 @@ def get_process_func(dataset_type, dsname):
                 'PHIDP_SMOOTH_1W': process_smooth_phidp_single_window
                 'PHIDP_SMOOTH_2W': process_smooth_phidp_double_window
                 'PWR': process_signal_power
+                'RAINFALL_ACCUMULATION': process_rainfall_accumulation
                 'RAINRATE': process_rainrate
                 'RAW': process_raw
                 'RCS': process_rcs
@@ -105,6 +123,8 @@ def get_process_func(dataset_type, dsname):
                 'HZT_COORD': process_hzt_coord
             'GRID' format output:
                 'GRID': process_grid
+                'GRID_RAINFALL_ACCUMULATION':
+                    process_grid_rainfall_accumulation
             'INTERCOMP' format output:
                 'INTERCOMP': process_intercomp
                 'INTERCOMP_TIME_AVG': process_intercomp_time_avg
@@ -134,6 +154,7 @@ def get_process_func(dataset_type, dsname):
                 'TIME_STATS': process_time_stats
                 'TIME_STATS2': process_time_stats2
             'TIMESERIES' format output:
+                'MULTI_POINT_MEASUREMENT': 'process_multi_point_measurement'
                 'POINT_MEASUREMENT': 'process_point_measurement'
                 'TRAJ_ANTENNA_PATTERN': process_traj_antenna_pattern
                 'TRAJ_ATPLANE': process_traj_atplane
@@ -160,6 +181,9 @@ def get_process_func(dataset_type, dsname):
     elif dataset_type == 'GRID':
         func_name = process_grid
         dsformat = 'GRID'
+    elif dataset_type == 'GRID_RAINFALL_ACCUMULATION':
+        func_name = process_grid_rainfall_accumulation
+        dsformat = 'GRID'
     elif dataset_type == 'QVP':
         func_name = 'process_qvp'
         dsformat = 'QVP'
@@ -240,6 +264,8 @@ def get_process_func(dataset_type, dsname):
         func_name = 'process_attenuation'
     elif dataset_type == 'RAINRATE':
         func_name = 'process_rainrate'
+    elif dataset_type == 'RAINFALL_ACCUMULATION':
+        func_name = 'process_rainfall_accumulation'
     elif dataset_type == 'DEALIAS_FOURDD':
         func_name = 'process_dealias_fourdd'
     elif dataset_type == 'DEALIAS_REGION':
@@ -328,6 +354,9 @@ def get_process_func(dataset_type, dsname):
     elif dataset_type == 'POINT_MEASUREMENT':
         func_name = 'process_point_measurement'
         dsformat = 'TIMESERIES'
+    elif dataset_type == 'MULTI_POINT_MEASUREMENT':
+        func_name = 'process_multi_point_measurement'
+        dsformat = 'TIMESERIES'
     elif dataset_type == 'ROI':
         func_name = process_roi
     elif dataset_type == 'TRAJ':
@@ -642,93 +671,17 @@ def process_roi(procstatus, dscfg, radar_list=None):
         'alt_min': alt_min,
         'alt_max': alt_max}
 
-    # extract the data within the ROI boundaries
-    inds_ray, inds_rng = np.indices(np.shape(radar.gate_longitude['data']))
-
-    mask = np.logical_and(
-        np.logical_and(
-            radar.gate_latitude['data'] >= roi_dict['lat'].min(),
-            radar.gate_latitude['data'] <= roi_dict['lat'].max()),
-        np.logical_and(
-            radar.gate_longitude['data'] >= roi_dict['lon'].min(),
-            radar.gate_longitude['data'] <= roi_dict['lon'].max()))
-
-    if alt_min is not None:
-        mask[radar.gate_altitude['data'] < alt_min] = 0
-    if alt_max is not None:
-        mask[radar.gate_altitude['data'] > alt_max] = 0
-
-    if np.all(mask == 0):
-        warn('No values within ROI')
-        return None, None
-
-    inds_ray = inds_ray[mask]
-    inds_rng = inds_rng[mask]
-
     # extract the data inside the ROI
-    lat = radar.gate_latitude['data'][mask]
-    lon = radar.gate_longitude['data'][mask]
-    inds, is_roi = belongs_roi_indices(lat, lon, roi_dict)
-
-    if is_roi == 'None':
+    inds_ray, inds_rng = find_roi_gates(radar, roi_dict)
+    if inds_ray.size == 0:
         warn('No values within ROI')
         return None, None
 
-    inds_ray = inds_ray[inds]
-    inds_rng = inds_rng[inds]
-
-    lat = lat[inds].T
-    lon = lon[inds].T
-    alt = radar.gate_altitude['data'][inds_ray, inds_rng].T
-
     # prepare new radar object output
-    new_dataset = {'radar_out': deepcopy(radar)}
-
-    new_dataset['radar_out'].range['data'] = radar.range['data'][inds_rng]
-    new_dataset['radar_out'].ngates = inds_rng.size
-    new_dataset['radar_out'].time['data'] = np.asarray(
-        [new_dataset['radar_out'].time['data'][0]])
-    new_dataset['radar_out'].scan_type = 'roi'
-    new_dataset['radar_out'].sweep_mode['data'] = np.array(['roi'])
-    new_dataset['radar_out'].sweep_start_ray_index['data'] = np.array(
-        [0], dtype='int32')
-    new_dataset['radar_out'].fixed_angle['data'] = np.array(
-        [], dtype='float64')
-    new_dataset['radar_out'].sweep_number['data'] = np.array(
-        [0], dtype='int32')
-    new_dataset['radar_out'].nsweeps = 1
-
-    if radar.rays_are_indexed is not None:
-        new_dataset['radar_out'].rays_are_indexed['data'] = np.array(
-            [radar.rays_are_indexed['data'][0]])
-    if radar.ray_angle_res is not None:
-        new_dataset['radar_out'].ray_angle_res['data'] = np.array(
-            [radar.ray_angle_res['data'][0]])
+    new_dataset = {
+        'radar_out': get_roi_radar(radar, inds_ray, inds_rng, [field_name])}
 
-    new_dataset['radar_out'].sweep_end_ray_index['data'] = np.array(
-        [1], dtype='int32')
-    new_dataset['radar_out'].rays_per_sweep = np.array([1], dtype='int32')
-    new_dataset['radar_out'].azimuth['data'] = np.array([], dtype='float64')
-    new_dataset['radar_out'].elevation['data'] = np.array([], dtype='float64')
-    new_dataset['radar_out'].nrays = 1
-
-    new_dataset['radar_out'].gate_longitude['data'] = lon
-    new_dataset['radar_out'].gate_latitude['data'] = lat
-    new_dataset['radar_out'].gate_altitude['data'] = alt
-
-    new_dataset['radar_out'].gate_x['data'] = (
-        radar.gate_x['data'][inds_ray, inds_rng].T)
-    new_dataset['radar_out'].gate_y['data'] = (
-        radar.gate_y['data'][inds_ray, inds_rng].T)
-    new_dataset['radar_out'].gate_z['data'] = (
-        radar.gate_z['data'][inds_ray, inds_rng].T)
-
-    new_dataset['radar_out'].fields = dict()
-    field_dict = deepcopy(radar.fields[field_name])
-    field_dict['data'] = radar.fields[field_name]['data'][inds_ray, inds_rng].T
-    new_dataset['radar_out'].add_field(field_name, field_dict)
-
-    return new_dataset['radar_out'], ind_rad
+    return new_dataset, ind_rad
 
 
 def process_grid(procstatus, dscfg, radar_list=None):
@@ -768,6 +721,17 @@ def process_grid(procstatus, dscfg, radar_list=None):
         roi : float
              the (minimum) radius of the region of interest in m. Default half
              the largest resolution
+        precompute_weights : int
+            If 1 the weights of each radar gate in each grid point are
+            computed only once for each scan geometry and gridding
+            configuration and reused in the following volumes. Note that with
+            NEAREST_NEIGHBOUR weighting the nearest gate is selected
+            regardless of whether it contains valid data. Default 0
+        weights_path : str
+            If precompute_weights is 1, directory where the weights are
+            stored so that they can be reused after a restart of the
+            processing. If None the weights are kept only in memory.
+            Default None
 
     radar_list : list of Radar objects
         Optional. list of radar objects
@@ -799,6 +763,156 @@ def process_grid(procstatus, dscfg, radar_list=None):
         warn('Field name '+field_name+' not available in radar object')
         return None, None
 
+    grid_config = _get_grid_config(radar, dscfg)
+
+    if dscfg.get('precompute_weights', 0):
+        weights = _get_grid_weights(
+            radar, **grid_config,
+            weights_path=dscfg.get('weights_path', None))
+
+        grid = grid_from_weights(
+            radar, weights, grid_config['grid_shape'],
+            grid_config['grid_limits'], grid_config['grid_origin'],
+            grid_config['grid_origin_alt'], [field_name])
+
+        return grid, ind_rad
+
+    # cartesian mapping
+    grid = pyart.map.grid_from_radars(
+        (radar,), gridding_algo='map_to_grid',
+        weighting_function=grid_config['wfunc'],
+        roi_func=grid_config['roi_func'], h_factor=1.0,
+        nb=grid_config['nb'], bsp=grid_config['bsp'],
+        min_radius=grid_config['min_radius'],
+        constant_roi=grid_config['min_radius'],
+        grid_shape=grid_config['grid_shape'],
+        grid_limits=grid_config['grid_limits'],
+        grid_origin=grid_config['grid_origin'],
+        grid_origin_alt=grid_config['grid_origin_alt'],
+        fields=[field_name])
+
+    return grid, ind_rad
+
+
+def process_grid_rainfall_accumulation(procstatus, dscfg, radar_list=None):
+    """
+    Integrates the rainfall rate in time at each point of a regular grid.
+    The rainfall rate of each volume is gridded with precomputed weights and
+    the rain accumulated in each update period is kept in memory so that
+    the accumulation over the last period is obtained without reprocessing
+    past volumes
+
+    Parameters
+    ----------
+    procstatus : int
+        Processing status: 0 initializing, 1 processing volume,
+        2 post-processing
+    dscfg : dictionary of dictionaries
+        data set configuration. Accepted Configuration Keywords::
+
+        datatype : string. Dataset keyword
+            The input data type. Must be RR
+        gridconfig, wfunc, roi_func, roi, weights_path : Dataset keywords
+            The grid definition and gridding parameters. See process_grid
+        period, update_period, start_average, max_gap, min_coverage :
+            Dataset keywords
+            The accumulation parameters. See process_rainfall_accumulation
+
+    radar_list : list of Radar objects
+        Optional. list of radar objects
+
+    Returns
+    -------
+    new_dataset : grid object
+        grid containing the rainfall accumulation
+    ind_rad : int
+        radar index
+
+    """
+    for datatypedescr in dscfg['datatype']:
+        radarnr, _, datatype, _, _ = get_datatype_fields(datatypedescr)
+        break
+    field_name = get_fieldname_pyart(datatype)
+    ind_rad = int(radarnr[5:8])-1
+
+    period = dscfg.get('period', 3600.)
+    min_coverage = dscfg.get('min_coverage', 0.)
+
+    if procstatus == 0:
+        return None, None
+
+    if procstatus == 1:
+        if (radar_list is None) or (radar_list[ind_rad] is None):
+            warn('ERROR: No valid radar')
+            return None, None
+
+        radar = radar_list[ind_rad]
+
+        if field_name not in radar.fields:
+            warn('Field name '+field_name+' not available in radar object')
+            return None, None
+
+        grid_config = _get_grid_config(radar, dscfg)
+        weights = _get_grid_weights(
+            radar, **grid_config,
+            weights_path=dscfg.get('weights_path', None))
+        grid = grid_from_weights(
+            radar, weights, grid_config['grid_shape'],
+            grid_config['grid_limits'], grid_config['grid_origin'],
+            grid_config['grid_origin_alt'], [field_name])
+
+        if dscfg['initialized'] == 0:
+            update_period = dscfg.get('update_period', period)
+            accumulator = RainfallAccumulator(
+                grid_config['grid_shape'], partial_period=update_period,
+                nbins=max(1, int(round(period/update_period))),
+                base_time=dscfg.get('start_average', 0.),
+                max_gap=dscfg.get('max_gap', 900.),
+                dtype=get_float_dtype(dscfg.get('compactdtype', 0)))
+            grid_ref = deepcopy(grid)
+            grid_ref.fields = dict()
+            dscfg['global_data'] = {
+                'accumulator': accumulator,
+                'grid': grid_ref}
+            dscfg['initialized'] = 1
+
+        closed_bins = dscfg['global_data']['accumulator'].add(
+            dscfg['timeinfo'], grid.fields[field_name]['data'])
+        if not closed_bins:
+            return None, None
+
+        return _get_rainfall_accumulation_grid(
+            dscfg['global_data'], period, min_coverage=min_coverage), ind_rad
+
+    # no more files to process: accumulation up to the last volume
+    if procstatus == 2:
+        if dscfg['initialized'] == 0:
+            return None, None
+
+        return _get_rainfall_accumulation_grid(
+            dscfg['global_data'], period, min_coverage=min_coverage,
+            include_current=True), ind_rad
+
+
+def _get_grid_config(radar, dscfg):
+    """
+    Gets the grid definition and gridding parameters from the dataset
+    configuration
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object to grid
+    dscfg : dict
+        the dataset configuration. See process_grid
+
+    Returns
+    -------
+    grid_config : dict
+        dictionary with the grid_shape, grid_limits, grid_origin,
+        grid_origin_alt, wfunc, roi_func, nb, bsp and min_radius parameters
+
+    """
     # default parameters
     xmin = -40.
     xmax = 40.
@@ -836,15 +950,11 @@ def process_grid(procstatus, dscfg, radar_list=None):
         if 'altorig' in dscfg['gridConfig']:
             alt = dscfg['gridConfig']['altorig']
 
-    wfunc = dscfg.get('wfunc', 'NEAREST_NEIGHBOUR')
-    roi_func = dscfg.get('roi_func', 'dist_beam')
-
     # number of grid points in cappi
     nz = int((zmax-zmin)/vres)+1
     ny = int((ymax-ymin)*1000./hres)+1
     nx = int((xmax-xmin)*1000./hres)+1
 
-    min_radius = dscfg.get('roi', np.max([vres, hres])/2.)
     # parameters to determine the gates to use for each grid point
     beamwidth = 1.
     beam_spacing = 1.
@@ -855,19 +965,83 @@ def process_grid(procstatus, dscfg, radar_list=None):
     if radar.ray_angle_res is not None:
         beam_spacing = radar.ray_angle_res['data'][0]
 
-    # cartesian mapping
-    grid = pyart.map.grid_from_radars(
-        (radar,), gridding_algo='map_to_grid',
-        weighting_function=wfunc,
-        roi_func=roi_func, h_factor=1.0, nb=beamwidth, bsp=beam_spacing,
-        min_radius=min_radius, constant_roi=min_radius,
-        grid_shape=(nz, ny, nx),
-        grid_limits=((zmin, zmax), (ymin*1000., ymax*1000.),
-                     (xmin*1000., xmax*1000.)),
-        grid_origin=(lat, lon), grid_origin_alt=alt,
-        fields=[field_name])
+    return {
+        'grid_shape': (nz, ny, nx),
+        'grid_limits': (
+            (zmin, zmax), (ymin*1000., ymax*1000.),
+            (xmin*1000., xmax*1000.)),
+        'grid_origin': (lat, lon),
+        'grid_origin_alt': alt,
+        'wfunc': dscfg.get('wfunc', 'NEAREST_NEIGHBOUR'),
+        'roi_func': dscfg.get('roi_func', 'dist_beam'),
+        'nb': beamwidth,
+        'bsp': beam_spacing,
+        'min_radius': dscfg.get('roi', np.max([vres, hres])/2.)}
+
+
+def _get_grid_weights(radar, grid_shape, grid_limits, grid_origin,
+                      grid_origin_alt, wfunc='NEAREST_NEIGHBOUR',
+                      roi_func='dist_beam', nb=1., bsp=1., min_radius=500.,
+                      weights_path=None):
+    """
+    Gets the gate to grid point weights corresponding to the radar scan
+    geometry and gridding configuration. The weights are looked for in
+    memory, then on disk and computed only if not found
 
-    return grid, ind_rad
+    Parameters
+    ----------
+    radar : radar object
+        the radar object defining the scan geometry
+    grid_shape, grid_limits, grid_origin, grid_origin_alt : tuples, float
+        the grid definition. See compute_grid_weights
+    wfunc, roi_func : str
+        the weighting and region of interest functions
+    nb, bsp, min_radius : float
+        parameters of the region of interest function
+    weights_path : str or None
+        directory where to look for and store the weights
+
+    Returns
+    -------
+    weights : scipy csr_matrix
+        matrix of weights
+
+    """
+    key = hashlib.sha1()
+    key.update(get_geometry_key(radar).encode('utf-8'))
+    key.update(str((
+        grid_shape, grid_limits, grid_origin, grid_origin_alt, wfunc,
+        roi_func, nb, bsp, min_radius)).encode('utf-8'))
+    key = key.hexdigest()
+
+    if key in _GRID_WEIGHTS_CACHE:
+        return _GRID_WEIGHTS_CACHE[key]
+
+    fname = None
+    weights = None
+    if weights_path is not None:
+        fname = os.path.join(weights_path, 'grid_weights_'+key+'.npz')
+        if os.path.isfile(fname):
+            weights = read_grid_weights(fname)
+            if (weights is not None and
+                    weights.shape[1] != radar.nrays*radar.ngates):
+                weights = None
+
+    if weights is None:
+        weights = compute_grid_weights(
+            radar, grid_shape, grid_limits, grid_origin, grid_origin_alt,
+            wfunc=wfunc, roi_func=roi_func, h_factor=1.0, nb=nb, bsp=bsp,
+            min_radius=min_radius, constant_roi=min_radius)
+        if fname is not None:
+            if not os.path.isdir(weights_path):
+                os.makedirs(weights_path)
+            write_grid_weights(weights, fname)
+
+    if len(_GRID_WEIGHTS_CACHE) >= _GRID_WEIGHTS_CACHE_SIZE:
+        _GRID_WEIGHTS_CACHE.pop(next(iter(_GRID_WEIGHTS_CACHE)))
+    _GRID_WEIGHTS_CACHE[key] = weights
+
+    return weights
 
 
 def process_azimuthal_average(procstatus, dscfg, radar_list=None):
@@ -1016,3 +1190,43 @@ def process_azimuthal_average(procstatus, dscfg, radar_list=None):
     new_dataset = {'radar_out': radar_rhi}
 
     return new_dataset, ind_rad
+
+
+def _get_rainfall_accumulation_grid(global_data, period, min_coverage=0.,
+                                    include_current=False):
+    """
+    Creates a grid object with the rainfall accumulation over the last
+    period
+
+    Parameters
+    ----------
+    global_data : dict
+        the grid rainfall accumulation dataset global data
+    period : float
+        the accumulation period [s]
+    min_coverage : float
+        minimum fraction of the period with valid rainfall rate
+    include_current : bool
+        If True the accumulation includes the current, incomplete, update
+        period
+
+    Returns
+    -------
+    grid : grid object
+        grid object with the rainfall accumulation and the number of samples
+
+    """
+    accumulation, npoints = global_data['accumulator'].get_accumulation(
+        period, min_coverage=min_coverage, include_current=include_current)
+
+    accu_dict = pyart.config.get_metadata('rainfall_accumulation')
+    accu_dict['data'] = accumulation
+    npoints_dict = pyart.config.get_metadata('number_of_samples')
+    npoints_dict['data'] = np.ma.asarray(npoints)
+
+    grid = deepcopy(global_data['grid'])
+    grid.fields = {
+        'rainfall_accumulation': accu_dict,
+        'number_of_samples': npoints_dict}
+
+    return grid
@@ -26,10 +26,11 @@ import pyart
 from ..io.io_aux import get_datatype_fields, get_fieldname_pyart
 from ..io.read_data_sun import read_sun_hits_multiple_days, read_solar_flux
 from ..io.read_data_other import read_excess_gates
-from ..io.read_data_radar import interpol_field
 
 from ..util.radar_utils import get_closest_solar_flux, get_histogram_bins
 from ..util.radar_utils import find_ray_index, find_rng_index
+from ..util.accumulator import RadarAccumulator
+from ..util.sun_utils import find_sun_hits
 
 
 def process_correct_bias(procstatus, dscfg, radar_list=None):
@@ -496,81 +497,48 @@ def process_occurrence(procstatus, dscfg, radar_list=None):
                          str(percent_prec_max))
                     return None, None
 
-        # prepare field number of samples and occurrence
-        radar_aux = deepcopy(radar)
-        radar_aux.fields = dict()
-
-        npoints_dict = pyart.config.get_metadata('number_of_samples')
-        npoints_dict['data'] = np.ma.ones(
-            (radar.nrays, radar.ngates), dtype=int)
-        radar_aux.add_field('number_of_samples', npoints_dict)
-
-        occu_dict = pyart.config.get_metadata('occurrence')
-        occu_dict['data'] = np.ma.zeros(
-            (radar.nrays, radar.ngates), dtype=int)
-        occu_dict['data'][np.logical_not(mask)] = 1
-
         # filter out out of range data
+        occu_data = np.logical_not(mask).astype(np.uint32)
         rmin = dscfg.get('rmin', -1.)
         rmax = dscfg.get('rmax', -1.)
         if rmin >= 0.:
-            ind_min = np.where(radar_aux.range['data'] < rmin)[0]
-            if ind_min:
+            ind_min = np.where(radar.range['data'] < rmin)[0]
+            if ind_min.size > 0:
                 ind_min = ind_min[-1]
-                occu_dict['data'][:, 0:ind_min+1] = 0
+                occu_data[:, 0:ind_min+1] = 0
         if rmax >= 0.:
-            ind_max = np.where(radar_aux.range['data'] > rmax)[0]
-            if ind_max:
+            ind_max = np.where(radar.range['data'] > rmax)[0]
+            if ind_max.size > 0:
                 ind_max = ind_max[0]
-                occu_dict['data'][:, ind_max:radar_aux.ngates] = 0
-
-        radar_aux.add_field('occurrence', occu_dict)
+                occu_data[:, ind_max:radar.ngates] = 0
 
-        # first volume: initialize radar object
+        # first volume: initialize accumulator
         if dscfg['initialized'] == 0:
-            new_dataset = {
-                'radar_out': radar_aux,
+            accumulator = RadarAccumulator(
+                radar,
+                {'occurrence': pyart.config.get_metadata('occurrence')},
+                dtype=np.uint32, count_dtype=np.uint32)
+            dscfg['global_data'] = {
+                'accumulator': accumulator,
                 'starttime': dscfg['timeinfo'],
-                'endtime': dscfg['timeinfo'],
-                'occu_final': False}
-
-            dscfg['global_data'] = new_dataset
+                'endtime': dscfg['timeinfo']}
             dscfg['initialized'] = 1
-
-            return new_dataset, ind_rad
-
-        # accumulate data
-        regular_grid = False
-        if 'regular_grid' in dscfg:
-            regular_grid = dscfg['regular_grid']
-
-        if not regular_grid:
-            occu_interp = interpol_field(
-                dscfg['global_data']['radar_out'], radar_aux, 'occurrence')
-            npoints_interp = interpol_field(
-                dscfg['global_data']['radar_out'], radar_aux,
-                'number_of_samples')
         else:
-            if radar_aux.nrays != dscfg['global_data']['radar_out'].nrays:
+            accumulator = dscfg['global_data']['accumulator']
+            regular_grid = dscfg.get('regular_grid', False)
+            if regular_grid and radar.nrays != accumulator.radar.nrays:
                 warn('Unable to accumulate radar object. ' +
                      'Number of rays of current radar different from ' +
-                     'reference. nrays current: '+str(radar_aux.nrays) +
-                     ' nrays ref: ' +
-                     str(dscfg['global_data']['radar_out'].nrays))
+                     'reference. nrays current: '+str(radar.nrays) +
+                     ' nrays ref: '+str(accumulator.radar.nrays))
                 return None, None
-            occu_interp = radar_aux.fields['occurrence']
-            npoints_interp = radar_aux.fields['number_of_samples']
-
-        dscfg['global_data']['radar_out'].fields['occurrence']['data'] += (
-            np.ma.asarray(
-                occu_interp['data'].filled(fill_value=0)).astype('int'))
-        dscfg['global_data']['radar_out'].fields['number_of_samples'][
-            'data'] += (np.ma.asarray(
-                npoints_interp['data'].filled(fill_value=0)).astype('int'))
+
+        # accumulate data
+        accumulator.add(radar, {'occurrence': occu_data})
         dscfg['global_data']['endtime'] = dscfg['timeinfo']
 
         new_dataset = {
-            'radar_out': dscfg['global_data']['radar_out'],
+            'radar_out': _get_occurrence_radar(accumulator),
             'starttime': dscfg['global_data']['starttime'],
             'endtime': dscfg['global_data']['endtime'],
             'occu_final': False}
@@ -581,19 +549,12 @@ def process_occurrence(procstatus, dscfg, radar_list=None):
     if procstatus == 2:
         if dscfg['initialized'] == 0:
             return None, None
-        if 'radar_out' not in dscfg['global_data']:
+        if 'accumulator' not in dscfg['global_data']:
             return None, None
 
-        radar = dscfg['global_data']['radar_out']
-
-        freq_occu_dict = pyart.config.get_metadata('frequency_of_occurrence')
-        freq_occu_dict['data'] = (100.*radar.fields['occurrence']['data'] /
-                                  radar.fields['number_of_samples']['data'])
-
-        radar.add_field('frequency_of_occurrence', freq_occu_dict)
-
         new_dataset = {
-            'radar_out': dscfg['global_data']['radar_out'],
+            'radar_out': _get_occurrence_radar(
+                dscfg['global_data']['accumulator'], final=True),
             'starttime': dscfg['global_data']['starttime'],
             'endtime': dscfg['global_data']['endtime'],
             'occu_final': True}
@@ -722,88 +683,55 @@ def process_time_avg_std(procstatus, dscfg, radar_list=None):
         rmax = dscfg.get('rmax', -1.)
         if rmin >= 0.:
             ind_min = np.where(radar.range['data'] < rmin)[0]
-            if ind_min:
+            if ind_min.size > 0:
                 ind_min = ind_min[-1]
                 mask[:, 0:ind_min+1] = 1
         if rmax >= 0.:
             ind_max = np.where(radar.range['data'] > rmax)[0]
-            if ind_max:
+            if ind_max.size > 0:
                 ind_max = ind_max[0]
                 mask[:, ind_max:radar.ngates] = 1
 
-        # prepare field number of samples and values sum
-        field = deepcopy(radar.fields[field_name]['data'])
+        # prepare values sum
+        field = radar.fields[field_name]['data']
         if lin_trans:
             field = np.ma.power(10., 0.1*field)
+        field = np.ma.filled(
+            np.ma.masked_where(mask, field), fill_value=0.)
 
-        field = np.ma.masked_where(mask, field)
-        field = np.ma.asarray(field)
-
-        radar_aux = deepcopy(radar)
-        radar_aux.fields = dict()
-
-        sum_dict = pyart.config.get_metadata('sum')
-        sum_dict['data'] = field
-        radar_aux.add_field('sum', sum_dict)
-
-        sum2_dict = pyart.config.get_metadata('sum_squared')
-        sum2_dict['data'] = field*field
-        radar_aux.add_field('sum_squared', sum2_dict)
-
-        npoints_dict = pyart.config.get_metadata('number_of_samples')
-        npoints_dict['data'] = np.ma.asarray(np.logical_not(mask), dtype=int)
-        radar_aux.add_field('number_of_samples', npoints_dict)
-
-        # first volume: initialize radar object
+        # first volume: initialize accumulator
         if dscfg['initialized'] == 0:
-            new_dataset = {
-                'radar_out': radar_aux,
+            accumulator = RadarAccumulator(
+                radar,
+                {'sum': pyart.config.get_metadata('sum'),
+                 'sum_squared': pyart.config.get_metadata('sum_squared')},
+                count_dtype=np.uint32)
+            dscfg['global_data'] = {
+                'accumulator': accumulator,
                 'starttime': dscfg['timeinfo'],
-                'endtime': dscfg['timeinfo'],
-                'occu_final': False}
-
-            dscfg['global_data'] = new_dataset
+                'endtime': dscfg['timeinfo']}
             dscfg['initialized'] = 1
-
-            return new_dataset, ind_rad
-
-        # accumulate data
-        regular_grid = False
-        if 'regular_grid' in dscfg:
-            regular_grid = dscfg['regular_grid']
-
-        if not regular_grid:
-            sum_interp = interpol_field(
-                dscfg['global_data']['radar_out'], radar_aux, 'sum')
-            sum2_interp = interpol_field(
-                dscfg['global_data']['radar_out'], radar_aux, 'sum_squared')
-            npoints_interp = interpol_field(
-                dscfg['global_data']['radar_out'], radar_aux,
-                'number_of_samples')
         else:
-            if radar_aux.nrays != dscfg['global_data']['radar_out'].nrays:
+            accumulator = dscfg['global_data']['accumulator']
+            regular_grid = dscfg.get('regular_grid', False)
+            if regular_grid and radar.nrays != accumulator.radar.nrays:
                 warn('Unable to accumulate radar object. ' +
                      'Number of rays of current radar different from ' +
-                     'reference. nrays current: '+str(radar_aux.nrays) +
-                     ' nrays ref: ' +
-                     str(dscfg['global_data']['radar_out'].nrays))
+                     'reference. nrays current: '+str(radar.nrays) +
+                     ' nrays ref: '+str(accumulator.radar.nrays))
                 return None, None
-            sum_interp = radar_aux.fields['sum']
-            sum2_interp = radar_aux.fields['sum_squared']
-            npoints_interp = radar_aux.fields['number_of_samples']
-
-        valid = np.logical_not(np.ma.getmaskarray(sum_interp))
-
-        dscfg['global_data']['radar_out'].fields['sum']['data'][valid] += (
-            np.ma.asarray(sum_interp['data'][valid]))
-        dscfg['global_data']['radar_out'].fields['sum_squared'][
-            'data'][valid] += np.ma.asarray(sum2_interp['data'][valid])
-        dscfg['global_data']['radar_out'].fields['number_of_samples'][
-            'data'][valid] += np.ma.asarray(npoints_interp['data'][valid])
+
+        # accumulate data
+        accumulator.add(
+            radar, {'sum': field, 'sum_squared': field*field},
+            count=np.logical_not(mask))
         dscfg['global_data']['endtime'] = dscfg['timeinfo']
 
         new_dataset = {
-            'radar_out': dscfg['global_data']['radar_out'],
+            'radar_out': accumulator.to_radar({
+                'sum': accumulator.get_sum('sum'),
+                'sum_squared': accumulator.get_sum('sum_squared'),
+                'number_of_samples': accumulator.get_count_field()}),
             'starttime': dscfg['global_data']['starttime'],
             'endtime': dscfg['global_data']['endtime'],
             'occu_final': False}
@@ -814,33 +742,31 @@ def process_time_avg_std(procstatus, dscfg, radar_list=None):
     if procstatus == 2:
         if dscfg['initialized'] == 0:
             return None, None
-        if 'radar_out' not in dscfg['global_data']:
+        if 'accumulator' not in dscfg['global_data']:
             return None, None
 
-        field_mean = (
-            dscfg['global_data']['radar_out'].fields['sum']['data'] /
-            dscfg['global_data']['radar_out'].fields[
-                'number_of_samples']['data'])
+        accumulator = dscfg['global_data']['accumulator']
+        field_mean = accumulator.get_mean('sum', in_place=False)
         field_std = np.ma.sqrt(
-            dscfg['global_data']['radar_out'].fields['sum_squared']['data'] /
-            dscfg['global_data']['radar_out'].fields[
-                'number_of_samples']['data']-field_mean*field_mean)
+            accumulator.get_mean('sum_squared', in_place=False) -
+            field_mean*field_mean)
         if lin_trans:
             field_mean = 10.*np.ma.log10(field_mean)
             field_std = 10.*np.ma.log10(field_std)
 
-        radar = dscfg['global_data']['radar_out']
-
         mean_dict = pyart.config.get_metadata(field_name)
         mean_dict['data'] = field_mean
-        radar.add_field(field_name, mean_dict)
 
         std_dict = pyart.config.get_metadata('standard_deviation')
         std_dict['data'] = field_std
-        radar.add_field('standard_deviation', std_dict)
 
         new_dataset = {
-            'radar_out': radar,
+            'radar_out': accumulator.to_radar({
+                'sum': accumulator.get_sum('sum'),
+                'sum_squared': accumulator.get_sum('sum_squared'),
+                'number_of_samples': accumulator.get_count_field(),
+                field_name: mean_dict,
+                'standard_deviation': std_dict}),
             'starttime': dscfg['global_data']['starttime'],
             'endtime': dscfg['global_data']['endtime'],
             'occu_final': True}
@@ -901,72 +827,52 @@ def process_occurrence_period(procstatus, dscfg, radar_list=None):
             warn('Unable to compute frequency of occurrence. Missing data')
             return None, None
 
-        radar_aux = deepcopy(radar)
-        radar_aux.fields = dict()
-        radar_aux.add_field('occurrence', radar.fields['occurrence'])
-        radar_aux.add_field(
-            'number_of_samples', radar.fields['number_of_samples'])
+        occu_data = np.ma.filled(
+            radar.fields[occu_field]['data'], fill_value=0).astype(np.uint32)
 
         # filter out out of range data
         rmin = dscfg.get('rmin', -1.)
         rmax = dscfg.get('rmax', -1.)
         if rmin >= 0.:
-            ind_min = np.where(radar_aux.range['data'] < rmin)[0]
-            if ind_min:
+            ind_min = np.where(radar.range['data'] < rmin)[0]
+            if ind_min.size > 0:
                 ind_min = ind_min[-1]
-                radar_aux.fields['occurrence']['data'][:, 0:ind_min+1] = 0
+                occu_data[:, 0:ind_min+1] = 0
         if rmax >= 0.:
-            ind_max = np.where(radar_aux.range['data'] > rmax)[0]
-            if ind_max:
+            ind_max = np.where(radar.range['data'] > rmax)[0]
+            if ind_max.size > 0:
                 ind_max = ind_max[0]
-                radar_aux.fields['occurrence']['data'][
-                    :, ind_max:radar_aux.ngates] = 0
+                occu_data[:, ind_max:radar.ngates] = 0
 
-        # first volume: initialize radar object
+        # first volume: initialize accumulator
         if dscfg['initialized'] == 0:
-            new_dataset = {
-                'radar_out': radar_aux,
+            accumulator = RadarAccumulator(
+                radar,
+                {'occurrence': pyart.config.get_metadata('occurrence')},
+                dtype=np.uint32, count_dtype=np.uint32)
+            dscfg['global_data'] = {
+                'accumulator': accumulator,
                 'starttime': dscfg['timeinfo'],
-                'endtime': dscfg['timeinfo'],
-                'occu_final': False}
-
-            dscfg['global_data'] = new_dataset
+                'endtime': dscfg['timeinfo']}
             dscfg['initialized'] = 1
-
-            return new_dataset, ind_rad
-
-        # accumulate data
-        regular_grid = False
-        if 'regular_grid' in dscfg:
-            regular_grid = dscfg['regular_grid']
-
-        if not regular_grid:
-            occu_interp = interpol_field(
-                dscfg['global_data']['radar_out'], radar_aux, 'occurrence')
-            npoints_interp = interpol_field(
-                dscfg['global_data']['radar_out'], radar_aux,
-                'number_of_samples')
         else:
-            if radar_aux.nrays != dscfg['global_data']['radar_out'].nrays:
+            accumulator = dscfg['global_data']['accumulator']
+            regular_grid = dscfg.get('regular_grid', False)
+            if regular_grid and radar.nrays != accumulator.radar.nrays:
                 warn('Unable to accumulate radar object. ' +
                      'Number of rays of current radar different from ' +
-                     'reference. nrays current: '+str(radar_aux.nrays) +
-                     ' nrays ref: ' +
-                     str(dscfg['global_data']['radar_out'].nrays))
+                     'reference. nrays current: '+str(radar.nrays) +
+                     ' nrays ref: '+str(accumulator.radar.nrays))
                 return None, None
-            occu_interp = radar_aux.fields['occurrence']
-            npoints_interp = radar_aux.fields['number_of_samples']
-
-        dscfg['global_data']['radar_out'].fields['occurrence']['data'] += (
-            np.ma.asarray(
-                occu_interp['data'].filled(fill_value=0)).astype('int'))
-        dscfg['global_data']['radar_out'].fields['number_of_samples'][
-            'data'] += np.ma.asarray(
-                npoints_interp['data'].filled(fill_value=0)).astype('int')
+
+        # accumulate data
+        accumulator.add(
+            radar, {'occurrence': occu_data},
+            count=radar.fields[nsamples_field]['data'])
         dscfg['global_data']['endtime'] = dscfg['timeinfo']
 
         new_dataset = {
-            'radar_out': dscfg['global_data']['radar_out'],
+            'radar_out': _get_occurrence_radar(accumulator),
             'starttime': dscfg['global_data']['starttime'],
             'endtime': dscfg['global_data']['endtime'],
             'occu_final': False}
@@ -977,19 +883,12 @@ def process_occurrence_period(procstatus, dscfg, radar_list=None):
     if procstatus == 2:
         if dscfg['initialized'] == 0:
             return None, None
-        if 'radar_out' not in dscfg['global_data']:
+        if 'accumulator' not in dscfg['global_data']:
             return None, None
 
-        radar = dscfg['global_data']['radar_out']
-
-        freq_occu_dict = pyart.config.get_metadata('frequency_of_occurrence')
-        freq_occu_dict['data'] = (100.*radar.fields['occurrence']['data'] /
-                                  radar.fields['number_of_samples']['data'])
-
-        radar.add_field('frequency_of_occurrence', freq_occu_dict)
-
         new_dataset = {
-            'radar_out': dscfg['global_data']['radar_out'],
+            'radar_out': _get_occurrence_radar(
+                dscfg['global_data']['accumulator'], final=True),
             'starttime': dscfg['global_data']['starttime'],
             'endtime': dscfg['global_data']['endtime'],
             'occu_final': True}
@@ -997,6 +896,37 @@ def process_occurrence_period(procstatus, dscfg, radar_list=None):
         return new_dataset, ind_rad
 
 
+def _get_occurrence_radar(accumulator, final=False):
+    """
+    Hands off the radar object containing the accumulated occurrence and
+    number of samples and, at the end of the processing, the frequency of
+    occurrence
+
+    Parameters
+    ----------
+    accumulator : RadarAccumulator object
+        the accumulator containing the occurrence
+    final : bool
+        If True the frequency of occurrence is computed
+
+    Returns
+    -------
+    radar : radar object
+        radar object containing the occurrence fields
+
+    """
+    data_dict = {
+        'occurrence': accumulator.get_sum('occurrence'),
+        'number_of_samples': accumulator.get_count_field()}
+    if final:
+        freq_occu_dict = pyart.config.get_metadata('frequency_of_occurrence')
+        freq_occu_dict['data'] = 100.*accumulator.get_mean(
+            'occurrence', in_place=False)
+        data_dict.update({'frequency_of_occurrence': freq_occu_dict})
+
+    return accumulator.to_radar(data_dict)
+
+
 def process_sun_hits(procstatus, dscfg, radar_list=None):
     """
     monitoring of the radar using sun hits
@@ -1150,7 +1080,7 @@ def process_sun_hits(procstatus, dscfg, radar_list=None):
         max_std_pwr = dscfg.get('max_std_pwr', 2.)
         max_std_zdr = dscfg.get('max_std_zdr', 2.)
 
-        sun_hits, new_radar = pyart.correct.get_sun_hits(
+        sun_hits, new_radar = find_sun_hits(
             radar, delev_max=delev_max, dazim_max=dazim_max, elmin=elmin,
             rmin=rmin, hmin=hmin, nbins_min=nbins_min,
             max_std_pwr=max_std_pwr, max_std_zdr=max_std_zdr,
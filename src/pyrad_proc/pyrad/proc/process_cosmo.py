@@ -35,6 +35,8 @@ from ..io.read_data_radar import interpol_field
 from ..io.read_data_hzt import read_hzt_data, hzt2radar_data, hzt2radar_coord
 from ..io.read_data_hzt import get_iso0_field
 
+from ..util.dtype_utils import get_float_dtype
+
 # from memory_profiler import profile
 
 
@@ -176,7 +178,8 @@ def process_cosmo(procstatus, dscfg, radar_list=None):
         if time_index != dscfg['global_data']['time_index']:
             cosmo_fields = cosmo2radar_data(
                 radar, cosmo_coord, cosmo_data, time_index=time_index,
-                field_names=field_names)
+                field_names=field_names,
+                dtype=get_float_dtype(dscfg.get('compactdtype', 0)))
             if cosmo_fields is None:
                 warn('Unable to obtain COSMO fields')
                 return None, None
@@ -189,7 +192,8 @@ def process_cosmo(procstatus, dscfg, radar_list=None):
     else:
         cosmo_fields = cosmo2radar_data(
             radar, cosmo_coord, cosmo_data, time_index=time_index,
-            field_names=field_names)
+            field_names=field_names,
+            dtype=get_float_dtype(dscfg.get('compactdtype', 0)))
         if cosmo_fields is None:
             warn('Unable to obtain COSMO fields')
             return None, None
@@ -482,7 +486,8 @@ def process_cosmo_lookup_table(procstatus, dscfg, radar_list=None):
             cosmo_data,
             dscfg['global_data']['cosmo_radar'].fields['cosmo_index'],
             time_index=time_index,
-            field_names=field_names)
+            field_names=field_names,
+            dtype=get_float_dtype(dscfg.get('compactdtype', 0)))
         if cosmo_fields is None:
             warn('Unable to obtain COSMO fields')
             return None, None
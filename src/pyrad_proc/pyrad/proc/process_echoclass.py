@@ -24,6 +24,7 @@ Functions for echo classification and filtering
 
 from copy import deepcopy
 from warnings import warn
+import threading
 
 import numpy as np
 
@@ -31,6 +32,90 @@ import pyart
 
 from ..io.io_aux import get_datatype_fields, get_fieldname_pyart
 
+from ..util.quantile_sketch import QuantileSketch
+
+from .process_parallel import run_chunked
+
+# centroids of the semi-supervised hydrometeor classification per radar
+_MASS_CENTERS = {
+    'A': [
+        #  Zh      ZDR     kdp   RhoHV   delta_Z
+        [13.5829, 0.4063, 0.0497, 0.9868, 1330.3],  # AG
+        [02.8453, 0.2457, 0.0000, 0.9798, 0653.8],  # CR
+        [07.6597, 0.2180, 0.0019, 0.9799, -1426.5],  # LR
+        [31.6815, 0.3926, 0.0828, 0.9978, 0535.3],  # RP
+        [39.4703, 1.0734, 0.4919, 0.9876, -1036.3],  # RN
+        [04.8267, -0.5690, 0.0000, 0.9691, 0869.8],  # VI
+        [30.8613, 0.9819, 0.1998, 0.9845, -0066.1],  # WS
+        [52.3969, 2.1094, 2.4675, 0.9730, -1550.2],  # MH
+        [50.6186, -0.0649, 0.0946, 0.9904, 1179.9],  # IH/HDG
+    ],
+    'L': [
+        #  Zh      ZDR     kdp   RhoHV   delta_Z
+        [13.8231, 0.2514, 0.0644, 0.9861, 1380.6],  # AG
+        [03.0239, 0.1971, 0.0000, 0.9661, 1464.1],  # CR
+        [04.9447, 0.1142, 0.0000, 0.9787, -0974.7],  # LR
+        [34.2450, 0.5540, 0.1459, 0.9937, 0945.3],  # RP
+        [40.9432, 1.0110, 0.5141, 0.9928, -0993.5],  # RN
+        [03.5202, -0.3498, 0.0000, 0.9746, 0843.2],  # VI
+        [32.5287, 0.9751, 0.2640, 0.9804, -0055.5],  # WS
+        [52.6547, 2.7054, 2.5101, 0.9765, -1114.6],  # MH
+        [46.4998, 0.1978, 0.6431, 0.9845, 1010.1],  # IH/HDG
+    ],
+    'D': [
+        #  Zh      ZDR     kdp   RhoHV   delta_Z
+        [12.567, 0.18934, 0.041193, 0.97693, 1328.1],  # AG
+        [3.2115, 0.13379, 0.0000, 0.96918, 1406.3],  # CR
+        [10.669, 0.18119, 0.0000, 0.97337, -1171.9],  # LR
+        [34.941, 0.13301, 0.090056, 0.9979, 898.44],  # RP
+        [39.653, 1.1432, 0.35013, 0.98501, -859.38],  # RN
+        [2.8874, -0.46363, 0.0000, 0.95653, 1015.6],  # VI
+        [34.122, 0.87987, 0.2281, 0.98003, -234.37],  # WS
+        [53.134, 2.0888, 2.0055, 0.96927, -1054.7],  # MH
+        [46.715, 0.030477, 0.16994, 0.9969, 976.56],  # IH/HDG
+    ],
+    'P': [
+        #  Zh      ZDR     kdp   RhoHV   delta_Z
+        [13.9882, 0.2470, 0.0690, 0.9939, 1418.1],  # AG
+        [00.9834, 0.4830, 0.0043, 0.9834, 0950.6],  # CR
+        [05.3962, 0.2689, 0.0000, 0.9831, -0479.5],  # LR
+        [35.3411, 0.1502, 0.0940, 0.9974, 0920.9],  # RP
+        [35.0114, 0.9681, 0.1106, 0.9785, -0374.0],  # RN
+        [02.5897, -0.3879, 0.0282, 0.9876, 0985.5],  # VI
+        [32.2914, 0.7789, 0.1443, 0.9075, -0153.5],  # WS
+        [53.2413, 1.8723, 0.3857, 0.9454, -0470.8],  # MH
+        [44.7896, 0.0015, 0.1349, 0.9968, 1116.7],  # IH/HDG
+    ],
+    'W': [
+        #  Zh      ZDR     kdp   RhoHV   delta_Z
+        [16.7650, 0.3754, 0.0442, 0.9866, 1409.0],  # AG
+        [01.4418, 0.3786, 0.0000, 0.9490, 1415.8],  # CR
+        [16.0987, 0.3238, 0.0000, 0.9871, -0818.7],  # LR
+        [36.5465, 0.2041, 0.0731, 0.9952, 0745.4],  # RP
+        [43.4011, 0.6658, 0.3241, 0.9894, -0778.5],  # RN
+        [00.9077, -0.4793, 0.0000, 0.9502, 1488.6],  # VI
+        [36.8091, 0.7266, 0.1284, 0.9924, -0071.1],  # WS
+        [53.8402, 0.8922, 0.5306, 0.9890, -1017.6],  # MH
+        [45.9686, 0.0845, 0.0963, 0.9940, 0867.4],  # IH/HDG
+    ],
+    'DX50': [
+        #  Zh      ZDR     kdp   RhoHV   delta_Z
+        [19.0770, 0.4139, 0.0099, 0.9841, 1061.7],  # AG
+        [03.9877, 0.5040, 0.0000, 0.9642, 0856.6],  # CR
+        [20.7982, 0.3177, 0.0004, 0.9858, -1375.1],  # LR
+        [34.7124, -0.3748, 0.0988, 0.9828, 1224.2],  # RP
+        [33.0134, 0.6614, 0.0819, 0.9802, -1169.8],  # RN
+        [08.2610, -0.4681, 0.0000, 0.9722, 1100.7],  # VI
+        [35.1801, 1.2830, 0.1322, 0.9162, -0159.8],  # WS
+        [52.4539, 2.3714, 1.1120, 0.9382, -1618.5],  # MH
+        [44.2216, -0.3419, 0.0687, 0.9683, 1272.7],  # IH/HDG
+    ],
+}
+
+# read-only centroids shared by the datasets processed in parallel threads
+_MASS_CENTERS_CACHE = dict()
+_MASS_CENTERS_CACHE_LOCK = threading.Lock()
+
 
 def process_echo_id(procstatus, dscfg, radar_list=None):
     """
@@ -370,6 +455,12 @@ def process_cdf(procstatus, dscfg, radar_list=None):
 
         datatype : list of string. Dataset keyword
             The input data types
+        quantile_sketch : int. Dataset keyword
+            If larger than 0 a streaming quantile sketch of the valid data of
+            all volumes is kept and the CDF over the whole processing period
+            is computed from it at the end of the processing. The value is
+            the accuracy parameter of the sketch. With 200 the rank error is
+            of the order of 1.65 %. Default 0
     radar_list : list of Radar objects
         Optional. list of radar objects
 
@@ -382,7 +473,7 @@ def process_cdf(procstatus, dscfg, radar_list=None):
 
     """
 
-    if procstatus != 1:
+    if procstatus == 0:
         return None, None
 
     echoid_field = None
@@ -400,6 +491,20 @@ def process_cdf(procstatus, dscfg, radar_list=None):
             field_name = get_fieldname_pyart(datatype)
 
     ind_rad = int(radarnr[5:8])-1
+
+    sketch_k = dscfg.get('quantile_sketch', 0)
+    if procstatus == 2:
+        if sketch_k <= 0 or dscfg['initialized'] == 0:
+            return None, None
+
+        new_dataset = {
+            'sketch': dscfg['global_data']['sketch'],
+            'field_name': field_name,
+            'starttime': dscfg['global_data']['starttime'],
+            'endtime': dscfg['global_data']['endtime']}
+
+        return new_dataset, ind_rad
+
     if radar_list[ind_rad] is None:
         warn('No valid radar')
         return None, None
@@ -409,6 +514,17 @@ def process_cdf(procstatus, dscfg, radar_list=None):
         warn('Unable to compute CDF. Missing field')
         return None, None
 
+    if sketch_k > 0:
+        if dscfg['initialized'] == 0:
+            dscfg['global_data'] = {
+                'sketch': QuantileSketch(k=sketch_k),
+                'starttime': dscfg['timeinfo'],
+                'endtime': dscfg['timeinfo']}
+            dscfg['initialized'] = 1
+        dscfg['global_data']['sketch'].update(
+            radar.fields[field_name]['data'])
+        dscfg['global_data']['endtime'] = dscfg['timeinfo']
+
     new_dataset = {'radar_out': deepcopy(radar)}
     new_dataset['radar_out'].fields = dict()
 
@@ -840,6 +956,26 @@ def process_hydroclass(procstatus, dscfg, radar_list=None):
             Used with HYDRO_METHOD SEMISUPERVISED. The name of the radar of
             which the derived centroids will be used. One of the following: A
             Albis, L Lema, P Plaine Morte, DX50
+        compute_entropy : bool. Dataset keyword
+            If True the entropy of the classification is computed. Default
+            False
+        output_distances : bool. Dataset keyword
+            If True and the entropy is computed the proportions of each
+            hydrometeor type are output. Default False
+        vectorize : bool. Dataset keyword
+            If True the classification is vectorized. Default False
+        partition : str. Dataset keyword
+            If 'volume' the classification is computed over the whole volume
+            at once. If 'sweep' or 'ray' it is computed sweep by sweep or in
+            blocks of rays and written into uint8 class and float32 entropy
+            and proportion fields, which limits the memory used by the
+            intermediate results. Default 'volume'
+        nprocesses : int. Dataset keyword
+            Number of processes used to classify the blocks when the
+            partition is not 'volume'. Default 1
+        nblocks : int. Dataset keyword
+            Approximate number of blocks when the partition is 'ray'. If not
+            specified 4 blocks per process are used
     radar_list : list of Radar objects
         Optional. list of radar objects
 
@@ -920,145 +1056,47 @@ def process_hydroclass(procstatus, dscfg, radar_list=None):
                  'Missing data')
             return None, None
 
-        mass_centers = np.zeros((9, 5))
-        if dscfg['RADARCENTROIDS'] == 'A':
-            #      Zh      ZDR     kdp   RhoHV   delta_Z
-            mass_centers[0, :] = [
-                13.5829, 0.4063, 0.0497, 0.9868, 1330.3]  # AG
-            mass_centers[1, :] = [
-                02.8453, 0.2457, 0.0000, 0.9798, 0653.8]  # CR
-            mass_centers[2, :] = [
-                07.6597, 0.2180, 0.0019, 0.9799, -1426.5]  # LR
-            mass_centers[3, :] = [
-                31.6815, 0.3926, 0.0828, 0.9978, 0535.3]  # RP
-            mass_centers[4, :] = [
-                39.4703, 1.0734, 0.4919, 0.9876, -1036.3]  # RN
-            mass_centers[5, :] = [
-                04.8267, -0.5690, 0.0000, 0.9691, 0869.8]  # VI
-            mass_centers[6, :] = [
-                30.8613, 0.9819, 0.1998, 0.9845, -0066.1]  # WS
-            mass_centers[7, :] = [
-                52.3969, 2.1094, 2.4675, 0.9730, -1550.2]  # MH
-            mass_centers[8, :] = [
-                50.6186, -0.0649, 0.0946, 0.9904, 1179.9]  # IH/HDG
-        elif dscfg['RADARCENTROIDS'] == 'L':
-            #       Zh      ZDR     kdp   RhoHV   delta_Z
-            mass_centers[0, :] = [
-                13.8231, 0.2514, 0.0644, 0.9861, 1380.6]  # AG
-            mass_centers[1, :] = [
-                03.0239, 0.1971, 0.0000, 0.9661, 1464.1]  # CR
-            mass_centers[2, :] = [
-                04.9447, 0.1142, 0.0000, 0.9787, -0974.7]  # LR
-            mass_centers[3, :] = [
-                34.2450, 0.5540, 0.1459, 0.9937, 0945.3]  # RP
-            mass_centers[4, :] = [
-                40.9432, 1.0110, 0.5141, 0.9928, -0993.5]  # RN
-            mass_centers[5, :] = [
-                03.5202, -0.3498, 0.0000, 0.9746, 0843.2]  # VI
-            mass_centers[6, :] = [
-                32.5287, 0.9751, 0.2640, 0.9804, -0055.5]  # WS
-            mass_centers[7, :] = [
-                52.6547, 2.7054, 2.5101, 0.9765, -1114.6]  # MH
-            mass_centers[8, :] = [
-                46.4998, 0.1978, 0.6431, 0.9845, 1010.1]  # IH/HDG
-        elif dscfg['RADARCENTROIDS'] == 'D':
-            #       Zh      ZDR     kdp   RhoHV   delta_Z
-            mass_centers[0, :] = [
-                12.567, 0.18934, 0.041193, 0.97693, 1328.1]  # AG
-            mass_centers[1, :] = [
-                3.2115, 0.13379, 0.0000, 0.96918, 1406.3]  # CR
-            mass_centers[2, :] = [
-                10.669, 0.18119, 0.0000, 0.97337, -1171.9]  # LR
-            mass_centers[3, :] = [
-                34.941, 0.13301, 0.090056, 0.9979, 898.44]  # RP
-            mass_centers[4, :] = [
-                39.653, 1.1432, 0.35013, 0.98501, -859.38]  # RN
-            mass_centers[5, :] = [
-                2.8874, -0.46363, 0.0000, 0.95653, 1015.6]  # VI
-            mass_centers[6, :] = [
-                34.122, 0.87987, 0.2281, 0.98003, -234.37]  # WS
-            mass_centers[7, :] = [
-                53.134, 2.0888, 2.0055, 0.96927, -1054.7]  # MH
-            mass_centers[8, :] = [
-                46.715, 0.030477, 0.16994, 0.9969, 976.56]  # IH/HDG
-        elif dscfg['RADARCENTROIDS'] == 'P':
-            #       Zh      ZDR     kdp   RhoHV   delta_Z
-            mass_centers[0, :] = [
-                13.9882, 0.2470, 0.0690, 0.9939, 1418.1]  # AG
-            mass_centers[1, :] = [
-                00.9834, 0.4830, 0.0043, 0.9834, 0950.6]  # CR
-            mass_centers[2, :] = [
-                05.3962, 0.2689, 0.0000, 0.9831, -0479.5]  # LR
-            mass_centers[3, :] = [
-                35.3411, 0.1502, 0.0940, 0.9974, 0920.9]  # RP
-            mass_centers[4, :] = [
-                35.0114, 0.9681, 0.1106, 0.9785, -0374.0]  # RN
-            mass_centers[5, :] = [
-                02.5897, -0.3879, 0.0282, 0.9876, 0985.5]  # VI
-            mass_centers[6, :] = [
-                32.2914, 0.7789, 0.1443, 0.9075, -0153.5]  # WS
-            mass_centers[7, :] = [
-                53.2413, 1.8723, 0.3857, 0.9454, -0470.8]  # MH
-            mass_centers[8, :] = [
-                44.7896, 0.0015, 0.1349, 0.9968, 1116.7]  # IH/HDG
-        elif dscfg['RADARCENTROIDS'] == 'W':
-            #       Zh      ZDR     kdp   RhoHV   delta_Z
-            mass_centers[0, :] = [
-                16.7650, 0.3754, 0.0442, 0.9866, 1409.0]  # AG
-            mass_centers[1, :] = [
-                01.4418, 0.3786, 0.0000, 0.9490, 1415.8]  # CR
-            mass_centers[2, :] = [
-                16.0987, 0.3238, 0.0000, 0.9871, -0818.7]  # LR
-            mass_centers[3, :] = [
-                36.5465, 0.2041, 0.0731, 0.9952, 0745.4]  # RP
-            mass_centers[4, :] = [
-                43.4011, 0.6658, 0.3241, 0.9894, -0778.5]  # RN
-            mass_centers[5, :] = [
-                00.9077, -0.4793, 0.0000, 0.9502, 1488.6]  # VI
-            mass_centers[6, :] = [
-                36.8091, 0.7266, 0.1284, 0.9924, -0071.1]  # WS
-            mass_centers[7, :] = [
-                53.8402, 0.8922, 0.5306, 0.9890, -1017.6]  # MH
-            mass_centers[8, :] = [
-                45.9686, 0.0845, 0.0963, 0.9940, 0867.4]  # IH/HDG
-        elif dscfg['RADARCENTROIDS'] == 'DX50':
-            #       Zh      ZDR     kdp   RhoHV   delta_Z
-            mass_centers[0, :] = [
-                19.0770, 0.4139, 0.0099, 0.9841, 1061.7]  # AG
-            mass_centers[1, :] = [
-                03.9877, 0.5040, 0.0000, 0.9642, 0856.6]  # CR
-            mass_centers[2, :] = [
-                20.7982, 0.3177, 0.0004, 0.9858, -1375.1]  # LR
-            mass_centers[3, :] = [
-                34.7124, -0.3748, 0.0988, 0.9828, 1224.2]  # RP
-            mass_centers[4, :] = [
-                33.0134, 0.6614, 0.0819, 0.9802, -1169.8]  # RN
-            mass_centers[5, :] = [
-                08.2610, -0.4681, 0.0000, 0.9722, 1100.7]  # VI
-            mass_centers[6, :] = [
-                35.1801, 1.2830, 0.1322, 0.9162, -0159.8]  # WS
-            mass_centers[7, :] = [
-                52.4539, 2.3714, 1.1120, 0.9382, -1618.5]  # MH
-            mass_centers[8, :] = [
-                44.2216, -0.3419, 0.0687, 0.9683, 1272.7]  # IH/HDG
-        else:
+        mass_centers = _get_mass_centers(dscfg['RADARCENTROIDS'])
+        if mass_centers is None:
             warn(
                 ' Unknown radar. ' +
                 'Default centroids will be used in classification.')
-            mass_centers = None
 
         compute_entropy = dscfg.get('compute_entropy', False)
         output_distances = dscfg.get('output_distances', False)
         vectorize = dscfg.get('vectorize', False)
 
-        fields_dict = pyart.retrieve.hydroclass_semisupervised(
-            radar, mass_centers=mass_centers,
-            weights=np.array([1., 1., 1., 0.75, 0.5]), refl_field=refl_field,
-            zdr_field=zdr_field, rhv_field=rhv_field, kdp_field=kdp_field,
-            temp_field=temp_field, iso0_field=iso0_field, hydro_field=None,
-            entropy_field=None, temp_ref=temp_ref,
-            compute_entropy=compute_entropy,
-            output_distances=output_distances, vectorize=vectorize)
+        partition = dscfg.get('partition', 'volume')
+
+        hydro_kwargs = {
+            'mass_centers': mass_centers,
+            'weights': np.array([1., 1., 1., 0.75, 0.5]),
+            'refl_field': refl_field,
+            'zdr_field': zdr_field,
+            'rhv_field': rhv_field,
+            'kdp_field': kdp_field,
+            'temp_field': temp_field,
+            'iso0_field': iso0_field,
+            'hydro_field': None,
+            'entropy_field': None,
+            'temp_ref': temp_ref,
+            'compute_entropy': compute_entropy,
+            'output_distances': output_distances,
+            'vectorize': vectorize}
+
+        if partition == 'volume':
+            fields_dict = pyart.retrieve.hydroclass_semisupervised(
+                radar, **hydro_kwargs)
+        else:
+            dtypes = {'hydro': np.uint8, 'entropy': np.float32}
+            for hydro_type in ('AG', 'CR', 'LR', 'RP', 'RN', 'VI', 'WS',
+                               'MH', 'IH'):
+                dtypes['prop_'+hydro_type] = np.float32
+            fields_dict = run_chunked(
+                pyart.retrieve.hydroclass_semisupervised, radar,
+                partition=partition, nprocesses=dscfg.get('nprocesses', 1),
+                nblocks=dscfg.get('nblocks', None), dtypes=dtypes,
+                **hydro_kwargs)
     else:
         raise Exception(
             "ERROR: Unknown hydrometeor classification method " +
@@ -1111,6 +1149,22 @@ def process_melting_layer(procstatus, dscfg, radar_list=None):
 
         datatype : list of string. Dataset keyword
             The input data types
+        ML_METHOD : string. Dataset keyword
+            The melting layer detection method. Can be GIANGRANDE,
+            WOLFENSBERGER or FROM_HYDROCLASS
+        incremental : bool. Dataset keyword
+            Used with the GIANGRANDE method. If True the melting layer is
+            detected from a height profile of melting layer signatures
+            accumulated in time instead of the data of the last nVol
+            volumes. Once a melting layer has been detected only the heights
+            within htol of it are searched. The incremental mode uses maxh,
+            hres, rmin, elmin, elmax, rhomin, rhomax, mlzhmin, mlzhmax,
+            mlzdrmin, mlzdrmax, htol, time_accu_max, nml_points_min,
+            percentile_bottom, percentile_top, time_nodata_allowed and
+            get_iso0. The temperature reference (TEMP or H_ISO0 data
+            types), nVol, zhmin, hwindow, ml_bottom_diff_max, wlength and
+            interpol are not used and a warning is issued if they are set.
+            Default False
     radar_list : list of Radar objects
         Optional. list of radar objects
 
@@ -1214,7 +1268,37 @@ def process_melting_layer(procstatus, dscfg, radar_list=None):
 
         get_iso0 = dscfg.get('get_iso0', True)
 
-        if not dscfg['initialized']:
+        if dscfg.get('incremental', False):
+            if not dscfg['initialized']:
+                ignored = [
+                    param for param in (
+                        'nVol', 'zhmin', 'hwindow', 'ml_bottom_diff_max',
+                        'wlength', 'interpol') if param in dscfg]
+                if temp_field is not None:
+                    ignored.append('TEMP')
+                elif temp_ref is not None:
+                    ignored.append('H_ISO0')
+                if ignored:
+                    warn('Melting layer incremental mode. ' +
+                         ', '.join(ignored)+' not used')
+                dscfg['initialized'] = True
+
+            # accumulated melting layer signatures
+            ml_obj, ml_dict, iso0_dict, ml_global = (
+                _melting_layer_incremental(
+                    radar, dscfg['global_data'], dscfg['timeinfo'],
+                    maxh=maxh, hres=hres, rmin=rmin, elmin=elmin,
+                    elmax=elmax, rhomin=rhomin, rhomax=rhomax,
+                    mlzhmin=mlzhmin, mlzhmax=mlzhmax, mlzdrmin=mlzdrmin,
+                    mlzdrmax=mlzdrmax, htol=htol,
+                    time_accu_max=time_accu_max,
+                    nml_points_min=nml_points_min,
+                    percentile_bottom=percentile_bottom,
+                    percentile_top=percentile_top,
+                    time_nodata_allowed=time_nodata_allowed,
+                    refl_field=refl_field, zdr_field=zdr_field,
+                    rhv_field=rhv_field, get_iso0=get_iso0))
+        elif not dscfg['initialized']:
             # initialize dataset
             ml_obj, ml_dict, iso0_dict, ml_global = (
                 pyart.retrieve.melting_layer_giangrande(
@@ -1517,3 +1601,315 @@ def process_zdr_column(procstatus, dscfg, radar_list=None):
         'fields': {'differential_reflectivity_column_height': zdr_col_dict}}
 
     return new_dataset, ind_rad
+
+
+def _get_mass_centers(radar_centroids):
+    """
+    Gets the centroids of the semi-supervised hydrometeor classification of
+    a radar. The centroids are kept in a read-only array that is shared by
+    all the volumes processed
+
+    Parameters
+    ----------
+    radar_centroids : str
+        The name of the radar of which the derived centroids will be used
+
+    Returns
+    -------
+    mass_centers : float array (9, 5) or None
+        The centroids of each hydrometeor type. None if the radar is unknown
+
+    """
+    if radar_centroids not in _MASS_CENTERS:
+        return None
+
+    with _MASS_CENTERS_CACHE_LOCK:
+        if radar_centroids not in _MASS_CENTERS_CACHE:
+            mass_centers = np.array(
+                _MASS_CENTERS[radar_centroids], dtype=np.float64)
+            mass_centers.flags.writeable = False
+            _MASS_CENTERS_CACHE[radar_centroids] = mass_centers
+
+        return _MASS_CENTERS_CACHE[radar_centroids]
+
+
+def _melting_layer_incremental(radar, ml_state, timeinfo, maxh=6000.,
+                               hres=50., rmin=1000., elmin=4., elmax=10.,
+                               rhomin=0.75, rhomax=0.94, mlzhmin=30.,
+                               mlzhmax=50., mlzdrmin=1., mlzdrmax=5.,
+                               htol=500., time_accu_max=1800.,
+                               nml_points_min=None, percentile_bottom=0.3,
+                               percentile_top=0.9, time_nodata_allowed=3600.,
+                               refl_field='reflectivity',
+                               zdr_field='differential_reflectivity',
+                               rhv_field='cross_correlation_ratio',
+                               get_iso0=True):
+    """
+    Detects the melting layer from a height profile of the number of gates
+    with melting layer signatures (RhoHV, Zh and ZDR within the given
+    limits). The profile of each volume is added to the profile accumulated
+    so far, which decays with a time constant time_accu_max. The melting
+    layer bottom and top are the given percentiles of the accumulated
+    profile. Once a melting layer has been detected only the heights within
+    htol of it are searched. The whole height range is searched again if
+    the current volume has no melting layer points there. The detection is
+    only refreshed by volumes with melting layer points
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object
+    ml_state : dict or None
+        the accumulated profile and the last melting layer detected. None
+        if the detection has not started yet
+    timeinfo : datetime object
+        the time of the volume
+    maxh : float
+        maximum height where to look for the melting layer [m MSL]
+    hres : float
+        height resolution of the profile [m]
+    rmin : float
+        minimum range where to look for melting layer signatures [m]
+    elmin, elmax : float
+        elevation limits where to look for melting layer signatures [deg]
+    rhomin, rhomax : float
+        RhoHV limits of the melting layer signatures
+    mlzhmin, mlzhmax : float
+        Zh limits of the melting layer signatures [dBZ]
+    mlzdrmin, mlzdrmax : float
+        ZDR limits of the melting layer signatures [dB]
+    htol : float
+        height tolerance around the last melting layer detected [m]
+    time_accu_max : float
+        time constant of the decay of the accumulated profile [s]
+    nml_points_min : float or None
+        minimum number of (decayed) melting layer points to consider the
+        detection valid. If None 20 points are required
+    percentile_bottom, percentile_top : float
+        percentiles of the accumulated profile defining the melting layer
+        bottom and top
+    time_nodata_allowed : float
+        maximum time the last melting layer detected is kept when no new
+        detection is possible [s]
+    refl_field, zdr_field, rhv_field : str
+        name of the input fields
+    get_iso0 : bool
+        If True the height over the iso0 (melting layer top) is computed
+
+    Returns
+    -------
+    ml_obj : radar object
+        radar-like object containing the melting layer bottom and top
+    ml_dict : dict
+        melting_layer field dictionary
+    iso0_dict : dict
+        height_over_iso0 field dictionary
+    ml_state : dict
+        the updated accumulated profile and last melting layer detected
+
+    """
+    if nml_points_min is None:
+        nml_points_min = 20
+    hbin_edges = np.arange(0., maxh+hres, hres)
+
+    if ml_state is None or ml_state['counts'].size != hbin_edges.size-1:
+        ml_state = {
+            'counts': np.zeros(hbin_edges.size-1),
+            'time': timeinfo,
+            'ml_bottom': None,
+            'ml_top': None,
+            'time_detection': None}
+
+    # decay the accumulated profile and forget old detections
+    dt = max((timeinfo-ml_state['time']).total_seconds(), 0.)
+    counts = ml_state['counts']*np.exp(-dt/time_accu_max)
+    if (ml_state['time_detection'] is not None and
+            (timeinfo-ml_state['time_detection']).total_seconds() >
+            time_nodata_allowed):
+        counts[:] = 0.
+        ml_state.update({
+            'ml_bottom': None, 'ml_top': None, 'time_detection': None})
+
+    hist_kwargs = {
+        'rmin': rmin, 'elmin': elmin, 'elmax': elmax, 'rhomin': rhomin,
+        'rhomax': rhomax, 'mlzhmin': mlzhmin, 'mlzhmax': mlzhmax,
+        'mlzdrmin': mlzdrmin, 'mlzdrmax': mlzdrmax,
+        'refl_field': refl_field, 'zdr_field': zdr_field,
+        'rhv_field': rhv_field}
+
+    # search around the last detection. The detection is only updated if
+    # the current volume has melting layer points
+    ml_bottom = None
+    if ml_state['ml_bottom'] is not None:
+        hist = _get_ml_height_hist(
+            radar, hbin_edges, ml_state['ml_bottom']-htol,
+            ml_state['ml_top']+htol, **hist_kwargs)
+        if hist.sum() > 0:
+            ml_bottom, ml_top = _get_ml_limits(
+                counts+hist, hbin_edges, nml_points_min, percentile_bottom,
+                percentile_top)
+
+    # fall back to the whole height range
+    if ml_bottom is None:
+        hist = _get_ml_height_hist(
+            radar, hbin_edges, hbin_edges[0], hbin_edges[-1], **hist_kwargs)
+        if hist.sum() > 0:
+            ml_bottom, ml_top = _get_ml_limits(
+                counts+hist, hbin_edges, nml_points_min, percentile_bottom,
+                percentile_top)
+
+    ml_state.update({'counts': counts+hist, 'time': timeinfo})
+    if ml_bottom is not None:
+        ml_state.update({
+            'ml_bottom': ml_bottom, 'ml_top': ml_top,
+            'time_detection': timeinfo})
+    elif ml_state['ml_bottom'] is None:
+        warn('Not enough melting layer points')
+        return None, None, None, ml_state
+
+    ml_bottom = ml_state['ml_bottom']
+    ml_top = ml_state['ml_top']
+
+    # radar-like object with the melting layer limits
+    ml_obj = pyart.testing.make_empty_ppi_radar(2, 360, 1)
+    ml_obj.latitude['data'] = deepcopy(radar.latitude['data'])
+    ml_obj.longitude['data'] = deepcopy(radar.longitude['data'])
+    ml_obj.altitude['data'] = deepcopy(radar.altitude['data'])
+    ml_obj.time['units'] = radar.time['units']
+    ml_obj.azimuth['data'] = np.arange(360, dtype=float)
+    ml_obj.range['data'] = np.array([0., 1.])
+    ml_obj.fixed_angle['data'] = np.array([90.])
+    ml_obj.elevation['data'] = np.zeros(360)+90.
+    ml_pos_dict = pyart.config.get_metadata('melting_layer_height')
+    ml_pos_dict['data'] = np.ma.asarray(
+        np.tile(np.array([ml_bottom, ml_top]), (360, 1)))
+    ml_obj.add_field('melting_layer_height', ml_pos_dict)
+
+    # position of each gate respect to the melting layer
+    beamwidth = 1.
+    if (radar.instrument_parameters is not None and
+            'radar_beam_width_h' in radar.instrument_parameters):
+        beamwidth = (
+            radar.instrument_parameters['radar_beam_width_h']['data'][0])
+    half_beam = radar.range['data']*np.sin(np.deg2rad(beamwidth/2.))
+    gate_altitude = np.ma.getdata(radar.gate_altitude['data'])
+    beam_bottom = gate_altitude-half_beam
+    beam_top = gate_altitude+half_beam
+
+    ml_data = np.full(gate_altitude.shape, 3, dtype=np.uint8)
+    ml_data[beam_bottom < ml_bottom] = 2
+    ml_data[beam_top > ml_top] = 4
+    ml_data[beam_top < ml_bottom] = 1
+    ml_data[beam_bottom > ml_top] = 5
+    ml_dict = pyart.config.get_metadata('melting_layer')
+    ml_dict['data'] = np.ma.asarray(ml_data)
+
+    iso0_dict = None
+    if get_iso0:
+        iso0_dict = pyart.config.get_metadata('height_over_iso0')
+        iso0_dict['data'] = np.ma.asarray(gate_altitude-ml_top)
+
+    return ml_obj, ml_dict, iso0_dict, ml_state
+
+
+def _get_ml_height_hist(radar, hbin_edges, hmin, hmax, rmin=1000.,
+                        elmin=4., elmax=10., rhomin=0.75, rhomax=0.94,
+                        mlzhmin=30., mlzhmax=50., mlzdrmin=1., mlzdrmax=5.,
+                        refl_field='reflectivity',
+                        zdr_field='differential_reflectivity',
+                        rhv_field='cross_correlation_ratio'):
+    """
+    Computes the height histogram of the gates with melting layer
+    signatures. Only the gates between hmin and hmax are examined
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object
+    hbin_edges : 1D array
+        the edges of the height bins [m MSL]
+    hmin, hmax : float
+        the limits of the heights to examine [m MSL]
+    rmin : float
+        minimum range [m]
+    elmin, elmax : float
+        elevation limits [deg]
+    rhomin, rhomax, mlzhmin, mlzhmax, mlzdrmin, mlzdrmax : float
+        RhoHV, Zh and ZDR limits of the melting layer signatures
+    refl_field, zdr_field, rhv_field : str
+        name of the input fields
+
+    Returns
+    -------
+    hist : 1D array
+        the number of gates with melting layer signature in each height bin
+
+    """
+    hist = np.zeros(hbin_edges.size-1)
+    hmin = max(hmin, hbin_edges[0])
+    hmax = min(hmax, hbin_edges[-1])
+
+    inds_ray = np.where(np.logical_and(
+        radar.elevation['data'] >= elmin,
+        radar.elevation['data'] <= elmax))[0]
+    ind_rmin = np.searchsorted(radar.range['data'], rmin)
+    if inds_ray.size == 0 or ind_rmin >= radar.ngates or hmin >= hmax:
+        return hist
+
+    # restrict the search to the range gates within the height limits
+    gate_altitude = np.ma.getdata(
+        radar.gate_altitude['data'])[inds_ray, ind_rmin:]
+    is_ml = np.logical_and(gate_altitude >= hmin, gate_altitude < hmax)
+    inds_rng = np.where(np.any(is_ml, axis=0))[0]
+    if inds_rng.size == 0:
+        return hist
+    rngs = slice(inds_rng[0], inds_rng[-1]+1)
+    gate_altitude = gate_altitude[:, rngs]
+    is_ml = is_ml[:, rngs]
+
+    rngs = slice(ind_rmin+inds_rng[0], ind_rmin+inds_rng[-1]+1)
+    for field_name, vmin, vmax in (
+            (rhv_field, rhomin, rhomax), (refl_field, mlzhmin, mlzhmax),
+            (zdr_field, mlzdrmin, mlzdrmax)):
+        data = radar.fields[field_name]['data'][inds_ray, rngs]
+        is_ml = np.logical_and(is_ml, np.ma.filled(
+            np.logical_and(data >= vmin, data <= vmax), False))
+
+    hist, _ = np.histogram(gate_altitude[is_ml], bins=hbin_edges)
+
+    return hist.astype(float)
+
+
+def _get_ml_limits(counts, hbin_edges, nml_points_min, percentile_bottom,
+                   percentile_top):
+    """
+    Gets the melting layer bottom and top from the height profile of the
+    number of gates with melting layer signatures
+
+    Parameters
+    ----------
+    counts : 1D array
+        number of gates with melting layer signature in each height bin
+    hbin_edges : 1D array
+        the edges of the height bins [m MSL]
+    nml_points_min : float
+        the minimum number of points to consider the detection valid
+    percentile_bottom, percentile_top : float
+        percentiles of the profile defining the melting layer bottom and top
+
+    Returns
+    -------
+    ml_bottom, ml_top : float or None
+        the melting layer bottom and top [m MSL]. None if there are not
+        enough points
+
+    """
+    npoints = np.sum(counts)
+    if npoints == 0 or npoints < nml_points_min:
+        return None, None
+
+    cum_counts = np.append(0., np.cumsum(counts))/npoints
+    ml_bottom, ml_top = np.interp(
+        [percentile_bottom, percentile_top], cum_counts, hbin_edges)
+
+    return float(ml_bottom), float(ml_top)
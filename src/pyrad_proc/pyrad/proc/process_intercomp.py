@@ -20,6 +20,7 @@ Functions used in the inter-comparison between radars
 
 from copy import deepcopy
 from warnings import warn
+import os
 import datetime
 import numpy as np
 import scipy
@@ -31,10 +32,14 @@ from ..io.io_aux import get_datatype_fields, get_fieldname_pyart
 from ..io.io_aux import get_save_dir, make_filename
 from ..io.read_data_other import read_colocated_gates, read_colocated_data
 from ..io.read_data_other import read_colocated_data_time_avg
+from ..io.read_data_other import read_hist2d_accumulator
+from ..io.write_data import write_hist2d_accumulator
 from ..io.read_data_radar import interpol_field
 
 from ..util.radar_utils import time_avg_range, get_range_bins_to_avg
 from ..util.radar_utils import find_colocated_indexes
+from ..util.accumulator import RadarAccumulator
+from ..util.hist2d_accumulator import Hist2dAccumulator
 
 
 def process_time_stats(procstatus, dscfg, radar_list=None):
@@ -559,20 +564,10 @@ def process_time_avg(procstatus, dscfg, radar_list=None):
 
         period = dscfg.get('period', 3600.)
 
-        field = deepcopy(radar.fields[field_name])
+        field_data = radar.fields[field_name]['data']
         if lin_trans:
-            field['data'] = np.ma.power(10., 0.1*field['data'])
-
-        field['data'] = field['data'].filled(fill_value=0.)
-        field['data'] = np.ma.asarray(field['data'])
-
-        radar_aux = deepcopy(radar)
-        radar_aux.fields = dict()
-        radar_aux.add_field(field_name, field)
-        npoints_dict = pyart.config.get_metadata('number_of_samples')
-        npoints_dict['data'] = np.ma.ones(
-            (radar.nrays, radar.ngates), dtype=int)
-        radar_aux.add_field('number_of_samples', npoints_dict)
+            field_data = np.ma.power(10., 0.1*field_data)
+        field_data = np.ma.filled(field_data, fill_value=0.)
 
         # first volume: initialize start and end time of averaging
         if dscfg['initialized'] == 0:
@@ -591,6 +586,8 @@ def process_time_avg(procstatus, dscfg, radar_list=None):
                 {'endtime': avg_par['starttime']+datetime.timedelta(
                     seconds=period)})
             avg_par.update({'timeinfo': dscfg['timeinfo']})
+            # partial states are merged per averaging period
+            avg_par.update({'merge_by': 'starttime'})
             dscfg['global_data'] = avg_par
             dscfg['initialized'] = 1
 
@@ -598,9 +595,9 @@ def process_time_avg(procstatus, dscfg, radar_list=None):
             return None, None
 
         dscfg['global_data']['timeinfo'] = dscfg['timeinfo']
-        # no radar object in global data: create it
-        if 'radar_out' not in dscfg['global_data']:
-            # get start and stop times of new radar object
+        # no accumulator in global data: create it
+        if 'accumulator' not in dscfg['global_data']:
+            # get start and stop times of new accumulator
             (dscfg['global_data']['starttime'],
              dscfg['global_data']['endtime']) = (
                  time_avg_range(
@@ -609,48 +606,33 @@ def process_time_avg(procstatus, dscfg, radar_list=None):
 
             # check if volume time older than starttime
             if dscfg['timeinfo'] > dscfg['global_data']['starttime']:
-                dscfg['global_data'].update({'radar_out': radar_aux})
+                accumulator = RadarAccumulator(
+                    radar, {field_name: radar.fields[field_name]})
+                accumulator.add(radar, {field_name: field_data})
+                dscfg['global_data'].update({'accumulator': accumulator})
 
             return None, None
 
         # still accumulating: add field to global field
         if dscfg['timeinfo'] < dscfg['global_data']['endtime']:
-            field_interp = interpol_field(
-                dscfg['global_data']['radar_out'], radar_aux, field_name)
-            npoints_interp = interpol_field(
-                dscfg['global_data']['radar_out'], radar_aux,
-                'number_of_samples')
-            dscfg['global_data']['radar_out'].fields[field_name]['data'] += (
-                field_interp['data'].filled(fill_value=0))
-            dscfg['global_data']['radar_out'].fields[
-                'number_of_samples']['data'] += (
-                    npoints_interp['data'].filled(fill_value=0)).astype('int')
+            dscfg['global_data']['accumulator'].add(
+                radar, {field_name: field_data})
 
             return None, None
 
         # we have reached the end of the accumulation period: do the averaging
         # and start a new object
-        dscfg['global_data']['radar_out'].fields[field_name]['data'] /= (
-            dscfg['global_data']['radar_out'].fields[
-                'number_of_samples']['data'])
-        if lin_trans:
-            dscfg['global_data']['radar_out'].fields[field_name]['data'] = (
-                10.*np.ma.log10(
-                    dscfg['global_data']['radar_out'].fields[
-                        field_name]['data']))
-
         new_dataset = {
-            'radar_out': deepcopy(dscfg['global_data']['radar_out']),
+            'radar_out': _get_time_avg_radar(
+                dscfg['global_data'].pop('accumulator'), field_name,
+                lin_trans=lin_trans),
             'timeinfo': dscfg['global_data']['endtime']}
 
         dscfg['global_data']['starttime'] += datetime.timedelta(
             seconds=period)
         dscfg['global_data']['endtime'] += datetime.timedelta(seconds=period)
 
-        # remove old radar object from global_data dictionary
-        dscfg['global_data'].pop('radar_out', None)
-
-        # get start and stop times of new radar object
+        # get start and stop times of new accumulator
         dscfg['global_data']['starttime'], dscfg['global_data']['endtime'] = (
             time_avg_range(
                 dscfg['timeinfo'], dscfg['global_data']['starttime'],
@@ -658,7 +640,10 @@ def process_time_avg(procstatus, dscfg, radar_list=None):
 
         # check if volume time older than starttime
         if dscfg['timeinfo'] > dscfg['global_data']['starttime']:
-            dscfg['global_data'].update({'radar_out': radar_aux})
+            accumulator = RadarAccumulator(
+                radar, {field_name: radar.fields[field_name]})
+            accumulator.add(radar, {field_name: field_data})
+            dscfg['global_data'].update({'accumulator': accumulator})
 
         return new_dataset, ind_rad
 
@@ -666,21 +651,13 @@ def process_time_avg(procstatus, dscfg, radar_list=None):
     if procstatus == 2:
         if dscfg['initialized'] == 0:
             return None, None
-        if 'radar_out' not in dscfg['global_data']:
+        if 'accumulator' not in dscfg['global_data']:
             return None, None
 
-        (dscfg['global_data']['radar_out'].fields[field_name][
-            'data']) /= (
-                dscfg['global_data']['radar_out'].fields[
-                    'number_of_samples']['data'])
-        if lin_trans:
-            dscfg['global_data']['radar_out'].fields[field_name]['data'] = (
-                10.*np.ma.log10(
-                    dscfg['global_data']['radar_out'].fields[
-                        field_name]['data']))
-
         new_dataset = {
-            'radar_out': deepcopy(dscfg['global_data']['radar_out']),
+            'radar_out': _get_time_avg_radar(
+                dscfg['global_data'].pop('accumulator'), field_name,
+                lin_trans=lin_trans),
             'timeinfo': dscfg['global_data']['endtime']}
 
         return new_dataset, ind_rad
@@ -738,21 +715,11 @@ def process_weighted_time_avg(procstatus, dscfg, radar_list=None):
 
         period = dscfg.get('period', 3600.)
 
-        field = deepcopy(radar.fields[field_name])
-        field['data'] = field['data'].filled(fill_value=0.)
-        field['data'] = np.ma.asarray(field['data'])
-
-        refl_field = deepcopy(radar.fields[refl_name])
-        refl_field['data'] = np.ma.power(10., 0.1*refl_field['data'])
-        refl_field['data'] = refl_field['data'].filled(fill_value=0.)
-        refl_field['data'] = np.ma.asarray(refl_field['data'])
-
-        field['data'] *= refl_field['data']
-
-        radar_aux = deepcopy(radar)
-        radar_aux.fields = dict()
-        radar_aux.add_field(field_name, field)
-        radar_aux.add_field(refl_name, refl_field)
+        refl_data = np.ma.filled(
+            np.ma.power(10., 0.1*radar.fields[refl_name]['data']),
+            fill_value=0.)
+        field_data = np.ma.filled(
+            radar.fields[field_name]['data'], fill_value=0.)*refl_data
 
         # first volume: initialize start and end time of averaging
         if dscfg['initialized'] == 0:
@@ -771,6 +738,8 @@ def process_weighted_time_avg(procstatus, dscfg, radar_list=None):
                 {'endtime': avg_par['starttime']+datetime.timedelta(
                     seconds=period)})
             avg_par.update({'timeinfo': dscfg['timeinfo']})
+            # partial states are merged per averaging period
+            avg_par.update({'merge_by': 'starttime'})
             dscfg['global_data'] = avg_par
             dscfg['initialized'] = 1
 
@@ -778,9 +747,9 @@ def process_weighted_time_avg(procstatus, dscfg, radar_list=None):
             return None, None
 
         dscfg['global_data']['timeinfo'] = dscfg['timeinfo']
-        # no radar object in global data: create it
-        if 'radar_out' not in dscfg['global_data']:
-            # get start and stop times of new radar object
+        # no accumulator in global data: create it
+        if 'accumulator' not in dscfg['global_data']:
+            # get start and stop times of new accumulator
             (dscfg['global_data']['starttime'],
              dscfg['global_data']['endtime']) = (
                  time_avg_range(
@@ -789,41 +758,35 @@ def process_weighted_time_avg(procstatus, dscfg, radar_list=None):
 
             # check if volume time older than starttime
             if dscfg['timeinfo'] > dscfg['global_data']['starttime']:
-                dscfg['global_data'].update({'radar_out': radar_aux})
+                accumulator = RadarAccumulator(
+                    radar, {field_name: radar.fields[field_name],
+                            refl_name: radar.fields[refl_name]})
+                accumulator.add(
+                    radar, {field_name: field_data, refl_name: refl_data})
+                dscfg['global_data'].update({'accumulator': accumulator})
 
             return None, None
 
         # still accumulating: add field to global field
         if dscfg['timeinfo'] < dscfg['global_data']['endtime']:
-            field_interp = interpol_field(
-                dscfg['global_data']['radar_out'], radar_aux, field_name)
-            dscfg['global_data']['radar_out'].fields[field_name]['data'] += (
-                field_interp['data'].filled(fill_value=0))
-
-            refl_interp = interpol_field(
-                dscfg['global_data']['radar_out'], radar_aux, refl_name)
-            dscfg['global_data']['radar_out'].fields[refl_name]['data'] += (
-                refl_interp['data'].filled(fill_value=0))
+            dscfg['global_data']['accumulator'].add(
+                radar, {field_name: field_data, refl_name: refl_data})
 
             return None, None
 
         # we have reached the end of the accumulation period: do the averaging
         # and start a new object
-        dscfg['global_data']['radar_out'].fields[field_name]['data'] /= (
-            dscfg['global_data']['radar_out'].fields[refl_name]['data'])
-
         new_dataset = {
-            'radar_out': deepcopy(dscfg['global_data']['radar_out']),
+            'radar_out': _get_weighted_time_avg_radar(
+                dscfg['global_data'].pop('accumulator'), field_name,
+                refl_name),
             'timeinfo': dscfg['global_data']['endtime']}
 
         dscfg['global_data']['starttime'] += datetime.timedelta(
             seconds=period)
         dscfg['global_data']['endtime'] += datetime.timedelta(seconds=period)
 
-        # remove old radar object from global_data dictionary
-        dscfg['global_data'].pop('radar_out', None)
-
-        # get start and stop times of new radar object
+        # get start and stop times of new accumulator
         dscfg['global_data']['starttime'], dscfg['global_data']['endtime'] = (
             time_avg_range(
                 dscfg['timeinfo'], dscfg['global_data']['starttime'],
@@ -831,7 +794,12 @@ def process_weighted_time_avg(procstatus, dscfg, radar_list=None):
 
         # check if volume time older than starttime
         if dscfg['timeinfo'] > dscfg['global_data']['starttime']:
-            dscfg['global_data'].update({'radar_out': radar_aux})
+            accumulator = RadarAccumulator(
+                radar, {field_name: radar.fields[field_name],
+                        refl_name: radar.fields[refl_name]})
+            accumulator.add(
+                radar, {field_name: field_data, refl_name: refl_data})
+            dscfg['global_data'].update({'accumulator': accumulator})
 
         return new_dataset, ind_rad
 
@@ -839,14 +807,13 @@ def process_weighted_time_avg(procstatus, dscfg, radar_list=None):
     if procstatus == 2:
         if dscfg['initialized'] == 0:
             return None, None
-        if 'radar_out' not in dscfg['global_data']:
+        if 'accumulator' not in dscfg['global_data']:
             return None, None
 
-        dscfg['global_data']['radar_out'].fields[field_name]['data'] /= (
-            dscfg['global_data']['radar_out'].fields[refl_name]['data'])
-
         new_dataset = {
-            'radar_out': deepcopy(dscfg['global_data']['radar_out']),
+            'radar_out': _get_weighted_time_avg_radar(
+                dscfg['global_data'].pop('accumulator'), field_name,
+                refl_name),
             'timeinfo': dscfg['global_data']['endtime']}
 
         return new_dataset, ind_rad
@@ -987,10 +954,6 @@ def process_time_avg_flag(procstatus, dscfg, radar_list=None):
                     temp_ref='height_over_iso0')
                 time_avg_flag['data'][mask_fzl] += 10000
 
-        radar_aux = deepcopy(radar)
-        radar_aux.fields = dict()
-        radar_aux.add_field('time_avg_flag', time_avg_flag)
-
         # first volume: initialize start and end time of averaging
         if dscfg['initialized'] == 0:
             start_average = 0.  # seconds from midnight
@@ -1008,6 +971,8 @@ def process_time_avg_flag(procstatus, dscfg, radar_list=None):
                 {'endtime': avg_par['starttime']+datetime.timedelta(
                     seconds=period)})
             avg_par.update({'timeinfo': dscfg['timeinfo']})
+            # partial states are merged per averaging period
+            avg_par.update({'merge_by': 'starttime'})
             dscfg['global_data'] = avg_par
             dscfg['initialized'] = 1
 
@@ -1015,9 +980,9 @@ def process_time_avg_flag(procstatus, dscfg, radar_list=None):
             return None, None
 
         dscfg['global_data']['timeinfo'] = dscfg['timeinfo']
-        # no radar object in global data: create it
-        if 'radar_out' not in dscfg['global_data']:
-            # get start and stop times of new radar object
+        # no accumulator in global data: create it
+        if 'accumulator' not in dscfg['global_data']:
+            # get start and stop times of new accumulator
             (dscfg['global_data']['starttime'],
              dscfg['global_data']['endtime']) = (
                  time_avg_range(
@@ -1026,33 +991,33 @@ def process_time_avg_flag(procstatus, dscfg, radar_list=None):
 
             # check if volume time older than starttime
             if dscfg['timeinfo'] > dscfg['global_data']['starttime']:
-                dscfg['global_data'].update({'radar_out': radar_aux})
+                accumulator = RadarAccumulator(
+                    radar, {'time_avg_flag': time_avg_flag}, dtype=np.int64)
+                accumulator.add(
+                    radar, {'time_avg_flag': time_avg_flag['data']})
+                dscfg['global_data'].update({'accumulator': accumulator})
 
             return None, None
 
         # still accumulating: add field to global field
         if dscfg['timeinfo'] < dscfg['global_data']['endtime']:
-            flag_interp = interpol_field(
-                dscfg['global_data']['radar_out'], radar_aux, 'time_avg_flag')
-            dscfg['global_data']['radar_out'].fields[
-                'time_avg_flag']['data'] += (
-                    flag_interp['data'].filled(fill_value=0)).astype(int)
+            dscfg['global_data']['accumulator'].add(
+                radar, {'time_avg_flag': time_avg_flag['data']})
 
             return None, None
 
         # we have reached the end of the accumulation: start a new object
+        accumulator = dscfg['global_data'].pop('accumulator')
         new_dataset = {
-            'radar_out': deepcopy(dscfg['global_data']['radar_out']),
+            'radar_out': accumulator.to_radar(
+                {'time_avg_flag': accumulator.get_sum('time_avg_flag')}),
             'timeinfo': dscfg['global_data']['endtime']}
 
         dscfg['global_data']['starttime'] += datetime.timedelta(
             seconds=period)
         dscfg['global_data']['endtime'] += datetime.timedelta(seconds=period)
 
-        # remove old radar object from global_data dictionary
-        dscfg['global_data'].pop('radar_out', None)
-
-        # get start and stop times of new radar object
+        # get start and stop times of new accumulator
         dscfg['global_data']['starttime'], dscfg['global_data']['endtime'] = (
             time_avg_range(
                 dscfg['timeinfo'], dscfg['global_data']['starttime'],
@@ -1060,7 +1025,10 @@ def process_time_avg_flag(procstatus, dscfg, radar_list=None):
 
         # check if volume time older than starttime
         if dscfg['timeinfo'] > dscfg['global_data']['starttime']:
-            dscfg['global_data'].update({'radar_out': radar_aux})
+            accumulator = RadarAccumulator(
+                radar, {'time_avg_flag': time_avg_flag}, dtype=np.int64)
+            accumulator.add(radar, {'time_avg_flag': time_avg_flag['data']})
+            dscfg['global_data'].update({'accumulator': accumulator})
 
         return new_dataset, ind_rad
 
@@ -1068,16 +1036,78 @@ def process_time_avg_flag(procstatus, dscfg, radar_list=None):
     if procstatus == 2:
         if dscfg['initialized'] == 0:
             return None, None
-        if 'radar_out' not in dscfg['global_data']:
+        if 'accumulator' not in dscfg['global_data']:
             return None, None
 
+        accumulator = dscfg['global_data'].pop('accumulator')
         new_dataset = {
-            'radar_out': deepcopy(dscfg['global_data']['radar_out']),
+            'radar_out': accumulator.to_radar(
+                {'time_avg_flag': accumulator.get_sum('time_avg_flag')}),
             'timeinfo': dscfg['global_data']['endtime']}
 
         return new_dataset, ind_rad
 
 
+def _get_time_avg_radar(accumulator, field_name, lin_trans=0):
+    """
+    Computes the time average of a field and hands off the radar object
+    containing it together with the number of samples
+
+    Parameters
+    ----------
+    accumulator : RadarAccumulator object
+        the accumulator containing the field sum
+    field_name : str
+        name of the averaged field
+    lin_trans : int
+        If 1 the field has been averaged in linear units
+
+    Returns
+    -------
+    radar : radar object
+        radar object containing the averaged field
+
+    """
+    field_mean = accumulator.get_mean(field_name)
+    if lin_trans:
+        field_mean = 10.*np.ma.log10(field_mean)
+
+    return accumulator.to_radar({
+        field_name: field_mean,
+        'number_of_samples': accumulator.get_count_field()})
+
+
+def _get_weighted_time_avg_radar(accumulator, field_name, refl_name):
+    """
+    Computes the reflectivity weighted time average of a field and hands
+    off the radar object containing it together with the accumulated linear
+    reflectivity
+
+    Parameters
+    ----------
+    accumulator : RadarAccumulator object
+        the accumulator containing the field sums
+    field_name : str
+        name of the averaged field
+    refl_name : str
+        name of the reflectivity field used as weight
+
+    Returns
+    -------
+    radar : radar object
+        radar object containing the averaged field
+
+    """
+    field_sum = accumulator.sums[field_name]
+    refl_sum = accumulator.sums[refl_name]
+    is_valid = np.logical_and(accumulator.count > 0, refl_sum > 0.)
+    np.divide(field_sum, refl_sum, out=field_sum, where=is_valid)
+
+    return accumulator.to_radar({
+        field_name: np.ma.masked_where(np.logical_not(is_valid), field_sum),
+        refl_name: accumulator.get_sum(refl_name)})
+
+
 def process_colocated_gates(procstatus, dscfg, radar_list=None):
     """
     Find colocated gates within two radars
@@ -1276,6 +1306,14 @@ def process_intercomp(procstatus, dscfg, radar_list=None):
             elevation tolerance between the two radars. Default 0.5 deg
         rng_tol : float. Dataset keyword
             range tolerance between the two radars. Default 50 m
+        hist_acc : bool. Dataset keyword
+            If True the colocated values are also accumulated in a 2D
+            histogram stored in a daily npz file next to the csv file. The
+            post-processing then uses the histogram of the last day instead
+            of reading the csv file. Default False
+        hist_step : float. Dataset keyword
+            The bin size of the 2D histogram. If None it is computed using
+            the Py-ART config file. Default None
     radar_list : list of Radar objects
         Optional. list of radar objects
 
@@ -1506,12 +1544,19 @@ def process_intercomp(procstatus, dscfg, radar_list=None):
         intercomp_dict['rad2_rng'] = radar2.range['data'][rad2_rng_ind]
         intercomp_dict['rad2_val'] = val2_vec
 
+        if dscfg.get('hist_acc', False):
+            _update_hist2d_accumulator(
+                dscfg, datatype, field_name, val1_vec, val2_vec)
+
         new_dataset = {'intercomp_dict': intercomp_dict,
                        'timeinfo': dscfg['global_data']['timeinfo'],
                        'final': False}
         return new_dataset, None
 
     if procstatus == 2:
+        if 'hist2d_acc' in dscfg['global_data']:
+            return _get_hist2d_dataset(dscfg), None
+
         savedir = get_save_dir(
             dscfg['basepath'], dscfg['procname'], dscfg['dsname'],
             dscfg['coloc_data_dir'],
@@ -1584,6 +1629,14 @@ def process_intercomp_time_avg(procstatus, dscfg, radar_list=None):
             maximum number of samples that can be no rain. Default 100 i.e. all
         phi_avg_max : float. Dataset keyword
             maximum average PhiDP allowed. Default 600 deg i.e. any
+        hist_acc : bool. Dataset keyword
+            If True the valid colocated reflectivities are also accumulated
+            in a 2D histogram stored in a daily npz file next to the csv
+            file. The post-processing then uses the histogram of the last
+            day instead of reading the csv file. Default False
+        hist_step : float. Dataset keyword
+            The bin size of the 2D histogram. If None it is computed using
+            the Py-ART config file. Default None
 
     radar_list : list of Radar objects
         Optional. list of radar objects
@@ -1653,6 +1706,7 @@ def process_intercomp_time_avg(procstatus, dscfg, radar_list=None):
             if radarnr == radarnr_list[0]:
                 if (datatype in (
                         'dBZ', 'dBZc', 'dBuZ', 'dBZv', 'dBZvc', 'dBuZv')):
+                    refl_type = datatype
                     rad1_refl_field = get_fieldname_pyart(datatype)
                 elif datatype in ('PhiDP', 'PhiDPc'):
                     rad1_phidp_field = get_fieldname_pyart(datatype)
@@ -1906,6 +1960,13 @@ def process_intercomp_time_avg(procstatus, dscfg, radar_list=None):
         intercomp_dict['rad2_PhiDPavg'] = phidp2_vec
         intercomp_dict['rad2_Flagavg'] = flag2_vec
 
+        if dscfg.get('hist_acc', False):
+            isvalid = _get_valid_time_avg(
+                dscfg, phidp1_vec, flag1_vec, phidp2_vec, flag2_vec)
+            _update_hist2d_accumulator(
+                dscfg, refl_type, rad1_refl_field, refl1_vec[isvalid],
+                refl2_vec[isvalid])
+
         new_dataset = {'intercomp_dict': intercomp_dict,
                        'timeinfo': dscfg['global_data']['timeinfo'],
                        'final': False}
@@ -1924,6 +1985,9 @@ def process_intercomp_time_avg(procstatus, dscfg, radar_list=None):
             warn('Unknown reflectivity type')
             return None, None
 
+        if 'hist2d_acc' in dscfg['global_data']:
+            return _get_hist2d_dataset(dscfg), None
+
         savedir = get_save_dir(
             dscfg['basepath'], dscfg['procname'], dscfg['dsname'],
             dscfg['coloc_data_dir'],
@@ -1940,32 +2004,9 @@ def process_intercomp_time_avg(procstatus, dscfg, radar_list=None):
          rad2_ele, rad2_azi, rad2_rng, rad2_dBZ, rad2_phi, rad2_flag) = (
              read_colocated_data_time_avg(fname))
 
-        rad1_excess_phi = (rad1_flag % 100).astype(int)
-        rad2_excess_phi = (rad2_flag % 100).astype(int)
-
-        rad1_clt = (((rad1_flag-rad1_excess_phi) % 10000) / 100).astype(int)
-        rad2_clt = (((rad2_flag-rad2_excess_phi) % 10000) / 100).astype(int)
-
-        rad1_non_rain = (
-            ((rad1_flag-rad1_clt*100-rad1_excess_phi) % 1000000) /
-            10000).astype(int)
-        rad2_non_rain = (
-            ((rad2_flag-rad2_clt*100-rad2_excess_phi) % 1000000) /
-            10000).astype(int)
-
-        clt_max = dscfg.get('clt_max', 100)
-        phi_excess_max = dscfg.get('phi_excess_max', 100)
-        non_rain_max = dscfg.get('non_rain_max', 100)
-        phi_avg_max = dscfg.get('phi_avg_max', 600.)
-
         # filter out invalid data
-        ind_val = np.where(
-            np.logical_and.reduce((
-                rad1_clt <= clt_max, rad2_clt <= clt_max,
-                rad1_excess_phi <= phi_excess_max,
-                rad2_excess_phi <= phi_excess_max,
-                rad1_non_rain <= non_rain_max, rad2_non_rain <= non_rain_max,
-                rad1_phi <= phi_avg_max, rad2_phi <= phi_avg_max)))[0]
+        ind_val = np.where(_get_valid_time_avg(
+            dscfg, rad1_phi, rad1_flag, rad2_phi, rad2_flag))[0]
 
         intercomp_dict = {
             'rad1_name': dscfg['global_data']['rad1_name'],
@@ -1990,3 +2031,144 @@ def process_intercomp_time_avg(procstatus, dscfg, radar_list=None):
                        'final': True}
 
         return new_dataset, None
+
+
+def _get_valid_time_avg(dscfg, rad1_phi, rad1_flag, rad2_phi, rad2_flag):
+    """
+    Gets the colocated time averaged gates that fulfill the quality criteria
+    of the dataset
+
+    Parameters
+    ----------
+    dscfg : dict
+        data set configuration. It may contain the keywords clt_max,
+        phi_excess_max, non_rain_max and phi_avg_max
+    rad1_phi, rad2_phi : float array
+        the average PhiDP of each radar
+    rad1_flag, rad2_flag : int array
+        the time average flag of each radar
+
+    Returns
+    -------
+    isvalid : bool array
+        True for the valid gates
+
+    """
+    rad1_flag = np.ma.getdata(rad1_flag)
+    rad2_flag = np.ma.getdata(rad2_flag)
+
+    rad1_excess_phi = (rad1_flag % 100).astype(int)
+    rad2_excess_phi = (rad2_flag % 100).astype(int)
+
+    rad1_clt = (((rad1_flag-rad1_excess_phi) % 10000) / 100).astype(int)
+    rad2_clt = (((rad2_flag-rad2_excess_phi) % 10000) / 100).astype(int)
+
+    rad1_non_rain = (
+        ((rad1_flag-rad1_clt*100-rad1_excess_phi) % 1000000) /
+        10000).astype(int)
+    rad2_non_rain = (
+        ((rad2_flag-rad2_clt*100-rad2_excess_phi) % 1000000) /
+        10000).astype(int)
+
+    clt_max = dscfg.get('clt_max', 100)
+    phi_excess_max = dscfg.get('phi_excess_max', 100)
+    non_rain_max = dscfg.get('non_rain_max', 100)
+    phi_avg_max = dscfg.get('phi_avg_max', 600.)
+
+    return np.logical_and.reduce((
+        rad1_clt <= clt_max, rad2_clt <= clt_max,
+        rad1_excess_phi <= phi_excess_max,
+        rad2_excess_phi <= phi_excess_max,
+        rad1_non_rain <= non_rain_max, rad2_non_rain <= non_rain_max,
+        np.ma.filled(rad1_phi <= phi_avg_max, False),
+        np.ma.filled(rad2_phi <= phi_avg_max, False)))
+
+
+def _update_hist2d_accumulator(dscfg, datatype, field_name, val1, val2):
+    """
+    Adds the colocated values of a volume to the daily 2D histogram
+    accumulator of the dataset and writes it. A new accumulator is started
+    when the day of the volume changes. The accumulator written by previous
+    runs for the same day is merged only if all its volumes are older than
+    the current one. Otherwise the period is being reprocessed and the file
+    is overwritten
+
+    Parameters
+    ----------
+    dscfg : dict
+        data set configuration. The accumulator is kept in its global data
+    datatype : str
+        the data type used in the name of the file
+    field_name : str
+        name of the field accumulated
+    val1, val2 : array like
+        the colocated values of radar 1 and radar 2
+
+    """
+    global_data = dscfg['global_data']
+    voltime = np.datetime64(dscfg['timeinfo'], 'us')
+
+    savedir = get_save_dir(
+        dscfg['basepath'], dscfg['procname'], dscfg['dsname'],
+        dscfg['coloc_data_dir'], timeinfo=dscfg['timeinfo'])
+    fname = savedir+make_filename(
+        'hist2d', dscfg['type'], datatype, ['npz'],
+        timeinfo=dscfg['timeinfo'], timeformat='%Y%m%d')[0]
+
+    if global_data.get('hist2d_fname', None) != fname:
+        step = dscfg.get('hist_step', None)
+        accumulator = Hist2dAccumulator.from_field_names(
+            field_name, field_name, step1=step, step2=step)
+
+        accumulator_prev = None
+        if os.path.isfile(fname):
+            accumulator_prev = read_hist2d_accumulator(fname)
+        if accumulator_prev is not None:
+            if (accumulator_prev.last_time is None or
+                    accumulator_prev.last_time >= voltime):
+                warn('Histogram of previous runs in file '+fname +
+                     ' may contain the current volume. Overwritten')
+            else:
+                try:
+                    accumulator.merge(accumulator_prev)
+                except ValueError as ee:
+                    warn(str(ee))
+                    warn('Histogram of previous runs in file '+fname +
+                         ' discarded')
+
+        global_data.update({
+            'hist2d_acc': accumulator,
+            'hist2d_fname': fname,
+            'hist2d_timeinfo': dscfg['timeinfo']})
+
+    global_data['hist2d_acc'].add(val1, val2)
+    global_data['hist2d_acc'].last_time = voltime
+    write_hist2d_accumulator(
+        global_data['hist2d_acc'], global_data['hist2d_fname'])
+
+
+def _get_hist2d_dataset(dscfg):
+    """
+    Gets the final intercomparison dataset from the 2D histogram
+    accumulator of the last day processed
+
+    Parameters
+    ----------
+    dscfg : dict
+        data set configuration. The accumulator is kept in its global data
+
+    Returns
+    -------
+    new_dataset : dict
+        dictionary containing the names of the radars, the accumulator and
+        the key "final" set to True
+
+    """
+    intercomp_dict = {
+        'rad1_name': dscfg['global_data']['rad1_name'],
+        'rad2_name': dscfg['global_data']['rad2_name']}
+
+    return {'intercomp_dict': intercomp_dict,
+            'hist2d_acc': dscfg['global_data']['hist2d_acc'],
+            'timeinfo': dscfg['global_data']['hist2d_timeinfo'],
+            'final': True}
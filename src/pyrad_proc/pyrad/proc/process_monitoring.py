@@ -25,9 +25,10 @@ import pyart
 
 from ..io.io_aux import get_datatype_fields, get_fieldname_pyart
 from ..io.read_data_other import read_selfconsistency
-from ..io.read_data_radar import interpol_field
 
 from ..util.radar_utils import get_histogram_bins
+from ..util.accumulator import RadarAccumulator
+from ..util.quantile_sketch import QuantileSketch
 
 
 def process_selfconsistency_kdp_phidp(procstatus, dscfg, radar_list=None):
@@ -982,6 +983,13 @@ def process_monitoring(procstatus, dscfg, radar_list=None):
         step : float. Dataset keyword
             The width of the histogram bin. Default is None. In that case the
             default step in function get_histogram_bins is used
+        quantile_sketch : int. Dataset keyword
+            If larger than 0 a streaming quantile sketch of the data is kept
+            instead of the cumulative histogram and used to compute the
+            quantiles of the VOL_TS product. The histograms of each volume
+            are still available. The value is the accuracy parameter of the
+            sketch. With 200 the rank error is of the order of 1.65 %.
+            Default 0
     radar_list : list of Radar objects
         Optional. list of radar objects
 
@@ -1044,24 +1052,35 @@ def process_monitoring(procstatus, dscfg, radar_list=None):
         radar_aux.add_field(field_name, field_dict)
         start_time = pyart.graph.common.generate_radar_time_begin(radar_aux)
 
-        # keep histogram in Memory or add to existing histogram
+        sketch_k = dscfg.get('quantile_sketch', 0)
+        sketch = None
+        if sketch_k > 0:
+            sketch = QuantileSketch(k=sketch_k).update(field)
+
+        # keep histogram (or only the quantile sketch) in Memory or add to
+        # the existing one
         if dscfg['initialized'] == 0:
-            dscfg['global_data'] = {'hist_obj': radar_aux,
-                                    'timeinfo': start_time}
+            dscfg['global_data'] = {'starttime': start_time}
+            if sketch is None:
+                dscfg['global_data'].update({
+                    'accumulator': RadarAccumulator(
+                        radar_aux, {field_name: field_dict},
+                        dtype=np.int64)})
+            else:
+                dscfg['global_data'].update(
+                    {'sketch': QuantileSketch(k=sketch_k)})
             dscfg['initialized'] = 1
+        if sketch is None:
+            dscfg['global_data']['accumulator'].add(
+                radar_aux, {field_name: field_dict['data']})
         else:
-            field_interp = interpol_field(
-                dscfg['global_data']['hist_obj'], radar_aux, field_name,
-                fill_value=0)
-            dscfg['global_data']['hist_obj'].fields[field_name]['data'] += (
-                field_interp['data'].filled(fill_value=0)).astype('int64')
-
-        #    dscfg['global_data']['timeinfo'] = dscfg['timeinfo']
+            dscfg['global_data']['sketch'].merge(sketch)
 
         dataset = dict()
         dataset.update({'hist_obj': radar_aux})
         dataset.update({'hist_type': 'instant'})
         dataset.update({'timeinfo': start_time})
+        dataset.update({'sketch': sketch})
 
         return dataset, ind_rad
 
@@ -1075,9 +1094,17 @@ def process_monitoring(procstatus, dscfg, radar_list=None):
             break
         ind_rad = int(radarnr[5:8])-1
 
+        # with a quantile sketch the cumulative histogram is not kept
+        hist_obj = None
+        accumulator = dscfg['global_data'].get('accumulator', None)
+        if accumulator is not None:
+            hist_obj = accumulator.to_radar(
+                {field_name: np.ma.asarray(accumulator.sums[field_name])})
+
         dataset = dict()
-        dataset.update({'hist_obj': dscfg['global_data']['hist_obj']})
+        dataset.update({'hist_obj': hist_obj})
         dataset.update({'hist_type': 'cumulative'})
-        dataset.update({'timeinfo': dscfg['global_data']['timeinfo']})
+        dataset.update({'timeinfo': dscfg['global_data']['starttime']})
+        dataset.update({'sketch': dscfg['global_data'].get('sketch', None)})
 
         return dataset, ind_rad
@@ -0,0 +1,421 @@
+"""
+pyrad.proc.process_parallel
+===========================
+
+Functions to run a radar algorithm on independent blocks of a volume. The
+volume is partitioned in sweeps or in blocks of rays, the blocks are
+processed on a pool of worker processes or one after the other and the
+resultant fields are stitched back together.
+
+.. autosummary::
+    :toctree: generated/
+
+    get_partition_blocks
+    extract_ray_block
+    run_partitioned
+    run_chunked
+    _iter_block_outputs
+    _init_block_worker
+    _process_block
+    _get_ray_dict
+    _get_sweep_dict
+
+"""
+
+from warnings import warn
+import multiprocessing
+
+import numpy as np
+
+import pyart
+
+# state of the partitioned run in a worker process. It is set by the
+# initializer of the pool, whose arguments are inherited by the forked
+# worker processes so that the input volume is shared and not pickled. The
+# state of the parent process is never modified so that several runs can
+# take place at the same time in different threads
+_PARTITION_STATE = dict()
+
+
+def get_partition_blocks(radar, partition='sweep', nblocks=1):
+    """
+    Gets the ray limits of the blocks in which a volume is partitioned.
+    Blocks never span more than one sweep
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object containing the volume
+    partition : str
+        Partitioning type. Can be 'sweep', one block per sweep, 'ray', blocks
+        of contiguous rays, or 'volume', a single block
+    nblocks : int
+        The approximate number of blocks in which to split the volume when
+        partitioning in rays
+
+    Returns
+    -------
+    blocks : list of tuples
+        list with the first and last ray index of each block
+
+    """
+    if partition == 'volume':
+        return [(0, radar.nrays-1)]
+
+    sweep_blocks = list(zip(
+        radar.sweep_start_ray_index['data'],
+        radar.sweep_end_ray_index['data']))
+    if partition == 'sweep':
+        return [(int(start), int(end)) for start, end in sweep_blocks]
+
+    if partition != 'ray':
+        raise ValueError(
+            'Unknown partitioning type '+partition +
+            '. Valid types are sweep, ray or volume')
+
+    block_size = max(1, int(np.ceil(radar.nrays/max(1, nblocks))))
+    blocks = []
+    for start, end in sweep_blocks:
+        for block_start in range(start, end+1, block_size):
+            blocks.append(
+                (int(block_start), int(min(block_start+block_size-1, end))))
+    return blocks
+
+
+def extract_ray_block(radar, ray_start, ray_end):
+    """
+    Creates a radar object containing a block of contiguous rays of a single
+    sweep. The field data are views of the original data
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object containing the volume
+    ray_start, ray_end : int
+        The first and last ray index of the block
+
+    Returns
+    -------
+    radar_block : radar object
+        radar object containing the block
+
+    """
+    rays = slice(ray_start, ray_end+1)
+    ind_sweep = np.searchsorted(
+        radar.sweep_start_ray_index['data'], ray_start, side='right')-1
+    sweeps = slice(ind_sweep, ind_sweep+1)
+
+    fields = dict()
+    for field_name, field in radar.fields.items():
+        fields[field_name] = _get_ray_dict(field, rays)
+
+    instrument_parameters = None
+    if radar.instrument_parameters is not None:
+        instrument_parameters = dict()
+        for key, param in radar.instrument_parameters.items():
+            size = np.size(param['data'])
+            if size == radar.nrays and size > 1:
+                instrument_parameters[key] = _get_ray_dict(param, rays)
+            elif size == radar.nsweeps and size > 1:
+                instrument_parameters[key] = _get_sweep_dict(param, sweeps)
+            else:
+                instrument_parameters[key] = param
+
+    sweep_start_ray_index = pyart.config.get_metadata(
+        'sweep_start_ray_index')
+    sweep_start_ray_index['data'] = np.array([0], dtype='int32')
+    sweep_end_ray_index = pyart.config.get_metadata('sweep_end_ray_index')
+    sweep_end_ray_index['data'] = np.array(
+        [ray_end-ray_start], dtype='int32')
+
+    rays_are_indexed = None
+    if radar.rays_are_indexed is not None:
+        rays_are_indexed = _get_sweep_dict(radar.rays_are_indexed, sweeps)
+    ray_angle_res = None
+    if radar.ray_angle_res is not None:
+        ray_angle_res = _get_sweep_dict(radar.ray_angle_res, sweeps)
+
+    return pyart.core.Radar(
+        _get_ray_dict(radar.time, rays), radar.range, fields,
+        radar.metadata, radar.scan_type, radar.latitude, radar.longitude,
+        radar.altitude, _get_sweep_dict(radar.sweep_number, sweeps),
+        _get_sweep_dict(radar.sweep_mode, sweeps),
+        _get_sweep_dict(radar.fixed_angle, sweeps), sweep_start_ray_index,
+        sweep_end_ray_index, _get_ray_dict(radar.azimuth, rays),
+        _get_ray_dict(radar.elevation, rays),
+        rays_are_indexed=rays_are_indexed, ray_angle_res=ray_angle_res,
+        instrument_parameters=instrument_parameters)
+
+
+def run_partitioned(func, radar, partition='sweep', nprocesses=1, **kwargs):
+    """
+    Runs an algorithm on independent blocks of a radar volume and stitches
+    the resultant fields together. The blocks are processed on a pool of
+    forked worker processes which share the input volume with the parent
+    process. If only one process is requested, the partitioning type is
+    'volume' or the platform does not support forking the algorithm is run
+    on the whole volume in the current process
+
+    Parameters
+    ----------
+    func : function
+        The algorithm. It takes a radar object as first argument and returns
+        a field dictionary or a tuple of field dictionaries
+    radar : radar object
+        the radar object containing the volume
+    partition : str
+        Partitioning type declared by the algorithm. 'sweep' if the sweeps
+        can be processed independently, 'ray' if the rays can be processed
+        independently or 'volume' if the volume cannot be partitioned
+    nprocesses : int
+        Number of worker processes
+    kwargs : dict
+        keyword arguments passed to the algorithm
+
+    Returns
+    -------
+    output : dict or tuple of dicts
+        The output of the algorithm for the whole volume
+
+    """
+    if nprocesses <= 1 or partition == 'volume':
+        return func(radar, **kwargs)
+
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        warn('Parallel processing requires forking worker processes.' +
+             ' Processing the whole volume at once')
+        return func(radar, **kwargs)
+
+    blocks = get_partition_blocks(
+        radar, partition=partition, nblocks=4*nprocesses)
+    if len(blocks) == 1:
+        return func(radar, **kwargs)
+
+    block_outputs = list(
+        _iter_block_outputs(func, radar, blocks, nprocesses, kwargs))
+
+    is_tuple = isinstance(block_outputs[0], tuple)
+    if not is_tuple:
+        block_outputs = [(block_output, ) for block_output in block_outputs]
+
+    output = []
+    for ind_out, field in enumerate(block_outputs[0]):
+        if field is None:
+            output.append(None)
+            continue
+        data = np.ma.masked_all(
+            (radar.nrays, radar.ngates), dtype=field['data'].dtype)
+        for (ray_start, ray_end), block_output in zip(blocks, block_outputs):
+            data[ray_start:ray_end+1, :] = block_output[ind_out]['data']
+        field_out = dict(field)
+        field_out['data'] = data
+        output.append(field_out)
+
+    if is_tuple:
+        return tuple(output)
+    return output[0]
+
+
+def run_chunked(func, radar, partition='sweep', nprocesses=1, nblocks=None,
+                dtypes=None, **kwargs):
+    """
+    Runs an algorithm block by block and writes the resultant fields into
+    preallocated arrays as the blocks are completed. Contrary to
+    run_partitioned the volume is partitioned also when a single process is
+    used so that the memory used by the intermediate results of the
+    algorithm is limited to one block
+
+    Parameters
+    ----------
+    func : function
+        The algorithm. It takes a radar object as first argument and returns
+        a field dictionary or a dictionary of field dictionaries
+    radar : radar object
+        the radar object containing the volume
+    partition : str
+        Partitioning type. 'sweep', 'ray' or 'volume'
+    nprocesses : int
+        Number of worker processes. If 1 the blocks are processed in the
+        current process
+    nblocks : int or None
+        The approximate number of blocks when partitioning in rays. If None
+        4 blocks per process are used
+    dtypes : dict or None
+        data type of the output of each field. The keys are the keys of the
+        output dictionary. If not specified the data type of the algorithm
+        output is used
+    kwargs : dict
+        keyword arguments passed to the algorithm
+
+    Returns
+    -------
+    output : dict
+        The output of the algorithm for the whole volume
+
+    """
+    if dtypes is None:
+        dtypes = dict()
+    if nblocks is None:
+        nblocks = 4*max(1, nprocesses)
+
+    blocks = get_partition_blocks(radar, partition=partition, nblocks=nblocks)
+
+    is_field = False
+    output = None
+    for (ray_start, ray_end), block_output in zip(blocks, _iter_block_outputs(
+            func, radar, blocks, nprocesses, kwargs)):
+        if output is None:
+            is_field = 'data' in block_output
+            if is_field:
+                block_output = {'data': block_output}
+            output = dict()
+            for key, field in block_output.items():
+                if field is None:
+                    output[key] = None
+                    continue
+                output[key] = dict(field)
+                output[key]['data'] = np.ma.masked_all(
+                    (radar.nrays, radar.ngates),
+                    dtype=dtypes.get(key, field['data'].dtype))
+        elif is_field:
+            block_output = {'data': block_output}
+
+        for key, field in block_output.items():
+            if output[key] is not None:
+                output[key]['data'][ray_start:ray_end+1, :] = field['data']
+
+    if is_field:
+        return output['data']
+    return output
+
+
+def _iter_block_outputs(func, radar, blocks, nprocesses, kwargs):
+    """
+    Runs an algorithm on the blocks of a volume and yields the output of
+    each block in order. If more than one process is requested and the
+    platform supports it the blocks are processed on a pool of forked worker
+    processes. Otherwise they are processed one after the other in the
+    current process
+
+    Parameters
+    ----------
+    func : function
+        The algorithm
+    radar : radar object
+        the radar object containing the volume
+    blocks : list of tuples
+        list with the first and last ray index of each block
+    nprocesses : int
+        Number of worker processes
+    kwargs : dict
+        keyword arguments passed to the algorithm
+
+    Returns
+    -------
+    block_output : generator
+        the output of the algorithm for each block
+
+    """
+    if (nprocesses <= 1 or len(blocks) == 1 or
+            'fork' not in multiprocessing.get_all_start_methods()):
+        for ray_start, ray_end in blocks:
+            yield func(extract_ray_block(radar, ray_start, ray_end), **kwargs)
+        return
+
+    ctx = multiprocessing.get_context('fork')
+    with ctx.Pool(processes=min(nprocesses, len(blocks)),
+                  initializer=_init_block_worker,
+                  initargs=(func, radar, blocks, kwargs)) as pool:
+        for block_output in pool.imap(_process_block, range(len(blocks))):
+            yield block_output
+
+
+def _init_block_worker(func, radar, blocks, kwargs):
+    """
+    Sets the state of the partitioned run in a worker process
+
+    Parameters
+    ----------
+    func : function
+        The algorithm
+    radar : radar object
+        the radar object containing the volume
+    blocks : list of tuples
+        list with the first and last ray index of each block
+    kwargs : dict
+        keyword arguments passed to the algorithm
+
+    """
+    _PARTITION_STATE.update({
+        'func': func,
+        'radar': radar,
+        'blocks': blocks,
+        'kwargs': kwargs})
+
+
+def _process_block(ind_block):
+    """
+    Runs the algorithm of the partitioned run of the worker process on one
+    block. Executed by the worker processes
+
+    Parameters
+    ----------
+    ind_block : int
+        index of the block to process
+
+    Returns
+    -------
+    output : dict or tuple of dicts
+        The output of the algorithm for the block
+
+    """
+    ray_start, ray_end = _PARTITION_STATE['blocks'][ind_block]
+    radar_block = extract_ray_block(
+        _PARTITION_STATE['radar'], ray_start, ray_end)
+
+    return _PARTITION_STATE['func'](
+        radar_block, **_PARTITION_STATE['kwargs'])
+
+
+def _get_ray_dict(dic, rays):
+    """
+    Copies a metadata dictionary keeping only the data of the selected rays
+
+    Parameters
+    ----------
+    dic : dict
+        the dictionary
+    rays : slice
+        the selected rays
+
+    Returns
+    -------
+    dic_out : dict
+        the dictionary with the selected data
+
+    """
+    dic_out = dict(dic)
+    dic_out['data'] = dic['data'][rays]
+    return dic_out
+
+
+def _get_sweep_dict(dic, sweeps):
+    """
+    Copies a metadata dictionary keeping only the data of the selected sweeps
+
+    Parameters
+    ----------
+    dic : dict
+        the dictionary
+    sweeps : slice
+        the selected sweeps
+
+    Returns
+    -------
+    dic_out : dict
+        the dictionary with the selected data
+
+    """
+    dic_out = dict(dic)
+    dic_out['data'] = dic['data'][sweeps]
+    return dic_out
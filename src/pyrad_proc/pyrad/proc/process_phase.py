@@ -30,6 +30,7 @@ import numpy as np
 import pyart
 
 from ..io.io_aux import get_datatype_fields
+from .process_parallel import run_partitioned
 
 
 def process_correct_phidp0(procstatus, dscfg, radar_list=None):
@@ -339,6 +340,9 @@ def process_phidp_kdp_Maesaka(procstatus, dscfg, radar_list=None):
             The freezing level height [m]. Default 2000.
         ml_thickness : float. Dataset keyword
             The melting layer thickness in meters. Default 700.
+        nprocesses : int. Dataset keyword
+            number of processes used to process the volume in parallel.
+            The volume is partitioned in sweeps. Default 1
     radar_list : list of Radar objects
         Optional. list of radar objects
 
@@ -458,11 +462,12 @@ def process_phidp_kdp_Maesaka(procstatus, dscfg, radar_list=None):
     radar_aux.add_field(phidp_field, phidp, replace_existing=True)
 
     # the return data is not a masked array
-    kdp, phidpf, _ = pyart.retrieve.kdp_proc.kdp_maesaka(
-        radar_aux, gatefilter=None, method='cg', backscatter=None, Clpf=1.,
-        length_scale=None, first_guess=0.01, finite_order='low',
-        fill_value=fill_value, psidp_field=phidp_field, kdp_field=kdp_field,
-        phidp_field=phidp_field)
+    kdp, phidpf, _ = run_partitioned(
+        pyart.retrieve.kdp_proc.kdp_maesaka, radar_aux, partition='sweep',
+        nprocesses=dscfg.get('nprocesses', 1), gatefilter=None, method='cg',
+        backscatter=None, Clpf=1., length_scale=None, first_guess=0.01,
+        finite_order='low', fill_value=fill_value, psidp_field=phidp_field,
+        kdp_field=kdp_field, phidp_field=phidp_field)
 
     kdp['data'] = np.ma.masked_where(mask, kdp['data'])
     phidpf['data'] = np.ma.masked_where(mask, phidpf['data'])
@@ -495,6 +500,9 @@ def process_phidp_kdp_lp(procstatus, dscfg, radar_list=None):
             The freezing level height [m]. Default 2000.
         ml_thickness : float. Dataset keyword
             The melting layer thickness in meters. Default 700.
+        nprocesses : int. Dataset keyword
+            number of processes used to process the volume in parallel.
+            The volume is partitioned in blocks of rays. Default 1
     radar_list : list of Radar objects
         Optional. list of radar objects
 
@@ -612,10 +620,11 @@ def process_phidp_kdp_lp(procstatus, dscfg, radar_list=None):
     phidp_field = 'corrected_differential_phase'
     kdp_field = 'corrected_specific_differential_phase'
 
-    phidp, kdp = pyart.correct.phase_proc_lp(
-        radar_aux, 0, debug=False, self_const=60000.0,
-        low_z=10.0, high_z=53.0, min_phidp=0.01, min_ncp=10.,
-        min_rhv=0.6, fzl=4000.0, sys_phase=0.0,
+    phidp, kdp = run_partitioned(
+        pyart.correct.phase_proc_lp, radar_aux, partition='ray',
+        nprocesses=dscfg.get('nprocesses', 1), offset=0, debug=False,
+        self_const=60000.0, low_z=10.0, high_z=53.0, min_phidp=0.01,
+        min_ncp=10., min_rhv=0.6, fzl=4000.0, sys_phase=0.0,
         overide_sys_phase=True, nowrap=None, really_verbose=False,
         LP_solver=LP_solver, refl_field=refl_field, ncp_field=snr_field,
         rhv_field=rhv_field, phidp_field=psidp_field, kdp_field=kdp_field,
@@ -811,6 +820,10 @@ def process_phidp_kdp_Vulpiani(procstatus, dscfg, radar_list=None):
             values
         parallel : boolean. Dataset keyword
             if set use parallel computing
+        nprocesses : int. Dataset keyword
+            number of processes used to process the volume in parallel.
+            The volume is partitioned in blocks of rays. If larger than 1
+            parallel is not used. Default 1
         get_phidp : boolean. Datset keyword
             if set the PhiDP computed by integrating the resultant KDP is
             added to the radar field
@@ -893,11 +906,18 @@ def process_phidp_kdp_Vulpiani(procstatus, dscfg, radar_list=None):
     kdp_field = 'corrected_specific_differential_phase'
     phidpr_field = 'corrected_differential_phase'
 
-    kdp_dict, phidpr_dict = pyart.retrieve.kdp_vulpiani(
-        radar, gatefilter=None, fill_value=None, psidp_field=phidp_field,
-        kdp_field=kdp_field, phidp_field=phidpr_field, band=band,
-        windsize=wind_len, n_iter=n_iter, interp=interp,
-        prefilter_psidp=False, filter_opt=None, parallel=parallel)
+    # parallel processing of blocks of the volume?
+    nprocesses = dscfg.get('nprocesses', 1)
+    if nprocesses > 1:
+        parallel = 0
+
+    kdp_dict, phidpr_dict = run_partitioned(
+        pyart.retrieve.kdp_vulpiani, radar, partition='ray',
+        nprocesses=nprocesses, gatefilter=None, fill_value=None,
+        psidp_field=phidp_field, kdp_field=kdp_field,
+        phidp_field=phidpr_field, band=band, windsize=wind_len,
+        n_iter=n_iter, interp=interp, prefilter_psidp=False, filter_opt=None,
+        parallel=parallel)
 
     # prepare for exit
     new_dataset = {'radar_out': deepcopy(radar)}
@@ -927,6 +947,10 @@ def process_phidp_kdp_Kalman(procstatus, dscfg, radar_list=None):
             The input data types
         parallel : boolean. Dataset keyword
             if set use parallel computing
+        nprocesses : int. Dataset keyword
+            number of processes used to process the volume in parallel.
+            The volume is partitioned in blocks of rays. If larger than 1
+            parallel is not used. Default 1
         get_phidp : boolean. Datset keyword
             if set the PhiDP computed by integrating the resultant KDP is
             added to the radar field
@@ -967,6 +991,9 @@ def process_phidp_kdp_Kalman(procstatus, dscfg, radar_list=None):
     # User defined options
     parallel = dscfg.get('parallel', 1)
     get_phidp = dscfg.get('get_phidp', 0)
+    nprocesses = dscfg.get('nprocesses', 1)
+    if nprocesses > 1:
+        parallel = 0
 
     # get band from radar object metadata
     band = 'C'
@@ -987,9 +1014,11 @@ def process_phidp_kdp_Kalman(procstatus, dscfg, radar_list=None):
     kdp_field = 'corrected_specific_differential_phase'
     phidpr_field = 'corrected_differential_phase'
 
-    kdp_dict, _, phidpr_dict = pyart.retrieve.kdp_schneebeli(
-        radar, gatefilter=None, fill_value=None, psidp_field=phidp_field,
-        kdp_field=kdp_field, phidp_field=phidpr_field, band=band, rcov=0,
+    kdp_dict, _, phidpr_dict = run_partitioned(
+        pyart.retrieve.kdp_schneebeli, radar, partition='ray',
+        nprocesses=nprocesses, gatefilter=None, fill_value=None,
+        psidp_field=phidp_field, kdp_field=kdp_field,
+        phidp_field=phidpr_field, band=band, rcov=0,
         pcov=0, prefilter_psidp=False, filter_opt=None, parallel=parallel)
 
     # prepare for exit
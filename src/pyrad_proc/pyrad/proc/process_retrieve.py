@@ -15,7 +15,9 @@ Functions for retrieving new moments and products
     process_l
     process_cdr
     process_rainrate
+    process_rainfall_accumulation
     process_bird_density
+    _get_rainfall_accumulation_radar
 
 
 """
@@ -23,9 +25,18 @@ Functions for retrieving new moments and products
 from copy import deepcopy
 from warnings import warn
 
+import numpy as np
+
 import pyart
 
 from ..io.io_aux import get_datatype_fields, get_fieldname_pyart
+from ..util.radar_utils import get_geometry_key
+from ..util.accumulator import get_regrid_map
+from ..util.rainfall_accumulator import RainfallAccumulator
+from ..util.dtype_utils import get_float_dtype
+
+# maximum number of regridding maps kept by each rainfall accumulation
+_REGRID_MAPS_SIZE = 10
 
 
 def process_signal_power(procstatus, dscfg, radar_list=None):
@@ -922,6 +933,133 @@ def process_rainrate(procstatus, dscfg, radar_list=None):
     return new_dataset, ind_rad
 
 
+def process_rainfall_accumulation(procstatus, dscfg, radar_list=None):
+    """
+    Integrates the rainfall rate in time at each gate. The rain accumulated
+    in each update period is kept in memory so that the accumulation over
+    the last period is obtained without reprocessing past volumes
+
+    Parameters
+    ----------
+    procstatus : int
+        Processing status: 0 initializing, 1 processing volume,
+        2 post-processing
+    dscfg : dictionary of dictionaries
+        data set configuration. Accepted Configuration Keywords::
+
+        datatype : string. Dataset keyword
+            The input data type. Must be RR
+        period : float. Dataset keyword
+            the accumulation period [s]. Default 3600.
+        update_period : float. Dataset keyword
+            the period at which the accumulation is produced [s]. The
+            accumulation period is rounded to a multiple of it. If shorter
+            than the accumulation period rolling accumulations are produced.
+            Default the accumulation period
+        start_average : float. Dataset keyword
+            start of the first update period of the day [s from midnight
+            UTC]. Default 0.
+        max_gap : float. Dataset keyword
+            maximum time between consecutive volumes [s]. The rain fallen
+            during longer gaps is not accumulated. Default 900.
+        min_coverage : float. Dataset keyword
+            minimum fraction of the accumulation period with valid rainfall
+            rate. Gates with less coverage are masked. Default 0.
+    radar_list : list of Radar objects
+        Optional. list of radar objects
+
+    Returns
+    -------
+    new_dataset : dict
+        dictionary containing the output
+    ind_rad : int
+        radar index
+
+    """
+    for datatypedescr in dscfg['datatype']:
+        radarnr, _, datatype, _, _ = get_datatype_fields(datatypedescr)
+        field_name = get_fieldname_pyart(datatype)
+        break
+    ind_rad = int(radarnr[5:8])-1
+
+    period = dscfg.get('period', 3600.)
+    min_coverage = dscfg.get('min_coverage', 0.)
+
+    if procstatus == 0:
+        return None, None
+
+    if procstatus == 1:
+        if radar_list[ind_rad] is None:
+            warn('No valid radar')
+            return None, None
+        radar = radar_list[ind_rad]
+
+        if field_name not in radar.fields:
+            warn('Unable to compute rainfall accumulation. Missing field ' +
+                 field_name)
+            return None, None
+
+        # first volume: the reference geometry is the one of the volume
+        if dscfg['initialized'] == 0:
+            update_period = dscfg.get('update_period', period)
+            accumulator = RainfallAccumulator(
+                (radar.nrays, radar.ngates), partial_period=update_period,
+                nbins=max(1, int(round(period/update_period))),
+                base_time=dscfg.get('start_average', 0.),
+                max_gap=dscfg.get('max_gap', 900.),
+                dtype=get_float_dtype(dscfg.get('compactdtype', 0)))
+            radar_ref = deepcopy(radar)
+            radar_ref.fields = dict()
+            dscfg['global_data'] = {
+                'accumulator': accumulator,
+                'radar': radar_ref,
+                'geometry_key': get_geometry_key(radar),
+                'regrid_maps': dict(),
+                'timeinfo': dscfg['timeinfo']}
+            dscfg['initialized'] = 1
+
+        global_data = dscfg['global_data']
+        global_data['timeinfo'] = dscfg['timeinfo']
+
+        rate = radar.fields[field_name]['data']
+        key = get_geometry_key(radar)
+        if key != global_data['geometry_key']:
+            radar_ref = global_data['radar']
+            regrid_maps = global_data['regrid_maps']
+            if key not in regrid_maps:
+                if len(regrid_maps) >= _REGRID_MAPS_SIZE:
+                    regrid_maps.pop(next(iter(regrid_maps)))
+                regrid_maps.update({key: get_regrid_map(radar_ref, radar)})
+            inds_dest, inds_orig = regrid_maps[key]
+            rate_ref = np.ma.masked_all((radar_ref.nrays, radar_ref.ngates))
+            rate_ref[inds_dest] = rate[inds_orig]
+            rate = rate_ref
+
+        closed_bins = global_data['accumulator'].add(dscfg['timeinfo'], rate)
+        if not closed_bins:
+            return None, None
+
+        new_dataset = {
+            'radar_out': _get_rainfall_accumulation_radar(
+                global_data, period, min_coverage=min_coverage),
+            'timeinfo': closed_bins[-1]}
+
+        return new_dataset, ind_rad
+
+    # no more files to process: accumulation up to the last volume
+    if procstatus == 2:
+        if dscfg['initialized'] == 0:
+            return None, None
+
+        new_dataset = {
+            'radar_out': _get_rainfall_accumulation_radar(
+                dscfg['global_data'], period, min_coverage=min_coverage,
+                include_current=True),
+            'timeinfo': dscfg['global_data']['timeinfo']}
+
+        return new_dataset, ind_rad
+
+
 def process_bird_density(procstatus, dscfg, radar_list=None):
     """
     Computes the bird density from the volumetric reflectivity
@@ -980,3 +1118,43 @@ def process_bird_density(procstatus, dscfg, radar_list=None):
     new_dataset['radar_out'].add_field('bird_density', bird_density_dict)
 
     return new_dataset, ind_rad
+
+
+def _get_rainfall_accumulation_radar(global_data, period, min_coverage=0.,
+                                     include_current=False):
+    """
+    Creates a radar object with the rainfall accumulation over the last
+    period
+
+    Parameters
+    ----------
+    global_data : dict
+        the rainfall accumulation dataset global data
+    period : float
+        the accumulation period [s]
+    min_coverage : float
+        minimum fraction of the period with valid rainfall rate
+    include_current : bool
+        If True the accumulation includes the current, incomplete, update
+        period
+
+    Returns
+    -------
+    radar : radar object
+        radar object with the rainfall accumulation and the number of
+        samples
+
+    """
+    accumulation, npoints = global_data['accumulator'].get_accumulation(
+        period, min_coverage=min_coverage, include_current=include_current)
+
+    accu_dict = pyart.config.get_metadata('rainfall_accumulation')
+    accu_dict['data'] = accumulation
+    npoints_dict = pyart.config.get_metadata('number_of_samples')
+    npoints_dict['data'] = np.ma.asarray(npoints)
+
+    radar = deepcopy(global_data['radar'])
+    radar.add_field('rainfall_accumulation', accu_dict)
+    radar.add_field('number_of_samples', npoints_dict)
+
+    return radar
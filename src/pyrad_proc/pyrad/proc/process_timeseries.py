@@ -8,6 +8,7 @@ Functions to obtain time series of radar data
     :toctree: generated/
 
     process_point_measurement
+    process_multi_point_measurement
     process_qvp
     process_rqvp
     process_evp
@@ -22,6 +23,8 @@ from netCDF4 import num2date
 import pyart
 
 from ..io.io_aux import get_datatype_fields, get_fieldname_pyart
+from ..io.read_data_sensor import read_station_table
+from ..util.radar_utils import get_geometry_key
 
 
 def process_point_measurement(procstatus, dscfg, radar_list=None):
@@ -210,6 +213,183 @@ def process_point_measurement(procstatus, dscfg, radar_list=None):
     return new_dataset, ind_rad
 
 
+def process_multi_point_measurement(procstatus, dscfg, radar_list=None):
+    """
+    Obtains the radar data at multiple point locations, e.g. the stations
+    of a sensor network. The gates corresponding to each station are
+    determined only once per scan geometry and the data of all fields is
+    extracted with a single gather per field and volume.
+
+    Parameters
+    ----------
+    procstatus : int
+        Processing status: 0 initializing, 1 processing volume,
+        2 post-processing
+    dscfg : dictionary of dictionaries
+        data set configuration. Accepted Configuration Keywords::
+
+        datatype : list of string. Dataset keyword
+            The data types to extract
+        stationfile : str. Dataset keyword
+            csv file containing the station table with columns StationID,
+            Longitude, Latitude and Altitude. If not specified the stations
+            are defined by the keywords station_id, lon, lat and alt
+        station_id : list of str. Dataset keyword
+            the station identifiers
+        lon, lat : list of floats. Dataset keyword
+            the station longitude and latitude [deg]
+        alt : list of floats. Dataset keyword
+            the station altitude [m MSL]
+        truealt : boolean. Dataset keyword
+            if True the station altitude is used to determine the gate of
+            interest. If False use the altitude at a given radar elevation
+            ele over the station. Default True
+        ele : float. Dataset keyword
+            radar elevation [deg]. Used when truealt is False
+        AziTol : float. Dataset keyword
+            azimuthal tolerance to determine which radar azimuth to use
+            [deg]. Default 0.5
+        EleTol : float. Dataset keyword
+            elevation tolerance to determine which radar elevation to use
+            [deg]. Default 0.5
+        RngTol : float. Dataset keyword
+            range tolerance to determine which radar bin to use [m].
+            Default 50.
+        nrays_avg, ngates_avg : int. Dataset keyword
+            number of rays and range gates at each side of the station gate
+            used to average the data. The neighbourhood is limited to the
+            sweep and range of the station gate. Default 0
+        avg_type : str. Dataset keyword
+            The type of averaging to perform. Can be either "mean" or
+            "median". Default "mean"
+
+    radar_list : list of Radar objects
+          Optional. list of radar objects
+
+    Returns
+    -------
+    new_dataset : dict
+        dictionary containing the data and metadata at the stations
+    ind_rad : int
+        radar index
+
+    """
+    if procstatus == 0:
+        return None, None
+
+    field_names = []
+    datatypes = []
+    for datatypedescr in dscfg['datatype']:
+        radarnr, _, datatype, _, _ = get_datatype_fields(datatypedescr)
+        field_names.append(get_fieldname_pyart(datatype))
+        datatypes.append(datatype)
+    ind_rad = int(radarnr[5:8])-1
+
+    if procstatus == 2:
+        if dscfg['initialized'] == 0:
+            return None, None
+
+        # prepare for exit
+        new_dataset = {
+            'station_id': dscfg['global_data']['station_id'],
+            'datatypes': datatypes,
+            'final': True}
+
+        return new_dataset, ind_rad
+
+    if (radar_list is None) or (radar_list[ind_rad] is None):
+        warn('ERROR: No valid radar')
+        return None, None
+    radar = radar_list[ind_rad]
+
+    # initialize dataset
+    if dscfg['initialized'] == 0:
+        if 'stationfile' in dscfg:
+            station_id, lon, lat, alt = read_station_table(
+                dscfg['stationfile'])
+            if station_id is None:
+                return None, None
+        else:
+            if 'lon' not in dscfg or 'lat' not in dscfg:
+                warn('Undefined stations')
+                return None, None
+            lon = np.asarray(dscfg['lon'], dtype=float)
+            lat = np.asarray(dscfg['lat'], dtype=float)
+            alt = np.asarray(dscfg.get('alt', np.zeros(lon.size)))
+            station_id = np.asarray(dscfg.get(
+                'station_id', [str(ind) for ind in range(lon.size)]))
+
+        dscfg['global_data'] = {
+            'station_id': station_id,
+            'point_coordinates_WGS84_lon_lat_alt': np.stack(
+                (lon, lat, alt), axis=-1),
+            'geometry_key': None}
+        dscfg['initialized'] = 1
+
+    # the station gates are determined only when the scan geometry changes
+    global_data = dscfg['global_data']
+    geometry_key = get_geometry_key(radar)
+    if global_data['geometry_key'] != geometry_key:
+        global_data.update(_get_station_gates(
+            radar, global_data['point_coordinates_WGS84_lon_lat_alt'],
+            truealt=dscfg.get('truealt', True), ele=dscfg.get('ele', 0.),
+            azi_tol=dscfg.get('AziTol', 0.5),
+            ele_tol=dscfg.get('EleTol', 0.5),
+            rng_tol=dscfg.get('RngTol', 50.),
+            nrays_avg=dscfg.get('nrays_avg', 0),
+            ngates_avg=dscfg.get('ngates_avg', 0)))
+        global_data['geometry_key'] = geometry_key
+
+    if not global_data['valid'].any():
+        warn('No radar bin found for any station')
+        return None, None
+
+    # the missing fields are masked so that all volumes have the same
+    # data types
+    avg_type = dscfg.get('avg_type', 'mean')
+    values = dict()
+    for field_name, datatype in zip(field_names, datatypes):
+        if field_name not in radar.fields:
+            warn('Unable to extract point measurement information. ' +
+                 'Field '+field_name+' not available')
+            values.update({datatype: np.ma.masked_all(
+                global_data['valid'].size)})
+            continue
+
+        data = radar.fields[field_name]['data'][
+            global_data['inds_ray'], global_data['inds_rng']]
+        if avg_type == 'median':
+            val = np.ma.median(data, axis=-1)
+        else:
+            val = np.ma.mean(data, axis=-1)
+        val = np.ma.masked_where(~global_data['valid'], val)
+        values.update({datatype: val})
+
+    if all(field_name not in radar.fields for field_name in field_names):
+        return None, None
+
+    time = num2date(
+        radar.time['data'][global_data['ind_ray']], radar.time['units'],
+        radar.time['calendar'])
+
+    # prepare for exit
+    new_dataset = {
+        'station_id': global_data['station_id'],
+        'datatypes': datatypes,
+        'values': values,
+        'time': time,
+        'valid': global_data['valid'],
+        'point_coordinates_WGS84_lon_lat_alt': (
+            global_data['point_coordinates_WGS84_lon_lat_alt']),
+        'antenna_coordinates_az_el_r': (
+            global_data['antenna_coordinates_az_el_r']),
+        'used_antenna_coordinates_az_el_r': (
+            global_data['used_antenna_coordinates_az_el_r']),
+        'final': False}
+
+    return new_dataset, ind_rad
+
+
 def process_qvp(procstatus, dscfg, radar_list=None):
     """
     Computes quasi vertical profiles, by averaging over height levels
@@ -937,3 +1117,103 @@ def process_time_height(procstatus, dscfg, radar_list=None):
         new_dataset.update({'start_time': dscfg['global_data']['start_time']})
 
         return new_dataset, ind_rad
+
+
+def _get_station_gates(radar, point_coordinates, truealt=True, ele=0.,
+                       azi_tol=0.5, ele_tol=0.5, rng_tol=50., nrays_avg=0,
+                       ngates_avg=0):
+    """
+    Finds the radar gates corresponding to a set of stations
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object
+    point_coordinates : 2D float array
+        the longitude, latitude and altitude of each station
+    truealt : boolean
+        if True the station altitude is used to determine the gate.
+        Otherwise the altitude at elevation ele over the station
+    ele : float
+        the radar elevation [deg]. Used when truealt is False
+    azi_tol, ele_tol, rng_tol : float
+        the azimuth, elevation [deg] and range [m] tolerances
+    nrays_avg, ngates_avg : int
+        number of rays and range gates at each side of the station gate to
+        use in the average
+
+    Returns
+    -------
+    station_gates : dict
+        dictionary containing the nominal and used antenna coordinates of
+        each station, the index of the closest ray, the ray and range
+        indices of the gates of the neighbourhood of each station and
+        whether a gate has been found within the tolerances
+
+    """
+    lon = point_coordinates[:, 0]
+    lat = point_coordinates[:, 1]
+
+    projparams = dict()
+    projparams.update({'proj': 'pyart_aeqd'})
+    projparams.update({'lon_0': radar.longitude['data']})
+    projparams.update({'lat_0': radar.latitude['data']})
+    x, y = pyart.core.geographic_to_cartesian(lon, lat, projparams)
+
+    if not truealt:
+        ke = 4./3.  # constant for effective radius
+        a = 6378100.  # earth radius
+        re = a * ke  # effective radius
+
+        elrad = ele * np.pi / 180.
+        r_ground = np.sqrt(x ** 2. + y ** 2.)
+        r = r_ground / np.cos(elrad)
+        alt = radar.altitude['data'][0]+np.sqrt(
+            r ** 2. + re ** 2. + 2. * r * re * np.sin(elrad)) - re
+    else:
+        alt = point_coordinates[:, 2]
+
+    r, az, el = pyart.core.cartesian_to_antenna(
+        x, y, alt-radar.altitude['data'][0])
+
+    # closest ray and range gate of each station
+    d_az = np.abs(np.mod(
+        radar.azimuth['data'][np.newaxis, :]-az[:, np.newaxis]+180.,
+        360.)-180.)
+    d_el = np.abs(
+        radar.elevation['data'][np.newaxis, :]-el[:, np.newaxis])
+    ind_ray = np.argmin(d_az+d_el, axis=-1)
+    ind_rng = np.argmin(np.abs(
+        radar.range['data'][np.newaxis, :]-r[:, np.newaxis]), axis=-1)
+
+    ind_station = np.arange(az.size)
+    valid = np.logical_and.reduce((
+        d_az[ind_station, ind_ray] <= azi_tol,
+        d_el[ind_station, ind_ray] <= ele_tol,
+        np.abs(radar.range['data'][ind_rng]-r) <= rng_tol))
+    if not valid.all():
+        warn(str(np.count_nonzero(~valid))+' stations out of ' +
+             str(valid.size)+' without radar bin within tolerance')
+
+    # neighbourhood of each station gate
+    ind_sweep = np.searchsorted(
+        radar.sweep_start_ray_index['data'], ind_ray, side='right')-1
+    inds_ray = np.clip(
+        ind_ray[:, np.newaxis]+np.arange(-nrays_avg, nrays_avg+1),
+        radar.sweep_start_ray_index['data'][ind_sweep][:, np.newaxis],
+        radar.sweep_end_ray_index['data'][ind_sweep][:, np.newaxis])
+    inds_rng = np.clip(
+        ind_rng[:, np.newaxis]+np.arange(-ngates_avg, ngates_avg+1), 0,
+        radar.ngates-1)
+    inds_ray = np.repeat(inds_ray, inds_rng.shape[1], axis=-1)
+    inds_rng = np.tile(inds_rng, (1, 2*nrays_avg+1))
+
+    return {
+        'antenna_coordinates_az_el_r': np.stack((az, el, r), axis=-1),
+        'used_antenna_coordinates_az_el_r': np.stack((
+            radar.azimuth['data'][ind_ray], radar.elevation['data'][ind_ray],
+            radar.range['data'][ind_rng]), axis=-1),
+        'ind_ray': ind_ray,
+        'inds_ray': inds_ray,
+        'inds_rng': inds_rng,
+        'valid': valid}
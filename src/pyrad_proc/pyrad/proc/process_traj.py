@@ -31,7 +31,7 @@ from netCDF4 import num2date, date2num
 
 from pyart.config import get_metadata
 from pyart.core import Radar
-from pyart.util import colocated_gates, intersection
+from pyart.util import colocated_gates, intersection, cross_section_rhi
 
 from ..io.io_aux import get_datatype_fields, get_fieldname_pyart
 from ..io.io_aux import get_field_unit, get_field_name
@@ -39,7 +39,8 @@ from ..io.timeseries import TimeSeries
 from ..io.read_data_other import read_antenna_pattern
 
 from ..util.stat_utils import quantiles_weighted
-from ..util.radar_utils import belongs_roi_indices, find_nearest_gate
+from ..util.radar_utils import find_roi_gates, find_gates_in_bbox
+from ..util.radar_utils import get_roi_radar, get_target_elevations
 
 
 def process_trajectory(procstatus, dscfg, radar_list=None, trajectory=None):
@@ -141,15 +142,12 @@ def process_traj_trt(procstatus, dscfg, radar_list=None, trajectory=None):
         warn('ERROR: No valid radar found')
         return None, None
 
-    # keep locally only field of interest in radar object
-    radar = deepcopy(radar_list[ind_rad])
-    radar.fields = dict()
+    radar = radar_list[ind_rad]
     nfields_available = 0
     for field_name in field_names:
-        if field_name not in radar_list[ind_rad].fields:
+        if field_name not in radar.fields:
             warn("Datatype '%s' not available in radar data" % field_name)
             continue
-        radar.add_field(field_name, radar_list[ind_rad].fields[field_name])
         nfields_available += 1
 
     if nfields_available == 0:
@@ -172,64 +170,7 @@ def process_traj_trt(procstatus, dscfg, radar_list=None, trajectory=None):
         return None, None
 
     # prepare new radar object output
-    radar_roi = deepcopy(radar)
-
-    radar_roi.range['data'] = radar.range['data'][inds_rng]
-    radar_roi.ngates = inds_rng.size
-    radar_roi.time['data'] = np.asarray([radar_roi.time['data'][0]])
-    radar_roi.scan_type = 'roi'
-    radar_roi.sweep_mode['data'] = np.array(['roi'])
-    radar_roi.sweep_start_ray_index['data'] = np.array([0], dtype='int32')
-    radar_roi.fixed_angle['data'] = np.array([], dtype='float64')
-    radar_roi.sweep_number['data'] = np.array([0], dtype='int32')
-    radar_roi.nsweeps = 1
-
-    if radar.rays_are_indexed is not None:
-        radar_roi.rays_are_indexed['data'] = np.array(
-            [radar.rays_are_indexed['data'][0]])
-    if radar.ray_angle_res is not None:
-        radar_roi.ray_angle_res['data'] = np.array(
-            [radar.ray_angle_res['data'][0]])
-
-    radar_roi.sweep_end_ray_index['data'] = np.array([1], dtype='int32')
-    radar_roi.rays_per_sweep = np.array([1], dtype='int32')
-    radar_roi.azimuth['data'] = np.array([], dtype='float64')
-    radar_roi.elevation['data'] = np.array([], dtype='float64')
-    radar_roi.nrays = 1
-
-    radar_roi.gate_longitude['data'] = np.empty(
-        (radar_roi.nrays, radar_roi.ngates), dtype=float)
-    radar_roi.gate_latitude['data'] = np.empty(
-        (radar_roi.nrays, radar_roi.ngates), dtype=float)
-    radar_roi.gate_altitude['data'] = np.empty(
-        (radar_roi.nrays, radar_roi.ngates), dtype=float)
-
-    radar_roi.gate_x['data'] = np.empty(
-        (radar_roi.nrays, radar_roi.ngates), dtype=float)
-    radar_roi.gate_y['data'] = np.empty(
-        (radar_roi.nrays, radar_roi.ngates), dtype=float)
-    radar_roi.gate_z['data'] = np.empty(
-        (radar_roi.nrays, radar_roi.ngates), dtype=float)
-
-    radar_roi.gate_longitude['data'][0, :] = lon
-    radar_roi.gate_latitude['data'][0, :] = lat
-    radar_roi.gate_altitude['data'][0, :] = alt
-
-    radar_roi.gate_x['data'][0, :] = radar.gate_x['data'][inds_ray, inds_rng]
-    radar_roi.gate_y['data'][0, :] = radar.gate_y['data'][inds_ray, inds_rng]
-    radar_roi.gate_z['data'][0, :] = radar.gate_z['data'][inds_ray, inds_rng]
-
-    radar_roi.fields = dict()
-    for field_name in field_names:
-        if field_name not in radar.fields:
-            warn("Datatype '%s' not available in radar data" % field_name)
-            continue
-
-        field_dict = deepcopy(radar.fields[field_name])
-        field_dict['data'] = np.ma.empty(
-            (radar_roi.nrays, radar_roi.ngates), dtype=float)
-        field_dict['data'][0, :] = radar.fields[field_name]['data'][inds_ray, inds_rng]
-        radar_roi.add_field(field_name, field_dict)
+    radar_roi = get_roi_radar(radar, inds_ray, inds_rng, field_names)
 
     new_dataset = {'radar_out': radar_roi}
 
@@ -1372,6 +1313,11 @@ def _get_gates_trt(radar, trajectory, voltime, time_tol=100., alt_min=None,
         Time tolerance where to look for data [s]
     alt_min, alt_max : float
         Minimum and maximum altitude where to look for data [m]
+    cell_center : bool
+        If True only the gate closest to the cell center in each sweep is
+        used. Otherwise all the gates inside the cell contour
+    latlon_tol : float
+        Tolerance around the cell center where to look for gates [deg]
 
     Returns
     -------
@@ -1388,102 +1334,71 @@ def _get_gates_trt(radar, trajectory, voltime, time_tol=100., alt_min=None,
     ind = np.argmin(dt)
 
     if not cell_center:
-        lon_roi = trajectory.cell_contour[ind]['lon']
-        lat_roi = trajectory.cell_contour[ind]['lat']
-
         roi_dict = {
-            'lon': lon_roi,
-            'lat': lat_roi,
+            'lon': trajectory.cell_contour[ind]['lon'],
+            'lat': trajectory.cell_contour[ind]['lat'],
             'alt_min': alt_min,
             'alt_max': alt_max}
 
-        # extract the data within the ROI boundaries
-        inds_ray, inds_rng = np.indices(np.shape(radar.gate_longitude['data']))
-
-        mask = np.logical_and(
-            np.logical_and(
-                radar.gate_latitude['data'] >= roi_dict['lat'].min(),
-                radar.gate_latitude['data'] <= roi_dict['lat'].max()),
-            np.logical_and(
-                radar.gate_longitude['data'] >= roi_dict['lon'].min(),
-                radar.gate_longitude['data'] <= roi_dict['lon'].max()))
-
-        if alt_min is not None:
-            mask[radar.gate_altitude['data'] < alt_min] = 0
-        if alt_max is not None:
-            mask[radar.gate_altitude['data'] > alt_max] = 0
-
-        if np.all(mask == 0):
-            warn('No values within ROI')
-            return None, None, None, None, None
-
-        inds_ray = inds_ray[mask]
-        inds_rng = inds_rng[mask]
-
         # extract the data inside the ROI
-        lat = radar.gate_latitude['data'][mask]
-        lon = radar.gate_longitude['data'][mask]
-        inds, is_roi = belongs_roi_indices(lat, lon, roi_dict)
-
-        if is_roi == 'None':
+        inds_ray, inds_rng = find_roi_gates(radar, roi_dict)
+        if inds_ray.size == 0:
             warn('No values within ROI')
             return None, None, None, None, None
 
-        inds_ray = inds_ray[inds]
-        inds_rng = inds_rng[inds]
-
-        lat = lat[inds]
-        lon = lon[inds]
+        lat = radar.gate_latitude['data'][inds_ray, inds_rng]
+        lon = radar.gate_longitude['data'][inds_ray, inds_rng]
         alt = radar.gate_altitude['data'][inds_ray, inds_rng]
     else:
-        radar_aux = deepcopy(radar)
         # transform radar into ppi over the required elevation
-        if radar_aux.scan_type == 'rhi':
-            target_elevations, el_tol = get_target_elevations(radar_aux)
+        if radar.scan_type == 'rhi':
+            target_elevations, el_tol = get_target_elevations(radar)
             radar_ppi = cross_section_rhi(
-                radar_aux, target_elevations, el_tol=el_tol)
-        elif radar_aux.scan_type == 'ppi':
-            radar_ppi = radar_aux
+                radar, target_elevations, el_tol=el_tol)
+        elif radar.scan_type == 'ppi':
+            radar_ppi = radar
         else:
             warn('Error: unsupported scan type.')
             return None, None, None, None, None
 
-        inds_ray = np.array([], dtype=int)
-        inds_rng = np.array([], dtype=int)
-        lat = np.array([])
-        lon = np.array([])
-        alt = np.array([])
-        for sweep in range(radar_ppi.nsweeps):
-            radar_aux = deepcopy(radar_ppi.extract_sweeps([sweep]))
-
-            # find nearest gate to lat lon point
-            ind_ray, ind_rng, _, _ = find_nearest_gate(
-                radar_aux, trajectory.wgs84_lat_deg[ind],
-                trajectory.wgs84_lon_deg[ind], latlon_tol=latlon_tol)
-
-            if ind_ray is None:
+        # find gates close to lat lon point
+        lat_cell = trajectory.wgs84_lat_deg[ind]
+        lon_cell = trajectory.wgs84_lon_deg[ind]
+        inds = find_gates_in_bbox(
+            radar_ppi, lat_cell-latlon_tol, lat_cell+latlon_tol,
+            lon_cell-latlon_tol, lon_cell+latlon_tol)
+        inds_ray, inds_rng = np.unravel_index(
+            inds, (radar_ppi.nrays, radar_ppi.ngates))
+        lat = radar_ppi.gate_latitude['data'][inds_ray, inds_rng]
+        lon = radar_ppi.gate_longitude['data'][inds_ray, inds_rng]
+        alt = radar_ppi.gate_altitude['data'][inds_ray, inds_rng]
+
+        # keep the gate with the closest latitude in each sweep
+        inds_sweep = np.searchsorted(
+            radar_ppi.sweep_start_ray_index['data'], inds_ray,
+            side='right')-1
+        inds_nearest = []
+        for sweep in np.unique(inds_sweep):
+            ind_sweep = np.where(inds_sweep == sweep)[0]
+            ind_nearest = ind_sweep[
+                np.argmin(np.abs(lat[ind_sweep]-lat_cell))]
+            if alt_min is not None and alt[ind_nearest] < alt_min:
                 continue
+            if alt_max is not None and alt[ind_nearest] > alt_max:
+                continue
+            inds_nearest.append(ind_nearest)
+        inds_nearest = np.asarray(inds_nearest, dtype=int)
 
-            if alt_min is not None:
-                if radar_aux.gate_altitude['data'][ind_ray][ind_rng] < alt_min:
-                    continue
-            if alt_max is not None:
-                if radar_aux.gate_altitude['data'][ind_ray][ind_rng] > alt_max:
-                    continue
-
-            inds_ray = np.append(inds_ray, ind_ray)
-            inds_rng = np.append(inds_rng, ind_rng)
-            lat = np.append(
-                lat, radar_aux.gate_latitude['data'][ind_ray][ind_rng])
-            lon = np.append(
-                lon, radar_aux.gate_longitude['data'][ind_ray][ind_rng])
-            alt = np.append(
-                alt, radar_aux.gate_altitude['data'][ind_ray][ind_rng])
-
-        if inds_ray.size == 0:
+        if inds_nearest.size == 0:
             warn('No values in center of cell')
             return None, None, None, None, None
 
+        inds_ray = inds_ray[inds_nearest]
+        inds_rng = inds_rng[inds_nearest]
+        lat = lat[inds_nearest]
+        lon = lon[inds_nearest]
+        alt = alt[inds_nearest]
+
     return inds_ray, inds_rng, lat, lon, alt
 
 
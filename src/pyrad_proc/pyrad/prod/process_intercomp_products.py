@@ -28,6 +28,7 @@ from ..io.read_data_other import read_intercomp_scores_ts
 from ..io.write_data import write_colocated_gates, write_colocated_data
 from ..io.write_data import write_colocated_data_time_avg
 from ..io.write_data import write_intercomp_scores_ts
+from ..io.timeseries_store import ts_store_in_sync, update_ts_store
 
 from ..graph.plots import plot_scatter
 from ..graph.plots_timeseries import plot_intercomp_scores_ts
@@ -51,6 +52,10 @@ def generate_intercomp_products(dataset, prdcfg):
                 'rewrite': Bool
                     If true rewrites the csv file containing the statistics.
                     Default False
+                'incremental': Bool
+                    If true the time series of statistics is kept in memory
+                    and only the new statistics are added to it instead of
+                    reading the whole csv file. Default False
                 'npoints_min': int
                     The minimum number of points to consider the statistics
                     valid and therefore use the data point in the plotting.
@@ -59,8 +64,12 @@ def generate_intercomp_products(dataset, prdcfg):
                     The minimum correlation to consider the statistics
                     valid and therefore use the data point in the plotting.
                     Default 0.
+            If the dataset contains a 2D histogram accumulator the
+            statistics are computed from it.
         'PLOT_SCATTER_INTERCOMP': Plots a density plot with the points of
-            radar 1 versus the points of radar 2
+            radar 1 versus the points of radar 2. If the dataset contains a
+            2D histogram accumulator the plot and the statistics are
+            obtained from it and parameter 'step' is not used.
             User defined parameters:
                 'step': float
                     The quantization step of the data. If none it will be
@@ -150,10 +159,14 @@ def generate_intercomp_products(dataset, prdcfg):
 
         step = prdcfg.get('step', None)
 
-        hist_2d, bin_edges1, bin_edges2, stats = compute_2d_stats(
-            np.ma.asarray(dataset['intercomp_dict']['rad1_val']),
-            np.ma.asarray(dataset['intercomp_dict']['rad2_val']),
-            field_name, field_name, step1=step, step2=step)
+        if dataset.get('hist2d_acc', None) is not None:
+            hist_2d, bin_edges1, bin_edges2, stats = (
+                dataset['hist2d_acc'].get_stats())
+        else:
+            hist_2d, bin_edges1, bin_edges2, stats = compute_2d_stats(
+                np.ma.asarray(dataset['intercomp_dict']['rad1_val']),
+                np.ma.asarray(dataset['intercomp_dict']['rad2_val']),
+                field_name, field_name, step1=step, step2=step)
         if hist_2d is None:
             return None
 
@@ -189,10 +202,13 @@ def generate_intercomp_products(dataset, prdcfg):
         rad1_name = dataset['intercomp_dict']['rad1_name']
         rad2_name = dataset['intercomp_dict']['rad2_name']
 
-        hist_2d, bin_edges1, bin_edges2, stats = compute_2d_stats(
-            np.ma.asarray(dataset['intercomp_dict']['rad1_val']),
-            np.ma.asarray(dataset['intercomp_dict']['rad2_val']),
-            field_name, field_name, step1=step, step2=step)
+        if dataset.get('hist2d_acc', None) is not None:
+            stats = dataset['hist2d_acc'].get_stats()[3]
+        else:
+            stats = compute_2d_stats(
+                np.ma.asarray(dataset['intercomp_dict']['rad1_val']),
+                np.ma.asarray(dataset['intercomp_dict']['rad2_val']),
+                field_name, field_name, step1=step, step2=step)[3]
 
         # put time info in file path and name
         csvtimeinfo_file = None
@@ -219,20 +235,45 @@ def generate_intercomp_products(dataset, prdcfg):
 
         csvfname = savedir+csvfname
 
+        incremental = prdcfg.get('incremental', False)
+        in_sync = incremental and ts_store_in_sync(csvfname)
+
         write_intercomp_scores_ts(
             dataset['timeinfo'], stats, field_name, csvfname,
             rad1_name=rad1_name, rad2_name=rad2_name)
         print('saved CSV file: '+csvfname)
 
-        (date_vec, np_vec, meanbias_vec, medianbias_vec, quant25bias_vec,
-         quant75bias_vec, modebias_vec, corr_vec, slope_vec, intercep_vec,
-         intercep_slope1_vec) = (
-             read_intercomp_scores_ts(csvfname, sort_by_date=sort_by_date))
-
-        if date_vec is None:
-            warn(
-                'Unable to plot time series. No valid data')
-            return None
+        if incremental:
+            sample = None
+            if in_sync:
+                sample = (
+                    dataset['timeinfo'].replace(microsecond=0),
+                    stats['npoints'], stats['meanbias'], stats['medianbias'],
+                    stats['quant25bias'], stats['quant75bias'],
+                    stats['modebias'], stats['corr'], stats['slope'],
+                    stats['intercep'], stats['intercep_slope_1'])
+            series = update_ts_store(
+                csvfname, read_intercomp_scores_ts, sample=sample,
+                read_kwargs={'sort_by_date': sort_by_date},
+                sort_by_date=sort_by_date)
+            if series is None:
+                warn(
+                    'Unable to plot time series. No valid data')
+                return None
+            (date_vec, np_vec, meanbias_vec, medianbias_vec,
+             quant25bias_vec, quant75bias_vec, modebias_vec, corr_vec,
+             slope_vec, intercep_vec, intercep_slope1_vec) = series
+        else:
+            (date_vec, np_vec, meanbias_vec, medianbias_vec,
+             quant25bias_vec, quant75bias_vec, modebias_vec, corr_vec,
+             slope_vec, intercep_vec, intercep_slope1_vec) = (
+                 read_intercomp_scores_ts(
+                     csvfname, sort_by_date=sort_by_date))
+
+            if date_vec is None:
+                warn(
+                    'Unable to plot time series. No valid data')
+                return None
 
         if len(date_vec) < 2:
             warn(
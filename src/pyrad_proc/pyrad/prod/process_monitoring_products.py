@@ -8,6 +8,7 @@ Functions for obtaining Pyrad products from monitoring datasets
     :toctree: generated/
 
     generate_monitoring_products
+    _plot_vol_ts
 
 """
 
@@ -27,6 +28,9 @@ from ..io.read_data_other import read_monitoring_ts
 
 from ..io.write_data import write_monitoring_ts, write_alarm_msg, send_msg
 from ..io.write_data import write_histogram
+from ..io.timeseries_store import ts_store_in_sync, update_ts_store
+from ..io.timeseries_store import ts_store_plot_due, set_ts_store_plotted
+from ..io.timeseries_store import get_ts_store_pending
 
 from ..graph.plots import plot_histogram2, plot_density
 from ..graph.plots_timeseries import plot_monitoring_ts
@@ -116,7 +120,9 @@ def generate_monitoring_products(dataset, prdcfg):
                     If true the resultant histogram is also saved in a csv
                     file. Default True.
         'VOL_TS': Computes statistics of the gathered data and writes them in
-            a csv file and plots a time series of those statistics.
+            a csv file and plots a time series of those statistics. If the
+            dataset contains a quantile sketch the quantiles are computed
+            from it instead of from the histograms.
             User defined parameters:
                 quantiles: list of 3 floats
                     the quantiles to compute. Default 25., 50., 75.
@@ -131,6 +137,14 @@ def generate_monitoring_products(dataset, prdcfg):
                 add_data_in_fname: Bool
                     If true and the data used is cumulative the year is
                     written in the csv file name and the plot file name
+                incremental: Bool
+                    If true the time series is kept in memory and only the
+                    new statistics are added to it instead of reading the
+                    whole csv file at each volume. Default False
+                plot_every: int
+                    Used with incremental. Number of new statistics between
+                    refreshes of the plot. If 0 the plot is generated only
+                    at the end of the processing. Default 1
                 npoints_min: int
                     Minimum number of points to use the data point in the
                     plotting and to send an alarm. Default 0
@@ -180,9 +194,34 @@ def generate_monitoring_products(dataset, prdcfg):
     hist_type = prdcfg.get('hist_type', 'cumulative')
 
     if dataset['hist_type'] != hist_type:
+        # plot the pending incremental time series at the end of the
+        # processing
+        if (prdcfg['type'] == 'VOL_TS' and hist_type == 'instant' and
+                prdcfg.get('incremental', False)):
+            field_name = get_fieldname_pyart(prdcfg['voltype'])
+            owner = (prdcfg['procname']+'/'+prdcfg['dsname']+'/' +
+                     prdcfg['prdname'])
+            figfname_list = []
+            for csvfname, _ in get_ts_store_pending(owner):
+                series = update_ts_store(
+                    csvfname, read_monitoring_ts,
+                    read_kwargs={
+                        'sort_by_date': prdcfg.get('sort_by_date', False)})
+                if series is None:
+                    continue
+                figfname_list.extend(_plot_vol_ts(
+                    series, field_name, os.path.dirname(csvfname)+'/',
+                    hist_type, prdcfg))
+                set_ts_store_plotted(csvfname, owner)
+            return figfname_list
         return None
 
     hist_obj = dataset['hist_obj']
+    if hist_obj is None and (
+            prdcfg['type'] != 'VOL_TS' or dataset.get('sketch') is None):
+        warn('Histogram not available. The dataset keeps only a quantile ' +
+             'sketch. Skipping product '+prdcfg['type'])
+        return None
 
     dssavedir = prdcfg['dsname']
     if 'dssavename' in prdcfg:
@@ -347,7 +386,7 @@ def generate_monitoring_products(dataset, prdcfg):
 
     if prdcfg['type'] == 'VOL_TS':
         field_name = get_fieldname_pyart(prdcfg['voltype'])
-        if field_name not in hist_obj.fields:
+        if hist_obj is not None and field_name not in hist_obj.fields:
             warn(
                 ' Field type ' + field_name +
                 ' not available in data set. Skipping product ' +
@@ -382,28 +421,59 @@ def generate_monitoring_products(dataset, prdcfg):
 
         csvfname = savedir+csvfname
 
-        quantiles, values = compute_quantiles_from_hist(
-            hist_obj.range['data'],
-            np.ma.sum(hist_obj.fields[field_name]['data'], axis=0),
-            quantiles=quantiles)
+        sketch = dataset.get('sketch', None)
+        if sketch is not None:
+            quantiles, values = sketch.compute_quantiles(quantiles=quantiles)
+            np_t = sketch.n
+        else:
+            quantiles, values = compute_quantiles_from_hist(
+                hist_obj.range['data'],
+                np.ma.sum(hist_obj.fields[field_name]['data'], axis=0),
+                quantiles=quantiles)
 
-        start_time = pyart.graph.common.generate_radar_time_begin(hist_obj)
-        np_t = np.ma.sum(hist_obj.fields[field_name]['data'], dtype=int)
-        if np.ma.getmaskarray(np_t):
-            np_t = 0
+            np_t = np.ma.sum(hist_obj.fields[field_name]['data'], dtype=int)
+            if np.ma.getmaskarray(np_t):
+                np_t = 0
+
+        if hist_obj is None:
+            start_time = dataset['timeinfo']
+        else:
+            start_time = pyart.graph.common.generate_radar_time_begin(
+                hist_obj)
+
+        incremental = prdcfg.get('incremental', False)
+        owner = (prdcfg['procname']+'/'+prdcfg['dsname']+'/' +
+                 prdcfg['prdname'])
+        in_sync = incremental and ts_store_in_sync(csvfname)
 
         write_monitoring_ts(
             start_time, np_t, values, quantiles, prdcfg['voltype'],
             csvfname)
         print('saved CSV file: '+csvfname)
 
-        date, np_t_vec, cquant_vec, lquant_vec, hquant_vec = (
-            read_monitoring_ts(csvfname, sort_by_date=sort_by_date))
+        if incremental:
+            sample = None
+            if in_sync:
+                sample = (
+                    start_time.replace(microsecond=0), np_t, values[1],
+                    values[0], values[2])
+            series = update_ts_store(
+                csvfname, read_monitoring_ts, sample=sample,
+                read_kwargs={'sort_by_date': sort_by_date},
+                sort_by_date=sort_by_date, owner=owner)
+            if series is None:
+                warn(
+                    'Unable to plot time series. No valid data')
+                return None
+            date, np_t_vec, cquant_vec, lquant_vec, hquant_vec = series
+        else:
+            date, np_t_vec, cquant_vec, lquant_vec, hquant_vec = (
+                read_monitoring_ts(csvfname, sort_by_date=sort_by_date))
 
-        if date is None:
-            warn(
-                'Unable to plot time series. No valid data')
-            return None
+            if date is None:
+                warn(
+                    'Unable to plot time series. No valid data')
+                return None
 
         if rewrite:
             val_vec = np.ma.asarray(
@@ -412,46 +482,22 @@ def generate_monitoring_products(dataset, prdcfg):
                 date, np_t_vec, val_vec, quantiles, prdcfg['voltype'],
                 csvfname, rewrite=True)
 
-        figtimeinfo = None
-        titldate = ''
-        if hist_type == 'instant':
-            figtimeinfo = date[0]
-            titldate = date[0].strftime('%Y-%m-%d')
-        else:
-            titldate = (date[0].strftime('%Y%m%d')+'-' +
-                        date[-1].strftime('%Y%m%d'))
-            if prdcfg.get('add_date_in_fname', False):
-                figtimeinfo = date[0]
-                timeformat = '%Y'
-
-        figfname_list = make_filename(
-            'ts', prdcfg['dstype'], prdcfg['voltype'],
-            prdcfg['imgformat'],
-            timeinfo=figtimeinfo, timeformat=timeformat,
-            runinfo=prdcfg['runinfo'])
-
-        for i, figfname in enumerate(figfname_list):
-            figfname_list[i] = savedir+figfname
-
-        titl = (prdcfg['runinfo']+' Monitoring '+titldate)
-
-        labely = generate_field_name_str(prdcfg['voltype'])
-
-        np_min = prdcfg.get('npoints_min', 0)
-        vmin = prdcfg.get('vmin', None)
-        vmax = prdcfg.get('vmax', None)
-
-        plot_monitoring_ts(
-            date, np_t_vec, cquant_vec, lquant_vec, hquant_vec, field_name,
-            figfname_list, ref_value=ref_value, vmin=vmin, vmax=vmax,
-            np_min=np_min, labelx='Time UTC', labely=labely, titl=titl)
-        print('----- save to '+' '.join(figfname_list))
+        figfname_list = None
+        if not incremental or ts_store_plot_due(
+                csvfname, owner, plot_every=prdcfg.get('plot_every', 1)):
+            figfname_list = _plot_vol_ts(
+                (date, np_t_vec, cquant_vec, lquant_vec, hquant_vec),
+                field_name, savedir, hist_type, prdcfg)
+            if incremental:
+                set_ts_store_plotted(csvfname, owner)
 
         # generate alarms if needed
         alarm = prdcfg.get('alarm', False)
         if not alarm:
             return figfname_list
 
+        np_min = prdcfg.get('npoints_min', 0)
+
         if 'tol_abs' not in prdcfg:
             warn('unable to send alarm. Missing tolerance on target')
             return None
@@ -790,3 +836,75 @@ def generate_monitoring_products(dataset, prdcfg):
 
     warn(' Unsupported product type: ' + prdcfg['type'])
     return None
+
+
+def _plot_vol_ts(series, field_name, savedir, hist_type, prdcfg):
+    """
+    Plots a time series of monitoring statistics
+
+    Parameters
+    ----------
+    series : tuple
+        the date, the number of points and the central, low and high
+        quantiles of the time series
+    field_name : str
+        name of the monitored field
+    savedir : str
+        directory where to save the plot
+    hist_type : str
+        type of histogram used to compute the statistics. Can be 'instant'
+        or 'cumulative'
+    prdcfg : dict
+        product configuration dictionary
+
+    Returns
+    -------
+    figfname_list : list of str
+        list of names of the created plots
+
+    """
+    date, np_t_vec, cquant_vec, lquant_vec, hquant_vec = series
+    ref_value = prdcfg.get('ref_value', 0.)
+
+    timeformat = None
+    if hist_type == 'instant':
+        timeformat = '%Y%m%d'
+    if prdcfg.get('add_date_in_fname', False):
+        timeformat = '%Y'
+
+    figtimeinfo = None
+    titldate = ''
+    if hist_type == 'instant':
+        figtimeinfo = date[0]
+        titldate = date[0].strftime('%Y-%m-%d')
+    else:
+        titldate = (date[0].strftime('%Y%m%d')+'-' +
+                    date[-1].strftime('%Y%m%d'))
+        if prdcfg.get('add_date_in_fname', False):
+            figtimeinfo = date[0]
+            timeformat = '%Y'
+
+    figfname_list = make_filename(
+        'ts', prdcfg['dstype'], prdcfg['voltype'],
+        prdcfg['imgformat'],
+        timeinfo=figtimeinfo, timeformat=timeformat,
+        runinfo=prdcfg['runinfo'])
+
+    for i, figfname in enumerate(figfname_list):
+        figfname_list[i] = savedir+figfname
+
+    titl = (prdcfg['runinfo']+' Monitoring '+titldate)
+
+    labely = generate_field_name_str(prdcfg['voltype'])
+
+    np_min = prdcfg.get('npoints_min', 0)
+    vmin = prdcfg.get('vmin', None)
+    vmax = prdcfg.get('vmax', None)
+
+    plot_monitoring_ts(
+        date, np_t_vec, cquant_vec, lquant_vec, hquant_vec, field_name,
+        figfname_list, ref_value=ref_value, vmin=vmin, vmax=vmax,
+        np_min=np_min, labelx='Time UTC', labely=labely, titl=titl)
+    print('----- save to '+' '.join(figfname_list))
+
+    return figfname_list
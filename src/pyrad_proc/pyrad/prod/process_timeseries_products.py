@@ -8,6 +8,9 @@ Functions for obtaining Pyrad products from a time series datasets
     :toctree: generated/
 
     generate_timeseries_products
+    _plot_point_ts
+    _plot_point_ts_comp
+    _plot_pending_point_ts
 
 """
 
@@ -24,6 +27,10 @@ from ..io.read_data_sensor import get_sensor_data
 from ..io.read_data_other import read_timeseries
 
 from ..io.write_data import write_ts_polar_data, write_ts_cum
+from ..io.write_data import write_ts_multi_point_data
+from ..io.timeseries_store import ts_store_in_sync, update_ts_store
+from ..io.timeseries_store import ts_store_plot_due, set_ts_store_plotted
+from ..io.timeseries_store import get_ts_store_pending
 
 from ..graph.plots_timeseries import plot_timeseries, plot_timeseries_comp
 from ..graph.plots_vol import plot_cappi, plot_traj
@@ -60,6 +67,13 @@ def generate_timeseries_products(dataset, prdcfg):
                 ScanPeriod: float
                     The scaning period of the radar in seconds. This parameter
                     is defined in the 'loc' config file
+                incremental: Bool
+                    If true the time series is kept in memory instead of
+                    reading the whole csv file at each volume. Default False
+                plot_every: int
+                    Used with incremental. Number of new samples between
+                    refreshes of the plot. If 0 the plot is generated only
+                    at the end of the processing. Default 1
         'COMPARE_POINT': Plots in the same graph 2 time series of
             data . One time series is a point measurement of radar data while
             the other is from a co-located instrument (rain gauge or
@@ -82,6 +96,13 @@ def generate_timeseries_products(dataset, prdcfg):
                 ele: float
                     The elevation angle used to retrieve the polarimetric
                     variables of a disdrometer
+                incremental: Bool
+                    If true the time series is kept in memory instead of
+                    reading the whole csv file at each volume. Default False
+                plot_every: int
+                    Used with incremental. Number of new samples between
+                    refreshes of the plot. If 0 the plot is generated only
+                    at the end of the processing. Default 1
         'COMPARE_TIME_AVG': Creates a scatter plot of average radar data
             versus average sensor data.
             User defined parameters:
@@ -117,6 +138,13 @@ def generate_timeseries_products(dataset, prdcfg):
                 vmin, vmax: float
                     The limits of the Y-axis. If none they will be obtained
                     from the Py-ART config file.
+                incremental: Bool
+                    If true the time series is kept in memory instead of
+                    reading the whole csv file at each volume. Default False
+                plot_every: int
+                    Used with incremental. Number of new samples between
+                    refreshes of the plot. If 0 the plot is generated only
+                    at the end of the processing. Default 1
         'PLOT_CUMULATIVE_POINT': Plots a time series of radar data
             accumulation at a particular point.
             User defined parameters:
@@ -151,6 +179,10 @@ def generate_timeseries_products(dataset, prdcfg):
                     Default 'NEAREST_NEIGHBOUR'
                 res: float
                     The CAPPI resolution [m]. Default 500.
+        'WRITE_MULTI_POINT': Writes one time series file per station with
+            the data of all the fields of a multiple point measurement
+            dataset. Stations without radar bin within tolerance are
+            skipped
 
     Parameters
     ----------
@@ -174,10 +206,13 @@ def generate_timeseries_products(dataset, prdcfg):
         prdsavedir = prdcfg['prdsavedir']
 
     if prdcfg['type'] == 'PLOT_AND_WRITE_POINT':
+        incremental = prdcfg.get('incremental', False)
+        owner = (prdcfg['procname']+'/'+prdcfg['dsname']+'/' +
+                 prdcfg['prdname'])
         if dataset['final']:
-            return None
-
-        dpi = prdcfg.get('dpi', 72)
+            if not incremental:
+                return None
+            return _plot_pending_point_ts(owner, prdcfg)
 
         az = '{:.1f}'.format(dataset['antenna_coordinates_az_el_r'][0])
         el = '{:.1f}'.format(dataset['antenna_coordinates_az_el_r'][1])
@@ -195,39 +230,69 @@ def generate_timeseries_products(dataset, prdcfg):
 
         csvfname = savedir+csvfname
 
+        in_sync = incremental and ts_store_in_sync(csvfname)
+
         write_ts_polar_data(dataset, csvfname)
         print('saved CSV file: '+csvfname)
 
-        date, value = read_timeseries(csvfname)
+        plot_info = {
+            'datatype': dataset['datatype'],
+            'antenna_coordinates_az_el_r': (
+                dataset['antenna_coordinates_az_el_r']),
+            'savedir': savedir}
+
+        if incremental:
+            sample = None
+            if in_sync:
+                sample = (dataset['time'], dataset['value'])
+            series = update_ts_store(
+                csvfname, read_timeseries, sample=sample, owner=owner,
+                owner_info=plot_info)
+            if series is None:
+                warn(
+                    'Unable to plot time series. No valid data')
+                return None
+            if not ts_store_plot_due(
+                    csvfname, owner, plot_every=prdcfg.get('plot_every', 1)):
+                return None
+            date, value = series
+        else:
+            date, value = read_timeseries(csvfname)
 
-        if date is None:
-            warn(
-                'Unable to plot time series. No valid data')
-            return None
+            if date is None:
+                warn(
+                    'Unable to plot time series. No valid data')
+                return None
 
-        vmin = prdcfg.get('vmin', None)
-        vmax = prdcfg.get('vmax', None)
+        figfname_list = _plot_point_ts(date, value, plot_info, prdcfg)
+        if incremental:
+            set_ts_store_plotted(csvfname, owner)
 
-        figfname_list = make_filename(
-            'ts', prdcfg['dstype'], dataset['datatype'],
-            prdcfg['imgformat'], prdcfginfo=gateinfo,
-            timeinfo=date[0], timeformat='%Y%m%d')
+        return figfname_list
 
-        for i, figfname in enumerate(figfname_list):
-            figfname_list[i] = savedir+figfname
+    if prdcfg['type'] == 'WRITE_MULTI_POINT':
+        if dataset['final']:
+            return None
 
-        label1 = 'Radar (az, el, r): ('+az+', '+el+', '+r+')'
-        titl = ('Time Series '+date[0].strftime('%Y-%m-%d'))
+        savedir = get_save_dir(
+            prdcfg['basepath'], prdcfg['procname'], dssavedir,
+            prdsavedir, timeinfo=prdcfg['timeinfo'])
 
-        labely = generate_field_name_str(dataset['datatype'])
+        csvfname_list = []
+        for ind_station, station_id in enumerate(dataset['station_id']):
+            if not dataset['valid'][ind_station]:
+                continue
 
-        plot_timeseries(
-            date, [value], figfname_list, labelx='Time UTC',
-            labely=labely, labels=[label1], title=titl, dpi=dpi,
-            ymin=vmin, ymax=vmax)
-        print('----- save to '+' '.join(figfname_list))
+            csvfname = make_filename(
+                'ts', prdcfg['dstype'], station_id, ['csv'],
+                timeinfo=prdcfg['timeinfo'], timeformat='%Y%m%d')[0]
 
-        return figfname_list
+            csvfname_list.append(write_ts_multi_point_data(
+                dataset, ind_station, savedir+csvfname))
+        print('saved CSV files for '+str(len(csvfname_list)) +
+              ' stations in '+savedir)
+
+        return csvfname_list
 
     if prdcfg['type'] == 'PLOT_CUMULATIVE_POINT':
         if dataset['final']:
@@ -283,10 +348,13 @@ def generate_timeseries_products(dataset, prdcfg):
         return figfname_list
 
     if prdcfg['type'] == 'COMPARE_POINT':
+        incremental = prdcfg.get('incremental', False)
+        owner = (prdcfg['procname']+'/'+prdcfg['dsname']+'/' +
+                 prdcfg['prdname'])
         if dataset['final']:
-            return None
-
-        dpi = prdcfg.get('dpi', 72)
+            if not incremental:
+                return None
+            return _plot_pending_point_ts(owner, prdcfg)
 
         az = '{:.1f}'.format(dataset['antenna_coordinates_az_el_r'][0])
         el = '{:.1f}'.format(dataset['antenna_coordinates_az_el_r'][1])
@@ -304,54 +372,49 @@ def generate_timeseries_products(dataset, prdcfg):
 
         csvfname = savedir_ts+csvfname
 
-        radardate, radarvalue = read_timeseries(csvfname)
-        if radardate is None:
-            warn(
-                'Unable to plot sensor comparison at point of interest. ' +
-                'No valid radar data')
-            return None
-
-        sensordate, sensorvalue, sensortype, _ = get_sensor_data(
-            radardate[0], dataset['datatype'], prdcfg)
-        if sensordate is None:
-            warn(
-                'Unable to plot sensor comparison at point of interest. ' +
-                'No valid sensor data')
-            return None
-
-        vmin = prdcfg.get('vmin', None)
-        vmax = prdcfg.get('vmax', None)
-
-        savedir = get_save_dir(
-            prdcfg['basepath'], prdcfg['procname'], dssavedir,
-            prdsavedir, timeinfo=radardate[0])
-
-        figfname_list = make_filename(
-            'ts_comp', prdcfg['dstype'], dataset['datatype'],
-            prdcfg['imgformat'], prdcfginfo=gateinfo,
-            timeinfo=radardate[0], timeformat='%Y%m%d')
-
-        for i, figfname in enumerate(figfname_list):
-            figfname_list[i] = savedir+figfname
-
-        label1 = 'Radar (az, el, r): ('+az+', '+el+', '+r+')'
-        label2 = sensortype+' '+prdcfg['sensorid']
-        titl = 'Time Series Comp. '+radardate[0].strftime('%Y-%m-%d')
-        labely = generate_field_name_str(dataset['datatype'])
-
-        plot_timeseries_comp(
-            radardate, radarvalue, sensordate, sensorvalue, figfname_list,
-            labelx='Time UTC', labely=labely, label1=label1, label2=label2,
-            titl=titl, ymin=vmin, ymax=vmax, dpi=dpi)
-        print('----- save to '+' '.join(figfname_list))
+        plot_info = {
+            'datatype': dataset['datatype'],
+            'antenna_coordinates_az_el_r': (
+                dataset['antenna_coordinates_az_el_r']),
+            'dssavedir': dssavedir,
+            'prdsavedir': prdsavedir}
+
+        if incremental:
+            series = update_ts_store(
+                csvfname, read_timeseries, owner=owner,
+                owner_info=plot_info)
+            if series is None:
+                warn(
+                    'Unable to plot sensor comparison at point of interest. ' +
+                    'No valid radar data')
+                return None
+            if not ts_store_plot_due(
+                    csvfname, owner, plot_every=prdcfg.get('plot_every', 1)):
+                return None
+            radardate, radarvalue = series
+        else:
+            radardate, radarvalue = read_timeseries(csvfname)
+            if radardate is None:
+                warn(
+                    'Unable to plot sensor comparison at point of interest. ' +
+                    'No valid radar data')
+                return None
+
+        figfname_list = _plot_point_ts_comp(
+            radardate, radarvalue, plot_info, prdcfg)
+        if incremental and figfname_list is not None:
+            set_ts_store_plotted(csvfname, owner)
 
         return figfname_list
 
     if prdcfg['type'] == 'COMPARE_CUMULATIVE_POINT':
+        incremental = prdcfg.get('incremental', False)
+        owner = (prdcfg['procname']+'/'+prdcfg['dsname']+'/' +
+                 prdcfg['prdname'])
         if dataset['final']:
-            return None
-
-        dpi = prdcfg.get('dpi', 72)
+            if not incremental:
+                return None
+            return _plot_pending_point_ts(owner, prdcfg)
 
         az = '{:.1f}'.format(dataset['antenna_coordinates_az_el_r'][0])
         el = '{:.1f}'.format(dataset['antenna_coordinates_az_el_r'][1])
@@ -369,49 +432,38 @@ def generate_timeseries_products(dataset, prdcfg):
 
         csvfname = savedir_ts+csvfname
 
-        radardate, radarvalue = read_timeseries(csvfname)
-        if radardate is None:
-            warn(
-                'Unable to plot sensor comparison at point of interest. ' +
-                'No valid radar data')
-            return None
-
-        sensordate, sensorvalue, sensortype, period2 = get_sensor_data(
-            radardate[0], dataset['datatype'], prdcfg)
-        if sensordate is None:
-            warn(
-                'Unable to plot sensor comparison at point of interest. ' +
-                'No valid sensor data')
-            return None
-
-        vmin = prdcfg.get('vmin', None)
-        vmax = prdcfg.get('vmax', None)
-
-        savedir = get_save_dir(
-            prdcfg['basepath'], prdcfg['procname'], dssavedir,
-            prdsavedir, timeinfo=radardate[0])
-
-        figfname_list = make_filename(
-            'ts_cumcomp', prdcfg['dstype'], dataset['datatype'],
-            prdcfg['imgformat'], prdcfginfo=gateinfo,
-            timeinfo=radardate[0], timeformat='%Y%m%d')
-
-        for i, figfname in enumerate(figfname_list):
-            figfname_list[i] = savedir+figfname
-
-        label1 = 'Radar (az, el, r): ('+az+', '+el+', '+r+')'
-        label2 = sensortype+' '+prdcfg['sensorid']
-        titl = ('Time Series Acc. Comp. ' +
-                radardate[0].strftime('%Y-%m-%d'))
-        labely = 'Rainfall accumulation (mm)'
-
-        plot_timeseries_comp(
-            radardate, radarvalue, sensordate, sensorvalue,
-            figfname_list, labelx='Time UTC', labely=labely,
-            label1=label1, label2=label2, titl=titl,
-            period1=prdcfg['ScanPeriod']*60., period2=period2,
-            ymin=vmin, ymax=vmax, dpi=dpi)
-        print('----- save to '+' '.join(figfname_list))
+        plot_info = {
+            'datatype': dataset['datatype'],
+            'antenna_coordinates_az_el_r': (
+                dataset['antenna_coordinates_az_el_r']),
+            'dssavedir': dssavedir,
+            'prdsavedir': prdsavedir}
+
+        if incremental:
+            series = update_ts_store(
+                csvfname, read_timeseries, owner=owner,
+                owner_info=plot_info)
+            if series is None:
+                warn(
+                    'Unable to plot sensor comparison at point of interest. ' +
+                    'No valid radar data')
+                return None
+            if not ts_store_plot_due(
+                    csvfname, owner, plot_every=prdcfg.get('plot_every', 1)):
+                return None
+            radardate, radarvalue = series
+        else:
+            radardate, radarvalue = read_timeseries(csvfname)
+            if radardate is None:
+                warn(
+                    'Unable to plot sensor comparison at point of interest. ' +
+                    'No valid radar data')
+                return None
+
+        figfname_list = _plot_point_ts_comp(
+            radardate, radarvalue, plot_info, prdcfg, cumulative=True)
+        if incremental and figfname_list is not None:
+            set_ts_store_plotted(csvfname, owner)
 
         return figfname_list
 
@@ -652,3 +704,177 @@ def generate_timeseries_products(dataset, prdcfg):
     # ================================================================
     warn(' Unsupported product type: ' + prdcfg['type'])
     return None
+
+
+def _plot_point_ts(date, value, plot_info, prdcfg):
+    """
+    Plots a time series of radar data at a point of interest
+
+    Parameters
+    ----------
+    date : array of datetime objects
+        the time of each sample
+    value : float array
+        the value of each sample
+    plot_info : dict
+        the data type, the antenna coordinates of the point and the
+        directory where to save the plot
+    prdcfg : dict
+        product configuration dictionary
+
+    Returns
+    -------
+    figfname_list : list of str
+        list of names of the created plots
+
+    """
+    dpi = prdcfg.get('dpi', 72)
+    vmin = prdcfg.get('vmin', None)
+    vmax = prdcfg.get('vmax', None)
+
+    az = '{:.1f}'.format(plot_info['antenna_coordinates_az_el_r'][0])
+    el = '{:.1f}'.format(plot_info['antenna_coordinates_az_el_r'][1])
+    r = '{:.1f}'.format(plot_info['antenna_coordinates_az_el_r'][2])
+    gateinfo = ('az'+az+'r'+r+'el'+el)
+
+    figfname_list = make_filename(
+        'ts', prdcfg['dstype'], plot_info['datatype'],
+        prdcfg['imgformat'], prdcfginfo=gateinfo,
+        timeinfo=date[0], timeformat='%Y%m%d')
+
+    for i, figfname in enumerate(figfname_list):
+        figfname_list[i] = plot_info['savedir']+figfname
+
+    label1 = 'Radar (az, el, r): ('+az+', '+el+', '+r+')'
+    titl = ('Time Series '+date[0].strftime('%Y-%m-%d'))
+
+    labely = generate_field_name_str(plot_info['datatype'])
+
+    plot_timeseries(
+        date, [value], figfname_list, labelx='Time UTC',
+        labely=labely, labels=[label1], title=titl, dpi=dpi,
+        ymin=vmin, ymax=vmax)
+    print('----- save to '+' '.join(figfname_list))
+
+    return figfname_list
+
+
+def _plot_point_ts_comp(radardate, radarvalue, plot_info, prdcfg,
+                        cumulative=False):
+    """
+    Plots in the same graph a time series of radar data at a point of
+    interest and the time series of a co-located sensor
+
+    Parameters
+    ----------
+    radardate : array of datetime objects
+        the time of each radar sample
+    radarvalue : float array
+        the value of each radar sample
+    plot_info : dict
+        the data type, the antenna coordinates of the point and the
+        directories where to save the plot
+    prdcfg : dict
+        product configuration dictionary
+    cumulative : bool
+        If True the data accumulation is plotted
+
+    Returns
+    -------
+    figfname_list : list of str
+        list of names of the created plots. None if there is no sensor data
+
+    """
+    sensordate, sensorvalue, sensortype, period2 = get_sensor_data(
+        radardate[0], plot_info['datatype'], prdcfg)
+    if sensordate is None:
+        warn(
+            'Unable to plot sensor comparison at point of interest. ' +
+            'No valid sensor data')
+        return None
+
+    dpi = prdcfg.get('dpi', 72)
+    vmin = prdcfg.get('vmin', None)
+    vmax = prdcfg.get('vmax', None)
+
+    az = '{:.1f}'.format(plot_info['antenna_coordinates_az_el_r'][0])
+    el = '{:.1f}'.format(plot_info['antenna_coordinates_az_el_r'][1])
+    r = '{:.1f}'.format(plot_info['antenna_coordinates_az_el_r'][2])
+    gateinfo = ('az'+az+'r'+r+'el'+el)
+
+    savedir = get_save_dir(
+        prdcfg['basepath'], prdcfg['procname'], plot_info['dssavedir'],
+        plot_info['prdsavedir'], timeinfo=radardate[0])
+
+    prdtype = 'ts_comp'
+    if cumulative:
+        prdtype = 'ts_cumcomp'
+    figfname_list = make_filename(
+        prdtype, prdcfg['dstype'], plot_info['datatype'],
+        prdcfg['imgformat'], prdcfginfo=gateinfo,
+        timeinfo=radardate[0], timeformat='%Y%m%d')
+
+    for i, figfname in enumerate(figfname_list):
+        figfname_list[i] = savedir+figfname
+
+    label1 = 'Radar (az, el, r): ('+az+', '+el+', '+r+')'
+    label2 = sensortype+' '+prdcfg['sensorid']
+    if cumulative:
+        titl = ('Time Series Acc. Comp. ' +
+                radardate[0].strftime('%Y-%m-%d'))
+        labely = 'Rainfall accumulation (mm)'
+
+        plot_timeseries_comp(
+            radardate, radarvalue, sensordate, sensorvalue,
+            figfname_list, labelx='Time UTC', labely=labely,
+            label1=label1, label2=label2, titl=titl,
+            period1=prdcfg['ScanPeriod']*60., period2=period2,
+            ymin=vmin, ymax=vmax, dpi=dpi)
+    else:
+        titl = 'Time Series Comp. '+radardate[0].strftime('%Y-%m-%d')
+        labely = generate_field_name_str(plot_info['datatype'])
+
+        plot_timeseries_comp(
+            radardate, radarvalue, sensordate, sensorvalue, figfname_list,
+            labelx='Time UTC', labely=labely, label1=label1, label2=label2,
+            titl=titl, ymin=vmin, ymax=vmax, dpi=dpi)
+    print('----- save to '+' '.join(figfname_list))
+
+    return figfname_list
+
+
+def _plot_pending_point_ts(owner, prdcfg):
+    """
+    Plots the incremental time series at points of interest with samples
+    not yet plotted by a product. Used at the end of the processing
+
+    Parameters
+    ----------
+    owner : str
+        identifier of the product
+    prdcfg : dict
+        product configuration dictionary
+
+    Returns
+    -------
+    figfname_list : list of str
+        list of names of the created plots
+
+    """
+    figfname_list = []
+    for csvfname, plot_info in get_ts_store_pending(owner):
+        series = update_ts_store(csvfname, read_timeseries)
+        if series is None or plot_info is None:
+            continue
+        date, value = series
+        if prdcfg['type'] == 'PLOT_AND_WRITE_POINT':
+            fname_list = _plot_point_ts(date, value, plot_info, prdcfg)
+        else:
+            fname_list = _plot_point_ts_comp(
+                date, value, plot_info, prdcfg,
+                cumulative=prdcfg['type'] == 'COMPARE_CUMULATIVE_POINT')
+        if fname_list is not None:
+            figfname_list.extend(fname_list)
+        set_ts_store_plotted(csvfname, owner)
+
+    return figfname_list
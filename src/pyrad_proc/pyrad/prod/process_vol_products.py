@@ -31,18 +31,26 @@ from ..graph.plots_vol import plot_rhi_contour, plot_ppi_contour
 from ..graph.plots_vol import plot_fixed_rng, plot_fixed_rng_span
 from ..graph.plots import plot_quantiles, plot_histogram
 from ..graph.plots_aux import get_colobar_label, get_field_name
+from ..graph.plot_pool import submit_plot, get_plot_radar, plot_inline
+from ..graph.movie_writer import append_movie_frame
+from ..graph.time_height_raster import plot_time_height_raster
+from ..graph.plots_raster import plot_ppi_raster, plot_cappi_raster
 
 from ..util.radar_utils import get_ROI, compute_profile_stats
 from ..util.radar_utils import compute_histogram, compute_quantiles
 from ..util.radar_utils import get_data_along_rng, get_data_along_azi
 from ..util.radar_utils import get_data_along_ele
 from ..util.stat_utils import quantiles_weighted
+from ..util.gate_geometry import attach_gate_geometry
 
 
 def generate_vol_products(dataset, prdcfg):
     """
     Generates radar volume products. Accepted product types:
-        'CDF': plots and writes the cumulative density function of data
+        'CDF': plots and writes the cumulative density function of data.
+            If the dataset contains a quantile sketch of the whole
+            processing period the CDF is computed from it. In that case the
+            sector and filtering parameters are not used
             User defined parameters:
                 quantiles: list of floats
                     The quantiles to compute in percent. Default None
@@ -86,6 +94,10 @@ def generate_vol_products(dataset, prdcfg):
                     pyart.map.grid_from_radars. Default 'NEAREST_NEIGHBOUR'
                 cappi_res: float
                     The CAPPI resolution [m]. Default 500.
+                raster: Bool
+                    If True the CAPPI is plotted as a raster with the pixel
+                    to gate mapping computed once per scan geometry. The
+                    wfunc is not used. Default False
         'FIELD_COVERAGE': Gets the field coverage over a certain sector
             User defined parameters:
                 threshold: float or None
@@ -139,6 +151,26 @@ def generate_vol_products(dataset, prdcfg):
                     from the Py-ART configuration file
                 write_data: Bool
                     If true the histogram data is written in a csv file
+        'MOVIE': Generates an image product at each volume and appends it as
+            a new frame to a movie. The movie of each day is encoded while
+            the volumes are processed and is complete once the last volume
+            of the day has been processed. The frames are also kept as PNG
+            images. If the processing is restarted the movie starts with the
+            frames of the day already saved. Requires ffmpeg
+            User defined parameters:
+                frame_type: str
+                    The type of image product used as frame. Its user
+                    defined parameters are also read from the product
+                    configuration. Default 'PPI_IMAGE'
+                movie_format: str
+                    The format of the movie. Can be 'mp4', 'avi' or 'gif'.
+                    Default 'mp4'
+                fps: float
+                    The number of frames per second. Default 2.
+                window: float or None
+                    If set the movie contains only the frames of the last
+                    window hours and it is updated at each volume. Default
+                    None
         'PLOT_ALONG_COORD': Plots the radar volume data along a particular
             coordinate
             User defined parameters:
@@ -200,6 +232,10 @@ def generate_vol_products(dataset, prdcfg):
                     If the plot type is 'QUANTILES', the list of quantiles to
                     compute. If None a default list of quantiles will be
                     computed
+                raster: Bool
+                    If the plot type is 'PPI' and raster is True the PPI is
+                    plotted as a raster with the pixel to gate mapping
+                    computed once per scan geometry. Default False
         'PPI_MAP': Plots a PPI image over a map. The map resolution and the
             type of maps used are defined in the variables 'mapres' and 'maps'
             in 'ppiMapImageConfig' in the loc config file.
@@ -465,6 +501,22 @@ def generate_vol_products(dataset, prdcfg):
             User defined parameters:
                 anglenr: float
                     The number of the fixed angle to plot
+                raster: Bool
+                    If True the plot is kept as a raster with fixed time
+                    slots where only the rays not yet plotted are drawn.
+                    Suited for the time-height plots of the QVP-like
+                    datasets, which grow by one ray per volume. Default
+                    False
+                time_res: float
+                    If raster is True, the duration of each time slot [s].
+                    Default 300.
+                period: float
+                    If raster is True, the period shown [s]. Once it is
+                    exceeded the plot scrolls. Default 86400.
+                write_every: int
+                    If raster is True, the number of volumes between two
+                    savings of the plot. The last update is always saved
+                    at the end of the processing. Default 1
         'WIND_PROFILE': Plots vertical profile of wind data (U, V, W
             components and wind velocity and direction) out of a radar
             volume containing the retrieved U,V and W components of the wind,
@@ -538,9 +590,17 @@ def generate_vol_products(dataset, prdcfg):
         quantiles = prdcfg.get('quantiles', None)
         plot_type = prdcfg.get('plot_type', 'PPI')
 
-        fname_list = plot_ppi(
-            dataset['radar_out'], field_name, ind_el, prdcfg, fname_list,
-            plot_type=plot_type, step=step, quantiles=quantiles)
+        if plot_type == 'PPI' and prdcfg.get('raster', False):
+            submit_plot(
+                plot_ppi_raster, get_plot_radar(
+                    dataset['radar_out'], field_name, sweeps=[ind_el]),
+                field_name, 0, prdcfg, fname_list)
+        else:
+            submit_plot(
+                plot_ppi, get_plot_radar(
+                    dataset['radar_out'], field_name, sweeps=[ind_el]),
+                field_name, 0, prdcfg, fname_list, plot_type=plot_type,
+                step=step, quantiles=quantiles)
 
         print('----- save to '+' '.join(fname_list))
 
@@ -622,8 +682,10 @@ def generate_vol_products(dataset, prdcfg):
         for i, fname in enumerate(fname_list):
             fname_list[i] = savedir+fname
 
-        plot_ppi_map(
-            dataset['radar_out'], field_name, ind_el, prdcfg, fname_list)
+        submit_plot(
+            plot_ppi_map, get_plot_radar(
+                dataset['radar_out'], field_name, sweeps=[ind_el]),
+            field_name, 0, prdcfg, fname_list)
 
         print('----- save to '+' '.join(fname_list))
 
@@ -851,8 +913,11 @@ def generate_vol_products(dataset, prdcfg):
         quantiles = prdcfg.get('quantiles', None)
         plot_type = prdcfg.get('plot_type', 'RHI')
 
-        plot_rhi(dataset['radar_out'], field_name, ind_az, prdcfg, fname_list,
-                 plot_type=plot_type, step=step, quantiles=quantiles)
+        submit_plot(
+            plot_rhi, get_plot_radar(
+                dataset['radar_out'], field_name, sweeps=[ind_az]),
+            field_name, 0, prdcfg, fname_list, plot_type=plot_type,
+            step=step, quantiles=quantiles)
 
         print('----- save to '+' '.join(fname_list))
 
@@ -1134,9 +1199,7 @@ def generate_vol_products(dataset, prdcfg):
         field['data'] = field['data'][:, rng_mask]
         new_dataset.range['data'] = new_dataset.range['data'][rng_mask]
         new_dataset.ngates = len(new_dataset.range['data'])
-        new_dataset.init_gate_x_y_z()
-        new_dataset.init_gate_longitude_latitude()
-        new_dataset.init_gate_altitude()
+        attach_gate_geometry(new_dataset)
 
         new_dataset.fields = dict()
         new_dataset.add_field(field_name, field)
@@ -1755,9 +1818,12 @@ def generate_vol_products(dataset, prdcfg):
         for i, fname in enumerate(fname_list):
             fname_list[i] = savedir+fname
 
-        plot_cappi(
-            dataset['radar_out'], field_name, prdcfg['altitude'], prdcfg,
-            fname_list)
+        plot_func = plot_cappi
+        if prdcfg.get('raster', False):
+            plot_func = plot_cappi_raster
+        submit_plot(
+            plot_func, get_plot_radar(dataset['radar_out'], field_name),
+            field_name, prdcfg['altitude'], prdcfg, fname_list)
         print('----- save to '+' '.join(fname_list))
 
         return fname_list
@@ -1792,10 +1858,10 @@ def generate_vol_products(dataset, prdcfg):
         for i, fname in enumerate(fname_list):
             fname_list[i] = savedir+fname
 
-        plot_fixed_rng(
-            dataset['radar_out'], field_name, prdcfg, fname_list,
-            azi_res=azi_res, ele_res=ele_res, ang_tol=ang_tol, vmin=vmin,
-            vmax=vmax)
+        submit_plot(
+            plot_fixed_rng, get_plot_radar(dataset['radar_out'], field_name),
+            field_name, prdcfg, fname_list, azi_res=azi_res,
+            ele_res=ele_res, ang_tol=ang_tol, vmin=vmin, vmax=vmax)
 
         print('----- save to '+' '.join(fname_list))
 
@@ -1982,8 +2048,10 @@ def generate_vol_products(dataset, prdcfg):
         for i, fname in enumerate(fname_list):
             fname_list[i] = savedir+fname
 
-        plot_bscope(
-            dataset['radar_out'], field_name, ind_ang, prdcfg, fname_list)
+        submit_plot(
+            plot_bscope, get_plot_radar(
+                dataset['radar_out'], field_name, sweeps=[ind_ang]),
+            field_name, 0, prdcfg, fname_list)
         print('----- save to '+' '.join(fname_list))
 
         return fname_list
@@ -2015,8 +2083,17 @@ def generate_vol_products(dataset, prdcfg):
         for i, fname in enumerate(fname_list):
             fname_list[i] = savedir+fname
 
-        plot_time_range(
-            dataset['radar_out'], field_name, ind_ang, prdcfg, fname_list)
+        if prdcfg.get('raster', False):
+            fname_list = plot_time_height_raster(
+                dataset['radar_out'], field_name, ind_ang, prdcfg,
+                fname_list,
+                prdcfg['procname']+'/'+dssavedir+'/'+prdcfg['prdname'])
+            if fname_list is None:
+                return None
+        else:
+            plot_time_range(
+                dataset['radar_out'], field_name, ind_ang, prdcfg,
+                fname_list)
         print('----- save to '+' '.join(fname_list))
 
         return fname_list
@@ -2289,6 +2366,57 @@ def generate_vol_products(dataset, prdcfg):
 
     if prdcfg['type'] == 'CDF':
         field_name = get_fieldname_pyart(prdcfg['voltype'])
+
+        # CDF of the whole processing period from a quantile sketch
+        if 'sketch' in dataset:
+            if field_name != dataset['field_name']:
+                warn(
+                    ' Field type ' + field_name +
+                    ' not available in data set. Skipping product ' +
+                    prdcfg['type'])
+                return None
+
+            sketch = dataset['sketch']
+            quantiles, values = sketch.compute_quantiles(
+                quantiles=prdcfg.get('quantiles', None))
+            if np.ma.getmaskarray(values).all():
+                return None
+
+            savedir = get_save_dir(
+                prdcfg['basepath'], prdcfg['procname'], dssavedir,
+                prdcfg['prdname'], timeinfo=dataset['endtime'])
+
+            fname_list = make_filename(
+                'cdf', prdcfg['dstype'], prdcfg['voltype'],
+                prdcfg['imgformat'], timeinfo=dataset['endtime'])
+
+            for i, fname in enumerate(fname_list):
+                fname_list[i] = savedir+fname
+
+            field_dict = pyart.config.get_metadata(field_name)
+            titl = (
+                dataset['starttime'].strftime('%Y-%m-%d %H:%M:%S')+' - ' +
+                dataset['endtime'].strftime('%Y-%m-%d %H:%M:%S')+'\n' +
+                get_field_name(field_dict, field_name))
+            labelx = get_colobar_label(field_dict, field_name)
+
+            plot_quantiles(values, quantiles/100., fname_list, labelx=labelx,
+                           labely='Cumulative probability', titl=titl)
+
+            print('----- save to '+' '.join(fname_list))
+
+            fname = savedir+make_filename(
+                'cdf', prdcfg['dstype'], prdcfg['voltype'],
+                ['txt'], timeinfo=dataset['endtime'])[0]
+
+            write_cdf(
+                quantiles, values, sketch.n, 0, -1, -1, -1, 0, sketch.n,
+                fname, datatype=labelx, timeinfo=dataset['endtime'])
+
+            print('----- save to '+fname)
+
+            return fname
+
         if field_name not in dataset['radar_out'].fields:
             warn(
                 ' Field type ' + field_name +
@@ -2599,5 +2727,45 @@ def generate_vol_products(dataset, prdcfg):
 
         return fname
 
+    if prdcfg['type'] == 'MOVIE':
+        frame_prdcfg = deepcopy(prdcfg)
+        frame_prdcfg['type'] = prdcfg.get('frame_type', 'PPI_IMAGE')
+        frame_prdcfg['imgformat'] = ['png']
+        if frame_prdcfg['type'] == 'MOVIE':
+            warn('A movie can not be used as frame of a movie')
+            return None
+        with plot_inline():
+            frame_list = generate_vol_products(dataset, frame_prdcfg)
+        if frame_list is None:
+            return None
+        if not isinstance(frame_list, list):
+            frame_list = [frame_list]
+
+        movie_format = prdcfg.get('movie_format', 'mp4')
+        window = prdcfg.get('window', None)
+        movie_timeinfo = None
+        if window is None:
+            movie_timeinfo = prdcfg['timeinfo']
+
+        savedir = get_save_dir(
+            prdcfg['basepath'], prdcfg['procname'], dssavedir,
+            prdcfg['prdname'], timeinfo=movie_timeinfo)
+
+        fname = make_filename(
+            'movie', prdcfg['dstype'], prdcfg['voltype'], [movie_format],
+            prdcfginfo=frame_prdcfg['type'].lower(),
+            timeinfo=movie_timeinfo, timeformat='%Y%m%d')[0]
+
+        fname = savedir+fname
+
+        fname_list = append_movie_frame(
+            prdcfg['procname']+'/'+dssavedir+'/'+prdcfg['prdname'], fname,
+            frame_list[0], prdcfg['timeinfo'], fps=prdcfg.get('fps', 2.),
+            window=window)
+        for movie_fname in fname_list:
+            print('----- save to '+movie_fname)
+
+        return frame_list+fname_list
+
     warn(' Unsupported product type: ' + prdcfg['type'])
     return None
@@ -27,6 +27,7 @@ Radar Utilities
     find_neighbour_gates
     find_colocated_indexes
     get_target_elevations
+    get_geometry_key
     get_fixed_rng_data
     get_fixed_rng_span_data
     time_avg_range
@@ -42,11 +43,65 @@ Radar Utilities
     compute_histogram
     compute_histogram_sweep
     belongs_roi_indices
+    points_in_polygon
+    get_gate_spatial_index
+    find_gates_in_bbox
+    find_roi_gates
+    get_roi_radar
     compute_profile_stats
     compute_directional_stats
     project_to_vertical
+    compute_grid_weights
+    grid_from_weights
 
     quantiles_weighted
+
+Accumulators
+============
+
+.. autosummary::
+    :toctree: generated/
+
+    RadarAccumulator
+    merge_accumulator_states
+    get_regrid_map
+    RainfallAccumulator
+    QuantileSketch
+    Hist2dAccumulator
+
+Gate geometry
+=============
+
+.. autosummary::
+    :toctree: generated/
+
+    GateGeometry
+    get_gate_geometry
+    attach_gate_geometry
+
+Data types
+==========
+
+.. autosummary::
+    :toctree: generated/
+
+    get_float_dtype
+    get_compact_dtype
+    compact_field
+    compact_radar_fields
+    pack_mask
+    unpack_mask
+
+Sun hits
+========
+
+.. autosummary::
+    :toctree: generated/
+
+    compute_sun_position
+    get_ray_sun_position
+    get_sun_hit_candidates
+    find_sun_hits
 """
 
 from .radar_utils import time_avg_range, get_closest_solar_flux
@@ -64,7 +119,27 @@ from .radar_utils import project_to_vertical, find_neighbour_gates
 from .radar_utils import get_target_elevations, get_data_along_rng
 from .radar_utils import get_data_along_azi, get_data_along_ele
 from .radar_utils import get_fixed_rng_data, get_fixed_rng_span_data
+from .radar_utils import get_geometry_key
+from .radar_utils import points_in_polygon, get_gate_spatial_index
+from .radar_utils import find_gates_in_bbox, find_roi_gates, get_roi_radar
 
 from .stat_utils import quantiles_weighted
 
+from .grid_utils import compute_grid_weights, grid_from_weights
+
+from .accumulator import RadarAccumulator, merge_accumulator_states
+from .accumulator import get_regrid_map
+from .rainfall_accumulator import RainfallAccumulator
+from .quantile_sketch import QuantileSketch
+from .hist2d_accumulator import Hist2dAccumulator
+
+from .gate_geometry import GateGeometry, get_gate_geometry
+from .gate_geometry import attach_gate_geometry
+
+from .dtype_utils import get_float_dtype, get_compact_dtype, compact_field
+from .dtype_utils import compact_radar_fields, pack_mask, unpack_mask
+
+from .sun_utils import compute_sun_position, get_ray_sun_position
+from .sun_utils import get_sun_hit_candidates, find_sun_hits
+
 __all__ = [s for s in dir() if not s.startswith('_')]
@@ -0,0 +1,461 @@
+"""
+pyrad.util.accumulator
+======================
+
+RadarAccumulator class implementation for accumulating radar fields in time
+over a fixed reference scan geometry.
+
+.. autosummary::
+    :toctree: generated/
+
+    RadarAccumulator
+    merge_accumulator_states
+    get_regrid_map
+    nearest_index_map
+
+"""
+
+from copy import copy, deepcopy
+from warnings import warn
+
+import numpy as np
+
+import pyart
+
+from .radar_utils import get_geometry_key
+
+# maximum number of regridding maps kept by each accumulator
+_REGRID_MAPS_SIZE = 10
+
+
+class RadarAccumulator(object):
+    """
+    Accumulates radar fields over time. The accumulated values are kept in
+    place in arrays with the geometry of the first radar object added.
+    Volumes with a different scan geometry are mapped into the reference
+    geometry by nearest neighbour. The mapping is computed only once for
+    each scan geometry.
+
+    Attributes
+    ----------
+    radar : radar object
+        radar object without fields defining the reference geometry
+    sums : dict
+        dictionary of arrays (nrays, ngates) with the accumulated values of
+        each field
+    metadata : dict
+        dictionary with the metadata of each accumulated field
+    count : int array (nrays, ngates)
+        number of samples accumulated at each gate
+    nvolumes : int
+        number of volumes accumulated
+    ang_tol : float
+        tolerance used to match the fixed angles of the sweeps [deg]
+
+    Methods:
+    --------
+    add : Adds the fields of a new volume
+    merge : Adds the accumulated values of another accumulator
+    get_mean : Get the mean of an accumulated field
+    get_sum : Get the sum of an accumulated field
+    get_count_field : Get the number of samples as a field dictionary
+    to_radar : Hands off the reference radar object with fields attached
+
+    """
+
+    def __init__(self, radar, field_metadata, dtype=np.float64,
+                 count_dtype=np.uint32, ang_tol=0.5):
+        """
+        Initalize the object.
+
+        Parameters
+        ----------
+        radar : radar object
+            radar object defining the reference geometry
+        field_metadata : dict
+            dictionary of field dictionaries with the metadata of the fields
+            to accumulate. The data of the field dictionaries is ignored
+        dtype : data type
+            data type of the accumulated values
+        count_dtype : data type
+            data type of the number of samples. It has to be large enough
+            for the number of volumes accumulated, merged partial states
+            included
+        ang_tol : float
+            tolerance used to match the fixed angles of the sweeps [deg]
+
+        """
+        radar_ref = copy(radar)
+        radar_ref.fields = dict()
+        self.radar = deepcopy(radar_ref)
+        self.geometry_key = get_geometry_key(radar)
+        self.ang_tol = ang_tol
+
+        self.metadata = dict()
+        self.sums = dict()
+        for field_name in field_metadata:
+            field_dict = {
+                key: deepcopy(value)
+                for key, value in field_metadata[field_name].items()
+                if key != 'data'}
+            self.metadata.update({field_name: field_dict})
+            self.sums.update({field_name: np.zeros(
+                (radar.nrays, radar.ngates), dtype=dtype)})
+        self.count = np.zeros(
+            (radar.nrays, radar.ngates), dtype=count_dtype)
+        self.nvolumes = 0
+        self._regrid_maps = dict()
+
+    def __getstate__(self):
+        """
+        Gets the state of the object to be pickled. The fields handed off
+        with the radar object and the regridding maps are not stored since
+        they can be recomputed
+
+        """
+        state = self.__dict__.copy()
+        state['radar'] = copy(self.radar)
+        state['radar'].fields = dict()
+        state['_regrid_maps'] = dict()
+        return state
+
+    def add(self, radar, data_dict, count=None):
+        """
+        Adds the data of a new volume to the accumulated values. Masked
+        values are accumulated as 0. The number of samples is increased at
+        all gates of the reference geometry covered by the new volume
+
+        Parameters
+        ----------
+        radar : radar object
+            the radar object defining the geometry of the data
+        data_dict : dict
+            dictionary with the data (nrays, ngates) of each field to add
+        count : int array (nrays, ngates) or None
+            the number of samples to add at each gate. If None one sample is
+            added at each gate
+
+        """
+        if count is None:
+            count = 1
+        else:
+            count = np.ma.filled(count, fill_value=0)
+
+        regrid_map = self._get_regrid_map(radar)
+        if regrid_map is None:
+            for field_name, data in data_dict.items():
+                np.add(self.sums[field_name],
+                       np.ma.filled(data, fill_value=0),
+                       out=self.sums[field_name], casting='unsafe')
+            np.add(self.count, count, out=self.count, casting='unsafe')
+        else:
+            inds_dest, inds_orig = regrid_map
+            for field_name, data in data_dict.items():
+                self.sums[field_name][inds_dest] += np.ma.filled(
+                    data, fill_value=0)[inds_orig]
+            if np.isscalar(count):
+                self.count[inds_dest] += count
+            else:
+                self.count[inds_dest] += count[inds_orig]
+        self.nvolumes += 1
+
+    def merge(self, other):
+        """
+        Adds the accumulated values of another accumulator. The values of
+        the other accumulator are mapped into the reference geometry. The
+        operation is associative so that accumulators of different time
+        periods can be merged in any grouping
+
+        Parameters
+        ----------
+        other : RadarAccumulator object
+            the accumulator to merge. It must accumulate the same fields
+
+        Returns
+        -------
+        self : RadarAccumulator object
+            the merged accumulator
+
+        """
+        if set(other.sums.keys()) != set(self.sums.keys()):
+            raise ValueError(
+                'ERROR: Unable to merge accumulators of different fields')
+
+        if np.issubdtype(self.count.dtype, np.integer) and (
+                int(np.max(self.count))+int(np.max(other.count)) >
+                np.iinfo(self.count.dtype).max):
+            raise ValueError(
+                'ERROR: Unable to merge accumulators. The number of samples '
+                'overflows '+str(self.count.dtype))
+
+        regrid_map = self._get_regrid_map(other.radar)
+        if regrid_map is None:
+            for field_name, field_sum in other.sums.items():
+                np.add(self.sums[field_name], field_sum,
+                       out=self.sums[field_name], casting='unsafe')
+            np.add(self.count, other.count, out=self.count,
+                   casting='unsafe')
+        else:
+            inds_dest, inds_orig = regrid_map
+            for field_name, field_sum in other.sums.items():
+                self.sums[field_name][inds_dest] += field_sum[inds_orig]
+            self.count[inds_dest] += other.count[inds_orig]
+        self.nvolumes += other.nvolumes
+
+        return self
+
+    def get_mean(self, field_name, in_place=True):
+        """
+        Gets the mean of an accumulated field. Gates without samples are
+        masked
+
+        Parameters
+        ----------
+        field_name : str
+            name of the field
+        in_place : bool
+            If True the mean is computed in the memory of the accumulated
+            values. The accumulated sum is not usable anymore
+
+        Returns
+        -------
+        mean : masked array
+            the mean value at each gate
+
+        """
+        has_samples = self.count > 0
+        out = self.sums[field_name] if in_place else None
+        mean = np.divide(
+            self.sums[field_name], self.count, out=out, where=has_samples)
+        return np.ma.masked_where(
+            np.logical_not(has_samples), mean, copy=False)
+
+    def get_sum(self, field_name):
+        """
+        Gets the sum of an accumulated field without copying it. Gates
+        without samples are masked
+
+        Parameters
+        ----------
+        field_name : str
+            name of the field
+
+        Returns
+        -------
+        field_sum : masked array
+            the accumulated values at each gate
+
+        """
+        return np.ma.masked_where(
+            self.count == 0, self.sums[field_name], copy=False)
+
+    def get_count_field(self):
+        """
+        Gets the number of samples accumulated at each gate as a field
+        dictionary
+
+        Returns
+        -------
+        npoints_dict : dict
+            the number_of_samples field dictionary
+
+        """
+        npoints_dict = pyart.config.get_metadata('number_of_samples')
+        npoints_dict['data'] = np.ma.asarray(self.count)
+        return npoints_dict
+
+    def to_radar(self, data_dict):
+        """
+        Hands off the reference radar object with the data of the fields
+        attached. The data is not copied. Data sharing memory with the
+        accumulated values reflects any further addition
+
+        Parameters
+        ----------
+        data_dict : dict
+            dictionary with the data of each field to attach. The metadata
+            of the field is the one of the accumulated field with the same
+            name if any. Values can also be complete field dictionaries
+
+        Returns
+        -------
+        radar : radar object
+            the reference radar object with the fields
+
+        """
+        for field_name, data in data_dict.items():
+            if isinstance(data, dict):
+                field_dict = data
+            else:
+                field_dict = deepcopy(self.metadata.get(field_name, dict()))
+                field_dict['data'] = data
+            self.radar.add_field(
+                field_name, field_dict, replace_existing=True)
+
+        return self.radar
+
+    def _get_regrid_map(self, radar):
+        """
+        Gets the indices mapping the gates of a radar object into the
+        reference geometry. None if the geometry is the reference one
+
+        Parameters
+        ----------
+        radar : radar object
+            the radar object
+
+        Returns
+        -------
+        regrid_map : tuple of 2 tuples or None
+            the destination and origin indices of the gates
+
+        """
+        key = get_geometry_key(radar)
+        if key == self.geometry_key:
+            return None
+        if key not in self._regrid_maps:
+            if len(self._regrid_maps) >= _REGRID_MAPS_SIZE:
+                self._regrid_maps.pop(next(iter(self._regrid_maps)))
+            self._regrid_maps.update({key: get_regrid_map(
+                self.radar, radar, ang_tol=self.ang_tol)})
+
+        return self._regrid_maps[key]
+
+
+def merge_accumulator_states(state_list):
+    """
+    Merges the partial states of an accumulating dataset obtained over
+    different processing chunks. A partial state is the dataset global data
+    containing a RadarAccumulator under the key 'accumulator' and/or a
+    QuantileSketch under the key 'sketch'. If the states
+    contain the key 'merge_by' only states with the same value of the key it
+    names are merged together. The start time of the merged state is the
+    earliest one and the end time and time info the latest ones
+
+    Parameters
+    ----------
+    state_list : list of dict
+        the partial states in chronological order
+
+    Returns
+    -------
+    merged_list : list of dict
+        the merged states
+
+    """
+    merged_states = dict()
+    for state in state_list:
+        merge_by = state.get('merge_by', None)
+        key = None if merge_by is None else state[merge_by]
+        if key not in merged_states:
+            merged_states.update({key: state})
+            continue
+
+        merged = merged_states[key]
+        for obj_key in ('accumulator', 'sketch'):
+            if merged.get(obj_key, None) is not None:
+                merged[obj_key].merge(state[obj_key])
+        if 'starttime' in state:
+            merged['starttime'] = min(merged['starttime'], state['starttime'])
+        for time_key in ('endtime', 'timeinfo'):
+            if time_key in state:
+                merged[time_key] = max(merged[time_key], state[time_key])
+
+    return list(merged_states.values())
+
+
+def get_regrid_map(radar_ref, radar, ang_tol=0.5):
+    """
+    Gets the indices mapping the gates of a radar object into the geometry
+    of a reference radar object by nearest neighbour. The sweeps are matched
+    by their fixed angle
+
+    Parameters
+    ----------
+    radar_ref : radar object
+        the radar object defining the reference geometry
+    radar : radar object
+        the radar object to map
+    ang_tol : float
+        tolerance used to match the fixed angles of the sweeps [deg]
+
+    Returns
+    -------
+    regrid_map : tuple of 2 tuples
+        the destination and origin indices of the gates
+
+    """
+    ray_map = np.full(radar_ref.nrays, -1, dtype=np.intp)
+    for sweep in range(radar_ref.nsweeps):
+        start_dest = radar_ref.sweep_start_ray_index['data'][sweep]
+        end_dest = radar_ref.sweep_end_ray_index['data'][sweep]
+        fixed_angle = radar_ref.fixed_angle['data'][sweep]
+
+        # look for nearest angle
+        delta_ang = np.absolute(radar.fixed_angle['data']-fixed_angle)
+        ind_sweep_orig = np.argmin(delta_ang)
+        if delta_ang[ind_sweep_orig] > ang_tol:
+            warn('No fixed angle of origin radar object matches the ' +
+                 'fixed angle of destination radar object for sweep nr ' +
+                 str(sweep)+' with fixed angle '+str(fixed_angle) +
+                 '+/-'+str(ang_tol))
+            continue
+
+        start_orig = radar.sweep_start_ray_index['data'][ind_sweep_orig]
+        end_orig = radar.sweep_end_ray_index['data'][ind_sweep_orig]
+        if radar_ref.scan_type == 'rhi':
+            angle_orig = radar.elevation['data'][start_orig:end_orig+1]
+            angle_dest = radar_ref.elevation['data'][start_dest:end_dest+1]
+        else:
+            angle_orig = radar.azimuth['data'][start_orig:end_orig+1]
+            angle_dest = radar_ref.azimuth['data'][start_dest:end_dest+1]
+
+        ind_ray = nearest_index_map(angle_orig, angle_dest)
+        ind_ray[ind_ray >= 0] += start_orig
+        ray_map[start_dest:end_dest+1] = ind_ray
+
+    rng_map = nearest_index_map(
+        radar.range['data'], radar_ref.range['data'])
+
+    rays_dest = np.where(ray_map >= 0)[0]
+    rngs_dest = np.where(rng_map >= 0)[0]
+    regrid_map = (
+        np.ix_(rays_dest, rngs_dest),
+        np.ix_(ray_map[rays_dest], rng_map[rngs_dest]))
+
+    return regrid_map
+
+
+def nearest_index_map(x_orig, x_dest):
+    """
+    For each destination coordinate gets the index of the nearest origin
+    coordinate. Destination coordinates outside the limits of the origin
+    coordinates are not mapped.
+
+    Parameters
+    ----------
+    x_orig : 1D array
+        the origin coordinates
+    x_dest : 1D array
+        the destination coordinates
+
+    Returns
+    -------
+    ind : 1D int array
+        index of the nearest origin coordinate. -1 if not mapped
+
+    """
+    ind_sort = np.argsort(x_orig, kind='stable')
+    x_sorted = x_orig[ind_sort]
+
+    ind_hi = np.clip(np.searchsorted(x_sorted, x_dest), 1, x_sorted.size-1)
+    ind_lo = ind_hi-1
+    if x_sorted.size == 1:
+        ind_hi = ind_lo = np.zeros(x_dest.size, dtype=np.intp)
+    use_lo = (x_dest-x_sorted[ind_lo]) <= (x_sorted[ind_hi]-x_dest)
+    ind = np.where(use_lo, ind_lo, ind_hi)
+
+    ind = ind_sort[ind]
+    ind[np.logical_or(x_dest < x_sorted[0], x_dest > x_sorted[-1])] = -1
+
+    return ind
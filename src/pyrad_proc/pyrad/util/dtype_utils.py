@@ -0,0 +1,192 @@
+"""
+pyrad.util.dtype_utils
+======================
+
+Functions implementing the compact data type policy: physical moments are
+stored in single precision, classes, counts and visibility in a fixed
+unsigned integer type per field and masks are dropped when nothing is
+masked or bit-packed when stored on disk.
+
+.. autosummary::
+    :toctree: generated/
+
+    get_float_dtype
+    get_compact_dtype
+    compact_field
+    compact_radar_fields
+    pack_mask
+    unpack_mask
+
+"""
+
+from copy import copy
+from warnings import warn
+
+import numpy as np
+
+# compact data type of the fields that are not physical moments. The data
+# type of a field is the same in all volumes
+_COMPACT_DTYPES = {
+    'radar_echo_id': np.uint8,
+    'radar_echo_classification': np.uint8,
+    'visibility': np.uint8,
+    'occurrence': np.uint16,
+    'number_of_samples': np.uint16,
+    'number_of_samples_velocity': np.uint16,
+    'number_of_samples_reflectivity': np.uint16,
+    'number_of_samples_velocity_all': np.uint16,
+    'number_of_samples_reflectivity_all': np.uint16,
+}
+
+
+def get_float_dtype(compact=False):
+    """
+    Gets the floating point data type of the physical moments
+
+    Parameters
+    ----------
+    compact : bool
+        If True the compact data type policy is used
+
+    Returns
+    -------
+    dtype : numpy data type
+        float32 if compact, float64 otherwise
+
+    """
+    if compact:
+        return np.float32
+    return np.float64
+
+
+def get_compact_dtype(field_name, dtype):
+    """
+    Gets the compact data type of a field. Classes, counts and visibility
+    have a fixed unsigned integer type, the other floating point fields are
+    single precision and the other integer fields keep their type
+
+    Parameters
+    ----------
+    field_name : str
+        the name of the field
+    dtype : numpy data type
+        the current data type of the field
+
+    Returns
+    -------
+    dtype : numpy data type
+        the compact data type
+
+    """
+    if field_name in _COMPACT_DTYPES:
+        return np.dtype(_COMPACT_DTYPES[field_name])
+    if np.dtype(dtype).kind == 'f':
+        return np.dtype(np.float32)
+    return np.dtype(dtype)
+
+
+def compact_field(field, field_name):
+    """
+    Gets a copy of a field dictionary with the data in the compact data
+    type. The mask is dropped if no data is masked. Data already in the
+    compact type are not copied. Fields whose values do not fit in their
+    integer type are kept unchanged
+
+    Parameters
+    ----------
+    field : dict
+        the field dictionary. It is not modified
+    field_name : str
+        the name of the field
+
+    Returns
+    -------
+    field : dict
+        the field dictionary with the compact data
+
+    """
+    field = dict(field)
+    data = field['data']
+    dtype = get_compact_dtype(field_name, data.dtype)
+
+    if data.dtype != dtype:
+        if dtype.kind == 'u':
+            values = np.ma.compressed(data)
+            if values.size > 0 and (
+                    values.min() < 0 or values.max() > np.iinfo(dtype).max):
+                warn('Values of field '+field_name+' out of the range of ' +
+                     str(dtype)+'. Data type not changed')
+                return field
+            if data.dtype.kind == 'f':
+                data = np.ma.round(data)
+        data = data.astype(dtype)
+    else:
+        data = data.view()
+    if np.ma.isMaskedArray(data):
+        data.shrink_mask()
+    field['data'] = data
+
+    return field
+
+
+def compact_radar_fields(radar):
+    """
+    Gets a shallow copy of a radar object with the fields in the compact
+    data type. The fields of the input radar object are not modified
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object
+
+    Returns
+    -------
+    radar : radar object
+        the radar object with compact fields
+
+    """
+    radar_out = copy(radar)
+    radar_out.fields = {
+        field_name: compact_field(field, field_name)
+        for field_name, field in radar.fields.items()}
+
+    return radar_out
+
+
+def pack_mask(mask):
+    """
+    Packs a boolean mask into bits
+
+    Parameters
+    ----------
+    mask : bool array
+        the mask
+
+    Returns
+    -------
+    packed_mask : 1D uint8 array
+        the bit-packed flattened mask
+
+    """
+    return np.packbits(np.asarray(mask, dtype=bool).ravel())
+
+
+def unpack_mask(packed_mask, shape):
+    """
+    Unpacks a bit-packed boolean mask
+
+    Parameters
+    ----------
+    packed_mask : 1D uint8 array
+        the bit-packed flattened mask
+    shape : tuple
+        the shape of the mask
+
+    Returns
+    -------
+    mask : bool array
+        the mask
+
+    """
+    return np.unpackbits(
+        packed_mask, count=int(np.prod(shape))).reshape(shape).astype(bool)
@@ -0,0 +1,215 @@
+"""
+pyrad.util.gate_geometry
+========================
+
+Process-wide cache of the gate geometry of the radar scan strategies. The
+gate Cartesian, geographic and Swiss coordinates are computed only once for
+all the radar objects sharing the same scan geometry and radar position.
+
+.. autosummary::
+    :toctree: generated/
+
+    GateGeometry
+    get_gate_geometry
+    attach_gate_geometry
+
+"""
+
+from copy import copy, deepcopy
+from functools import partial
+
+import pyart
+from pyart.lazydict import LazyLoadDict
+
+from .radar_utils import get_geometry_key, get_gate_spatial_index
+
+# gate geometry of the scan strategies already processed
+_GATE_GEOMETRY_CACHE = dict()
+_GATE_GEOMETRY_CACHE_SIZE = 10
+
+# radar attributes containing gate coordinates
+_GATE_COORDS = (
+    'gate_x', 'gate_y', 'gate_z', 'gate_longitude', 'gate_latitude',
+    'gate_altitude')
+
+
+class GateGeometry(object):
+    """
+    Gate geometry of a scan strategy. The gate coordinates are computed the
+    first time they are requested and shared (read-only) afterwards.
+
+    Attributes
+    ----------
+    geometry_key : str
+        key identifying the scan geometry
+    radar : radar object
+        radar object without fields defining the scan geometry
+
+    """
+
+    def __init__(self, radar):
+        """
+        initalize the object
+
+        Parameters
+        ----------
+        radar : radar object
+            a radar object with the scan geometry
+
+        """
+        self.geometry_key = get_geometry_key(radar)
+
+        self.radar = copy(radar)
+        self.radar.fields = dict()
+        for attr in ('range', 'azimuth', 'elevation', 'latitude',
+                     'longitude', 'altitude', 'projection'):
+            setattr(self.radar, attr, deepcopy(getattr(radar, attr)))
+        self.radar.init_gate_x_y_z()
+        self.radar.init_gate_longitude_latitude()
+        self.radar.init_gate_altitude()
+
+        self._data = dict()
+
+    def __copy__(self):
+        """ the geometry is shared, never copied """
+        return self
+
+    def __deepcopy__(self, memo):
+        """ the geometry is shared, never copied """
+        return self
+
+    def get_gate_data(self, coord):
+        """
+        Gets the gate coordinates
+
+        Parameters
+        ----------
+        coord : str
+            the coordinate. One of gate_x, gate_y, gate_z, gate_longitude,
+            gate_latitude or gate_altitude
+
+        Returns
+        -------
+        data : 2D array
+            read-only array (nrays, ngates) with the gate coordinate
+
+        """
+        if coord not in self._data:
+            data = getattr(self.radar, coord)['data']
+            data.flags.writeable = False
+            self._data[coord] = data
+
+        return self._data[coord]
+
+    def get_swiss_coord(self):
+        """
+        Gets the gate coordinates in the Swiss CH1903 system
+
+        Returns
+        -------
+        x_radar, y_radar, z_radar : 2D arrays
+            read-only arrays containing the Swiss coordinates of the gates
+            [m]
+
+        """
+        if 'swiss_x' not in self._data:
+            x0, y0, _ = pyart.core.wgs84_to_swissCH1903(
+                self.radar.longitude['data'][0],
+                self.radar.latitude['data'][0],
+                self.radar.altitude['data'][0], no_altitude_transform=True)
+
+            for coord, offset in (('swiss_x', x0), ('swiss_y', y0)):
+                data = self.get_gate_data('gate_'+coord[-1])+offset
+                data.flags.writeable = False
+                self._data[coord] = data
+
+        return (
+            self._data['swiss_x'], self._data['swiss_y'],
+            self.get_gate_data('gate_altitude'))
+
+    def get_spatial_index(self, cell_size=0.01):
+        """
+        Gets a spatial index of the gates. See get_gate_spatial_index
+
+        Parameters
+        ----------
+        cell_size : float
+            the size of the grid cells [deg]
+
+        Returns
+        -------
+        gate_index : dict
+            the spatial index
+
+        """
+        return get_gate_spatial_index(self.radar, cell_size=cell_size)
+
+    def attach(self, radar):
+        """
+        Sets the gate coordinates of a radar object with the same scan
+        geometry. The coordinates are loaded lazily from the shared geometry
+
+        Parameters
+        ----------
+        radar : radar object
+            the radar object
+
+        Returns
+        -------
+        radar : radar object
+            the radar object with the shared gate coordinates
+
+        """
+        for coord in _GATE_COORDS:
+            gate_dict = LazyLoadDict(pyart.config.get_metadata(coord))
+            gate_dict.set_lazy('data', partial(self.get_gate_data, coord))
+            setattr(radar, coord, gate_dict)
+
+        return radar
+
+
+def get_gate_geometry(radar):
+    """
+    Gets the gate geometry shared by all the radar objects with the scan
+    geometry of a radar object
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object
+
+    Returns
+    -------
+    gate_geometry : GateGeometry object
+        the shared gate geometry
+
+    """
+    key = get_geometry_key(radar)
+    if key in _GATE_GEOMETRY_CACHE:
+        return _GATE_GEOMETRY_CACHE[key]
+
+    gate_geometry = GateGeometry(radar)
+    if len(_GATE_GEOMETRY_CACHE) >= _GATE_GEOMETRY_CACHE_SIZE:
+        _GATE_GEOMETRY_CACHE.pop(next(iter(_GATE_GEOMETRY_CACHE)))
+    _GATE_GEOMETRY_CACHE[key] = gate_geometry
+
+    return gate_geometry
+
+
+def attach_gate_geometry(radar):
+    """
+    Sets the gate coordinates of a radar object from the shared gate
+    geometry of its scan strategy
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object
+
+    Returns
+    -------
+    radar : radar object
+        the radar object with the shared gate coordinates
+
+    """
+    return get_gate_geometry(radar).attach(radar)
@@ -0,0 +1,296 @@
+"""
+pyrad.util.grid_utils
+=====================
+
+Functions to map radar data into a regular Cartesian grid by means of a
+precomputed sparse matrix of gate to grid point weights
+
+.. autosummary::
+    :toctree: generated/
+
+    compute_grid_weights
+    grid_from_weights
+    _compute_roi
+
+"""
+from copy import deepcopy
+
+import numpy as np
+from scipy.spatial import cKDTree
+from scipy.sparse import csr_matrix
+
+import pyart
+
+
+def compute_grid_weights(radar, grid_shape, grid_limits, grid_origin,
+                         grid_origin_alt, wfunc='NEAREST_NEIGHBOUR',
+                         roi_func='dist_beam', h_factor=1., nb=1., bsp=1.,
+                         min_radius=500., constant_roi=500., nroi_groups=20):
+    """
+    Computes the sparse matrix of weights that maps the radar gates into the
+    points of a regular Cartesian grid. The weighting and region of interest
+    functions mimic those of pyart.map.grid_from_radars
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object defining the scan geometry
+    grid_shape : 3-tuple of ints
+        number of points in the grid (z, y, x)
+    grid_limits : 3-tuple of 2-tuples
+        minimum and maximum grid location (inclusive) in meters for the z, y,
+        x coordinates
+    grid_origin : 2-tuple of floats
+        latitude and longitude of the grid origin [deg]
+    grid_origin_alt : float
+        altitude of the grid origin [m MSL]
+    wfunc : str
+        the weighting function used to combine the radar gates close to a
+        grid point. Possible values BARNES, BARNES2, CRESSMAN,
+        NEAREST_NEIGHBOUR
+    roi_func : str
+        the function used to compute the region of interest. Possible values:
+        dist_beam, constant
+    h_factor, nb, bsp, min_radius : float
+        parameters of the dist_beam region of interest function
+    constant_roi : float
+        the radius of the region of interest when roi_func is constant [m]
+    nroi_groups : int
+        the grid points are processed in groups of similar region of interest
+        in order to limit the number of candidate gates per search
+
+    Returns
+    -------
+    weights : scipy csr_matrix
+        matrix of size (number of grid points, number of gates) containing
+        the weight of each radar gate in each grid point
+
+    """
+    wfunc = wfunc.upper()
+    if wfunc not in ('BARNES', 'BARNES2', 'CRESSMAN', 'NEAREST',
+                     'NEAREST_NEIGHBOUR'):
+        raise ValueError('ERROR: Unknown weighting function '+wfunc)
+
+    # position of the radar gates respect to the grid origin
+    x_disp, y_disp = pyart.core.geographic_to_cartesian_aeqd(
+        radar.longitude['data'], radar.latitude['data'], grid_origin[1],
+        grid_origin[0])
+    z_disp = float(radar.altitude['data'][0])-grid_origin_alt
+    offset = (z_disp, float(np.asarray(y_disp).ravel()[0]),
+              float(np.asarray(x_disp).ravel()[0]))
+
+    gate_xyz = np.empty((radar.nrays*radar.ngates, 3), dtype=np.float64)
+    gate_xyz[:, 0] = radar.gate_z['data'].ravel()+offset[0]
+    gate_xyz[:, 1] = radar.gate_y['data'].ravel()+offset[1]
+    gate_xyz[:, 2] = radar.gate_x['data'].ravel()+offset[2]
+
+    # position of the grid points
+    nz, ny, nx = grid_shape
+    (zmin, zmax), (ymin, ymax), (xmin, xmax) = grid_limits
+    z_grid, y_grid, x_grid = np.meshgrid(
+        np.linspace(zmin, zmax, nz), np.linspace(ymin, ymax, ny),
+        np.linspace(xmin, xmax, nx), indexing='ij')
+    point_xyz = np.stack(
+        (z_grid.ravel(), y_grid.ravel(), x_grid.ravel()), axis=-1)
+    npoints = point_xyz.shape[0]
+
+    roi = _compute_roi(
+        point_xyz, offset, roi_func=roi_func, h_factor=h_factor, nb=nb,
+        bsp=bsp, min_radius=min_radius, constant_roi=constant_roi)
+
+    tree = cKDTree(gate_xyz)
+
+    # process grid points in groups of increasing region of interest
+    ind_sorted = np.argsort(roi, kind='stable')
+    rows_list = []
+    cols_list = []
+    vals_list = []
+    for ind_group in np.array_split(ind_sorted, min(nroi_groups, npoints)):
+        if ind_group.size == 0:
+            continue
+        pts = point_xyz[ind_group]
+        roi_group = roi[ind_group]
+        roi_max = roi_group.max()
+
+        if wfunc in ('NEAREST', 'NEAREST_NEIGHBOUR'):
+            dist, ind_gate = tree.query(
+                pts, k=1, distance_upper_bound=roi_max)
+            is_valid = dist <= roi_group
+            rows_list.append(ind_group[is_valid])
+            cols_list.append(ind_gate[is_valid])
+            vals_list.append(np.ones(np.count_nonzero(is_valid)))
+            continue
+
+        inds_gate = tree.query_ball_point(pts, roi_max)
+        nneigh = np.fromiter(
+            (len(inds) for inds in inds_gate), dtype=np.intp,
+            count=ind_group.size)
+        if nneigh.sum() == 0:
+            continue
+        cols = np.fromiter(
+            (ind for inds in inds_gate for ind in inds), dtype=np.intp,
+            count=nneigh.sum())
+        rows_group = np.repeat(np.arange(ind_group.size), nneigh)
+
+        dist2 = np.sum(
+            (gate_xyz[cols]-pts[rows_group])**2., axis=-1)
+        roi2 = roi_group[rows_group]**2.
+        is_valid = dist2 < roi2
+        dist2 = dist2[is_valid]
+        roi2 = roi2[is_valid]
+
+        if wfunc == 'CRESSMAN':
+            vals = (roi2-dist2)/(roi2+dist2)
+        elif wfunc == 'BARNES':
+            vals = np.exp(-dist2/(2.*roi2))+1e-5
+        else:
+            vals = np.exp(-dist2/(roi2/4.))+1e-5
+
+        rows_list.append(ind_group[rows_group[is_valid]])
+        cols_list.append(cols[is_valid])
+        vals_list.append(vals)
+
+    if rows_list:
+        rows = np.concatenate(rows_list)
+        cols = np.concatenate(cols_list)
+        vals = np.concatenate(vals_list)
+    else:
+        rows = np.array([], dtype=np.intp)
+        cols = np.array([], dtype=np.intp)
+        vals = np.array([], dtype=np.float32)
+
+    return csr_matrix(
+        (vals.astype(np.float32), (rows, cols)),
+        shape=(npoints, radar.nrays*radar.ngates))
+
+
+def grid_from_weights(radar, weights, grid_shape, grid_limits, grid_origin,
+                      grid_origin_alt, field_names):
+    """
+    Maps radar fields into a regular Cartesian grid using a precomputed
+    sparse matrix of weights. Masked and invalid gates do not contribute to
+    the grid points. Grid points without valid gates are masked
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object containing the fields to grid
+    weights : scipy csr_matrix
+        matrix of weights as obtained with compute_grid_weights
+    grid_shape : 3-tuple of ints
+        number of points in the grid (z, y, x)
+    grid_limits : 3-tuple of 2-tuples
+        minimum and maximum grid location (inclusive) in meters for the z, y,
+        x coordinates
+    grid_origin : 2-tuple of floats
+        latitude and longitude of the grid origin [deg]
+    grid_origin_alt : float
+        altitude of the grid origin [m MSL]
+    field_names : list of str
+        the names of the fields to grid
+
+    Returns
+    -------
+    grid : grid object
+        the gridded data
+
+    """
+    if weights.shape[1] != radar.nrays*radar.ngates:
+        raise ValueError(
+            'ERROR: Grid weights not compatible with radar geometry')
+
+    fields = dict()
+    for field_name in field_names:
+        data = np.ma.masked_invalid(radar.fields[field_name]['data']).ravel()
+        valid = np.logical_not(np.ma.getmaskarray(data))
+        field_sum = weights.dot(data.filled(fill_value=0.))
+        weight_sum = weights.dot(valid.astype(np.float32))
+
+        is_valid = weight_sum > 0.
+        field_data = np.ma.masked_all(weights.shape[0])
+        field_data[is_valid] = field_sum[is_valid]/weight_sum[is_valid]
+
+        field_dict = deepcopy(radar.fields[field_name])
+        field_dict.pop('data', None)
+        field_dict['data'] = field_data.reshape(grid_shape)
+        fields.update({field_name: field_dict})
+
+    time = pyart.config.get_metadata('grid_time')
+    time['data'] = np.array([radar.time['data'][0]])
+    time['units'] = radar.time['units']
+
+    origin_latitude = pyart.config.get_metadata('origin_latitude')
+    origin_latitude['data'] = np.array([grid_origin[0]], dtype='float64')
+    origin_longitude = pyart.config.get_metadata('origin_longitude')
+    origin_longitude['data'] = np.array([grid_origin[1]], dtype='float64')
+    origin_altitude = pyart.config.get_metadata('origin_altitude')
+    origin_altitude['data'] = np.array([grid_origin_alt], dtype='float64')
+
+    nz, ny, nx = grid_shape
+    (zmin, zmax), (ymin, ymax), (xmin, xmax) = grid_limits
+    x = pyart.config.get_metadata('x')
+    x['data'] = np.linspace(xmin, xmax, nx).astype('float64')
+    y = pyart.config.get_metadata('y')
+    y['data'] = np.linspace(ymin, ymax, ny).astype('float64')
+    z = pyart.config.get_metadata('z')
+    z['data'] = np.linspace(zmin, zmax, nz).astype('float64')
+
+    radar_latitude = pyart.config.get_metadata('radar_latitude')
+    radar_latitude['data'] = np.array([radar.latitude['data'][0]])
+    radar_longitude = pyart.config.get_metadata('radar_longitude')
+    radar_longitude['data'] = np.array([radar.longitude['data'][0]])
+    radar_altitude = pyart.config.get_metadata('radar_altitude')
+    radar_altitude['data'] = np.array([radar.altitude['data'][0]])
+    radar_time = pyart.config.get_metadata('radar_time')
+    radar_time['data'] = np.array([radar.time['data'][0]])
+    radar_time['units'] = radar.time['units']
+    radar_name = pyart.config.get_metadata('radar_name')
+    radar_name['data'] = np.array(
+        [radar.metadata.get('instrument_name', '')])
+
+    return pyart.core.Grid(
+        time, fields, deepcopy(radar.metadata), origin_latitude,
+        origin_longitude, origin_altitude, x, y, z,
+        radar_latitude=radar_latitude, radar_longitude=radar_longitude,
+        radar_altitude=radar_altitude, radar_time=radar_time,
+        radar_name=radar_name)
+
+
+def _compute_roi(point_xyz, offset, roi_func='dist_beam', h_factor=1.,
+                 nb=1., bsp=1., min_radius=500., constant_roi=500.):
+    """
+    Computes the radius of the region of interest at each grid point
+
+    Parameters
+    ----------
+    point_xyz : 2D float array
+        the z, y, x coordinates of the grid points [m]
+    offset : 3-tuple of floats
+        the z, y, x position of the radar respect to the grid origin [m]
+    roi_func : str
+        the function used to compute the region of interest. Possible values:
+        dist_beam, constant
+    h_factor, nb, bsp, min_radius : float
+        parameters of the dist_beam region of interest function
+    constant_roi : float
+        the radius of the region of interest when roi_func is constant [m]
+
+    Returns
+    -------
+    roi : 1D float array
+        the radius of the region of interest at each grid point [m]
+
+    """
+    if roi_func == 'constant':
+        return np.full(point_xyz.shape[0], constant_roi, dtype=np.float64)
+    if roi_func != 'dist_beam':
+        raise ValueError('ERROR: Unknown region of interest function ' +
+                         roi_func)
+
+    z_rel = point_xyz[:, 0]-offset[0]
+    y_rel = point_xyz[:, 1]-offset[1]
+    x_rel = point_xyz[:, 2]-offset[2]
+    roi = (h_factor*(z_rel/20.) +
+           np.sqrt(y_rel*y_rel+x_rel*x_rel)*np.tan(nb*bsp*np.pi/180.))
+
+    return np.maximum(roi, min_radius)
@@ -0,0 +1,375 @@
+"""
+pyrad.util.hist2d_accumulator
+=============================
+
+Hist2dAccumulator class implementation for accumulating the colocated
+values of two radars in a binned 2D histogram.
+
+.. autosummary::
+    :toctree: generated/
+
+    Hist2dAccumulator
+
+"""
+
+from warnings import warn
+
+import numpy as np
+
+from .radar_utils import get_histogram_bins
+
+# names of the sums kept by the accumulator
+_SUM_NAMES = (
+    'npoints', 'sum1', 'sum2', 'sum11', 'sum22', 'sum12', 'sumlin1',
+    'sumlin2')
+
+
+class Hist2dAccumulator(object):
+    """
+    Accumulates the colocated values of two radars in a 2D histogram. The
+    values of each new volume are added with a single bincount. Together
+    with the histogram the accumulator keeps the sums needed to compute the
+    mean bias and the linear regression exactly and a fine histogram of the
+    differences between the two radars from which the bias quantiles are
+    computed. The accumulators are mergeable so that the histograms of
+    different volumes, days or processes can be combined without going back
+    to the colocated values. As in compute_2d_hist the values outside the
+    histogram limits are assigned to the first or last bin
+
+    Attributes
+    ----------
+    bin_edges1, bin_edges2 : float array
+        the bin edges of the values of radar 1 and radar 2
+    counts : int array (nbins1, nbins2)
+        the number of samples in each bin
+    diff_edges : float array
+        the bin edges of the differences radar 2 - radar 1
+    diff_counts : int array
+        the number of samples in each bin of differences
+    sums : float array
+        the number of samples, the sums of the values of each radar, of
+        their squares, of their product and of their linear values
+    last_time : datetime64 or None
+        the time of the last volume accumulated, if known
+
+    Methods:
+    --------
+    add : Adds the colocated values of a new volume
+    merge : Adds the histogram of another accumulator
+    get_stats : Gets the histogram and the intercomparison statistics
+
+    """
+
+    def __init__(self, bin_edges1, bin_edges2, diff_res=0.1):
+        """
+        Initalize the object.
+
+        Parameters
+        ----------
+        bin_edges1, bin_edges2 : float array
+            the bin edges of the values of radar 1 and radar 2
+        diff_res : float
+            resolution of the histogram of differences relative to the
+            smallest bin of the 2D histogram
+
+        """
+        self.bin_edges1 = np.asarray(bin_edges1, dtype=np.float64)
+        self.bin_edges2 = np.asarray(bin_edges2, dtype=np.float64)
+        self.counts = np.zeros(
+            (self.bin_edges1.size-1, self.bin_edges2.size-1),
+            dtype=np.int64)
+
+        bin_centers1 = self._get_bin_centers(self.bin_edges1)
+        bin_centers2 = self._get_bin_centers(self.bin_edges2)
+        diff_step = diff_res*min(
+            np.min(np.diff(self.bin_edges1)),
+            np.min(np.diff(self.bin_edges2)))
+        diff_min = bin_centers2[0]-bin_centers1[-1]
+        diff_max = bin_centers2[-1]-bin_centers1[0]
+        ndiff = int(np.ceil((diff_max-diff_min)/diff_step))+1
+        self.diff_edges = (
+            diff_min-diff_step/2.+diff_step*np.arange(ndiff+1))
+        self.diff_counts = np.zeros(ndiff, dtype=np.int64)
+
+        self.sums = np.zeros(len(_SUM_NAMES), dtype=np.float64)
+        self.last_time = None
+
+    @classmethod
+    def from_field_names(cls, field_name1, field_name2, step1=None,
+                         step2=None):
+        """
+        Creates an accumulator with the histogram bins of two fields as
+        defined in the Py-ART config file
+
+        Parameters
+        ----------
+        field_name1, field_name2 : str
+            the name of the fields
+        step1, step2 : float
+            size of bin
+
+        Returns
+        -------
+        accumulator : Hist2dAccumulator object
+            the empty accumulator
+
+        """
+        return cls(get_histogram_bins(field_name1, step=step1),
+                   get_histogram_bins(field_name2, step=step2))
+
+    def add(self, val1, val2):
+        """
+        Adds the colocated values of a new volume. Pairs where any of the
+        values is masked or invalid are ignored
+
+        Parameters
+        ----------
+        val1, val2 : array like
+            the colocated values of radar 1 and radar 2
+
+        Returns
+        -------
+        self : Hist2dAccumulator object
+            the updated accumulator
+
+        """
+        val1 = np.ma.masked_invalid(np.ma.ravel(val1))
+        val2 = np.ma.masked_invalid(np.ma.ravel(val2))
+        isvalid = np.logical_not(np.logical_or(
+            np.ma.getmaskarray(val1), np.ma.getmaskarray(val2)))
+        if not np.any(isvalid):
+            return self
+
+        val1 = self._clip(
+            np.ma.getdata(val1)[isvalid].astype(np.float64), self.bin_edges1)
+        val2 = self._clip(
+            np.ma.getdata(val2)[isvalid].astype(np.float64), self.bin_edges2)
+
+        ind1 = self._get_bin_index(val1, self.bin_edges1)
+        ind2 = self._get_bin_index(val2, self.bin_edges2)
+        nbins2 = self.counts.shape[1]
+        self.counts += np.bincount(
+            ind1*nbins2+ind2, minlength=self.counts.size).reshape(
+                self.counts.shape)
+
+        self.diff_counts += np.bincount(
+            self._get_bin_index(val2-val1, self.diff_edges),
+            minlength=self.diff_counts.size)
+
+        lin1 = np.power(10., 0.1*val1)
+        lin2 = np.power(10., 0.1*val2)
+        self.sums += np.array([
+            val1.size, np.sum(val1), np.sum(val2), np.dot(val1, val1),
+            np.dot(val2, val2), np.dot(val1, val2), np.sum(lin1),
+            np.sum(lin2)])
+
+        return self
+
+    def merge(self, other):
+        """
+        Adds the histogram of another accumulator. The operation is
+        associative so that the accumulators of different time periods can
+        be merged in any grouping
+
+        Parameters
+        ----------
+        other : Hist2dAccumulator object
+            the accumulator to merge. It must have the same bins
+
+        Returns
+        -------
+        self : Hist2dAccumulator object
+            the merged accumulator
+
+        """
+        if (not np.array_equal(self.bin_edges1, other.bin_edges1) or
+                not np.array_equal(self.bin_edges2, other.bin_edges2) or
+                not np.array_equal(self.diff_edges, other.diff_edges)):
+            raise ValueError(
+                'ERROR: Unable to merge accumulators with different bins')
+
+        self.counts += other.counts
+        self.diff_counts += other.diff_counts
+        self.sums += other.sums
+        if self.last_time is None:
+            self.last_time = other.last_time
+        elif other.last_time is not None:
+            self.last_time = max(self.last_time, other.last_time)
+
+        return self
+
+    def get_npoints(self):
+        """
+        Gets the number of samples accumulated
+
+        Returns
+        -------
+        npoints : int
+            the number of samples
+
+        """
+        return int(self.sums[0])
+
+    def get_stats(self):
+        """
+        Gets the 2D histogram and the statistics of the accumulated values.
+        The statistics are those of compute_2d_stats. The mean bias and the
+        linear regression are exact while the median and quartile biases
+        have the resolution of the histogram of differences
+
+        Returns
+        -------
+        hist_2d : float array
+            the histogram. None if no sample has been accumulated
+        bin_edges1, bin_edges2 : float array
+            The bin edges
+        stats : dict
+            a dictionary with statistics
+
+        """
+        npoints = self.get_npoints()
+        if npoints == 0:
+            warn('Unable to compute 2D histogram. Empty field')
+            stats = {
+                'npoints': 0,
+                'meanbias': np.ma.asarray(np.ma.masked),
+                'medianbias': np.ma.asarray(np.ma.masked),
+                'quant25bias': np.ma.asarray(np.ma.masked),
+                'quant75bias': np.ma.asarray(np.ma.masked),
+                'modebias': np.ma.asarray(np.ma.masked),
+                'corr': np.ma.asarray(np.ma.masked),
+                'slope': np.ma.asarray(np.ma.masked),
+                'intercep': np.ma.asarray(np.ma.masked),
+                'intercep_slope_1': np.ma.asarray(np.ma.masked)
+            }
+            return None, None, None, stats
+
+        _, sum1, sum2, sum11, sum22, sum12, sumlin1, sumlin2 = self.sums
+
+        meanbias = 10.*np.log10(sumlin2/sumlin1)
+        quant25bias, medianbias, quant75bias = self._get_diff_quantiles(
+            [25., 50., 75.])
+
+        bin_centers1 = self._get_bin_centers(self.bin_edges1)
+        bin_centers2 = self._get_bin_centers(self.bin_edges2)
+        ind_max_val1, ind_max_val2 = np.unravel_index(
+            np.argmax(self.counts), self.counts.shape)
+        modebias = bin_centers2[ind_max_val2]-bin_centers1[ind_max_val1]
+
+        # linear regression from the sums of the values
+        cov12 = npoints*sum12-sum1*sum2
+        var1 = npoints*sum11-sum1*sum1
+        var2 = npoints*sum22-sum2*sum2
+        if var1 > 0.:
+            slope = cov12/var1
+            intercep = (sum2-slope*sum1)/npoints
+        else:
+            slope = np.ma.masked
+            intercep = np.ma.masked
+        if var1 > 0. and var2 > 0.:
+            corr = cov12/np.sqrt(var1*var2)
+        else:
+            corr = np.ma.masked
+        intercep_slope_1 = (sum2-sum1)/npoints
+
+        stats = {
+            'npoints': npoints,
+            'meanbias': np.ma.asarray(meanbias),
+            'medianbias': np.ma.asarray(medianbias),
+            'quant25bias': np.ma.asarray(quant25bias),
+            'quant75bias': np.ma.asarray(quant75bias),
+            'modebias': np.ma.asarray(modebias),
+            'corr': np.ma.asarray(corr),
+            'slope': np.ma.asarray(slope),
+            'intercep': np.ma.asarray(intercep),
+            'intercep_slope_1': np.ma.asarray(intercep_slope_1)
+        }
+
+        return (self.counts.astype(np.float64), self.bin_edges1,
+                self.bin_edges2, stats)
+
+    def _get_diff_quantiles(self, quantiles):
+        """
+        Gets quantiles of the differences from their histogram. The value of
+        a quantile is the center of the bin where it falls
+
+        Parameters
+        ----------
+        quantiles : list of float
+            the quantiles to compute [%]
+
+        Returns
+        -------
+        values : float array
+            the value at each quantile
+
+        """
+        cum_counts = np.cumsum(self.diff_counts)
+        ind = np.searchsorted(
+            cum_counts, np.asarray(quantiles)/100.*cum_counts[-1],
+            side='left')
+        ind = np.clip(ind, 0, self.diff_counts.size-1)
+
+        return self._get_bin_centers(self.diff_edges)[ind]
+
+    @staticmethod
+    def _get_bin_centers(bin_edges):
+        """
+        Gets the centers of the bins
+
+        Parameters
+        ----------
+        bin_edges : float array
+            the bin edges
+
+        Returns
+        -------
+        bin_centers : float array
+            the bin centers
+
+        """
+        return (bin_edges[:-1]+bin_edges[1:])/2.
+
+    @staticmethod
+    def _clip(values, bin_edges):
+        """
+        Assigns the values outside the histogram limits to the center of the
+        first or last bin
+
+        Parameters
+        ----------
+        values : float array
+            the values
+        bin_edges : float array
+            the bin edges
+
+        Returns
+        -------
+        values : float array
+            the clipped values
+
+        """
+        bin_centers = Hist2dAccumulator._get_bin_centers(bin_edges)
+        return np.clip(values, bin_centers[0], bin_centers[-1])
+
+    @staticmethod
+    def _get_bin_index(values, bin_edges):
+        """
+        Gets the index of the bin of each value. The values outside the
+        limits are assigned to the first or last bin
+
+        Parameters
+        ----------
+        values : float array
+            the values
+        bin_edges : float array
+            the bin edges
+
+        Returns
+        -------
+        ind : int array
+            the bin indices
+
+        """
+        ind = np.searchsorted(bin_edges, values, side='right')-1
+        return np.clip(ind, 0, bin_edges.size-2)
@@ -0,0 +1,215 @@
+"""
+pyrad.util.quantile_sketch
+==========================
+
+QuantileSketch class implementation. A streaming quantile sketch with bounded
+memory that can be merged across volumes and processes
+
+.. autosummary::
+    :toctree: generated/
+
+    QuantileSketch
+
+"""
+
+from warnings import warn
+
+import numpy as np
+
+
+class QuantileSketch(object):
+    """
+    Streaming quantile sketch following the KLL algorithm (Karnin, Lang and
+    Liberty, 2016). The values are kept in a hierarchy of compactors. When a
+    compactor exceeds its capacity its values are sorted and one value out
+    of two is promoted to the next compactor, where each value represents
+    twice as many samples. The memory used is of the order of 3*k values
+    regardless of the number of samples added and the rank error of the
+    quantiles is of the order of 1.65 % for k=200. The compaction offset
+    alternates deterministically so that the results are reproducible
+
+    Attributes
+    ----------
+    k : int
+        the accuracy parameter. The capacity of the top compactor
+    n : int
+        the number of samples added
+    vmin, vmax : float
+        the minimum and maximum value added
+    compactors : list of 1D float arrays
+        the values kept at each level. A value at level h represents 2**h
+        samples
+
+    Methods:
+    --------
+    update : Adds new samples
+    merge : Adds the samples of another sketch
+    compute_quantiles : Computes quantiles of the samples added
+
+    """
+
+    def __init__(self, k=200):
+        """
+        Initalize the object.
+
+        Parameters
+        ----------
+        k : int
+            the accuracy parameter. The larger k the more accurate and the
+            larger the sketch
+
+        """
+        self.k = int(k)
+        self.n = 0
+        self.vmin = None
+        self.vmax = None
+        self.compactors = [np.empty(0, dtype=np.float64)]
+        self._offsets = [0]
+
+    def update(self, values):
+        """
+        Adds new samples to the sketch. Masked and invalid values are
+        ignored
+
+        Parameters
+        ----------
+        values : array like
+            the values to add
+
+        Returns
+        -------
+        self : QuantileSketch object
+            the updated sketch
+
+        """
+        values = np.ma.masked_invalid(values).compressed().astype(np.float64)
+        if values.size == 0:
+            return self
+
+        self._update_limits(values.size, values.min(), values.max())
+        self.compactors[0] = np.append(self.compactors[0], values)
+        self._compress()
+
+        return self
+
+    def merge(self, other):
+        """
+        Adds the samples of another sketch. The operation is associative so
+        that sketches obtained over different volumes or processes can be
+        merged in any grouping
+
+        Parameters
+        ----------
+        other : QuantileSketch object
+            the sketch to merge
+
+        Returns
+        -------
+        self : QuantileSketch object
+            the merged sketch
+
+        """
+        if other.n == 0:
+            return self
+
+        self._update_limits(other.n, other.vmin, other.vmax)
+        for level, items in enumerate(other.compactors):
+            if level == len(self.compactors):
+                self.compactors.append(np.empty(0, dtype=np.float64))
+                self._offsets.append(0)
+            self.compactors[level] = np.append(self.compactors[level], items)
+        self._compress()
+
+        return self
+
+    def compute_quantiles(self, quantiles=None):
+        """
+        Computes quantiles of the samples added
+
+        Parameters
+        ----------
+        quantiles : float array
+            list of quantiles to compute [%]
+
+        Returns
+        -------
+        quantiles : float array
+            list of quantiles
+        values : float array
+            values at each quantile
+
+        """
+        if quantiles is None:
+            quantiles = [10., 20., 30., 40., 50., 60., 70., 80., 90., 95.]
+            warn('No quantiles have been defined. Default ' + str(quantiles) +
+                 ' will be used')
+        quantiles = np.asarray(quantiles, dtype=np.float64)
+        values = np.ma.masked_all(quantiles.size)
+
+        if self.n < 10:
+            warn('Unable to compute quantiles. Not enough valid data')
+            return quantiles, values
+
+        items = np.concatenate(self.compactors)
+        weights = np.concatenate([
+            np.full(items_level.size, 2**level, dtype=np.int64)
+            for level, items_level in enumerate(self.compactors)])
+        ind = np.argsort(items, kind='stable')
+        items = items[ind]
+        cum_weights = np.cumsum(weights[ind])
+
+        ind_quant = np.searchsorted(
+            cum_weights, quantiles/100.*cum_weights[-1], side='left')
+        values[:] = items[np.clip(ind_quant, 0, items.size-1)]
+        values[quantiles <= 0.] = self.vmin
+        values[quantiles >= 100.] = self.vmax
+
+        return quantiles, values
+
+    def _update_limits(self, n, vmin, vmax):
+        """
+        Updates the number of samples and the limits of the values
+
+        Parameters
+        ----------
+        n : int
+            number of samples added
+        vmin, vmax : float
+            minimum and maximum value of the samples added
+
+        """
+        self.n += n
+        self.vmin = vmin if self.vmin is None else min(self.vmin, vmin)
+        self.vmax = vmax if self.vmax is None else max(self.vmax, vmax)
+
+    def _compress(self):
+        """
+        Compacts the compactors exceeding their capacity
+
+        """
+        level = 0
+        while level < len(self.compactors):
+            items = self.compactors[level]
+            nlevels = len(self.compactors)
+            capacity = max(
+                2, int(np.ceil(self.k*(2./3.)**(nlevels-level-1))))
+            if items.size <= capacity:
+                level += 1
+                continue
+
+            if level == nlevels-1:
+                self.compactors.append(np.empty(0, dtype=np.float64))
+                self._offsets.append(0)
+
+            # keep one value if the number of values is odd so that the
+            # weight of the sketch is preserved
+            items = np.sort(items)
+            keep = items[items.size-items.size % 2:]
+            items = items[:items.size-items.size % 2]
+
+            offset = self._offsets[level]
+            self._offsets[level] = 1-offset
+            self.compactors[level+1] = np.append(
+                self.compactors[level+1], items[offset::2])
+            self.compactors[level] = keep
+            level += 1
@@ -16,12 +16,18 @@ Miscellaneous functions dealing with radar data
     join_time_series
     get_range_bins_to_avg
     belongs_roi_indices
+    points_in_polygon
+    get_gate_spatial_index
+    find_gates_in_bbox
+    find_roi_gates
+    get_roi_radar
     find_ray_index
     find_rng_index
     find_nearest_gate
     find_neighbour_gates
     find_colocated_indexes
     get_target_elevations
+    get_geometry_key
     time_avg_range
     get_closest_solar_flux
     get_fixed_rng_data
@@ -46,16 +52,11 @@ Miscellaneous functions dealing with radar data
 from warnings import warn
 from copy import deepcopy
 import datetime
+import hashlib
 
 import numpy as np
 import scipy
-
-try:
-    import shapely
-    _SHAPELY_AVAILABLE = True
-except ImportError:
-    warn('shapely not available')
-    _SHAPELY_AVAILABLE = False
+from matplotlib.path import Path
 
 try:
     import pandas as pd
@@ -68,6 +69,11 @@ import pyart
 
 from .stat_utils import quantiles_weighted
 
+# spatial indices of the radar gates shared by radar objects with the same
+# scan geometry
+_GATE_INDEX_CACHE = dict()
+_GATE_INDEX_CACHE_SIZE = 10
+
 
 def get_data_along_rng(radar, field_name, fix_elevations, fix_azimuths,
                        ang_tol=1., rmin=None, rmax=None):
@@ -570,47 +576,277 @@ def belongs_roi_indices(lat, lon, roi):
         Can be 'All', 'None', 'Some'
 
     """
-    if not _SHAPELY_AVAILABLE:
-        warn('shapely package not available. ' +
-             'Unable to determine if points belong to Region Of Interest')
-        return np.asarray([]), 'None'
+    is_inside = points_in_polygon(
+        np.asarray(lat).flatten(), np.asarray(lon).flatten(), roi['lat'],
+        roi['lon'])
 
-    lon_list = lon.flatten()
-    lat_list = lat.flatten()
-
-    polygon = shapely.geometry.Polygon(list(zip(roi['lon'], roi['lat'])))
-    points = shapely.geometry.MultiPoint(list(zip(lon_list, lat_list)))
-
-    inds = []
-    if polygon.contains(points):
+    inds = np.asarray([], dtype=int)
+    if is_inside.all():
         warn('All points in the region of interest')
         is_roi = 'All'
         inds = np.indices(np.shape(lon))
-    elif polygon.disjoint(points):
+    elif not is_inside.any():
         warn('No points in the region of interest')
         is_roi = 'None'
     else:
-        points_roi = points.intersection(polygon)
-        if points_roi.geom_type == 'Point':
-            ind = np.where(
-                np.logical_and(lon == points_roi.x, lat == points_roi.y))
-            if len(ind) == 1:
-                ind = ind[0]
-            inds.extend(ind)
-        else:
-            points_roi_list = list(points_roi)
-            for point in points_roi_list:
-                ind = np.where(np.logical_and(lon == point.x, lat == point.y))
-                if len(ind) == 1:
-                    ind = ind[0]
-                inds.extend(ind)
-        nroi = len(lat[inds])
-        npoint = len(lat_list)
-        warn(str(nroi)+' points out of '+str(npoint) +
+        inds = np.where(is_inside)[0]
+        warn(str(inds.size)+' points out of '+str(is_inside.size) +
              ' in the region of interest')
         is_roi = 'Some'
 
-    return np.asarray(inds), is_roi
+    return inds, is_roi
+
+
+def points_in_polygon(lat, lon, lat_poly, lon_poly):
+    """
+    Vectorized test of which points lie inside a polygon
+
+    Parameters
+    ----------
+    lat, lon : 1D float arrays
+        latitudes and longitudes of the points to check
+    lat_poly, lon_poly : 1D float arrays
+        latitudes and longitudes of the polygon vertices
+
+    Returns
+    -------
+    is_inside : 1D bool array
+        True for the points inside the polygon
+
+    """
+    polygon = Path(np.column_stack((
+        np.asarray(lon_poly, dtype=float), np.asarray(lat_poly, dtype=float))))
+
+    return polygon.contains_points(np.column_stack((
+        np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))))
+
+
+def get_gate_spatial_index(radar, cell_size=0.01):
+    """
+    Get a spatial index of the radar gates. The gates are binned in a
+    regular latitude-longitude grid and sorted by grid cell so that the gates
+    in a region can be found by looking only at the cells overlapping it.
+    The index is kept in memory and shared by all radar objects with the same
+    scan geometry
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object
+    cell_size : float
+        the size of the grid cells [deg]
+
+    Returns
+    -------
+    gate_index : dict
+        dictionary containing the grid definition, the grid cell of each gate
+        (sorted) and the flat indices of the gates sorted by grid cell
+
+    """
+    key = get_geometry_key(radar)+'_'+str(cell_size)
+    if key in _GATE_INDEX_CACHE:
+        return _GATE_INDEX_CACHE[key]
+
+    lat = np.ma.getdata(radar.gate_latitude['data']).flatten()
+    lon = np.ma.getdata(radar.gate_longitude['data']).flatten()
+    lat0 = lat.min()
+    lon0 = lon.min()
+    rows = np.floor((lat-lat0)/cell_size).astype(np.int64)
+    cols = np.floor((lon-lon0)/cell_size).astype(np.int64)
+    nrows = rows.max()+1
+    ncols = cols.max()+1
+    cells = rows*ncols+cols
+    order = np.argsort(cells, kind='stable')
+
+    gate_index = {
+        'cell_size': cell_size,
+        'lat0': lat0,
+        'lon0': lon0,
+        'nrows': nrows,
+        'ncols': ncols,
+        'cells': cells[order],
+        'order': order}
+
+    if len(_GATE_INDEX_CACHE) >= _GATE_INDEX_CACHE_SIZE:
+        _GATE_INDEX_CACHE.pop(next(iter(_GATE_INDEX_CACHE)))
+    _GATE_INDEX_CACHE[key] = gate_index
+
+    return gate_index
+
+
+def find_gates_in_bbox(radar, lat_min, lat_max, lon_min, lon_max,
+                       cell_size=0.01):
+    """
+    Find the radar gates within a latitude-longitude box. Only the gates in
+    the spatial index cells overlapping the box are checked
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object
+    lat_min, lat_max, lon_min, lon_max : float
+        the limits of the box [deg]
+    cell_size : float
+        the size of the spatial index cells [deg]
+
+    Returns
+    -------
+    inds : 1D array of ints
+        the sorted flat indices of the gates within the box
+
+    """
+    gate_index = get_gate_spatial_index(radar, cell_size=cell_size)
+
+    row_min = max(
+        int(np.floor((lat_min-gate_index['lat0'])/cell_size)), 0)
+    row_max = min(
+        int(np.floor((lat_max-gate_index['lat0'])/cell_size)),
+        gate_index['nrows']-1)
+    col_min = max(
+        int(np.floor((lon_min-gate_index['lon0'])/cell_size)), 0)
+    col_max = min(
+        int(np.floor((lon_max-gate_index['lon0'])/cell_size)),
+        gate_index['ncols']-1)
+    if row_min > row_max or col_min > col_max:
+        return np.asarray([], dtype=int)
+
+    # the cells of each grid row within the box are contiguous
+    rows = np.arange(row_min, row_max+1, dtype=np.int64)
+    ind_start = np.searchsorted(
+        gate_index['cells'], rows*gate_index['ncols']+col_min, side='left')
+    ind_end = np.searchsorted(
+        gate_index['cells'], rows*gate_index['ncols']+col_max, side='right')
+    inds = np.sort(np.concatenate([
+        gate_index['order'][start:end]
+        for start, end in zip(ind_start, ind_end)]))
+
+    lat = np.ma.getdata(radar.gate_latitude['data']).ravel()[inds]
+    lon = np.ma.getdata(radar.gate_longitude['data']).ravel()[inds]
+
+    return inds[np.logical_and(
+        np.logical_and(lat >= lat_min, lat <= lat_max),
+        np.logical_and(lon >= lon_min, lon <= lon_max))]
+
+
+def find_roi_gates(radar, roi, cell_size=0.01):
+    """
+    Find the radar gates within a region of interest defined by a polygon
+    and optionally an altitude range
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object
+    roi : dict
+        dictionary describing the region of interest. Contains the keys
+        'lat' and 'lon' with the polygon vertices and optionally 'alt_min'
+        and 'alt_max' [m MSL]
+    cell_size : float
+        the size of the spatial index cells [deg]
+
+    Returns
+    -------
+    inds_ray, inds_rng : 1D arrays of ints
+        the ray and range indices of the gates within the region of interest
+
+    """
+    lat_roi = np.asarray(roi['lat'], dtype=float)
+    lon_roi = np.asarray(roi['lon'], dtype=float)
+
+    inds = find_gates_in_bbox(
+        radar, lat_roi.min(), lat_roi.max(), lon_roi.min(), lon_roi.max(),
+        cell_size=cell_size)
+
+    if inds.size > 0:
+        alt = np.ma.getdata(radar.gate_altitude['data']).ravel()[inds]
+        mask = np.ones(inds.size, dtype=bool)
+        if roi.get('alt_min', None) is not None:
+            mask[alt < roi['alt_min']] = False
+        if roi.get('alt_max', None) is not None:
+            mask[alt > roi['alt_max']] = False
+        inds = inds[mask]
+
+    if inds.size > 0:
+        inds = inds[points_in_polygon(
+            np.ma.getdata(radar.gate_latitude['data']).ravel()[inds],
+            np.ma.getdata(radar.gate_longitude['data']).ravel()[inds],
+            lat_roi, lon_roi)]
+
+    inds_ray, inds_rng = np.unravel_index(inds, (radar.nrays, radar.ngates))
+
+    return inds_ray, inds_rng
+
+
+def get_roi_radar(radar, inds_ray, inds_rng, field_names):
+    """
+    Creates a radar object containing only the gates of a region of
+    interest arranged in a single ray. The original radar object is not
+    copied, only the data of the selected gates is extracted
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object containing the data
+    inds_ray, inds_rng : 1D arrays of ints
+        the ray and range indices of the gates to extract
+    field_names : list of str
+        the names of the fields to extract
+
+    Returns
+    -------
+    radar_roi : radar object
+        radar object with scan type 'roi' containing the selected gates
+
+    """
+    r_time = dict(radar.time)
+    r_time['data'] = np.asarray([radar.time['data'][0]])
+    r_range = dict(radar.range)
+    r_range['data'] = radar.range['data'][inds_rng]
+    r_azimuth = dict(radar.azimuth)
+    r_azimuth['data'] = np.array([], dtype='float64')
+    r_elevation = dict(radar.elevation)
+    r_elevation['data'] = np.array([], dtype='float64')
+
+    rays_are_indexed = None
+    if radar.rays_are_indexed is not None:
+        rays_are_indexed = dict(radar.rays_are_indexed)
+        rays_are_indexed['data'] = np.array(
+            [radar.rays_are_indexed['data'][0]])
+    ray_angle_res = None
+    if radar.ray_angle_res is not None:
+        ray_angle_res = dict(radar.ray_angle_res)
+        ray_angle_res['data'] = np.array([radar.ray_angle_res['data'][0]])
+
+    fields = dict()
+    for field_name in field_names:
+        if field_name not in radar.fields:
+            warn("Datatype '%s' not available in radar data" % field_name)
+            continue
+        field_dict = dict(radar.fields[field_name])
+        field_dict['data'] = (
+            radar.fields[field_name]['data'][inds_ray, inds_rng].reshape(
+                1, -1))
+        fields.update({field_name: field_dict})
+
+    radar_roi = pyart.core.Radar(
+        r_time, r_range, fields, dict(radar.metadata), 'roi',
+        radar.latitude, radar.longitude, radar.altitude,
+        {'data': np.array([0], dtype='int32')},
+        {'data': np.array(['roi'])},
+        {'data': np.array([], dtype='float64')},
+        {'data': np.array([0], dtype='int32')},
+        {'data': np.array([1], dtype='int32')},
+        r_azimuth, r_elevation, rays_are_indexed=rays_are_indexed,
+        ray_angle_res=ray_angle_res,
+        instrument_parameters=radar.instrument_parameters)
+
+    for gate_attr in ('gate_longitude', 'gate_latitude', 'gate_altitude',
+                      'gate_x', 'gate_y', 'gate_z'):
+        getattr(radar_roi, gate_attr)['data'] = (
+            getattr(radar, gate_attr)['data'][inds_ray, inds_rng].reshape(
+                1, -1))
+
+    return radar_roi
 
 
 def find_ray_index(ele_vec, azi_vec, ele, azi, ele_tol=0., azi_tol=0.,
@@ -729,15 +965,11 @@ def find_nearest_gate(radar, lat, lon, latlon_tol=0.0005):
 
     """
     # find gates close to lat lon point
-    inds_ray_aux, inds_rng_aux = np.where(np.logical_and(
-        np.logical_and(
-            radar.gate_latitude['data'] < lat+latlon_tol,
-            radar.gate_latitude['data'] > lat-latlon_tol),
-        np.logical_and(
-            radar.gate_longitude['data'] < lon+latlon_tol,
-            radar.gate_longitude['data'] > lon-latlon_tol)))
-
-    if inds_ray_aux.size == 0:
+    inds = find_gates_in_bbox(
+        radar, lat-latlon_tol, lat+latlon_tol, lon-latlon_tol,
+        lon+latlon_tol)
+
+    if inds.size == 0:
         warn('No data found at point lat '+str(lat)+' +- ' +
              str(latlon_tol)+' lon '+str(lon)+' +- ' +
              str(latlon_tol)+' deg')
@@ -745,10 +977,9 @@ def find_nearest_gate(radar, lat, lon, latlon_tol=0.0005):
         return None, None, None, None
 
     # find closest latitude
-    ind_min = np.argmin(np.abs(
-        radar.gate_latitude['data'][inds_ray_aux, inds_rng_aux]-lat))
-    ind_ray = inds_ray_aux[ind_min]
-    ind_rng = inds_rng_aux[ind_min]
+    ind_min = inds[np.argmin(np.abs(
+        np.ma.getdata(radar.gate_latitude['data']).ravel()[inds]-lat))]
+    ind_ray, ind_rng = np.unravel_index(ind_min, (radar.nrays, radar.ngates))
 
     azi = radar.azimuth['data'][ind_ray]
     rng = radar.range['data'][ind_rng]
@@ -894,6 +1125,45 @@ def get_target_elevations(radar_in):
     return target_elevations, el_tol
 
 
+def get_geometry_key(radar, ang_res=0.1, rng_res=1.):
+    """
+    Computes a key identifying the scan geometry of a radar object. Radar
+    objects with the same number of rays and gates, the same antenna angles
+    and range bins (up to the resolution specified) and the same radar
+    position share the same key
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object
+    ang_res : float
+        the resolution used to compare the azimuth and elevation angles [deg]
+    rng_res : float
+        the resolution used to compare the range bins [m]
+
+    Returns
+    -------
+    key : str
+        hexadecimal string identifying the scan geometry
+
+    """
+    key = hashlib.sha1()
+    key.update(radar.scan_type.encode('utf-8'))
+    key.update(np.array(
+        [radar.nrays, radar.ngates, radar.nsweeps], dtype=np.int64).tobytes())
+    key.update(np.round(
+        radar.azimuth['data']/ang_res).astype(np.int64).tobytes())
+    key.update(np.round(
+        radar.elevation['data']/ang_res).astype(np.int64).tobytes())
+    key.update(np.round(
+        radar.range['data']/rng_res).astype(np.int64).tobytes())
+    key.update(np.round(np.array([
+        radar.latitude['data'][0], radar.longitude['data'][0],
+        radar.altitude['data'][0]])*1e4).astype(np.int64).tobytes())
+
+    return key.hexdigest()
+
+
 def time_avg_range(timeinfo, avg_starttime, avg_endtime, period):
     """
     finds the new start and end time of an averaging
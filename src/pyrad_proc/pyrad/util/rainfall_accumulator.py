@@ -0,0 +1,285 @@
+"""
+pyrad.util.rainfall_accumulator
+===============================
+
+RainfallAccumulator class implementation for integrating rain rate fields in
+time. The rain accumulated in each partial period is kept in a ring buffer so
+that accumulations over rolling windows can be obtained at any time without
+going back to past volumes.
+
+.. autosummary::
+    :toctree: generated/
+
+    RainfallAccumulator
+
+"""
+
+import datetime
+from warnings import warn
+
+import numpy as np
+
+
+class RainfallAccumulator(object):
+    """
+    Integrates rain rate fields in time at each gate or grid point. The rain
+    rate is integrated with the trapezoidal rule between consecutive samples.
+    The accumulated rain is stored per partial period in a ring buffer
+
+    Attributes
+    ----------
+    shape : tuple
+        shape of the rain rate fields
+    partial_period : float
+        duration of the partial periods [s]
+    nbins : int
+        number of complete partial periods kept in the ring buffer
+    base_time : float
+        start of the first partial period of the day [s from midnight]
+    max_gap : float
+        maximum time between consecutive samples [s]. Longer gaps are not
+        integrated
+    partial_sums : float array (nbins+1, shape)
+        rain accumulated in each partial period [mm]. The buffer contains
+        the complete partial periods and the current one
+    partial_time : float array (nbins+1, shape)
+        time with valid rain rate in each partial period [s]
+    partial_count : int array (nbins+1, shape)
+        number of valid samples in each partial period
+    bin_end : datetime object
+        end time of the current partial period
+    ind_bin : int
+        index of the current partial period in the ring buffer
+    nbins_done : int
+        number of completed partial periods in the ring buffer
+    last_time : datetime object
+        time of the last sample
+    last_rate : masked array
+        last rain rate sample [mm/h]
+
+    Methods:
+    --------
+    add : Adds a new rain rate sample
+    get_accumulation : Gets the rain accumulated over a window
+
+    """
+
+    def __init__(self, shape, partial_period=3600., nbins=1, base_time=0.,
+                 max_gap=900., dtype=np.float64):
+        """
+        Initalize the object.
+
+        Parameters
+        ----------
+        shape : tuple
+            shape of the rain rate fields
+        partial_period : float
+            duration of the partial periods [s]
+        nbins : int
+            number of complete partial periods kept in the ring buffer
+        base_time : float
+            start of the first partial period of the day [s from midnight]
+        max_gap : float
+            maximum time between consecutive samples [s]
+        dtype : data type
+            data type of the accumulated values
+
+        """
+        self.shape = tuple(shape)
+        self.partial_period = partial_period
+        self.nbins = nbins
+        self.base_time = base_time
+        self.max_gap = max_gap
+
+        self.partial_sums = np.zeros((nbins+1, )+self.shape, dtype=dtype)
+        self.partial_time = np.zeros(
+            (nbins+1, )+self.shape, dtype=np.float32)
+        self.partial_count = np.zeros(
+            (nbins+1, )+self.shape, dtype=np.uint16)
+        self.bin_end = None
+        self.ind_bin = 0
+        self.nbins_done = 0
+        self.last_time = None
+        self.last_rate = None
+
+    def add(self, time, rate):
+        """
+        Adds a new rain rate sample. The rain fallen since the last sample
+        is distributed among the partial periods it spans
+
+        Parameters
+        ----------
+        time : datetime object
+            time of the sample
+        rate : masked array
+            rain rate [mm/h]. Masked values are not integrated
+
+        Returns
+        -------
+        closed_bins : list of datetime objects
+            end time of the partial periods completed by the sample
+
+        """
+        rate = np.ma.asarray(rate)
+        if rate.shape != self.shape:
+            raise ValueError(
+                'ERROR: Rain rate field shape '+str(rate.shape) +
+                ' does not match accumulator shape '+str(self.shape))
+
+        if self.last_time is None:
+            self.bin_end = self._get_bin_end(time)
+            self._set_last(time, rate)
+            return []
+
+        if time <= self.last_time:
+            warn('Rain rate sample at '+str(time)+' not newer than last ' +
+                 'sample. Skipped')
+            return []
+
+        closed_bins = []
+        dt = (time-self.last_time).total_seconds()
+        if dt > self.max_gap:
+            warn('Gap of '+str(dt)+' s between rain rate samples. ' +
+                 'The rain fallen during the gap is not accumulated')
+            while self.bin_end <= time:
+                closed_bins.append(self._close_bin())
+            self._set_last(time, rate)
+            return closed_bins
+
+        # masked values are replaced by the other end of the interval
+        mask0 = np.ma.getmaskarray(self.last_rate)
+        mask1 = np.ma.getmaskarray(rate)
+        rate0 = np.ma.getdata(self.last_rate)
+        rate1 = np.ma.getdata(rate)
+        rate0 = np.where(mask0, rate1, rate0)
+        rate1 = np.where(mask1, rate0, rate1)
+        valid = np.logical_not(mask0 & mask1)
+        rate0 = np.where(valid, rate0, 0.)
+        rate1 = np.where(valid, rate1, 0.)
+
+        tstart = self.last_time
+        while True:
+            tend = min(time, self.bin_end)
+            frac0 = (tstart-self.last_time).total_seconds()/dt
+            frac1 = (tend-self.last_time).total_seconds()/dt
+            self.partial_sums[self.ind_bin] += (
+                (rate0*(1.-0.5*(frac0+frac1))+rate1*0.5*(frac0+frac1)) *
+                (tend-tstart).total_seconds()/3600.)
+            self.partial_time[self.ind_bin][valid] += (
+                (tend-tstart).total_seconds())
+            if tend < self.bin_end:
+                break
+            closed_bins.append(self._close_bin())
+            if tend == time:
+                break
+            tstart = tend
+
+        self._set_last(time, rate)
+        return closed_bins
+
+    def get_accumulation(self, window, min_coverage=0., include_current=False):
+        """
+        Gets the rain accumulated over the last partial periods covering a
+        window
+
+        Parameters
+        ----------
+        window : float
+            duration of the window [s]. It is rounded to a number of partial
+            periods
+        min_coverage : float
+            minimum fraction of the window with valid rain rate. Points with
+            less coverage are masked
+        include_current : bool
+            If True the current, incomplete, partial period is the last of
+            the window. Otherwise the window ends with the last complete
+            partial period
+
+        Returns
+        -------
+        accumulation : masked array
+            accumulated rain [mm]
+        npoints : int array
+            number of valid samples in the window
+
+        """
+        nwin = int(round(window/self.partial_period))
+        if nwin > self.nbins:
+            warn('Accumulation window longer than the ring buffer. ' +
+                 'Only '+str(self.nbins*self.partial_period)+' s are used')
+            nwin = self.nbins
+
+        if include_current:
+            inds = (self.ind_bin-np.arange(nwin)) % (self.nbins+1)
+            inds = inds[:self.nbins_done+1]
+        else:
+            inds = (self.ind_bin-1-np.arange(nwin)) % (self.nbins+1)
+            inds = inds[:self.nbins_done]
+
+        accumulation = np.sum(self.partial_sums[inds], axis=0)
+        npoints = np.sum(self.partial_count[inds], axis=0)
+        coverage = np.sum(self.partial_time[inds], axis=0)/window
+        mask = coverage <= 0.
+        if min_coverage > 0.:
+            mask |= coverage < min_coverage
+
+        return np.ma.masked_where(mask, accumulation), npoints
+
+    def _get_bin_end(self, time):
+        """
+        Gets the end time of the partial period containing a given time
+
+        Parameters
+        ----------
+        time : datetime object
+            the time
+
+        Returns
+        -------
+        bin_end : datetime object
+            end time of the partial period
+
+        """
+        date_00 = time.replace(hour=0, minute=0, second=0, microsecond=0)
+        bin_start = date_00+datetime.timedelta(seconds=self.base_time)
+        nperiods = np.floor(
+            (time-bin_start).total_seconds()/self.partial_period)
+        return bin_start+datetime.timedelta(
+            seconds=(nperiods+1)*self.partial_period)
+
+    def _close_bin(self):
+        """
+        Completes the current partial period and starts the next one
+
+        Returns
+        -------
+        bin_end : datetime object
+            end time of the completed partial period
+
+        """
+        bin_end = self.bin_end
+        self.ind_bin = (self.ind_bin+1) % (self.nbins+1)
+        self.partial_sums[self.ind_bin] = 0.
+        self.partial_time[self.ind_bin] = 0.
+        self.partial_count[self.ind_bin] = 0
+        self.nbins_done = min(self.nbins_done+1, self.nbins)
+        self.bin_end += datetime.timedelta(seconds=self.partial_period)
+
+        return bin_end
+
+    def _set_last(self, time, rate):
+        """
+        Keeps a rain rate sample for the integration of the next one
+
+        Parameters
+        ----------
+        time : datetime object
+            time of the sample
+        rate : masked array
+            rain rate [mm/h]
+
+        """
+        self.partial_count[self.ind_bin] += np.logical_not(
+            np.ma.getmaskarray(rate)).astype(np.uint16)
+        self.last_time = time
+        self.last_rate = rate
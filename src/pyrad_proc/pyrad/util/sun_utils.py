@@ -0,0 +1,574 @@
+"""
+pyrad.util.sun_utils
+====================
+
+Vectorized sun hit detection. The position of the sun is computed for all
+the rays of a volume at once, the rays pointing close to the sun are
+selected by their angular distance to it and the sun hit statistics of the
+selected rays are computed in bulk. The acceptance rules and the output are
+those of pyart.correct.get_sun_hits with the MF sun position.
+
+.. autosummary::
+    :toctree: generated/
+
+    compute_sun_position
+    get_ray_sun_position
+    get_sun_hit_candidates
+    find_sun_hits
+    _get_declination
+    _est_sun_hit_pwr
+    _est_sun_hit_zdr
+    _get_sun_hit_field
+
+"""
+
+import datetime
+from copy import copy
+from warnings import warn
+
+import numpy as np
+from netCDF4 import num2date
+
+import pyart
+from pyart.correct.sunlib import gas_att_sun
+
+# correction of the solar declination at each fortnight of the year [arcmin]
+_DECLINATION_CORRECTION = np.array([
+    0., 3., 6., 9., 12., 13., 12., 10., 10., 8., 6., 3., 1., -2., -3., -4.,
+    -5., -5., -3., -3., -1., -1., 0., 0., 1., 3., 6.])
+
+
+def compute_sun_position(dayjul, htime, latitude, longitude,
+                         refraction=True):
+    """
+    Computes the position of the sun for a set of times at once. The
+    formulas are those of pyart.correct.sun_position_mfr
+
+    Parameters
+    ----------
+    dayjul : int array
+        day of the year. 1 for the 1st of January
+    htime : float array
+        time since midnight [h]
+    latitude, longitude : float
+        position of the observer [deg]
+    refraction : bool
+        If True the elevation is corrected for atmospheric refraction
+
+    Returns
+    -------
+    sun_el, sun_az : float arrays
+        elevation and azimuth of the sun [deg]
+
+    """
+    dayjul = np.asarray(dayjul, dtype=int)
+    htime = np.asarray(htime, dtype=float)
+    lat = latitude*np.pi/180.
+    lon = longitude*np.pi/180.
+
+    # equation of time [h]
+    omega = 2.*np.pi/365.2425
+    eqt = np.zeros(dayjul.shape)
+    for i, (coeff_cos, coeff_sin) in enumerate((
+            (-0.00720, 0.12290), (0.0528, 0.1565), (0.0012, 0.0041))):
+        z = dayjul*omega*(i+1)
+        eqt += coeff_cos*np.cos(z)+coeff_sin*np.sin(z)
+    eqt = -eqt
+
+    # hour angle and declination [rad]
+    hang = (htime+12./np.pi*lon+eqt-12.)*np.pi/12.
+    delta1 = _get_declination(dayjul)
+    delta2 = _get_declination(dayjul+1)
+    sdec = (delta1+(delta2-delta1)*htime/24.)*np.pi/180.
+
+    with np.errstate(invalid='ignore'):
+        sun_el = np.arcsin(
+            np.sin(lat)*np.sin(sdec) +
+            np.cos(lat)*np.cos(sdec)*np.cos(hang))*180./np.pi
+        sun_az = np.arccos(
+            (np.sin(lat)*np.cos(sdec)*np.cos(hang)-np.cos(lat)*np.sin(sdec)) /
+            np.cos(sun_el*np.pi/180.))*180./np.pi
+    sun_az = np.where(hang < 0, 180.-sun_az, 180.+sun_az)
+
+    if refraction:
+        # Holleman and Huuskonen (2013)
+        es_rad = sun_el*np.pi/180.
+        k = 5./4.
+        no = 313.*1e-6+1.
+        refr = (
+            (k-1.)/(2.*k-1.)*np.cos(es_rad) *
+            (np.sqrt(np.sin(es_rad)**2.+(4.*k-2.)/(k-1.)*(no-1.)) -
+             np.sin(es_rad)))*180./np.pi
+        sun_el = sun_el+np.where(sun_el < -0.77, 0., refr)
+
+    return sun_el, sun_az
+
+
+def get_ray_sun_position(radar, refraction=True):
+    """
+    Computes the position of the sun at the time of each ray of a radar
+    volume
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object
+    refraction : bool
+        If True the elevation is corrected for atmospheric refraction
+
+    Returns
+    -------
+    sun_el, sun_az : float arrays
+        elevation and azimuth of the sun for each ray [deg]
+
+    """
+    time_ref = num2date(
+        0., radar.time['units'], radar.time.get('calendar', 'gregorian'))
+    time_ref = np.datetime64(datetime.datetime(
+        time_ref.year, time_ref.month, time_ref.day, time_ref.hour,
+        time_ref.minute, time_ref.second), 'us')
+    times = time_ref+np.round(
+        np.asarray(radar.time['data'], dtype=float)*1e6).astype(
+            'timedelta64[us]')
+
+    days = times.astype('datetime64[D]')
+    dayjul = (days-days.astype('datetime64[Y]')).astype(int)+1
+    htime = (times-days).astype(np.int64)/1e6/3600.
+
+    return compute_sun_position(
+        dayjul, htime, radar.latitude['data'][0],
+        radar.longitude['data'][0], refraction=refraction)
+
+
+def get_sun_hit_candidates(radar, delev_max=2., dazim_max=2., elmin=1.):
+    """
+    Selects the rays of a radar volume pointing close enough to the sun to
+    potentially contain a sun hit
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object
+    delev_max, dazim_max : float
+        maximum elevation and azimuth distance between the ray and the sun
+        [deg]
+    elmin : float
+        minimum radar elevation [deg]
+
+    Returns
+    -------
+    ind_rays : int array
+        indices of the candidate rays
+    sun_el, sun_az : float arrays
+        elevation and azimuth of the sun for the candidate rays [deg]
+
+    """
+    sun_el, sun_az = get_ray_sun_position(radar)
+    rad_el = radar.elevation['data']
+    rad_az = radar.azimuth['data']
+
+    with np.errstate(invalid='ignore'):
+        delev = np.abs(rad_el-sun_el)
+        dazim = np.abs((rad_az-sun_az)*np.cos(sun_el*np.pi/180.))
+        dazim = np.where(dazim > 360., dazim-360., dazim)
+
+        # the rays are rejected as in pyart, i.e. undefined sun positions
+        # are not rejected
+        is_rejected = (
+            (rad_el < elmin) | (sun_el < 0.) | (delev > delev_max) |
+            (dazim > dazim_max))
+    ind_rays = np.where(~is_rejected)[0]
+
+    return ind_rays, sun_el[ind_rays], sun_az[ind_rays]
+
+
+def find_sun_hits(radar, delev_max=2., dazim_max=2., elmin=1.,
+                  rmin=50000., hmin=10000., nbins_min=20, attg=None,
+                  max_std_pwr=1., max_std_zdr=1.5, pwrh_field=None,
+                  pwrv_field=None, zdr_field=None):
+    """
+    Detects the sun hits in a radar volume. The candidate rays are selected
+    by their angular distance to the sun and the sun signal of all of them
+    is estimated at once with the Hildebrand and Sekhon (1974) method. The
+    results are those of pyart.correct.get_sun_hits
+
+    Parameters
+    ----------
+    radar : radar object
+        the radar object
+    delev_max, dazim_max : float
+        maximum elevation and azimuth distance between the ray and the sun
+        [deg]
+    elmin : float
+        minimum radar elevation [deg]
+    rmin : float
+        minimum range where to look for a sun hit signal [m]. If the radar
+        range is shorter the last 2*nbins_min gates are inspected
+    hmin : float
+        minimum altitude where to look for a sun hit signal [m MSL]. The
+        search starts at the closest of rmin and the range where the
+        altitude exceeds hmin
+    nbins_min : int
+        minimum number of range gates with signal to consider the ray a sun
+        hit
+    attg : float
+        gaseous attenuation coefficient [dB/km]. If None it is obtained from
+        the radar frequency
+    max_std_pwr, max_std_zdr : float
+        maximum standard deviation of the signal power and the ZDR to
+        consider the ray a sun hit [dB]
+    pwrh_field, pwrv_field, zdr_field : str
+        names of the horizontal and vertical signal power and ZDR fields
+
+    Returns
+    -------
+    sun_hits : dict
+        dictionary with the sun hit parameters of each candidate ray
+    new_radar : radar object
+        radar object with the sweeps containing the candidate rays. It
+        contains the power and ZDR fields and the sun hit flags
+
+    """
+    if attg is None:
+        attg = 0.
+        if (radar.instrument_parameters is not None and
+                'frequency' in radar.instrument_parameters):
+            attg = pyart.retrieve.get_coeff_attg(
+                radar.instrument_parameters['frequency']['data'][0])
+        else:
+            warn('Unknown 1-way gas attenuation. It will be set to 0')
+
+    ind_rmin = np.where(radar.range['data'] > rmin)[0]
+    if ind_rmin.size > 0:
+        ind_rmin = ind_rmin[0]
+    else:
+        warn('Maximum radar range below the minimum range for sun signal' +
+             ' estimation. The last '+str(2*nbins_min)+' will be inspected')
+        ind_rmin = int(radar.ngates-2*nbins_min)
+        if ind_rmin < 0:
+            warn('Radar range too short to retrieve sun signal')
+            return None, None
+
+    if pwrh_field is None:
+        pwrh_field = pyart.config.get_field_name('signal_power_hh')
+    if pwrv_field is None:
+        pwrv_field = pyart.config.get_field_name('signal_power_vv')
+    if zdr_field is None:
+        zdr_field = pyart.config.get_field_name('differential_reflectivity')
+
+    pwrh = radar.fields.get(pwrh_field, dict()).get('data', None)
+    pwrv = radar.fields.get(pwrv_field, dict()).get('data', None)
+    zdr = radar.fields.get(zdr_field, dict()).get('data', None)
+    if pwrh is None and pwrv is None and zdr is None:
+        return None, None
+    if zdr is not None:
+        # ZDR is only valid where the power of both channels is
+        mask_zdr = np.ma.getmaskarray(zdr)
+        for pwr in (pwrh, pwrv):
+            if pwr is not None:
+                mask_zdr = mask_zdr | np.ma.getmaskarray(pwr)
+        zdr = np.ma.masked_where(mask_zdr, zdr)
+
+    ind_rays, sun_el, sun_az = get_sun_hit_candidates(
+        radar, delev_max=delev_max, dazim_max=dazim_max, elmin=elmin)
+    nhits = ind_rays.size
+    if nhits == 0:
+        return None, None
+
+    # first gate where to look for the sun signal
+    is_high = np.ma.filled(
+        radar.gate_altitude['data'][ind_rays, :] > hmin, False)
+    ind_min = np.where(
+        np.any(is_high, axis=1),
+        np.minimum(ind_rmin, np.argmax(is_high, axis=1)), ind_rmin)
+    is_far = (
+        np.arange(radar.ngates)[np.newaxis, :] >= ind_min[:, np.newaxis])
+
+    # one-way gaseous attenuation of the sun signal
+    attg_sun = gas_att_sun(sun_el, attg)
+
+    fill_value = pyart.config.get_fillvalue()
+    sun_hits = {
+        'time': list(num2date(
+            radar.time['data'][ind_rays], radar.time['units'],
+            radar.time.get('calendar', 'gregorian'))),
+        'ray': ind_rays,
+        'NPrng': np.full(nhits, radar.ngates),
+        'rad_el': radar.elevation['data'][ind_rays],
+        'rad_az': radar.azimuth['data'][ind_rays],
+        'sun_el': sun_el,
+        'sun_az': sun_az}
+    fields = dict()
+
+    hits = dict()
+    for pwr, field_name, hit_name, keys in (
+            (pwrh, pwrh_field, 'sun_hit_h',
+             ('dBm_sun_hit', 'std(dBm_sun_hit)', 'NPh', 'NPhval')),
+            (pwrv, pwrv_field, 'sun_hit_v',
+             ('dBmv_sun_hit', 'std(dBmv_sun_hit)', 'NPv', 'NPvval'))):
+        if pwr is None:
+            values = (
+                np.full(nhits, fill_value), np.full(nhits, fill_value),
+                np.zeros(nhits, dtype=int), np.zeros(nhits, dtype=int))
+            hits[hit_name] = None
+        else:
+            values = _est_sun_hit_pwr(
+                pwr[ind_rays, :], is_far, attg_sun, max_std_pwr, nbins_min,
+                fill_value)
+            hits[hit_name] = values[4]
+            fields[field_name] = pyart.config.get_metadata(field_name)
+            fields[field_name]['data'] = pwr
+            fields[hit_name] = _get_sun_hit_field(
+                hit_name, values[4], pwr, ind_rays)
+        sun_hits.update(dict(zip(keys, values[:4])))
+
+    if zdr is None:
+        values = (
+            np.full(nhits, fill_value), np.full(nhits, fill_value),
+            np.zeros(nhits, dtype=int), np.zeros(nhits, dtype=int))
+    else:
+        values = _est_sun_hit_zdr(
+            zdr[ind_rays, :], is_far, hits['sun_hit_h'], hits['sun_hit_v'],
+            max_std_zdr, nbins_min, fill_value)
+        fields[zdr_field] = pyart.config.get_metadata(zdr_field)
+        fields[zdr_field]['data'] = zdr
+        fields['sun_hit_zdr'] = _get_sun_hit_field(
+            'sun_hit_zdr', values[4], zdr, ind_rays)
+    sun_hits.update(dict(zip(
+        ('ZDR_sun_hit', 'std(ZDR_sun_hit)', 'NPzdr', 'NPzdrval'),
+        values[:4])))
+
+    for key in ('dBm_sun_hit', 'std(dBm_sun_hit)', 'dBmv_sun_hit',
+                'ZDR_sun_hit', 'std(ZDR_sun_hit)'):
+        sun_hits[key] = np.ma.masked_values(sun_hits[key], fill_value)
+    # as in pyart.correct.get_sun_hits the standard deviation written for
+    # the vertical channel is that of the horizontal channel
+    sun_hits['std(dBmv_sun_hit)'] = sun_hits['std(dBm_sun_hit)'].copy()
+
+    # sweeps of the candidate rays, once per ray. Only the fields used in
+    # the detection are kept, the other fields are not copied
+    sweep_start = radar.sweep_start_ray_index['data']
+    sweep_end = radar.sweep_end_ray_index['data']
+    in_sweep = (
+        (sweep_start[np.newaxis, :] <= ind_rays[:, np.newaxis]) &
+        (sweep_end[np.newaxis, :] >= ind_rays[:, np.newaxis]))
+    sweeps = np.argmax(in_sweep, axis=1)[np.any(in_sweep, axis=1)]
+
+    new_radar = copy(radar)
+    new_radar.fields = dict()
+    for field_name, field_dict in fields.items():
+        new_radar.add_field(field_name, field_dict)
+    new_radar = new_radar.extract_sweeps(sweeps)
+
+    return sun_hits, new_radar
+
+
+def _get_declination(dayjul):
+    """
+    Computes the solar declination at the beginning of a set of days as in
+    pyart.correct.solar_declination
+
+    Parameters
+    ----------
+    dayjul : int array
+        day of the year. 1 for the 1st of January
+
+    Returns
+    -------
+    declination : float array
+        the solar declination [deg]
+
+    """
+    z = dayjul*2.*np.pi/365.2425
+    x = 0.33281-22.984*np.cos(z)-0.3499*np.cos(2.*z)-0.1398*np.cos(3.*z)
+    y = 3.7872*np.sin(z)+0.03205*np.sin(2.*z)+0.07187*np.sin(3.*z)
+
+    fortnight = dayjul//15+1
+    day_fortnight = dayjul-(fortnight-1)*15
+    corr = (
+        _DECLINATION_CORRECTION[fortnight] +
+        day_fortnight/15.*(
+            _DECLINATION_CORRECTION[fortnight+1] -
+            _DECLINATION_CORRECTION[fortnight]))/60.
+
+    return x+y+corr
+
+
+def _est_sun_hit_pwr(pwr, is_far, attg_sun, max_std, nbins_min,
+                     fill_value):
+    """
+    Estimates the sun signal power of a set of rays at once. The noise level
+    of each ray is found with the Hildebrand and Sekhon (1974) method
+    applied to the sorted linear power of its gates
+
+    Parameters
+    ----------
+    pwr : masked 2D array
+        the signal power of the candidate rays [dBm]
+    is_far : bool 2D array
+        True for the gates where to look for the sun signal
+    attg_sun : float array
+        one-way gaseous attenuation of the sun signal of each ray [dB]
+    max_std : float
+        maximum standard deviation of the sun signal [dB]
+    nbins_min : int
+        minimum number of valid gates to estimate the sun signal
+    fill_value : float
+        value of the rays without valid sun signal
+
+    Returns
+    -------
+    sun_pwr, sun_pwr_std : float arrays
+        the sun signal power and its standard deviation [dBm]
+    npoints : int array
+        the number of gates used in the estimation. 0 if the signal is not
+        valid
+    nvalid : int array
+        the number of valid gates
+    sun_hit : bool 2D array
+        True for the gates used in the estimation
+
+    """
+    nrays, ngates = pwr.shape
+    valid = is_far & np.logical_not(np.ma.getmaskarray(pwr))
+    nvalid = np.sum(valid, axis=1)
+
+    # sort the linear power of each ray. Invalid gates go at the end
+    pwr_mw = np.power(
+        10., 0.1*(np.ma.getdata(pwr)+attg_sun[:, np.newaxis]))
+    pwr_mw[~valid] = np.inf
+    ind_sort = np.argsort(pwr_mw, axis=1)
+    pwr_sorted = np.take_along_axis(pwr_mw, ind_sort, axis=1)
+    is_valid = np.isfinite(pwr_sorted)
+    pwr_sorted[~is_valid] = 0.
+
+    # Hildebrand and Sekhon criterion on the partial sums
+    npts = np.arange(1, ngates+1)[np.newaxis, :]
+    sum1 = np.cumsum(pwr_sorted, axis=1)
+    sum2 = np.cumsum(pwr_sorted*pwr_sorted, axis=1)
+    is_noise = is_valid & (npts*sum2 < sum1*sum1*2.)
+    npoints = np.sum(np.cumprod(is_noise, axis=1), axis=1)
+
+    # statistics of the noise gates
+    ind_last = (np.maximum(npoints, 1)-1)[:, np.newaxis]
+    mean_mw = (
+        np.take_along_axis(sum1, ind_last, axis=1)[:, 0] /
+        np.maximum(npoints, 1))
+    pwr_dbm = np.ma.masked_where(
+        npts > npoints[:, np.newaxis],
+        10.*np.log10(np.where(is_valid, pwr_sorted, 1.)))
+    sun_pwr_std = np.ma.filled(pwr_dbm.std(axis=1), 0.)
+
+    is_hit = (nvalid >= nbins_min) & ~(sun_pwr_std > max_std)
+    sun_pwr = np.full(nrays, fill_value)
+    sun_pwr[is_hit] = 10.*np.log10(mean_mw[is_hit])
+    sun_pwr_std = np.where(is_hit, sun_pwr_std, fill_value)
+    npoints = np.where(is_hit, npoints, 0)
+
+    # gates used in the estimation, back in range order
+    sun_hit = np.zeros((nrays, ngates), dtype=bool)
+    np.put_along_axis(
+        sun_hit, ind_sort, npts <= npoints[:, np.newaxis], axis=1)
+
+    return sun_pwr, sun_pwr_std, npoints, nvalid, sun_hit
+
+
+def _est_sun_hit_zdr(zdr, is_far, sun_hit_h, sun_hit_v, max_std,
+                     nbins_min, fill_value):
+    """
+    Estimates the sun signal ZDR of a set of rays at once from the gates
+    that are sun hits in both channels
+
+    Parameters
+    ----------
+    zdr : masked 2D array
+        the ZDR of the candidate rays, masked where the power of any channel
+        is [dB]
+    is_far : bool 2D array
+        True for the gates where to look for the sun signal
+    sun_hit_h, sun_hit_v : bool 2D array or None
+        the sun hit gates of each channel. None if the channel is not
+        available
+    max_std : float
+        maximum standard deviation of the sun signal ZDR [dB]
+    nbins_min : int
+        minimum number of valid gates to estimate the sun signal
+    fill_value : float
+        value of the rays without valid sun signal
+
+    Returns
+    -------
+    sun_zdr, sun_zdr_std : float arrays
+        the sun signal ZDR and its standard deviation [dB]
+    npoints : int array
+        the number of gates used in the estimation. 0 if the signal is not
+        valid
+    nvalid : int array
+        the number of valid gates
+    sun_hit : bool 2D array
+        True for the gates used in the estimation
+
+    """
+    nrays = zdr.shape[0]
+    mask = np.ma.getmaskarray(zdr)
+    nvalid = np.sum(is_far & ~mask, axis=1)
+
+    sun_hit = ~mask
+    for sun_hit_pwr in (sun_hit_h, sun_hit_v):
+        if sun_hit_pwr is not None:
+            sun_hit = sun_hit & sun_hit_pwr
+    npoints = np.sum(sun_hit, axis=1)
+
+    # statistics ray by ray so that the sums are computed in the same order
+    # as in pyart
+    sun_zdr = np.zeros(nrays)
+    sun_zdr_std = np.zeros(nrays)
+    for ind in np.nonzero(npoints >= 2)[0]:
+        zdr_ray = zdr[ind, :][sun_hit[ind, :]]
+        sun_zdr[ind] = np.ma.mean(zdr_ray)
+        sun_zdr_std[ind] = np.ma.std(zdr_ray)
+
+    is_hit = (
+        (nvalid >= nbins_min) & (npoints >= 2) & ~(sun_zdr_std > max_std))
+    if sun_hit_h is None and sun_hit_v is None:
+        is_hit[:] = False
+    sun_zdr = np.where(is_hit, sun_zdr, fill_value)
+    sun_zdr_std = np.where(is_hit, sun_zdr_std, fill_value)
+    npoints = np.where(is_hit, npoints, 0)
+    sun_hit &= is_hit[:, np.newaxis]
+
+    return sun_zdr, sun_zdr_std, npoints, nvalid, sun_hit
+
+
+def _get_sun_hit_field(field_name, sun_hit, field, ind_rays):
+    """
+    Creates a field dictionary flagging the sun hit gates of a volume
+
+    Parameters
+    ----------
+    field_name : str
+        name of the field
+    sun_hit : bool 2D array
+        True for the sun hit gates of the candidate rays
+    field : masked 2D array
+        the data of the whole volume used in the detection
+    ind_rays : int array
+        indices of the candidate rays
+
+    Returns
+    -------
+    sun_hit_dict : dict
+        field dictionary. 2 for the sun hit gates, 1 otherwise. Gates without
+        data are masked
+
+    """
+    mask = np.ma.getmaskarray(field)
+    data = np.ones(mask.shape, dtype=np.uint8)
+    data[ind_rays, :] += sun_hit
+    data[mask] = 0
+
+    sun_hit_dict = pyart.config.get_metadata(field_name)
+    sun_hit_dict['data'] = np.ma.masked_where(mask, data)
+    sun_hit_dict.update({'_FillValue': 0})
+
+    return sun_hit_dict
@@ -0,0 +1,124 @@
+""" Unit Tests for Pyrad's util/dtype_utils.py module. """
+
+import numpy as np
+import pytest
+
+import pyart
+
+from pyrad.util.dtype_utils import compact_field, compact_radar_fields
+from pyrad.util.radar_utils import compute_quantiles
+from pyrad.util.radar_utils import compute_directional_stats
+from pyrad.util.radar_utils import compute_histogram_sweep
+
+
+def _make_radar():
+    """ Radar with representative fields as produced by the processing. """
+    radar = pyart.testing.make_empty_ppi_radar(100, 36, 2)
+    shape = (radar.nrays, radar.ngates)
+    rng = np.random.RandomState(0)
+    mask = rng.random_sample(shape) < 0.2
+
+    refl = np.ma.masked_where(mask, rng.uniform(-30., 70., shape))
+    zdr = np.ma.masked_where(mask, rng.normal(0.5, 1.5, shape))
+    hydro = np.ma.masked_where(
+        mask, rng.randint(1, 10, shape).astype(float))
+    vis = np.ma.asarray(rng.randint(0, 101, shape).astype(float))
+    nsamples = np.ma.zeros(shape, dtype=int)
+    nsamples += rng.randint(0, 2000, shape)
+
+    for field_name, data in (
+            ('reflectivity', refl),
+            ('differential_reflectivity', zdr),
+            ('radar_echo_classification', hydro),
+            ('visibility', vis),
+            ('number_of_samples', nsamples)):
+        field = pyart.config.get_metadata(field_name)
+        field['data'] = data
+        radar.add_field(field_name, field)
+
+    return radar
+
+
+def _get_quantization_step(data):
+    """ Largest spacing of the single precision values of the data. """
+    return np.spacing(np.float32(np.ma.max(np.ma.abs(data))))
+
+
+def test_compact_radar_fields_dtypes():
+    radar = _make_radar()
+    radar_compact = compact_radar_fields(radar)
+
+    assert radar_compact.fields['reflectivity']['data'].dtype == np.float32
+    assert (radar_compact.fields['differential_reflectivity']['data'].dtype ==
+            np.float32)
+    assert (radar_compact.fields['radar_echo_classification']['data'].dtype ==
+            np.uint8)
+    assert radar_compact.fields['visibility']['data'].dtype == np.uint8
+    assert (radar_compact.fields['number_of_samples']['data'].dtype ==
+            np.uint16)
+
+    # the masks are kept and the input radar is not modified
+    for field_name in radar.fields:
+        assert np.array_equal(
+            np.ma.getmaskarray(radar.fields[field_name]['data']),
+            np.ma.getmaskarray(radar_compact.fields[field_name]['data']))
+    assert radar.fields['reflectivity']['data'].dtype == np.float64
+    assert radar.fields['number_of_samples']['data'].dtype == int
+
+
+def test_compact_products_equivalence():
+    radar = _make_radar()
+    radar_compact = compact_radar_fields(radar)
+
+    # physical moments: within the single precision quantization step
+    quantiles = [5., 25., 50., 75., 95.]
+    for field_name in ('reflectivity', 'differential_reflectivity'):
+        data = radar.fields[field_name]['data']
+        data_compact = radar_compact.fields[field_name]['data']
+        step = _get_quantization_step(data)
+
+        _, values = compute_quantiles(data, quantiles=quantiles)
+        _, values_compact = compute_quantiles(
+            data_compact, quantiles=quantiles)
+        assert np.ma.allclose(values_compact, values, rtol=0., atol=step)
+
+        values, nvalid = compute_directional_stats(
+            data, avg_type='median', axis=0)
+        values_compact, nvalid_compact = compute_directional_stats(
+            data_compact, avg_type='median', axis=0)
+        assert np.array_equal(nvalid_compact, nvalid)
+        assert np.ma.allclose(values_compact, values, rtol=0., atol=step)
+
+    # classes, visibility and counts: identical
+    for field_name in ('radar_echo_classification', 'visibility',
+                       'number_of_samples'):
+        data = radar.fields[field_name]['data']
+        data_compact = radar_compact.fields[field_name]['data']
+        assert np.array_equal(
+            np.ma.compressed(data_compact), np.ma.compressed(data))
+
+    for sweep in range(radar.nsweeps):
+        ray_start, ray_end = radar.get_start_end(sweep)
+        bin_edges, values = compute_histogram_sweep(
+            radar.fields['radar_echo_classification']['data'], ray_start,
+            ray_end, 'radar_echo_classification')
+        _, values_compact = compute_histogram_sweep(
+            radar_compact.fields['radar_echo_classification']['data'],
+            ray_start, ray_end, 'radar_echo_classification')
+        assert np.array_equal(
+            np.histogram(values_compact, bins=bin_edges)[0],
+            np.histogram(values, bins=bin_edges)[0])
+
+
+def test_compact_field_out_of_range():
+    for value in (70000, -1):
+        data = np.ma.zeros((3, 4), dtype=int)
+        data[1, 2] = value
+        field = {'data': data}
+
+        with pytest.warns(UserWarning, match='out of the range'):
+            field_compact = compact_field(field, 'number_of_samples')
+
+        assert field_compact['data'] is data
+        assert field['data'] is data
+        assert field_compact['data'].dtype == int
@@ -14,13 +14,19 @@ To run the processing framework type:
     python main_process_data_period.py \
 [config_file] [process_start_date] [process_end_date] \
 --starttime [process_start_time] --endtime [process_end_time] \
---postproc_cfgfile [postproc_config_file] --cfgpath [cfgpath]
+--postproc_cfgfile [postproc_config_file] --cfgpath [cfgpath] \
+--merge_days [merge_days] --nprocesses [nprocesses]
 
 starttime is an optional argument with default: '000000'
 endtime is an optional argument with default: '235959'
 postproc_cfgfile is an optional argument with default: None
 cfgpath is an optional argument with default: \
 '$HOME/pyrad/config/processing/'
+merge_days is an optional argument with default: 0. If 1 the accumulating \
+datasets (occurrence, time averages, monitoring) are computed over the whole \
+period by merging the partial results of each day
+nprocesses is an optional argument with default: 1. Number of days processed \
+in parallel when merge_days is 1
 
 Example:
     python main_process_data_period.py 'paradiso_fvj_vol.txt' '20140523' \
@@ -39,6 +45,7 @@ import atexit
 import os
 
 from pyrad.flow import main as pyrad_main
+from pyrad.flow import main_chunks as pyrad_main_chunks
 
 print(__doc__)
 
@@ -83,6 +90,14 @@ def main():
     parser.add_argument("--PROFILE_MULTIPROCESSING", type=int, default=0,
                         help="If 1 the multiprocessing is profiled")
 
+    parser.add_argument("--merge_days", type=int, default=0,
+                        help="If 1 the days are processed independently "
+                        "and the partial results of the accumulating "
+                        "datasets are merged over the whole period")
+    parser.add_argument("--nprocesses", type=int, default=1,
+                        help="Number of days processed in parallel if "
+                        "merge_days is 1")
+
     parser.add_argument(
         '--postproc_cfgfile', type=str, default=None,
         help='name of main post-processing configuration file')
@@ -135,6 +150,23 @@ def main():
     else:
         infostr = args.infostr
 
+    if args.merge_days:
+        starttimes = []
+        endtimes = []
+        for day in range(ndays):
+            current_date = proc_startdate + datetime.timedelta(days=day)
+            starttimes.append(current_date + proc_starttime)
+            endtimes.append(current_date + proc_endtime)
+        pyrad_main_chunks(cfgfile_proc, starttimes, endtimes,
+                          infostr=infostr, nprocesses=args.nprocesses)
+        if args.postproc_cfgfile is not None:
+            try:
+                pyrad_main(cfgfile_postproc, starttime=starttimes[0],
+                           endtime=endtimes[-1], infostr=infostr)
+            except ValueError:
+                print(ValueError)
+        return
+
     for day in range(ndays):
         current_date = proc_startdate + datetime.timedelta(days=day)
         proc_startdatetime = current_date + proc_starttime